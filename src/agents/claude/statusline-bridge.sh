@@ -11,43 +11,43 @@
 #   echo "$input" | /path/to/statusline-bridge.sh
 #   # ... user's statusline code continues with $input ...
 #
+# Runs on every StatusLine refresh (far more often than hooks fire), so the
+# hot path is kept fork-free: builtin JSON extraction, builtin timestamps,
+# TTY resolution cached per session, and no write at all when the extracted
+# values match the existing state file (only `ts` is refreshed, coarsely).
+#
 # Test overrides (for testing without real TTY):
 #   _TAVS_BRIDGE_STATE_DIR  — override state directory
 #   _TAVS_BRIDGE_TTY_SAFE   — override TTY_SAFE identifier
+#   _TAVS_BRIDGE_NOW        — override current epoch seconds
 # ==============================================================================
 set -euo pipefail
 
+# Seconds between `ts` refreshes when the payload is unchanged. Must stay
+# well below TAVS_CONTEXT_BRIDGE_MAX_AGE (default 30) or data goes stale.
+_TS_REFRESH_INTERVAL="${TAVS_CONTEXT_BRIDGE_TS_REFRESH:-10}"
+
+# Max session→TTY entries kept in the resolution cache
+_TTY_CACHE_MAX=16
+
 # === READ STDIN ===
-# StatusLine mechanism pipes JSON on stdin; cat reads full payload
+# StatusLine mechanism pipes JSON on stdin; read builtin slurps full payload
 _input=""
 if [[ ! -t 0 ]]; then
-    _input=$(cat 2>/dev/null) || true
+    IFS= read -r -d '' _input 2>/dev/null || true
 fi
 [[ -z "$_input" ]] && exit 0
 
-# === TTY RESOLUTION ===
-# Inlined from terminal-osc-sequences.sh:41-58 — cannot source that file
-# (it pulls in themes.sh and other heavy dependencies)
-_tty_safe="${_TAVS_BRIDGE_TTY_SAFE:-}"
-if [[ -z "$_tty_safe" ]]; then
-    _tty_dev=""
-    _tty_dev=$(ps -o tty= -p $PPID 2>/dev/null) || true
-    _tty_dev="${_tty_dev// /}"
-    if [[ -n "$_tty_dev" && "$_tty_dev" != "??" && "$_tty_dev" != "-" ]]; then
-        [[ "$_tty_dev" != /dev/* ]] && _tty_dev="/dev/$_tty_dev"
-    else
-        # Fallback to /dev/tty
-        if { echo -n "" > /dev/tty; } 2>/dev/null; then
-            _tty_dev="/dev/tty"
-        else
-            exit 0  # Can't determine TTY — exit silently
-        fi
-    fi
-    _tty_safe="${_tty_dev//\//_}"
+# === TIMESTAMP ===
+# EPOCHSECONDS (bash 5+) → printf %(%s)T (bash 4.2+) → date (bash 3.2)
+_now="${_TAVS_BRIDGE_NOW:-${EPOCHSECONDS:-}}"
+if [[ -z "$_now" ]]; then
+    printf -v _now '%(%s)T' -1 2>/dev/null || _now=""
+    [[ "$_now" =~ ^[0-9]+$ ]] || _now=$(date +%s)
 fi
 
 # === STATE DIRECTORY ===
-# Inlined from spinner.sh:16-24 — same reason as above
+# Inlined from spinner.sh:16-24 — cannot source it (heavy dependencies)
 _state_dir="${_TAVS_BRIDGE_STATE_DIR:-}"
 if [[ -z "$_state_dir" ]]; then
     if [[ -n "${XDG_RUNTIME_DIR:-}" && -d "${XDG_RUNTIME_DIR:-}" ]]; then
@@ -62,44 +62,121 @@ if [[ ! -d "$_state_dir" ]]; then
     chmod 700 "$_state_dir" 2>/dev/null || true
 fi
 
+# === TTY RESOLUTION ===
+# Inlined from terminal-osc-sequences.sh:41-58 — cannot source that file
+# (it pulls in themes.sh and other heavy dependencies).
+# `ps` is only spawned on a cache miss; hits are resolved with builtins from
+# bridge-tty.cache (lines of "session_id=tty_safe", newest last). The cache is
+# keyed on the payload's session_id: the bridge's parent is a fresh shell on
+# every refresh, so its PID would almost never hit and could be reused by an
+# unrelated process. An entry whose device is gone is resolved again; the
+# file is only rewritten when the session's entry is new or changed.
+_tty_safe="${_TAVS_BRIDGE_TTY_SAFE:-}"
+if [[ -z "$_tty_safe" ]]; then
+    _session=""
+    _session_re='"session_id"[[:space:]]*:[[:space:]]*"([A-Za-z0-9_-]+)"'
+    [[ "$_input" =~ $_session_re ]] && _session="${BASH_REMATCH[1]}"
+
+    _tty_cache="${_state_dir}/bridge-tty.cache"
+    _cached=() _cached_tty=""
+    if [[ -n "$_session" && -f "$_tty_cache" ]]; then
+        while IFS='=' read -r _k _v; do
+            [[ "$_k" =~ ^[A-Za-z0-9_-]+$ && "$_v" =~ ^[A-Za-z0-9_]+$ ]] || continue
+            [[ "$_k" == "$_session" ]] && { _cached_tty="$_v"; continue; }
+            _cached+=("${_k}=${_v}")
+        done < "$_tty_cache"
+        [[ -n "$_cached_tty" && -e "${_cached_tty//_//}" ]] && _tty_safe="$_cached_tty"
+    fi
+
+    if [[ -z "$_tty_safe" ]]; then
+        _tty_dev=""
+        _tty_dev=$(ps -o tty= -p $PPID 2>/dev/null) || true
+        _tty_dev="${_tty_dev// /}"
+        # No TTY: "??" (macOS), "?" (Linux procps) or "-"
+        if [[ -n "$_tty_dev" && "$_tty_dev" != "?" && "$_tty_dev" != "??" && "$_tty_dev" != "-" ]]; then
+            [[ "$_tty_dev" != /dev/* ]] && _tty_dev="/dev/$_tty_dev"
+            _tty_safe="${_tty_dev//\//_}"
+
+            # Remember this session, keeping only the newest entries
+            if [[ -n "$_session" && "$_tty_safe" != "$_cached_tty" ]]; then
+                _cached+=("${_session}=${_tty_safe}")
+                _start=$(( ${#_cached[@]} - _TTY_CACHE_MAX ))
+                (( _start < 0 )) && _start=0
+                _cache_tmp="${_tty_cache}.tmp.$$"
+                if printf '%s\n' "${_cached[@]:$_start}" > "$_cache_tmp" 2>/dev/null; then
+                    mv "$_cache_tmp" "$_tty_cache" 2>/dev/null || rm -f "$_cache_tmp" 2>/dev/null
+                fi
+            fi
+        elif { echo -n "" > /dev/tty; } 2>/dev/null; then
+            # Fallback to /dev/tty (not cached — no stable session mapping)
+            _tty_safe="_dev_tty"
+        else
+            exit 0  # Can't determine TTY — exit silently
+        fi
+    fi
+fi
+
 # === JSON FIELD EXTRACTION ===
-# sed-based extraction — no jq dependency (matching trigger.sh pattern)
-# Handles: "key": value, "key": "value", "key":value (with/without quotes)
-_extract() {
-    printf '%s' "$_input" | \
-        sed -n "s/.*\"$1\"[[:space:]]*:[[:space:]]*\"\{0,1\}\([^\",}]*\).*/\1/p" | head -1
-}
-
-_pct=$(_extract 'used_percentage')
-_model=$(_extract 'display_name')
-_cost=$(_extract 'total_cost_usd')
-_duration=$(_extract 'total_duration_ms')
-_lines_add=$(_extract 'total_lines_added')
-_lines_rem=$(_extract 'total_lines_removed')
-
-# Filter out literal "null" (used_percentage is null before first API call)
-[[ "$_pct" == "null" ]] && _pct=""
-[[ "$_model" == "null" ]] && _model=""
-[[ "$_cost" == "null" ]] && _cost=""
-[[ "$_duration" == "null" ]] && _duration=""
-[[ "$_lines_add" == "null" ]] && _lines_add=""
-[[ "$_lines_rem" == "null" ]] && _lines_rem=""
+# Single pass over the payload with builtin regex matching — no jq, sed or
+# subshells. Handles: "key": value, "key": "value", "key":value.
+# Values stop at a quote, comma, closing brace or line break.
+_nl=$'\n'
+_cr=$'\r'
+_value_re="[[:space:]]*:[[:space:]]*\"?([^\",}${_nl}${_cr}]*)"
+_pct="" _model="" _cost="" _duration="" _lines_add="" _lines_rem=""
+for _field in used_percentage:_pct display_name:_model total_cost_usd:_cost \
+              total_duration_ms:_duration total_lines_added:_lines_add \
+              total_lines_removed:_lines_rem; do
+    _re="\"${_field%%:*}\"${_value_re}"
+    if [[ "$_input" =~ $_re ]]; then
+        _val="${BASH_REMATCH[1]}"
+        # Filter out literal "null" (used_percentage is null before first API call)
+        [[ "$_val" == "null" ]] && _val=""
+        printf -v "${_field#*:}" '%s' "$_val"
+    fi
+done
 
-# === ATOMIC WRITE ===
-# mktemp + mv pattern (from session-state.sh, title-state-persistence.sh)
+# === UNCHANGED-PAYLOAD SHORT-CIRCUIT ===
+# Same values as the existing state file and ts still fresh → no write.
 _state_file="${_state_dir}/context.${_tty_safe}"
-_tmp_file=$(mktemp "${_state_file}.tmp.XXXXXX" 2>/dev/null) || exit 0
-
-cat > "$_tmp_file" << EOF
-# TAVS Context Bridge - $(date -u +%Y-%m-%dT%H:%M:%S+00:00)
-pct=${_pct:-}
-model=${_model:-}
-cost=${_cost:-}
-duration=${_duration:-}
-lines_add=${_lines_add:-}
-lines_rem=${_lines_rem:-}
-ts=$(date +%s)
-EOF
+if [[ -f "$_state_file" ]]; then
+    _old_pct="" _old_model="" _old_cost="" _old_duration=""
+    _old_lines_add="" _old_lines_rem="" _old_ts=""
+    while IFS='=' read -r _k _v; do
+        case "$_k" in
+            pct)       _old_pct="$_v" ;;
+            model)     _old_model="$_v" ;;
+            cost)      _old_cost="$_v" ;;
+            duration)  _old_duration="$_v" ;;
+            lines_add) _old_lines_add="$_v" ;;
+            lines_rem) _old_lines_rem="$_v" ;;
+            ts)        _old_ts="$_v" ;;
+        esac
+    done < "$_state_file"
+
+    if [[ "$_old_ts" =~ ^[0-9]+$ ]] \
+        && (( _now - _old_ts >= 0 && _now - _old_ts < _TS_REFRESH_INTERVAL )) \
+        && [[ "$_pct" == "$_old_pct" && "$_model" == "$_old_model" \
+           && "$_cost" == "$_old_cost" && "$_duration" == "$_old_duration" \
+           && "$_lines_add" == "$_old_lines_add" \
+           && "$_lines_rem" == "$_old_lines_rem" ]]; then
+        exit 0
+    fi
+fi
+
+# === ATOMIC WRITE ===
+# tmp.$$ + mv pattern (from session-state.sh)
+_stamp=""
+TZ=UTC printf -v _stamp '%(%Y-%m-%dT%H:%M:%S+00:00)T' "$_now" 2>/dev/null || true
+[[ "$_stamp" == *T* ]] || _stamp=$(date -u +%Y-%m-%dT%H:%M:%S+00:00)
+
+_tmp_file="${_state_file}.tmp.$$"
+if ! printf '# TAVS Context Bridge - %s\npct=%s\nmodel=%s\ncost=%s\nduration=%s\nlines_add=%s\nlines_rem=%s\nts=%s\n' \
+        "$_stamp" "$_pct" "$_model" "$_cost" "$_duration" \
+        "$_lines_add" "$_lines_rem" "$_now" > "$_tmp_file" 2>/dev/null; then
+    rm -f "$_tmp_file" 2>/dev/null
+    exit 0
+fi
 
 mv "$_tmp_file" "$_state_file" 2>/dev/null || { rm -f "$_tmp_file" 2>/dev/null; exit 0; }
 
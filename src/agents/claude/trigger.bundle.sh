@@ -0,0 +1,5218 @@
+#!/bin/bash
+# Generated by 'tavs build' from src/agents/claude/trigger.sh and src/core/*.sh.
+# Do not edit: change the sources and rebuild.
+_TAVS_BUNDLE_DIR="${BASH_SOURCE[0]%/*}"
+[[ "$_TAVS_BUNDLE_DIR" == "${BASH_SOURCE[0]}" ]] && _TAVS_BUNDLE_DIR="."
+_TAVS_TRIGGER="$_TAVS_BUNDLE_DIR/trigger.bundle.sh"
+CORE_DIR="$_TAVS_BUNDLE_DIR/../../core"
+if [[ -z "${_TAVS_RERUN:-}" ]]; then
+[[ -z "${TAVS_EVENT_SEQ:-}" && -n "${EPOCHREALTIME:-}" ]] && \
+    export TAVS_EVENT_SEQ="${EPOCHREALTIME/[.,]/}"
+SCRIPT_DIR="$_TAVS_BUNDLE_DIR"
+export TAVS_AGENT="claude"
+_tavs_stdin=""
+if [[ ! -t 0 ]]; then
+    _tavs_stdin=$(cat 2>/dev/null)
+fi
+if [[ -n "$_tavs_stdin" ]]; then
+    _mode=$(printf '%s' "$_tavs_stdin" | \
+        sed -n 's/.*"permission_mode"[[:space:]]*:[[:space:]]*"\([^"]*\)".*/\1/p' | head -1)
+    [[ -n "$_mode" ]] && export TAVS_PERMISSION_MODE="$_mode"
+    _transcript=$(printf '%s' "$_tavs_stdin" | \
+        sed -n 's/.*"transcript_path"[[:space:]]*:[[:space:]]*"\([^"]*\)".*/\1/p' | head -1)
+    [[ -n "$_transcript" ]] && export TAVS_TRANSCRIPT_PATH="$_transcript"
+    _session_id=$(printf '%s' "$_tavs_stdin" | \
+        sed -n 's/.*"session_id"[[:space:]]*:[[:space:]]*"\([^"]*\)".*/\1/p' | head -1)
+    [[ -n "$_session_id" ]] && export TAVS_SESSION_ID="$_session_id"
+    _cwd=$(printf '%s' "$_tavs_stdin" | \
+        sed -n 's/.*"cwd"[[:space:]]*:[[:space:]]*"\([^"]*\)".*/\1/p' | head -1)
+    [[ -n "$_cwd" ]] && export TAVS_CWD="$_cwd"
+fi
+export TAVS_PERMISSION_MODE="${TAVS_PERMISSION_MODE:-default}"
+export _TAVS_HOOK_PAYLOAD="$_tavs_stdin"
+fi
+SCRIPT_DIR="$CORE_DIR"
+CORE_DIR="$SCRIPT_DIR"
+_TAVS_TRIGGER="${_TAVS_TRIGGER:-$CORE_DIR/trigger.sh}"
+_TAVS_UTIL_LOADED=1
+if [[ -n "${ZSH_VERSION:-}" ]]; then
+    util_upper() { _UTIL_UPPER="${(U)1}"; }
+    util_lower() { _UTIL_LOWER="${(L)1}"; }
+elif [[ "${BASH_VERSINFO[0]:-0}" -ge 4 ]]; then
+    util_upper() { _UTIL_UPPER="${1^^}"; }
+    util_lower() { _UTIL_LOWER="${1,,}"; }
+else
+    util_upper() { _UTIL_UPPER=$(printf '%s' "$1" | tr '[:lower:]' '[:upper:]'); }
+    util_lower() { _UTIL_LOWER=$(printf '%s' "$1" | tr '[:upper:]' '[:lower:]'); }
+fi
+util_strip_ctrl() {
+    local LC_ALL=C
+    _UTIL_STRIPPED="${1//[[:cntrl:]]/}"
+}
+util_now() {
+    _UTIL_NOW="${EPOCHSECONDS:-}"
+    if [[ -z "$_UTIL_NOW" ]]; then
+        printf -v _UTIL_NOW '%(%s)T' -1 2>/dev/null || _UTIL_NOW=""
+        [[ "$_UTIL_NOW" =~ ^[0-9]+$ ]] || _UTIL_NOW=$(date +%s)
+    fi
+}
+util_now_ms() {
+    local us="${EPOCHREALTIME:-}"
+    if [[ -n "$us" ]]; then
+        us="${us/[.,]/}"
+        _UTIL_NOW_MS=$((10#$us / 1000))
+    elif command -v gdate &>/dev/null; then
+        _UTIL_NOW_MS=$(gdate +%s%3N)
+    elif command -v perl &>/dev/null; then
+        _UTIL_NOW_MS=$(perl -MTime::HiRes=time -e 'printf "%.0f\n", time*1000')
+    else
+        util_now
+        _UTIL_NOW_MS=$((_UTIL_NOW * 1000))
+    fi
+}
+util_read_file() {
+    _UTIL_FILE=""
+    [[ -r "$1" && -f "$1" ]] || return 1
+    IFS= read -r -d '' _UTIL_FILE < "$1"
+    while [[ "$_UTIL_FILE" == *$'\n' ]]; do
+        _UTIL_FILE="${_UTIL_FILE%$'\n'}"
+    done
+    return 0
+}
+_UTIL_TMP_SEQ=0
+util_tmpfile() {
+    _UTIL_TMP_SEQ=$((_UTIL_TMP_SEQ + 1))
+    _UTIL_TMPFILE="${1}.tmp.${BASHPID:-$$}.${_UTIL_TMP_SEQ}${RANDOM}"
+}
+if [[ -n "${ZSH_VERSION:-}" ]]; then
+    util_hash() {
+        _UTIL_HASH=$(printf '%s' "$1" | cksum)
+        _UTIL_HASH="${_UTIL_HASH%% *}"
+    }
+else
+    _UTIL_CRC_TABLE=(
+    0 79764919 159529838 222504665 319059676 398814059
+    445009330 507990021 638119352 583659535 797628118 726387553
+    890018660 835552979 1015980042 944750013 1276238704 1221641927
+    1167319070 1095957929 1595256236 1540665371 1452775106 1381403509
+    1780037320 1859660671 1671105958 1733955601 2031960084 2111593891
+    1889500026 1952343757 2552477408 2632100695 2443283854 2506133561
+    2334638140 2414271883 2191915858 2254759653 3190512472 3135915759
+    3081330742 3009969537 2905550212 2850959411 2762807018 2691435357
+    3560074640 3505614887 3719321342 3648080713 3342211916 3287746299
+    3467911202 3396681109 4063920168 4143685023 4223187782 4286162673
+    3779000052 3858754371 3904687514 3967668269 881225847 809987520
+    1023691545 969234094 662832811 591600412 771767749 717299826
+    311336399 374308984 453813921 533576470 25881363 88864420
+    134795389 214552010 2023205639 2086057648 1897238633 1976864222
+    1804852699 1867694188 1645340341 1724971778 1587496639 1516133128
+    1461550545 1406951526 1302016099 1230646740 1142491917 1087903418
+    2896545431 2825181984 2770861561 2716262478 3215044683 3143675388
+    3055782693 3001194130 2326604591 2389456536 2200899649 2280525302
+    2578013683 2640855108 2418763421 2498394922 3769900519 3832873040
+    3912640137 3992402750 4088425275 4151408268 4197601365 4277358050
+    3334271071 3263032808 3476998961 3422541446 3585640067 3514407732
+    3694837229 3640369242 1762451694 1842216281 1619975040 1682949687
+    2047383090 2127137669 1938468188 2001449195 1325665622 1271206113
+    1183200824 1111960463 1543535498 1489069629 1434599652 1363369299
+    622672798 568075817 748617968 677256519 907627842 853037301
+    1067152940 995781531 51762726 131386257 177728840 240578815
+    269590778 349224269 429104020 491947555 4046411278 4126034873
+    4172115296 4234965207 3794477266 3874110821 3953728444 4016571915
+    3609705398 3555108353 3735388376 3664026991 3290680682 3236090077
+    3449943556 3378572211 3174993278 3120533705 3032266256 2961025959
+    2923101090 2868635157 2813903052 2742672763 2604032198 2683796849
+    2461293480 2524268063 2284983834 2364738477 2175806836 2238787779
+    1569362073 1498123566 1409854455 1355396672 1317987909 1246755826
+    1192025387 1137557660 2072149281 2135122070 1912620623 1992383480
+    1753615357 1816598090 1627664531 1707420964 295390185 358241886
+    404320391 483945776 43990325 106832002 186451547 266083308
+    932423249 861060070 1041341759 986742920 613929101 542559546
+    756411363 701822548 3316196985 3244833742 3425377559 3370778784
+    3601682597 3530312978 3744426955 3689838204 3819031489 3881883254
+    3928223919 4007849240 4037393693 4100235434 4180117107 4259748804
+    2310601993 2373574846 2151335527 2231098320 2596047829 2659030626
+    2470359227 2550115596 2947551409 2876312838 2788305887 2733848168
+    3165939309 3094707162 3040238851 2985771188
+    )
+    util_hash() {
+        local LC_ALL=C
+        local str="$1" crc=0 i len byte
+        len=${#str}
+        for (( i = 0; i < len; i++ )); do
+            printf -v byte '%d' "'${str:i:1}"
+            (( byte < 0 )) && byte=$((byte + 256))
+            crc=$(( ((crc << 8) & 0xFFFFFFFF) ^ _UTIL_CRC_TABLE[((crc >> 24) ^ byte) & 0xFF] ))
+        done
+        while (( len > 0 )); do
+            crc=$(( ((crc << 8) & 0xFFFFFFFF) ^ _UTIL_CRC_TABLE[((crc >> 24) ^ len) & 0xFF] ))
+            len=$((len >> 8))
+        done
+        _UTIL_HASH=$(( ~crc & 0xFFFFFFFF ))
+    }
+fi
+util_lower "${TAVS_STATUS:-}"
+case "$_UTIL_LOWER" in
+    false|0|off|no|disabled)
+        exit 0
+        ;;
+esac
+[[ "${1:-}" == "repaint" ]] && TAVS_EVENT_SEQ=""
+if [[ -z "${TAVS_EVENT_SEQ:-}" ]]; then
+    util_now_ms
+    export TAVS_EVENT_SEQ="$(( _UTIL_NOW_MS * 1000 ))"
+fi
+_TAVS_METRICS_LOADED=1
+_METRICS_BUCKETS_MS="5 10 25 50 100 250 500 1000 2500"
+_METRICS_BUCKETS_LE="0.005 0.01 0.025 0.05 0.1 0.25 0.5 1 2.5"
+metrics_start() {
+    _TAVS_METRICS_START=""
+    [[ -n "${EPOCHREALTIME:-}" ]] && _TAVS_METRICS_START="${EPOCHREALTIME/[.,]/}"
+    return 0
+}
+metrics_trigger() {
+    [[ "${ENABLE_METRICS:-true}" == "true" ]] || return 0
+    local state="${1:-none}" outcome="$2" agent="${TAVS_AGENT:-unknown}" us="-"
+    [[ "$state" =~ ^[a-z_-]+$ ]] || state="other"
+    [[ "$agent" =~ ^[a-z0-9_-]+$ ]] || agent="other"
+    if [[ -n "${_TAVS_METRICS_START:-}" && -n "${EPOCHREALTIME:-}" ]]; then
+        us=$(( ${EPOCHREALTIME/[.,]/} - _TAVS_METRICS_START ))
+    fi
+    local dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    [[ -d "$dir" ]] || return 0
+    printf 't %s %s %s %s\n' "$state" "$agent" "$outcome" "$us" \
+        >> "$dir/metrics.log" 2>/dev/null
+    local every="${TAVS_METRICS_FOLD_EVERY:-64}"
+    [[ "$every" =~ ^[1-9][0-9]*$ ]] || every=64
+    if (( RANDOM % every == 0 )) && [[ -n "${BASH_VERSION:-}" ]]; then
+        ( metrics_fold ) </dev/null >/dev/null 2>&1 &
+        disown 2>/dev/null
+    fi
+    return 0
+}
+metrics_count() {
+    [[ "${ENABLE_METRICS:-true}" == "true" ]] || return 0
+    local dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    [[ -d "$dir" ]] || return 0
+    printf 'c %s\n' "$1" >> "$dir/metrics.log" 2>/dev/null
+    return 0
+}
+metrics_fold() {
+    local dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    local lock="$dir/metrics.lock" fold="$dir/metrics.log.fold" holder=""
+    if ! mkdir "$lock" 2>/dev/null; then
+        [[ -f "$lock/pid" ]] && read -r holder < "$lock/pid" 2>/dev/null
+        [[ -n "$holder" ]] && kill -0 "$holder" 2>/dev/null && return 1
+        rm -rf "$lock" 2>/dev/null
+        mkdir "$lock" 2>/dev/null || return 1
+    fi
+    echo "${BASHPID:-$$}" > "$lock/pid" 2>/dev/null
+    [[ -f "$fold" ]] || mv -f "$dir/metrics.log" "$fold" 2>/dev/null
+    local series value _METRICS_KEYS=""
+    if [[ -f "$dir/metrics.state" ]]; then
+        while read -r series value; do
+            [[ "$value" =~ ^[0-9]+$ ]] && _metrics_add "$series" "$value"
+        done < "$dir/metrics.state"
+    fi
+    local kind state agent outcome us labels hit i
+    local series_re='^tavs_[a-z_]+(\{[^ ]*\})?$'
+    local -a buckets les
+    buckets=($_METRICS_BUCKETS_MS)
+    les=($_METRICS_BUCKETS_LE)
+    if [[ -f "$fold" ]]; then
+        while read -r kind state agent outcome us; do
+            case "$kind" in
+                t)
+                    labels="state=\"$state\",agent=\"$agent\""
+                    _metrics_add "tavs_trigger_total{$labels,outcome=\"$outcome\"}" 1
+                    [[ "$us" =~ ^[0-9]+$ ]] || continue
+                    for (( i = 0; i < ${#buckets[@]}; i++ )); do
+                        hit=0
+                        [[ $us -le $(( ${buckets[$i]} * 1000 )) ]] && hit=1
+                        _metrics_add "tavs_trigger_duration_seconds_bucket{$labels,le=\"${les[$i]}\"}" $hit
+                    done
+                    _metrics_add "tavs_trigger_duration_seconds_bucket{$labels,le=\"+Inf\"}" 1
+                    _metrics_add "tavs_trigger_duration_seconds_sum{$labels}" "$us"
+                    _metrics_add "tavs_trigger_duration_seconds_count{$labels}" 1
+                    ;;
+                c)
+                    [[ "$state" =~ $series_re ]] && _metrics_add "$state" 1
+                    ;;
+            esac
+        done < "$fold"
+    fi
+    _metrics_write "$dir" && rm -f "$fold" 2>/dev/null
+    rm -f "$lock/pid" 2>/dev/null
+    rmdir "$lock" 2>/dev/null
+    return 0
+}
+_metrics_add() {
+    local var="_MX_${1//[^a-zA-Z0-9]/_}"
+    if [[ -z "${!var:-}" ]]; then
+        _METRICS_KEYS+="$1"$'\n'
+        printf -v "$var" '%s' "$2"
+    else
+        printf -v "$var" '%s' $(( ${!var} + $2 ))
+    fi
+}
+_metrics_write() {
+    local dir="$1" series var state="" prom="" family value
+    local -a sorted
+    sorted=()
+    while IFS= read -r series; do
+        [[ -n "$series" ]] && sorted+=("$series")
+    done < <(printf '%s' "$_METRICS_KEYS" | LC_ALL=C sort)
+    for family in \
+        "tavs_trigger_total counter TAVS trigger invocations by state, agent and outcome" \
+        "tavs_trigger_duration_seconds histogram TAVS trigger run time" \
+        "tavs_lock_timeouts_total counter Lock waits that gave up" \
+        "tavs_idle_max_runtime_total counter Idle workers stopped at MAX_TIMER_RUNTIME"; do
+        local name="${family%% *}" rest="${family#* }"
+        prom+="# HELP $name ${rest#* }"$'\n'"# TYPE $name ${rest%% *}"$'\n'
+        for series in "${sorted[@]}"; do
+            case "$series" in
+                "$name"|"$name{"*|"${name}_bucket{"*|"${name}_sum{"*|"${name}_count{"*) ;;
+                *) continue ;;
+            esac
+            var="_MX_${series//[^a-zA-Z0-9]/_}"
+            value="${!var}"
+            if [[ "$series" == *_seconds_sum\{* ]]; then
+                printf -v value '%d.%06d' $(( value / 1000000 )) $(( value % 1000000 ))
+            fi
+            prom+="$series $value"$'\n'
+        done
+    done
+    for series in "${sorted[@]}"; do
+        var="_MX_${series//[^a-zA-Z0-9]/_}"
+        state+="$series ${!var}"$'\n'
+    done
+    util_tmpfile "$dir/metrics.state"
+    printf '%s' "$state" > "$_UTIL_TMPFILE" 2>/dev/null &&
+        mv -f "$_UTIL_TMPFILE" "$dir/metrics.state" 2>/dev/null ||
+        { rm -f "$_UTIL_TMPFILE" 2>/dev/null; return 1; }
+    local target
+    for target in "$dir/metrics.prom" ${TAVS_METRICS_TEXTFILE:+"$TAVS_METRICS_TEXTFILE"}; do
+        util_tmpfile "$target"
+        printf '%s' "$prom" > "$_UTIL_TMPFILE" 2>/dev/null &&
+            mv -f "$_UTIL_TMPFILE" "$target" 2>/dev/null ||
+            rm -f "$_UTIL_TMPFILE" 2>/dev/null
+    done
+    return 0
+}
+metrics_start
+_event_dedup_init() {
+    [[ -n "${_TAVS_DEDUP_INIT:-}" ]] && return 0
+    _TAVS_DEDUP_INIT=1
+    _TAVS_DEDUP_FILE=""
+    [[ -n "${_TAVS_DEFERRED_ID:-}" ]] && return 0
+    local dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    if [[ -n "${TTY_DEVICE:-}" ]]; then
+        _TAVS_DEDUP_FILE="$dir/fp.${TTY_DEVICE//\//_}"
+    elif [[ -n "${TAVS_SESSION_ID:-}" ]]; then
+        _TAVS_DEDUP_FILE="$dir/fp.s.${TAVS_SESSION_ID//\//_}"
+    fi
+}
+_event_dedup_fp() {
+    local count_file="$1" count=0
+    shift
+    [[ -n "$count_file" && -f "$count_file" ]] && read -r count < "$count_file"
+    util_now
+    _TAVS_DEDUP_FP="$*|${TAVS_PERMISSION_MODE:-}|${TAVS_AGENT:-}|${count:-0}|$((_UTIL_NOW / 60))"
+}
+event_dedup_check() {
+    _TAVS_DEDUP_METRICS="" _TAVS_DEDUP_JOURNAL=""
+    case "${1:-}" in
+        processing) [[ "${2:-}" == "new-prompt" ]] && return 1 ;;
+        permission|compacting) ;;
+        *) return 1 ;;
+    esac
+    _event_dedup_init
+    [[ -n "$_TAVS_DEDUP_FILE" && -f "$_TAVS_DEDUP_FILE" ]] || return 1
+    local key value fp="" ts=0 window=0 count_file="" metrics="" journal=""
+    while IFS='=' read -r key value; do
+        case "$key" in
+            fp) fp="$value" ;;
+            ts) ts="$value" ;;
+            window) window="$value" ;;
+            count_file) count_file="$value" ;;
+            metrics) metrics="$value" ;;
+            journal) journal="$value" ;;
+        esac
+    done < "$_TAVS_DEDUP_FILE"
+    [[ "$ts" =~ ^[0-9]+$ && "$window" =~ ^[0-9]+$ ]] || return 1
+    [[ $window -gt 0 ]] || return 1
+    _event_dedup_fp "$count_file" "$@"
+    [[ "$_TAVS_DEDUP_FP" == "$fp" ]] || return 1
+    [[ $((_UTIL_NOW - ts)) -lt $window ]] || return 1
+    _TAVS_DEDUP_METRICS="$metrics" _TAVS_DEDUP_JOURNAL="$journal"
+    return 0
+}
+event_dedup_record() {
+    _event_dedup_init
+    [[ -n "$_TAVS_DEDUP_FILE" ]] || return 0
+    local window="${TAVS_DEDUP_WINDOW:-0}"
+    [[ "$window" =~ ^[0-9]+$ ]] || window=0
+    if [[ "${1:-}" == "processing" && "${TAVS_TITLE_MODE:-}" == "full" ]]; then
+        window=0
+    fi
+    [[ "${DEBUG_ALL:-0}" == "1" ]] && window=0
+    local count_file="${SUBAGENT_COUNT_FILE:-}"
+    _event_dedup_fp "$count_file" "$@"
+    local dir="${_TAVS_DEDUP_FILE%/*}"
+    if [[ ! -d "$dir" ]]; then
+        mkdir -p "$dir" 2>/dev/null
+        chmod 700 "$dir" 2>/dev/null
+    fi
+    util_tmpfile "$_TAVS_DEDUP_FILE"
+    printf 'fp=%s\nts=%s\nwindow=%s\ncount_file=%s\nmetrics=%s\njournal=%s\n' \
+        "$_TAVS_DEDUP_FP" "$_UTIL_NOW" "$window" "$count_file" "${ENABLE_METRICS:-true}" "${ENABLE_JOURNAL:-false}" \
+        > "$_UTIL_TMPFILE" 2>/dev/null &&
+        mv -f "$_UTIL_TMPFILE" "$_TAVS_DEDUP_FILE" 2>/dev/null ||
+        rm -f "$_UTIL_TMPFILE" 2>/dev/null
+    return 0
+}
+event_dedup_forget() {
+    _event_dedup_init
+    [[ -n "$_TAVS_DEDUP_FILE" && -f "$_TAVS_DEDUP_FILE" ]] && \
+        rm -f "$_TAVS_DEDUP_FILE" 2>/dev/null
+    return 0
+}
+if event_dedup_check "$@"; then
+    [[ "$_TAVS_DEDUP_METRICS" == "true" ]] && ENABLE_METRICS=true metrics_trigger "$1" dedup
+    if [[ "$_TAVS_DEDUP_JOURNAL" == "true" ]]; then
+        source "$CORE_DIR/journal.sh"
+        journal_record dedup "$1" "${2:-}"
+    fi
+    exit 0
+fi
+_TAVS_LATENCY_BUDGET_LOADED=1
+latency_budget_start() {
+    util_now_ms
+    _TAVS_BUDGET_START="$_UTIL_NOW_MS"
+    return 0
+}
+latency_budget_allows() {
+    [[ -z "${_TAVS_BUDGET_START:-}" ]] && return 0
+    local budget="${TAVS_LATENCY_BUDGET_MS:-0}" rank
+    [[ "$budget" =~ ^[0-9]+$ && $budget -gt 0 ]] || return 0
+    case "$1" in
+        image) rank=1 ;;
+        dir_icon) rank=2 ;;
+        context) rank=3 ;;
+        user_title) rank=4 ;;
+        *) return 0 ;;
+    esac
+    util_now_ms
+    local now="$_UTIL_NOW_MS"
+    local elapsed=$(( now - _TAVS_BUDGET_START ))
+    [[ $elapsed -le $(( budget * rank )) ]] && return 0
+    _latency_budget_record "$1" "$elapsed"
+    util_now_ms
+    _TAVS_BUDGET_START=$(( _TAVS_BUDGET_START + _UTIL_NOW_MS - now ))
+    return 1
+}
+latency_budget_shed() {
+    local file="${TAVS_TMP_DIR:-/tmp/tavs}/shed.${1//\//_}" key value
+    _LATENCY_SHED_IMAGE=0 _LATENCY_SHED_DIR_ICON=0 _LATENCY_SHED_CONTEXT=0
+    _LATENCY_SHED_USER_TITLE=0 _LATENCY_SHED_LAST=0 _LATENCY_SHED_LAST_STAGE=""
+    _LATENCY_SHED_ELAPSED_MS=0
+    [[ -f "$file" ]] || return 1
+    while IFS='=' read -r key value; do
+        case "$key" in
+            last_stage) _LATENCY_SHED_LAST_STAGE="$value"; continue ;;
+        esac
+        [[ "$value" =~ ^[0-9]+$ ]] || continue
+        case "$key" in
+            image) _LATENCY_SHED_IMAGE="$value" ;;
+            dir_icon) _LATENCY_SHED_DIR_ICON="$value" ;;
+            context) _LATENCY_SHED_CONTEXT="$value" ;;
+            user_title) _LATENCY_SHED_USER_TITLE="$value" ;;
+            last) _LATENCY_SHED_LAST="$value" ;;
+            elapsed_ms) _LATENCY_SHED_ELAPSED_MS="$value" ;;
+        esac
+    done < "$file"
+    return 0
+}
+_latency_budget_record() {
+    local stage="$1" elapsed_ms="$2"
+    [[ "${DEBUG_ALL:-0}" == "1" ]] && \
+        echo "[TAVS] Latency budget: shed $stage after ${elapsed_ms}ms" >&2
+    [[ -z "${TTY_DEVICE:-}" ]] && return 0
+    latency_budget_shed "$TTY_DEVICE"
+    case "$stage" in
+        image) _LATENCY_SHED_IMAGE=$((_LATENCY_SHED_IMAGE + 1)) ;;
+        dir_icon) _LATENCY_SHED_DIR_ICON=$((_LATENCY_SHED_DIR_ICON + 1)) ;;
+        context) _LATENCY_SHED_CONTEXT=$((_LATENCY_SHED_CONTEXT + 1)) ;;
+        user_title) _LATENCY_SHED_USER_TITLE=$((_LATENCY_SHED_USER_TITLE + 1)) ;;
+    esac
+    util_now
+    local file="${TAVS_TMP_DIR:-/tmp/tavs}/shed.${TTY_DEVICE//\//_}"
+    util_tmpfile "$file"
+    printf 'image=%s\ndir_icon=%s\ncontext=%s\nuser_title=%s\nlast=%s\nlast_stage=%s\nelapsed_ms=%s\n' \
+        "$_LATENCY_SHED_IMAGE" "$_LATENCY_SHED_DIR_ICON" "$_LATENCY_SHED_CONTEXT" \
+        "$_LATENCY_SHED_USER_TITLE" "$_UTIL_NOW" "$stage" "$elapsed_ms" \
+        > "$_UTIL_TMPFILE" 2>/dev/null &&
+        mv -f "$_UTIL_TMPFILE" "$file" 2>/dev/null ||
+        rm -f "$_UTIL_TMPFILE" 2>/dev/null
+    return 0
+}
+latency_budget_start
+if [[ -n "$CORE_DIR/theme-config-loader.sh" ]]; then
+    _THIS_SCRIPT="$CORE_DIR/theme-config-loader.sh"
+elif [[ -n "${(%):-%x}" ]] 2>/dev/null; then
+    _THIS_SCRIPT="${(%):-%x}"
+else
+    _THIS_SCRIPT="$0"
+fi
+_THEME_SCRIPT_DIR="$CORE_DIR"
+_CONFIG_DIR="$_THEME_SCRIPT_DIR/../config"
+_THEMES_DIR="$_THEME_SCRIPT_DIR/../themes"
+_USER_CONFIG_DIR="$HOME/.tavs"
+_USER_CONFIG="$_USER_CONFIG_DIR/user.conf"
+_resolve_agent_faces() {
+    local agent="$1"
+    case "$agent" in
+        claude|gemini|codex|opencode|unknown) ;;
+        *)
+            if [[ ! "$agent" =~ ^[a-zA-Z0-9_]+$ ]]; then
+                echo "Warning: Invalid agent name '$agent', using 'unknown'" >&2
+                agent="unknown"
+            fi
+            ;;
+    esac
+    local prefix
+    util_upper "$agent"
+    prefix="${_UTIL_UPPER}_"
+    local states=(
+        PROCESSING PERMISSION COMPLETE COMPACTING RESET RESET_FINAL
+        IDLE_0 IDLE_1 IDLE_2 IDLE_3 IDLE_4 IDLE_5
+        SUBAGENT TOOL_ERROR
+    )
+    local state count
+    for state in "${states[@]}"; do
+        eval "count=\${#${prefix}FACES_${state}[@]}"
+        if [[ $count -gt 0 ]]; then
+            eval "FACES_${state}=(\"\${${prefix}FACES_${state}[@]}\")"
+        else
+            eval "count=\${#UNKNOWN_FACES_${state}[@]}"
+            if [[ $count -gt 0 ]]; then
+                eval "FACES_${state}=(\"\${UNKNOWN_FACES_${state}[@]}\")"
+            else
+                case "$state" in
+                    PROCESSING)  eval "FACES_${state}=('(°-°)')" ;;
+                    PERMISSION)  eval "FACES_${state}=('(°□°)')" ;;
+                    COMPLETE)    eval "FACES_${state}=('(^‿^)')" ;;
+                    COMPACTING)  eval "FACES_${state}=('(@_@)')" ;;
+                    RESET)       eval "FACES_${state}=('(-_-)')" ;;
+                    IDLE_0)      eval "FACES_${state}=('(•‿•)')" ;;
+                    IDLE_1)      eval "FACES_${state}=('(‿‿)')" ;;
+                    IDLE_2)      eval "FACES_${state}=('(︶‿︶)')" ;;
+                    IDLE_3)      eval "FACES_${state}=('(¬‿¬)')" ;;
+                    IDLE_4)      eval "FACES_${state}=('(-.-)zzZ')" ;;
+                    IDLE_5)      eval "FACES_${state}=('(︶.︶)ᶻᶻ')" ;;
+                    SUBAGENT)    eval "FACES_${state}=('(⇆-⇆)')" ;;
+                    TOOL_ERROR)  eval "FACES_${state}=('(✕_✕)')" ;;
+                esac
+            fi
+        fi
+    done
+}
+get_random_face() {
+    local state="$1"
+    local array_name
+    case "$state" in
+        processing) array_name="FACES_PROCESSING" ;;
+        permission) array_name="FACES_PERMISSION" ;;
+        complete)   array_name="FACES_COMPLETE" ;;
+        compacting) array_name="FACES_COMPACTING" ;;
+        reset)      array_name="FACES_RESET" ;;
+        reset_final) array_name="FACES_RESET_FINAL" ;;
+        idle_0)     array_name="FACES_IDLE_0" ;;
+        idle_1)     array_name="FACES_IDLE_1" ;;
+        idle_2)     array_name="FACES_IDLE_2" ;;
+        idle_3)     array_name="FACES_IDLE_3" ;;
+        idle_4)     array_name="FACES_IDLE_4" ;;
+        idle_5)     array_name="FACES_IDLE_5" ;;
+        idle)       array_name="FACES_IDLE_1" ;;
+        subagent*)  array_name="FACES_SUBAGENT" ;;
+        tool_error) array_name="FACES_TOOL_ERROR" ;;
+        *)          echo ""; return ;;
+    esac
+    local count
+    eval "count=\${#${array_name}[@]}"
+    if [[ $count -eq 0 ]]; then
+        echo ""
+        return
+    fi
+    local index=$((RANDOM % count))
+    eval "echo \"\${${array_name}[@]:$index:1}\""
+}
+get_compact_face() {
+    local state="$1"
+    local theme="${TAVS_COMPACT_THEME:-squares}"
+    local theme_upper
+    util_upper "$theme"
+    theme_upper="$_UTIL_UPPER"
+    local state_upper
+    case "$state" in
+        processing) state_upper="PROCESSING" ;;
+        permission) state_upper="PERMISSION" ;;
+        complete)   state_upper="COMPLETE" ;;
+        compacting) state_upper="COMPACTING" ;;
+        reset)      state_upper="RESET" ;;
+        idle_0)     state_upper="IDLE_0" ;;
+        idle_1)     state_upper="IDLE_1" ;;
+        idle_2)     state_upper="IDLE_2" ;;
+        idle_3)     state_upper="IDLE_3" ;;
+        idle_4)     state_upper="IDLE_4" ;;
+        idle_5)     state_upper="IDLE_5" ;;
+        idle)       state_upper="IDLE_1" ;;
+        subagent*)  state_upper="SUBAGENT" ;;
+        tool_error) state_upper="TOOL_ERROR" ;;
+        *)          echo ""; return ;;
+    esac
+    local array_name="COMPACT_${theme_upper}_${state_upper}"
+    local count
+    eval "count=\${#${array_name}[@]}"
+    if [[ $count -eq 0 ]]; then
+        get_random_face "$state"
+        return
+    fi
+    local index=$((RANDOM % count))
+    local pair
+    eval "pair=\"\${${array_name}[@]:$index:1}\""
+    local left="${pair%% *}"
+    local right="${pair##* }"
+    local _ctx_eye="${COMPACT_CONTEXT_EYE:-${TAVS_COMPACT_CONTEXT_EYE:-mirror}}"
+    if [[ "$state" == "reset" && "${_TAVS_RESET_FINAL:-}" == "true" ]]; then
+        left="—"
+        right="—"
+    elif [[ "$_ctx_eye" == "mirror" ]]; then
+        right="$left"
+    elif [[ "$state" == "compacting" && "$_ctx_eye" == "true" ]]; then
+        local _ctx_style="${COMPACT_CONTEXT_STYLE:-${TAVS_COMPACT_CONTEXT_STYLE:-food}}"
+        local _ctx_token=""
+        _ctx_token=$(_context_style_to_token "$_ctx_style")
+        if [[ -n "$_ctx_token" ]]; then
+            local _ctx_val
+            _ctx_val=$(resolve_context_token "$_ctx_token" "0")
+            [[ -n "$_ctx_val" ]] && right="$_ctx_val"
+        fi
+    elif [[ "$_ctx_eye" == "true" ]]; then
+        if type load_context_data &>/dev/null; then
+            load_context_data 2>/dev/null
+        fi
+        local _ctx_pct="${TAVS_CONTEXT_PCT:-0}"
+        local _ctx_style="${COMPACT_CONTEXT_STYLE:-${TAVS_COMPACT_CONTEXT_STYLE:-food}}"
+        local _ctx_token=""
+        _ctx_token=$(_context_style_to_token "$_ctx_style")
+        if [[ -n "$_ctx_token" ]]; then
+            local _ctx_val
+            _ctx_val=$(resolve_context_token "$_ctx_token" "$_ctx_pct")
+            [[ -n "$_ctx_val" ]] && right="$_ctx_val"
+        fi
+    else
+        if [[ "$state" == "processing" || "$state" == subagent* ]]; then
+            if type has_active_subagents &>/dev/null && has_active_subagents 2>/dev/null; then
+                local agent_count
+                agent_count=$(get_subagent_count 2>/dev/null)
+                [[ $agent_count -gt 0 ]] && right="+${agent_count}"
+            fi
+        fi
+    fi
+    local _default_frame='[{L} {R}]'
+    local frame="${SPINNER_FACE_FRAME:-$_default_frame}"
+    local face
+    face="${frame//\{L\}/$left}"
+    face="${face//\{R\}/$right}"
+    echo "$face"
+}
+_source_colors_if_needed() {
+    if ! type hex_to_rgb &>/dev/null; then
+        local colors_script="${_THEME_SCRIPT_DIR:-$(dirname "$0")}/colors.sh"
+        if [[ -f "$colors_script" ]]; then
+            source "$colors_script"
+            return 0
+        fi
+        return 1
+    fi
+    return 0
+}
+_source_detect_if_needed() {
+    if ! type query_terminal_bg &>/dev/null; then
+        local detect_script="${_THEME_SCRIPT_DIR:-$(dirname "$0")}/terminal-detection.sh"
+        if [[ -f "$detect_script" ]]; then
+            source "$detect_script"
+            return 0
+        fi
+        return 1
+    fi
+    return 0
+}
+initialize_dynamic_colors() {
+    local tty_device="${1:-$TTY_DEVICE}"
+    [[ "$THEME_MODE" != "dynamic" ]] && return 0
+    _source_colors_if_needed || {
+        echo "Warning: colors.sh not available for dynamic mode" >&2
+        return 1
+    }
+    _source_detect_if_needed || {
+        echo "Warning: detect.sh not available for dynamic mode" >&2
+        return 1
+    }
+    if [[ "$DYNAMIC_DISABLE_SSH" == "true" ]] && is_ssh_session; then
+        return 1
+    fi
+    local base_color
+    base_color=$(get_terminal_bg_cached "$tty_device" "$DYNAMIC_QUERY_TIMEOUT")
+    if [[ -z "$base_color" ]]; then
+        base_color="$COLOR_BASE"
+    fi
+    local is_dark="true"
+    if ! is_dark_color "$base_color"; then
+        is_dark="false"
+    fi
+    local system_mode
+    _current_system_mode
+    system_mode="$_CURRENT_SYSTEM_MODE"
+    local proc_hue="$HUE_PROCESSING"
+    if [[ "${ENABLE_MODE_AWARE_PROCESSING:-true}" == "true" ]]; then
+        local _pmode="${TAVS_PERMISSION_MODE:-default}"
+        [[ "$_pmode" == "dontAsk" ]] && _pmode="acceptEdits"
+        case "$_pmode" in
+            plan)              proc_hue="${HUE_PROCESSING_PLAN:-50}" ;;
+            acceptEdits)       proc_hue="${HUE_PROCESSING_ACCEPT:-33}" ;;
+            bypassPermissions) proc_hue="${HUE_PROCESSING_BYPASS:-12}" ;;
+        esac
+    fi
+    calculate_color_set "$base_color" "$proc_hue"
+    local color_proc="$COLOR_SET_PROCESSING"
+    local color_perm="$COLOR_SET_PERMISSION"
+    local color_comp="$COLOR_SET_COMPLETE"
+    local color_idle="$COLOR_SET_IDLE"
+    local color_compact="$COLOR_SET_COMPACTING"
+    local color_subagent="$COLOR_SET_SUBAGENT"
+    local color_tool_error="$COLOR_SET_TOOL_ERROR"
+    if [[ -n "$TTY_SAFE" ]]; then
+        write_session_colors "$TAVS_AGENT" "$base_color" "$is_dark" "$system_mode" \
+            "$color_proc" "$color_perm" "$color_comp" "$color_idle" "$color_compact"
+    fi
+    COLOR_BASE="$base_color"
+    COLOR_PROCESSING="$color_proc"
+    COLOR_PERMISSION="$color_perm"
+    COLOR_COMPLETE="$color_comp"
+    COLOR_IDLE="$color_idle"
+    COLOR_COMPACTING="$color_compact"
+    COLOR_SUBAGENT="$color_subagent"
+    COLOR_TOOL_ERROR="$color_tool_error"
+    IS_DARK_THEME="$is_dark"
+    _build_stage_arrays
+    return 0
+}
+load_session_colors_or_defaults() {
+    if ! type read_session_colors &>/dev/null; then
+        local state_script="${_THEME_SCRIPT_DIR:-$(dirname "$0")}/session-state.sh"
+        if [[ -f "$state_script" ]]; then
+            source "$state_script"
+        fi
+    fi
+    if type has_session_colors &>/dev/null && has_session_colors && read_session_colors; then
+        COLOR_BASE="$SESSION_BASE_COLOR"
+        COLOR_PROCESSING="$SESSION_COLOR_PROCESSING"
+        COLOR_PERMISSION="$SESSION_COLOR_PERMISSION"
+        COLOR_COMPLETE="$SESSION_COLOR_COMPLETE"
+        COLOR_IDLE="$SESSION_COLOR_IDLE"
+        COLOR_COMPACTING="$SESSION_COLOR_COMPACTING"
+        IS_DARK_THEME="$SESSION_IS_DARK"
+        if [[ "$ENABLE_LIGHT_DARK_SWITCHING" == "true" ]]; then
+            local current_mode
+            _current_system_mode
+            current_mode="$_CURRENT_SYSTEM_MODE"
+            if [[ "$current_mode" != "$SESSION_SYSTEM_MODE" ]]; then
+                clear_mode_cache
+                _resolve_colors
+                return 1
+            fi
+        fi
+        _build_stage_arrays
+        return 0
+    fi
+    return 1
+}
+refresh_colors_if_needed() {
+    [[ "$ENABLE_LIGHT_DARK_SWITCHING" != "true" ]] && return 0
+    local current_mode
+    _current_system_mode
+    current_mode="$_CURRENT_SYSTEM_MODE"
+    if [[ "$current_mode" != "$_CACHED_SYSTEM_MODE" ]]; then
+        _CACHED_SYSTEM_MODE="$current_mode"
+        _resolve_colors
+        if type has_session_colors &>/dev/null && has_session_colors; then
+            if read_session_colors; then
+                write_session_colors "$SESSION_AGENT" "$SESSION_BASE_COLOR" \
+                    "$IS_DARK_THEME" "$current_mode" \
+                    "$COLOR_PROCESSING" "$COLOR_PERMISSION" "$COLOR_COMPLETE" \
+                    "$COLOR_IDLE" "$COLOR_COMPACTING"
+            fi
+        fi
+    fi
+}
+get_effective_color() {
+    local state="$1"
+    local session_color
+    if type get_session_color &>/dev/null; then
+        session_color=$(get_session_color "$state")
+        if [[ -n "$session_color" ]]; then
+            echo "$session_color"
+            return
+        fi
+    fi
+    case "$state" in
+        processing)  echo "$COLOR_PROCESSING" ;;
+        permission)  echo "$COLOR_PERMISSION" ;;
+        complete)    echo "$COLOR_COMPLETE" ;;
+        idle)        echo "$COLOR_IDLE" ;;
+        compacting)  echo "$COLOR_COMPACTING" ;;
+        subagent*)   echo "$COLOR_SUBAGENT" ;;
+        tool_error)  echo "$COLOR_TOOL_ERROR" ;;
+        base)        echo "$COLOR_BASE" ;;
+        *)           echo "" ;;
+    esac
+}
+TAVS_AGENT="${TAVS_AGENT:-claude}"
+_load_config_file() {
+    local file="$1"
+    if [[ -f "$file" ]]; then
+        source "$file"
+        return 0
+    fi
+    return 1
+}
+_apply_title_preset() {
+    case "${TAVS_TITLE_PRESET:-}" in
+        dashboard)
+            TAVS_FACE_MODE="standard"
+            TAVS_TITLE_FORMAT='{FACE}˙°({STATUS_ICON}|{CONTEXT_FOOD}|{DIR_ICON}|{SESSION_ICON}) {AGENTS} {CONTEXT_PCT} {BASE}  {SESSION_ID}'
+            TAVS_TITLE_FORMAT_PROCESSING=""
+            TAVS_TITLE_FORMAT_PERMISSION=""
+            TAVS_TITLE_FORMAT_COMPLETE=""
+            TAVS_TITLE_FORMAT_IDLE=""
+            TAVS_TITLE_FORMAT_COMPACTING='{FACE}˙°({STATUS_ICON}|{CONTEXT_PCT}|{DIR_ICON}|{SESSION_ICON}) {BASE}  {SESSION_ID}'
+            TAVS_TITLE_FORMAT_SUBAGENT=""
+            TAVS_TITLE_FORMAT_TOOL_ERROR=""
+            TAVS_TITLE_FORMAT_RESET=""
+            ;;
+        compact)
+            TAVS_FACE_MODE="compact"
+            TAVS_COMPACT_THEME="${TAVS_COMPACT_THEME:-squares}"
+            TAVS_COMPACT_CONTEXT_EYE="mirror"
+            TAVS_TITLE_FORMAT='{DIR_ICON} {FACE} {AGENTS} «{CONTEXT_FOOD}{CONTEXT_PCT}» {SESSION_ID} {BASE}'
+            TAVS_TITLE_FORMAT_PROCESSING=""
+            TAVS_TITLE_FORMAT_PERMISSION=""
+            TAVS_TITLE_FORMAT_COMPLETE=""
+            TAVS_TITLE_FORMAT_IDLE=""
+            TAVS_TITLE_FORMAT_COMPACTING=""
+            TAVS_TITLE_FORMAT_SUBAGENT=""
+            TAVS_TITLE_FORMAT_TOOL_ERROR=""
+            TAVS_TITLE_FORMAT_RESET=""
+            ;;
+        compact_project_sorted)
+            TAVS_FACE_MODE="compact"
+            TAVS_COMPACT_THEME="${TAVS_COMPACT_THEME:-squares}"
+            TAVS_COMPACT_CONTEXT_EYE="mirror"
+            TAVS_TITLE_FORMAT='{DIR_ICON} {FACE} {AGENTS} «{CONTEXT_FOOD}{CONTEXT_PCT}» {SESSION_ID} {BASE}'
+            TAVS_TITLE_FORMAT_PROCESSING=""
+            TAVS_TITLE_FORMAT_PERMISSION=""
+            TAVS_TITLE_FORMAT_COMPLETE=""
+            TAVS_TITLE_FORMAT_IDLE=""
+            TAVS_TITLE_FORMAT_COMPACTING=""
+            TAVS_TITLE_FORMAT_SUBAGENT=""
+            TAVS_TITLE_FORMAT_TOOL_ERROR=""
+            TAVS_TITLE_FORMAT_RESET=""
+            ;;
+    esac
+}
+load_agent_config() {
+    local agent="${1:-$TAVS_AGENT}"
+    agent="${agent:-unknown}"
+    TAVS_AGENT="$agent"
+    if [[ -f "$_CONFIG_DIR/defaults.conf" ]]; then
+        _load_config_file "$_CONFIG_DIR/defaults.conf"
+    else
+        _set_inline_defaults
+    fi
+    _load_config_file "$_USER_CONFIG" || true
+    _apply_title_preset
+    [[ "${ENABLE_SESSION_ICONS:-true}" == "false" ]] && TAVS_IDENTITY_MODE="off"
+    if [[ -f "$_USER_CONFIG" ]]; then
+        if grep -q '^TAVS_SESSION_ICONS=' "$_USER_CONFIG" 2>/dev/null && \
+           ! grep -q '^TAVS_SESSION_ICON_POOL=' "$_USER_CONFIG" 2>/dev/null; then
+            TAVS_SESSION_ICON_POOL=("${TAVS_SESSION_ICONS[@]}")
+        fi
+    fi
+    if [[ "$THEME_MODE" == "preset" ]] && [[ -n "$THEME_PRESET" ]]; then
+        _load_config_file "$_THEMES_DIR/${THEME_PRESET}.conf"
+    fi
+    _resolve_agent_variables "$agent"
+    _resolve_agent_faces "$agent"
+    _resolve_colors
+}
+_resolve_agent_variables() {
+    local agent="$1"
+    local prefix
+    util_upper "$agent"
+    prefix="${_UTIL_UPPER}_"
+    local vars=(
+        AGENT_NAME
+        DARK_BASE DARK_PROCESSING DARK_PERMISSION DARK_COMPLETE DARK_IDLE DARK_COMPACTING DARK_SUBAGENT DARK_TOOL_ERROR
+        LIGHT_BASE LIGHT_PROCESSING LIGHT_PERMISSION LIGHT_COMPLETE LIGHT_IDLE LIGHT_COMPACTING LIGHT_SUBAGENT LIGHT_TOOL_ERROR
+        MUTED_DARK_BASE MUTED_DARK_PROCESSING MUTED_DARK_PERMISSION MUTED_DARK_COMPLETE MUTED_DARK_IDLE MUTED_DARK_COMPACTING MUTED_DARK_SUBAGENT MUTED_DARK_TOOL_ERROR
+        MUTED_LIGHT_BASE MUTED_LIGHT_PROCESSING MUTED_LIGHT_PERMISSION MUTED_LIGHT_COMPLETE MUTED_LIGHT_IDLE MUTED_LIGHT_COMPACTING MUTED_LIGHT_SUBAGENT MUTED_LIGHT_TOOL_ERROR
+        DARK_PROCESSING_PLAN DARK_PROCESSING_ACCEPT DARK_PROCESSING_BYPASS
+        LIGHT_PROCESSING_PLAN LIGHT_PROCESSING_ACCEPT LIGHT_PROCESSING_BYPASS
+        MUTED_DARK_PROCESSING_PLAN MUTED_DARK_PROCESSING_ACCEPT MUTED_DARK_PROCESSING_BYPASS
+        MUTED_LIGHT_PROCESSING_PLAN MUTED_LIGHT_PROCESSING_ACCEPT MUTED_LIGHT_PROCESSING_BYPASS
+        SPINNER_FACE_FRAME
+        CONTEXT_WINDOW_SIZE
+        TITLE_FORMAT
+        TITLE_FORMAT_PROCESSING TITLE_FORMAT_PERMISSION TITLE_FORMAT_COMPLETE
+        TITLE_FORMAT_IDLE TITLE_FORMAT_COMPACTING TITLE_FORMAT_SUBAGENT
+        TITLE_FORMAT_TOOL_ERROR TITLE_FORMAT_RESET
+        COMPACT_CONTEXT_STYLE
+        COMPACT_CONTEXT_EYE
+        IDENTITY_MODE
+        DIR_ICON_TYPE
+    )
+    local var value
+    for var in "${vars[@]}"; do
+        eval "value=\${${prefix}${var}:-}"
+        if [[ -z "$value" ]]; then
+            eval "value=\${UNKNOWN_${var}:-}"
+        fi
+        if [[ -z "$value" ]] && [[ "$var" == *_BASE || "$var" == *_PROCESSING || "$var" == *_PERMISSION || "$var" == *_COMPLETE || "$var" == *_IDLE || "$var" == *_COMPACTING || "$var" == *_SUBAGENT || "$var" == *_TOOL_ERROR || "$var" == *_PROCESSING_PLAN || "$var" == *_PROCESSING_ACCEPT || "$var" == *_PROCESSING_BYPASS || "$var" == "SPINNER_FACE_FRAME" ]]; then
+            eval "value=\${DEFAULT_${var}:-}"
+        fi
+        if [[ -n "$value" ]]; then
+            eval "$var=\"\$value\""
+        fi
+    done
+}
+_set_inline_defaults() {
+    THEME_MODE="${THEME_MODE:-static}"
+    THEME_PRESET="${THEME_PRESET:-}"
+    if [[ -n "${ENABLE_LIGHT_DARK_SWITCHING:-}" ]] && [[ -z "${ENABLE_LIGHT_DARK_SWITCHING:-}" ]]; then
+        ENABLE_LIGHT_DARK_SWITCHING="$ENABLE_LIGHT_DARK_SWITCHING"
+    fi
+    ENABLE_LIGHT_DARK_SWITCHING="${ENABLE_LIGHT_DARK_SWITCHING:-false}"
+    FORCE_MODE="${FORCE_MODE:-auto}"
+    TRUECOLOR_MODE_OVERRIDE="${TRUECOLOR_MODE_OVERRIDE:-off}"
+    ENABLE_BACKGROUND_CHANGE="${ENABLE_BACKGROUND_CHANGE:-true}"
+    ENABLE_TITLE_PREFIX="${ENABLE_TITLE_PREFIX:-true}"
+    ENABLE_PROCESSING="${ENABLE_PROCESSING:-true}"
+    ENABLE_PERMISSION="${ENABLE_PERMISSION:-true}"
+    ENABLE_COMPLETE="${ENABLE_COMPLETE:-true}"
+    ENABLE_IDLE="${ENABLE_IDLE:-true}"
+    ENABLE_COMPACTING="${ENABLE_COMPACTING:-true}"
+    ENABLE_SUBAGENT="${ENABLE_SUBAGENT:-true}"
+    ENABLE_TOOL_ERROR="${ENABLE_TOOL_ERROR:-true}"
+    ENABLE_MODE_AWARE_PROCESSING="${ENABLE_MODE_AWARE_PROCESSING:-true}"
+    ENABLE_ANTHROPOMORPHISING="${ENABLE_ANTHROPOMORPHISING:-true}"
+    FACE_POSITION="${FACE_POSITION:-before}"
+    DEFAULT_DARK_BASE="${DEFAULT_DARK_BASE:-#303446}"
+    DEFAULT_DARK_PROCESSING="${DEFAULT_DARK_PROCESSING:-#3d3b42}"
+    DEFAULT_DARK_PERMISSION="${DEFAULT_DARK_PERMISSION:-#3d3440}"
+    DEFAULT_DARK_COMPLETE="${DEFAULT_DARK_COMPLETE:-#374539}"
+    DEFAULT_DARK_IDLE="${DEFAULT_DARK_IDLE:-#3d3850}"
+    DEFAULT_DARK_COMPACTING="${DEFAULT_DARK_COMPACTING:-#334545}"
+    DEFAULT_DARK_SUBAGENT="${DEFAULT_DARK_SUBAGENT:-#42402E}"
+    DEFAULT_DARK_TOOL_ERROR="${DEFAULT_DARK_TOOL_ERROR:-#4A2A1F}"
+    DEFAULT_LIGHT_BASE="${DEFAULT_LIGHT_BASE:-#eff1f5}"
+    DEFAULT_LIGHT_PROCESSING="${DEFAULT_LIGHT_PROCESSING:-#f5e6dc}"
+    DEFAULT_LIGHT_PERMISSION="${DEFAULT_LIGHT_PERMISSION:-#f5dde0}"
+    DEFAULT_LIGHT_COMPLETE="${DEFAULT_LIGHT_COMPLETE:-#e5f0e5}"
+    DEFAULT_LIGHT_IDLE="${DEFAULT_LIGHT_IDLE:-#ebe5f5}"
+    DEFAULT_LIGHT_COMPACTING="${DEFAULT_LIGHT_COMPACTING:-#e0f0f0}"
+    DEFAULT_LIGHT_SUBAGENT="${DEFAULT_LIGHT_SUBAGENT:-#F5F0D0}"
+    DEFAULT_LIGHT_TOOL_ERROR="${DEFAULT_LIGHT_TOOL_ERROR:-#B87050}"
+    DEFAULT_MUTED_DARK_BASE="${DEFAULT_MUTED_DARK_BASE:-#4a4e5c}"
+    DEFAULT_MUTED_DARK_PROCESSING="${DEFAULT_MUTED_DARK_PROCESSING:-#5a5650}"
+    DEFAULT_MUTED_DARK_PERMISSION="${DEFAULT_MUTED_DARK_PERMISSION:-#5a4a4c}"
+    DEFAULT_MUTED_DARK_COMPLETE="${DEFAULT_MUTED_DARK_COMPLETE:-#4f5a52}"
+    DEFAULT_MUTED_DARK_IDLE="${DEFAULT_MUTED_DARK_IDLE:-#544f62}"
+    DEFAULT_MUTED_DARK_COMPACTING="${DEFAULT_MUTED_DARK_COMPACTING:-#4a5858}"
+    DEFAULT_MUTED_DARK_SUBAGENT="${DEFAULT_MUTED_DARK_SUBAGENT:-#5a5848}"
+    DEFAULT_MUTED_DARK_TOOL_ERROR="${DEFAULT_MUTED_DARK_TOOL_ERROR:-#6a4a3f}"
+    DEFAULT_MUTED_LIGHT_BASE="${DEFAULT_MUTED_LIGHT_BASE:-#b8bac2}"
+    DEFAULT_MUTED_LIGHT_PROCESSING="${DEFAULT_MUTED_LIGHT_PROCESSING:-#c9b8a8}"
+    DEFAULT_MUTED_LIGHT_PERMISSION="${DEFAULT_MUTED_LIGHT_PERMISSION:-#c9a8ac}"
+    DEFAULT_MUTED_LIGHT_COMPLETE="${DEFAULT_MUTED_LIGHT_COMPLETE:-#a8c2a8}"
+    DEFAULT_MUTED_LIGHT_IDLE="${DEFAULT_MUTED_LIGHT_IDLE:-#b8aac8}"
+    DEFAULT_MUTED_LIGHT_COMPACTING="${DEFAULT_MUTED_LIGHT_COMPACTING:-#a8c2c2}"
+    DEFAULT_MUTED_LIGHT_SUBAGENT="${DEFAULT_MUTED_LIGHT_SUBAGENT:-#c8c4a0}"
+    DEFAULT_MUTED_LIGHT_TOOL_ERROR="${DEFAULT_MUTED_LIGHT_TOOL_ERROR:-#c09070}"
+    STATUS_ICON_PROCESSING="${STATUS_ICON_PROCESSING:-🟠}"
+    STATUS_ICON_PERMISSION="${STATUS_ICON_PERMISSION:-🔴}"
+    STATUS_ICON_COMPLETE="${STATUS_ICON_COMPLETE:-🟢}"
+    STATUS_ICON_IDLE="${STATUS_ICON_IDLE:-🟣}"
+    STATUS_ICON_COMPACTING="${STATUS_ICON_COMPACTING:-🔄}"
+    STATUS_ICON_SUBAGENT="${STATUS_ICON_SUBAGENT:-🔀}"
+    STATUS_ICON_TOOL_ERROR="${STATUS_ICON_TOOL_ERROR:-❌}"
+    HUE_PROCESSING="${HUE_PROCESSING:-30}"
+    HUE_PERMISSION="${HUE_PERMISSION:-0}"
+    HUE_COMPLETE="${HUE_COMPLETE:-120}"
+    HUE_IDLE="${HUE_IDLE:-270}"
+    HUE_COMPACTING="${HUE_COMPACTING:-180}"
+    HUE_SUBAGENT="${HUE_SUBAGENT:-50}"
+    HUE_TOOL_ERROR="${HUE_TOOL_ERROR:-15}"
+    DYNAMIC_QUERY_TIMEOUT="${DYNAMIC_QUERY_TIMEOUT:-0.1}"
+    DYNAMIC_DISABLE_SSH="${DYNAMIC_DISABLE_SSH:-true}"
+    ENABLE_STAGE_INDICATORS="${ENABLE_STAGE_INDICATORS:-true}"
+    STAGE_DURATIONS=(60 30 30 30 30 30 30)
+    IDLE_CHECK_INTERVAL="${IDLE_CHECK_INTERVAL:-15}"
+    ENABLE_BELL_PROCESSING="${ENABLE_BELL_PROCESSING:-false}"
+    ENABLE_BELL_PERMISSION="${ENABLE_BELL_PERMISSION:-true}"
+    ENABLE_BELL_COMPLETE="${ENABLE_BELL_COMPLETE:-false}"
+    ENABLE_BELL_COMPACTING="${ENABLE_BELL_COMPACTING:-false}"
+    ENABLE_BELL_SUBAGENT="${ENABLE_BELL_SUBAGENT:-false}"
+    ENABLE_BELL_TOOL_ERROR="${ENABLE_BELL_TOOL_ERROR:-false}"
+    DEBUG_ALL="${DEBUG_ALL:-0}"
+    IDLE_DEBUG="${IDLE_DEBUG:-0}"
+    STATE_GRACE_PERIOD_MS="${STATE_GRACE_PERIOD_MS:-400}"
+    UNKNOWN_FACES_PROCESSING=('(°-°)')
+    UNKNOWN_FACES_PERMISSION=('(°□°)')
+    UNKNOWN_FACES_COMPLETE=('(^‿^)')
+    UNKNOWN_FACES_COMPACTING=('(@_@)')
+    UNKNOWN_FACES_RESET=('(-_-)')
+    UNKNOWN_FACES_IDLE_0=('(•‿•)')
+    UNKNOWN_FACES_IDLE_1=('(‿‿)')
+    UNKNOWN_FACES_IDLE_2=('(︶‿︶)')
+    UNKNOWN_FACES_IDLE_3=('(¬‿¬)')
+    UNKNOWN_FACES_IDLE_4=('(-.-)zzZ')
+    UNKNOWN_FACES_IDLE_5=('(︶.︶)ᶻᶻ')
+    UNKNOWN_FACES_SUBAGENT=('(⇆-⇆)')
+    UNKNOWN_FACES_TOOL_ERROR=('(✕_✕)')
+}
+_apply_mode_aware_processing() {
+    [[ "${ENABLE_MODE_AWARE_PROCESSING:-true}" != "true" ]] && return 0
+    local mode="${TAVS_PERMISSION_MODE:-default}"
+    [[ "$mode" == "dontAsk" ]] && mode="acceptEdits"
+    [[ "$mode" == "default" ]] && return 0
+    local suffix=""
+    case "$mode" in
+        plan)              suffix="PLAN" ;;
+        acceptEdits)       suffix="ACCEPT" ;;
+        bypassPermissions) suffix="BYPASS" ;;
+        *)                 return 0 ;;
+    esac
+    local mode_color=""
+    if [[ "${IS_MUTED_THEME:-false}" == "true" ]]; then
+        if [[ "${IS_DARK_THEME:-true}" == "true" ]]; then
+            eval "mode_color=\${MUTED_DARK_PROCESSING_${suffix}:-}"
+        else
+            eval "mode_color=\${MUTED_LIGHT_PROCESSING_${suffix}:-}"
+        fi
+    else
+        if [[ "${IS_DARK_THEME:-true}" == "true" ]]; then
+            eval "mode_color=\${DARK_PROCESSING_${suffix}:-}"
+        else
+            eval "mode_color=\${LIGHT_PROCESSING_${suffix}:-}"
+        fi
+    fi
+    [[ -n "$mode_color" ]] && COLOR_PROCESSING="$mode_color"
+}
+_CACHED_SYSTEM_MODE=""
+_SYSTEM_MODE_FILE="${TAVS_TMP_DIR:-/tmp/tavs}/system-mode"
+_resolve_colors() {
+    local use_dark="true"
+    local use_muted="false"
+    local in_truecolor="false"
+    if _source_detect_if_needed && is_truecolor_mode; then
+        in_truecolor="true"
+    fi
+    if [[ "$FORCE_MODE" == "dark" ]]; then
+        use_dark="true"
+    elif [[ "$FORCE_MODE" == "light" ]]; then
+        use_dark="false"
+    elif [[ "$ENABLE_LIGHT_DARK_SWITCHING" == "true" ]]; then
+        if [[ "$in_truecolor" == "true" ]]; then
+            case "$TRUECOLOR_MODE_OVERRIDE" in
+                "muted")
+                    use_muted="true"
+                    _load_system_mode
+                    [[ "$_CACHED_SYSTEM_MODE" == "dark" ]] && use_dark="true" || use_dark="false"
+                    ;;
+                "full")
+                    _load_system_mode
+                    [[ "$_CACHED_SYSTEM_MODE" == "dark" ]] && use_dark="true" || use_dark="false"
+                    ;;
+                *)
+                    use_dark="true"
+                    ;;
+            esac
+        else
+            _load_system_mode
+            [[ "$_CACHED_SYSTEM_MODE" == "dark" ]] && use_dark="true" || use_dark="false"
+        fi
+    fi
+    if [[ "$use_muted" == "true" ]]; then
+        if [[ "$use_dark" == "true" ]]; then
+            COLOR_BASE="${MUTED_DARK_BASE}"
+            COLOR_PROCESSING="${MUTED_DARK_PROCESSING}"
+            COLOR_PERMISSION="${MUTED_DARK_PERMISSION}"
+            COLOR_COMPLETE="${MUTED_DARK_COMPLETE}"
+            COLOR_IDLE="${MUTED_DARK_IDLE}"
+            COLOR_COMPACTING="${MUTED_DARK_COMPACTING}"
+            COLOR_SUBAGENT="${MUTED_DARK_SUBAGENT}"
+            COLOR_TOOL_ERROR="${MUTED_DARK_TOOL_ERROR}"
+            IS_DARK_THEME="true"
+            IS_MUTED_THEME="true"
+        else
+            COLOR_BASE="${MUTED_LIGHT_BASE}"
+            COLOR_PROCESSING="${MUTED_LIGHT_PROCESSING}"
+            COLOR_PERMISSION="${MUTED_LIGHT_PERMISSION}"
+            COLOR_COMPLETE="${MUTED_LIGHT_COMPLETE}"
+            COLOR_IDLE="${MUTED_LIGHT_IDLE}"
+            COLOR_COMPACTING="${MUTED_LIGHT_COMPACTING}"
+            COLOR_SUBAGENT="${MUTED_LIGHT_SUBAGENT}"
+            COLOR_TOOL_ERROR="${MUTED_LIGHT_TOOL_ERROR}"
+            IS_DARK_THEME="false"
+            IS_MUTED_THEME="true"
+        fi
+    else
+        if [[ "$use_dark" == "true" ]]; then
+            COLOR_BASE="${DARK_BASE}"
+            COLOR_PROCESSING="${DARK_PROCESSING}"
+            COLOR_PERMISSION="${DARK_PERMISSION}"
+            COLOR_COMPLETE="${DARK_COMPLETE}"
+            COLOR_IDLE="${DARK_IDLE}"
+            COLOR_COMPACTING="${DARK_COMPACTING}"
+            COLOR_SUBAGENT="${DARK_SUBAGENT}"
+            COLOR_TOOL_ERROR="${DARK_TOOL_ERROR}"
+            IS_DARK_THEME="true"
+            IS_MUTED_THEME="false"
+        else
+            COLOR_BASE="${LIGHT_BASE}"
+            COLOR_PROCESSING="${LIGHT_PROCESSING}"
+            COLOR_PERMISSION="${LIGHT_PERMISSION}"
+            COLOR_COMPLETE="${LIGHT_COMPLETE}"
+            COLOR_IDLE="${LIGHT_IDLE}"
+            COLOR_COMPACTING="${LIGHT_COMPACTING}"
+            COLOR_SUBAGENT="${LIGHT_SUBAGENT}"
+            COLOR_TOOL_ERROR="${LIGHT_TOOL_ERROR}"
+            IS_DARK_THEME="false"
+            IS_MUTED_THEME="false"
+        fi
+    fi
+    _apply_mode_aware_processing
+    _build_stage_arrays
+}
+_detect_system_mode() {
+    case "$(uname -s)" in
+        Darwin)
+            if defaults read -g AppleInterfaceStyle &>/dev/null; then
+                echo "dark"
+            else
+                echo "light"
+            fi
+            ;;
+        Linux)
+            if command -v gsettings &>/dev/null; then
+                local scheme
+                scheme=$(gsettings get org.gnome.desktop.interface color-scheme 2>/dev/null)
+                if [[ "$scheme" == *"dark"* ]]; then
+                    echo "dark"
+                    return
+                fi
+            fi
+            echo "light"
+            ;;
+        *)
+            echo "dark"
+            ;;
+    esac
+}
+_read_shared_system_mode() {
+    local mode="" pid=""
+    _SHARED_SYSTEM_MODE=""
+    [[ -f "$_SYSTEM_MODE_FILE" ]] || return 1
+    read -r mode pid < "$_SYSTEM_MODE_FILE" 2>/dev/null
+    [[ "$mode" == "dark" || "$mode" == "light" ]] || return 1
+    [[ -n "$pid" ]] && kill -0 "$pid" 2>/dev/null || return 1
+    _SHARED_SYSTEM_MODE="$mode"
+}
+_current_system_mode() {
+    if _read_shared_system_mode; then
+        _CURRENT_SYSTEM_MODE="$_SHARED_SYSTEM_MODE"
+    else
+        _CURRENT_SYSTEM_MODE=$(_detect_system_mode)
+    fi
+}
+_load_system_mode() {
+    [[ -n "$_CACHED_SYSTEM_MODE" ]] && return 0
+    _current_system_mode
+    _CACHED_SYSTEM_MODE="$_CURRENT_SYSTEM_MODE"
+}
+clear_mode_cache() {
+    _CACHED_SYSTEM_MODE=""
+}
+refresh_colors() {
+    clear_mode_cache
+    _resolve_colors
+}
+_build_stage_arrays() {
+    _source_colors_if_needed 2>/dev/null || true
+    if type calculate_stage_colors &>/dev/null; then
+        calculate_stage_colors "$COLOR_COMPLETE" "$COLOR_IDLE" "$COLOR_BASE"
+        UNIFIED_STAGE_COLORS=(
+            "${IDLE_STAGE_0_COLOR:-$COLOR_SET_STAGE_0}"
+            "${IDLE_STAGE_1_COLOR:-$COLOR_SET_STAGE_1}"
+            "${IDLE_STAGE_2_COLOR:-$COLOR_SET_STAGE_2}"
+            "${IDLE_STAGE_3_COLOR:-$COLOR_SET_STAGE_3}"
+            "${IDLE_STAGE_4_COLOR:-$COLOR_SET_STAGE_4}"
+            "${IDLE_STAGE_5_COLOR:-$COLOR_SET_STAGE_5}"
+            "${IDLE_STAGE_6_COLOR:-$COLOR_SET_STAGE_6}"
+        )
+    else
+        UNIFIED_STAGE_COLORS=(
+            "${IDLE_STAGE_0_COLOR:-$COLOR_COMPLETE}"
+            "${IDLE_STAGE_1_COLOR:-$COLOR_IDLE}"
+            "${IDLE_STAGE_2_COLOR:-$(_interpolate_stage_color 2)}"
+            "${IDLE_STAGE_3_COLOR:-$(_interpolate_stage_color 3)}"
+            "${IDLE_STAGE_4_COLOR:-$(_interpolate_stage_color 4)}"
+            "${IDLE_STAGE_5_COLOR:-$(_interpolate_stage_color 5)}"
+            "${IDLE_STAGE_6_COLOR:-reset}"
+        )
+    fi
+    UNIFIED_STAGE_STATUS_ICONS=(
+        "${IDLE_STAGE_0_STATUS_ICON:-$STATUS_ICON_COMPLETE}"
+        "${IDLE_STAGE_1_STATUS_ICON:-$STATUS_ICON_IDLE}"
+        "${IDLE_STAGE_2_STATUS_ICON:-$STATUS_ICON_IDLE}"
+        "${IDLE_STAGE_3_STATUS_ICON:-$STATUS_ICON_IDLE}"
+        "${IDLE_STAGE_4_STATUS_ICON:-$STATUS_ICON_IDLE}"
+        "${IDLE_STAGE_5_STATUS_ICON:-$STATUS_ICON_IDLE}"
+        "${IDLE_STAGE_6_STATUS_ICON:-}"
+    )
+    if [[ ${#STAGE_DURATIONS[@]} -gt 0 ]]; then
+        UNIFIED_STAGE_DURATIONS=("${STAGE_DURATIONS[@]}")
+    else
+        UNIFIED_STAGE_DURATIONS=(60 30 30 30 30 30 30)
+    fi
+    UNIFIED_CHECK_INTERVAL="${IDLE_CHECK_INTERVAL:-15}"
+}
+_interpolate_stage_color() {
+    local stage=$1
+    local t=$(( (stage - 1) * 200 ))
+    if type interpolate_hsl &>/dev/null; then
+        interpolate_hsl "$COLOR_IDLE" "$COLOR_BASE" "$t"
+        return
+    fi
+    if type hex_to_rgb &>/dev/null && type rgb_to_hex &>/dev/null; then
+        local rgb1 rgb2
+        rgb1=$(hex_to_rgb "$COLOR_IDLE")
+        rgb2=$(hex_to_rgb "$COLOR_BASE")
+        read -r r1 g1 b1 <<< "$rgb1"
+        read -r r2 g2 b2 <<< "$rgb2"
+        local r=$(( r1 + (r2 - r1) * t / 1000 ))
+        local g=$(( g1 + (g2 - g1) * t / 1000 ))
+        local b=$(( b1 + (b2 - b1) * t / 1000 ))
+        rgb_to_hex "$r" "$g" "$b"
+        return
+    fi
+    echo "$COLOR_IDLE"
+}
+apply_theme() {
+    local preset_name="$1"
+    if [[ -z "$preset_name" ]]; then
+        echo "Error: No theme preset specified" >&2
+        return 1
+    fi
+    local preset_file="$_THEMES_DIR/${preset_name}.conf"
+    if [[ ! -f "$preset_file" ]]; then
+        echo "Error: Theme preset '$preset_name' not found at $preset_file" >&2
+        return 1
+    fi
+    _load_config_file "$preset_file"
+    _resolve_colors
+    return 0
+}
+list_themes() {
+    if [[ -d "$_THEMES_DIR" ]]; then
+        find "$_THEMES_DIR" -name "*.conf" -exec basename {} .conf \; 2>/dev/null | sort
+    fi
+}
+if [[ -z "${_THEME_LOADED:-}" ]]; then
+    _THEME_LOADED="1"
+    load_agent_config "$TAVS_AGENT"
+fi
+_TAVS_DEBUG_LOG_LOADED=1
+_DEBUG_LOG_CHECK_EVERY=32
+debug_log() {
+    local file="$1" event="$2" record ts pair key value
+    shift 2
+    if [[ -n "${BASH_VERSION:-}" && -n "${EPOCHREALTIME:-}" ]]; then
+        value="${EPOCHREALTIME#*[.,]}"
+        printf -v ts '%(%Y-%m-%dT%H:%M:%S)T.%s' "${EPOCHREALTIME%[.,]*}" "${value:0:3}"
+    else
+        util_now
+        ts="$_UTIL_NOW"
+    fi
+    record="$ts ${BASHPID:-$$} $event"
+    for pair in "$@"; do
+        key="${pair%%=*}"
+        value="${pair#*=}"
+        if [[ "$key" == "payload" ]]; then
+            local max="${TAVS_DEBUG_PAYLOAD_MAX:-2048}"
+            [[ "$max" =~ ^[0-9]+$ ]] || max=2048
+            [[ ${#value} -gt $max ]] && \
+                value="${value:0:$max}...(+$(( ${#value} - max )) bytes)"
+        fi
+        printf -v value '%q' "$value"
+        record+=" $key=$value"
+    done
+    [[ -d "${file%/*}" ]] || mkdir -p "${file%/*}" 2>/dev/null
+    printf '%s\n' "$record" >> "$file" 2>/dev/null
+    (( RANDOM % _DEBUG_LOG_CHECK_EVERY )) || _debug_log_rotate "$file"
+    return 0
+}
+_debug_log_rotate() {
+    local file="$1" size
+    local max_kb="${TAVS_DEBUG_LOG_MAX_KB:-1024}" keep="${TAVS_DEBUG_LOG_KEEP:-2}"
+    [[ "$max_kb" =~ ^[0-9]+$ && $max_kb -gt 0 ]] || return 0
+    [[ "$keep" =~ ^[0-9]+$ ]] || keep=2
+    [[ -f "$file" ]] || return 0
+    size=$(wc -c < "$file" 2>/dev/null) || return 0
+    size="${size//[[:space:]]/}"
+    [[ "$size" =~ ^[0-9]+$ && $size -gt $(( max_kb * 1024 )) ]] || return 0
+    if [[ $keep -eq 0 ]]; then
+        : > "$file"
+        return 0
+    fi
+    local i=$keep
+    rm -f "${file}.${keep}" 2>/dev/null
+    while [[ $i -gt 1 ]]; do
+        [[ -f "${file}.$((i - 1))" ]] && mv -f "${file}.$((i - 1))" "${file}.${i}" 2>/dev/null
+        i=$((i - 1))
+    done
+    mv -f "$file" "${file}.1" 2>/dev/null
+    return 0
+}
+get_tavs_tmp_dir() {
+    local tmp_dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    if [[ ! -d "$tmp_dir" ]]; then
+        mkdir -p "$tmp_dir" 2>/dev/null
+        chmod 700 "$tmp_dir" 2>/dev/null
+    fi
+    printf '%s' "$tmp_dir"
+}
+_TAVS_TMP_DIR=$(get_tavs_tmp_dir)
+STATE_DB="${_TAVS_TMP_DIR}/state"
+STATE_GRACE_PERIOD_MS="${STATE_GRACE_PERIOD_MS:-400}"
+get_time_ms() {
+    util_now_ms
+    echo "$_UTIL_NOW_MS"
+}
+IDLE_DEBUG="${IDLE_DEBUG:-0}"
+IDLE_DEBUG_LOG="${_TAVS_TMP_DIR}/idle-timer.log"
+DEBUG_ALL="${DEBUG_ALL:-0}"
+DEBUG_LOG_DIR="${_TAVS_TMP_DIR}/debug"
+get_state_priority() {
+    case "$1" in
+        permission)  echo 100 ;;
+        compacting)  echo 50 ;;
+        tool_error)  echo 35 ;;
+        processing)  echo 30 ;;
+        subagent)    echo 25 ;;
+        complete)    echo 20 ;;
+        idle)        echo 15 ;;
+        reset)       echo 10 ;;
+        *)           echo 0 ;;
+    esac
+}
+read_session_state() {
+    SESSION_STATE="" SESSION_PRIORITY=0 SESSION_TIME=0 SESSION_TIMER_PID="" SESSION_SEQ=0
+    [[ ! -f "$STATE_DB" ]] && return 1
+    local tty state priority time pid seq found=1
+    while read -r tty state priority time pid seq; do
+        [[ "$tty" == "$TTY_SAFE" ]] || continue
+        SESSION_STATE="$state" SESSION_PRIORITY="$priority" SESSION_TIME="$time"
+        SESSION_TIMER_PID="$pid" SESSION_SEQ="${seq:-0}"
+        found=0
+    done < "$STATE_DB"
+    [[ "$SESSION_TIMER_PID" == "-" ]] && SESSION_TIMER_PID=""
+    return $found
+}
+_STATE_SEQ_MAX_SKEW_US=60000000
+is_stale_event() {
+    [[ "${TAVS_EVENT_SEQ:-}" =~ ^[0-9]+$ ]] || return 1
+    read_session_state || return 1
+    [[ "$SESSION_SEQ" =~ ^[0-9]+$ ]] || return 1
+    local ahead=$(( SESSION_SEQ - TAVS_EVENT_SEQ ))
+    [[ $ahead -gt 0 && $ahead -lt $_STATE_SEQ_MAX_SKEW_US ]]
+}
+write_session_state() {
+    local state="$1"
+    local timer_pid="${2:-}"
+    is_stale_event && return 1
+    local priority
+    priority=$(get_state_priority "$state")
+    local now_ms
+    now_ms=$(get_time_ms)
+    [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" write_session_state "tty=$TTY_SAFE" "state=$state" "timer_pid=$timer_pid"
+    local tmp_file="${STATE_DB}.tmp.$$"
+    {
+        grep -v "^${TTY_SAFE} " "$STATE_DB" 2>/dev/null
+        echo "${TTY_SAFE} ${state} ${priority} ${now_ms} ${timer_pid:--} ${TAVS_EVENT_SEQ:-0}"
+    } > "$tmp_file" 2>/dev/null
+    mv "$tmp_file" "$STATE_DB" 2>/dev/null
+}
+_state_protected_by() {
+    case "$1" in
+        permission) _STATE_PROTECTED="compacting tool_error processing subagent complete idle" ;;
+        compacting) _STATE_PROTECTED="tool_error processing subagent complete idle" ;;
+        tool_error) _STATE_PROTECTED="processing subagent complete idle" ;;
+        processing) _STATE_PROTECTED="subagent complete idle" ;;
+        subagent)   _STATE_PROTECTED="complete idle" ;;
+        complete)   _STATE_PROTECTED="idle" ;;
+        *)          _STATE_PROTECTED="" ;;
+    esac
+}
+get_state_transition() {
+    local new_state="$1"
+    _STATE_TRANSITION="apply"
+    _STATE_DEFER_MS=0
+    read_session_state || return 0
+    _state_protected_by "$SESSION_STATE"
+    case " $_STATE_PROTECTED " in
+        *" $new_state "*) ;;
+        *) return 0 ;;
+    esac
+    util_now_ms
+    local elapsed_ms=$(( _UTIL_NOW_MS - SESSION_TIME ))
+    if [[ $elapsed_ms -lt $STATE_GRACE_PERIOD_MS ]]; then
+        _STATE_TRANSITION="defer"
+        _STATE_DEFER_MS=$(( STATE_GRACE_PERIOD_MS - elapsed_ms ))
+    fi
+}
+_STATE_TRIGGER="${_TAVS_TRIGGER:-$CORE_DIR/trigger.sh}"
+_read_deferred_state() {
+    _DEFERRED_ID="" _DEFERRED_STATE="" _DEFERRED_BASIS=""
+    local file="${STATE_DB}.deferred.${TTY_SAFE}"
+    [[ -f "$file" ]] || return 1
+    read -r _DEFERRED_ID _DEFERRED_STATE _DEFERRED_BASIS < "$file"
+    [[ -n "$_DEFERRED_ID" ]]
+}
+defer_state_event() {
+    local state="$1" delay_ms="$2"
+    local file="${STATE_DB}.deferred.${TTY_SAFE}"
+    util_now_ms
+    local id="${_UTIL_NOW_MS}.$$"
+    util_tmpfile "$file"
+    printf '%s %s %s\n' "$id" "$state" "$SESSION_TIME" > "$_UTIL_TMPFILE" 2>/dev/null &&
+        mv -f "$_UTIL_TMPFILE" "$file" 2>/dev/null || return 1
+    local delay
+    printf -v delay '%d.%03d' $(( delay_ms / 1000 )) $(( delay_ms % 1000 ))
+    (
+        sleep "$delay"
+        _TAVS_RERUN=1 _TAVS_DEFERRED_ID="$id" TTY_DEVICE="$TTY_DEVICE" \
+            "$_STATE_TRIGGER" "$state"
+    ) </dev/null >/dev/null 2>&1 &
+    disown 2>/dev/null || true
+}
+should_change_state() {
+    local new_state="$1"
+    if [[ -n "${_TAVS_DEFERRED_ID:-}" ]]; then
+        _read_deferred_state || return 1
+        [[ "$_DEFERRED_ID" == "$_TAVS_DEFERRED_ID" ]] || return 1
+        read_session_state
+        [[ "$SESSION_TIME" == "$_DEFERRED_BASIS" ]] || return 1
+        rm -f "${STATE_DB}.deferred.${TTY_SAFE}" 2>/dev/null
+    fi
+    get_state_transition "$new_state"
+    [[ "$_STATE_TRANSITION" == "apply" ]] && return 0
+    defer_state_event "$new_state" "$_STATE_DEFER_MS"
+    return 1
+}
+record_state() {
+    write_session_state "$1" ""
+}
+write_skip_signal() {
+    local skip_file="${STATE_DB}.skip.${TTY_SAFE}"
+    echo "1" > "$skip_file"
+    [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" write_skip_signal "file=$skip_file"
+}
+check_and_clear_skip_signal() {
+    local skip_file="${STATE_DB}.skip.${TTY_SAFE}"
+    if [[ -f "$skip_file" ]]; then
+        rm -f "$skip_file"
+        [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" clear_skip_signal "file=$skip_file"
+        return 0
+    fi
+    return 1
+}
+SESSION_COLORS_DB="${_TAVS_TMP_DIR}/colors"
+write_session_colors() {
+    local agent="${1:-claude}"
+    local base_color="${2:-}"
+    local is_dark="${3:-true}"
+    local system_mode="${4:-dark}"
+    local color_proc="${5:-}"
+    local color_perm="${6:-}"
+    local color_comp="${7:-}"
+    local color_idle="${8:-}"
+    local color_compact="${9:-}"
+    [[ -z "$TTY_SAFE" ]] && return 1
+    local tmp_file="${SESSION_COLORS_DB}.tmp.$$"
+    {
+        grep -v "^${TTY_SAFE} " "$SESSION_COLORS_DB" 2>/dev/null
+        echo "${TTY_SAFE} ${agent} ${base_color} ${is_dark} ${system_mode} ${color_proc} ${color_perm} ${color_comp} ${color_idle} ${color_compact}"
+    } > "$tmp_file" 2>/dev/null
+    mv "$tmp_file" "$SESSION_COLORS_DB" 2>/dev/null
+    [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" write_session_colors "tty=$TTY_SAFE" "agent=$agent" "base=$base_color"
+}
+read_session_colors() {
+    SESSION_AGENT=""
+    SESSION_BASE_COLOR=""
+    SESSION_IS_DARK=""
+    SESSION_SYSTEM_MODE=""
+    SESSION_COLOR_PROCESSING=""
+    SESSION_COLOR_PERMISSION=""
+    SESSION_COLOR_COMPLETE=""
+    SESSION_COLOR_IDLE=""
+    SESSION_COLOR_COMPACTING=""
+    [[ ! -f "$SESSION_COLORS_DB" ]] && return 1
+    [[ -z "$TTY_SAFE" ]] && return 1
+    local line
+    line=$(grep "^${TTY_SAFE} " "$SESSION_COLORS_DB" 2>/dev/null | tail -1)
+    [[ -z "$line" ]] && return 1
+    read -r _ SESSION_AGENT SESSION_BASE_COLOR SESSION_IS_DARK SESSION_SYSTEM_MODE \
+         SESSION_COLOR_PROCESSING SESSION_COLOR_PERMISSION SESSION_COLOR_COMPLETE \
+         SESSION_COLOR_IDLE SESSION_COLOR_COMPACTING <<< "$line"
+    return 0
+}
+has_session_colors() {
+    [[ -f "$SESSION_COLORS_DB" ]] || return 1
+    [[ -z "$TTY_SAFE" ]] && return 1
+    grep -q "^${TTY_SAFE} " "$SESSION_COLORS_DB" 2>/dev/null
+}
+clear_session_colors() {
+    [[ ! -f "$SESSION_COLORS_DB" ]] && return 0
+    [[ -z "$TTY_SAFE" ]] && return 1
+    local tmp_file="${SESSION_COLORS_DB}.tmp.$$"
+    grep -v "^${TTY_SAFE} " "$SESSION_COLORS_DB" > "$tmp_file" 2>/dev/null
+    mv "$tmp_file" "$SESSION_COLORS_DB" 2>/dev/null
+    [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" clear_session_colors "tty=$TTY_SAFE"
+}
+get_session_color() {
+    local state="$1"
+    if has_session_colors && read_session_colors; then
+        case "$state" in
+            processing) echo "$SESSION_COLOR_PROCESSING" ;;
+            permission) echo "$SESSION_COLOR_PERMISSION" ;;
+            complete)   echo "$SESSION_COLOR_COMPLETE" ;;
+            idle)       echo "$SESSION_COLOR_IDLE" ;;
+            compacting) echo "$SESSION_COLOR_COMPACTING" ;;
+            base)       echo "$SESSION_BASE_COLOR" ;;
+            *)          echo "" ;;
+        esac
+    fi
+}
+TERMINAL_SH_DIR="$CORE_DIR"
+get_face() {
+    local theme="$1"
+    local state="$2"
+    if type get_random_face &>/dev/null; then
+        get_random_face "$state"
+        return
+    fi
+    case "$state" in
+        processing)  echo "(°-°)" ;;
+        permission)  echo "(°□°)" ;;
+        complete)    echo "(^‿^)" ;;
+        compacting)  echo "(@_@)" ;;
+        reset)       echo "(-_-)" ;;
+        idle_0)      echo "(•‿•)" ;;
+        idle_1)      echo "(‿‿)" ;;
+        idle_2)      echo "(︶‿︶)" ;;
+        idle_3)      echo "(¬‿¬)" ;;
+        idle_4)      echo "(-.-)zzZ" ;;
+        idle_5)      echo "(︶.︶)ᶻᶻ" ;;
+        idle)        echo "(‿‿)" ;;
+        *)           echo "" ;;
+    esac
+}
+_TAVS_TTY_FRAME_LOADED=1
+_TTY_FRAME_LOCK_ATTEMPTS=20
+tty_write() {
+    [[ -z "${TTY_DEVICE:-}" ]] && return 1
+    if [[ -n "${_TAVS_FRAME_OPEN:-}" ]]; then
+        local chunk
+        printf -v chunk "$@"
+        _TAVS_FRAME+="$chunk"
+        return 0
+    fi
+    printf "$@" > "$TTY_DEVICE"
+}
+tty_write_now() {
+    [[ -z "${TTY_DEVICE:-}" ]] && return 1
+    local data
+    printf -v data "$@"
+    _tty_frame_write "$data"
+}
+tty_frame_begin() {
+    _TAVS_FRAME_OPEN=1
+    _TAVS_FRAME=""
+    _TAVS_FRAME_ON_WRITE=""
+}
+tty_frame_on_write() {
+    if [[ -z "${_TAVS_FRAME_OPEN:-}" ]]; then
+        "$@"
+        return
+    fi
+    local cmd
+    printf -v cmd '%q ' "$@"
+    _TAVS_FRAME_ON_WRITE+="$cmd"$'\n'
+}
+tty_frame_flush() {
+    local state="${1:-}" frame="${_TAVS_FRAME:-}" on_write="${_TAVS_FRAME_ON_WRITE:-}"
+    _TAVS_FRAME_OPEN=""
+    _TAVS_FRAME=""
+    _TAVS_FRAME_ON_WRITE=""
+    [[ -z "${TTY_DEVICE:-}" || -z "$frame" ]] && return 0
+    local dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    local owner="$dir/frame.${TTY_DEVICE//\//_}"
+    local lock="${owner}.lock" attempts=0 locked=true
+    while ! mkdir "$lock" 2>/dev/null; do
+        [[ -d "$dir" ]] || { locked=false; break; }
+        attempts=$((attempts + 1))
+        if [[ $attempts -ge 5 ]]; then
+            _tty_frame_owner "$owner"
+            if [[ -n "$_TTY_FRAME_PID" ]] && ! kill -0 "$_TTY_FRAME_PID" 2>/dev/null; then
+                rmdir "$lock" 2>/dev/null
+                continue
+            fi
+        fi
+        if [[ $attempts -ge $_TTY_FRAME_LOCK_ATTEMPTS ]]; then
+            locked=false
+            metrics_count 'tavs_lock_timeouts_total{lock="frame"}'
+            break
+        fi
+        sleep 0.01
+    done
+    local rc=0
+    _tty_frame_owner "$owner"
+    local ahead=0
+    [[ "$_TTY_FRAME_SEQ" =~ ^[0-9]+$ && "${TAVS_EVENT_SEQ:-}" =~ ^[0-9]+$ ]] && \
+        ahead=$(( _TTY_FRAME_SEQ - TAVS_EVENT_SEQ ))
+    if [[ $ahead -gt 0 && $ahead -lt ${_STATE_SEQ_MAX_SKEW_US:-60000000} ]]; then
+        rc=1
+    else
+        if [[ "$locked" == "true" ]]; then
+            printf 'state=%s\nseq=%s\npid=%s\n' \
+                "$state" "${TAVS_EVENT_SEQ:-}" "${BASHPID:-$$}" > "$owner" 2>/dev/null
+        fi
+        _tty_frame_write "$frame" || rc=1
+    fi
+    [[ "$locked" == "true" ]] && rmdir "$lock" 2>/dev/null
+    [[ $rc -eq 0 && -n "$on_write" ]] && eval "$on_write"
+    return $rc
+}
+_tty_frame_owner() {
+    local key value
+    _TTY_FRAME_STATE="" _TTY_FRAME_SEQ="" _TTY_FRAME_PID=""
+    [[ -f "$1" ]] || return 1
+    while IFS='=' read -r key value; do
+        case "$key" in
+            state) _TTY_FRAME_STATE="$value" ;;
+            seq) _TTY_FRAME_SEQ="$value" ;;
+            pid) _TTY_FRAME_PID="$value" ;;
+        esac
+    done < "$1"
+}
+_tty_frame_write() {
+    local data="$1" timeout="${TAVS_TTY_WRITE_TIMEOUT:-0.25}"
+    if [[ "$timeout" == "0" ]]; then
+        printf '%s' "$data" > "$TTY_DEVICE" 2>/dev/null
+        return
+    fi
+    local drops="${TAVS_TMP_DIR:-/tmp/tavs}/frame.${TTY_DEVICE//\//_}.drops"
+    if [[ -f "$drops" ]]; then
+        tty_frame_drops "$TTY_DEVICE"
+        util_now
+        if [[ $_TTY_DROP_UNTIL -gt $_UTIL_NOW ]]; then
+            _tty_frame_drop "$drops" skipped
+            return 1
+        fi
+    fi
+    [[ "${BASH_VERSINFO[0]:-4}" -lt 4 ]] && timeout=1
+    local pid="" status=""
+    exec 9< <(
+        echo "${BASHPID:-$(sh -c 'echo $PPID')}"
+        printf '%s' "$data" > "$TTY_DEVICE" 2>/dev/null && echo ok || echo failed
+    )
+    read -r -u 9 pid
+    if read -r -t "$timeout" -u 9 status; then
+        exec 9<&-
+        [[ "$status" == "ok" ]]
+        return
+    fi
+    exec 9<&-
+    [[ -n "$pid" ]] && kill "$pid" 2>/dev/null
+    _tty_frame_drop "$drops" timeouts
+    return 1
+}
+tty_frame_drops() {
+    local file="${TAVS_TMP_DIR:-/tmp/tavs}/frame.${1//\//_}.drops" key value
+    _TTY_DROP_TIMEOUTS=0 _TTY_DROP_SKIPPED=0 _TTY_DROP_LAST=0 _TTY_DROP_UNTIL=0
+    [[ -f "$file" ]] || return 1
+    while IFS='=' read -r key value; do
+        [[ "$value" =~ ^[0-9]+$ ]] || continue
+        case "$key" in
+            timeouts) _TTY_DROP_TIMEOUTS="$value" ;;
+            skipped) _TTY_DROP_SKIPPED="$value" ;;
+            last) _TTY_DROP_LAST="$value" ;;
+            until) _TTY_DROP_UNTIL="$value" ;;
+        esac
+    done < "$file"
+    return 0
+}
+_tty_frame_drop() {
+    local file="$1" kind="$2"
+    tty_frame_drops "$TTY_DEVICE"
+    util_now
+    _TTY_DROP_LAST="$_UTIL_NOW"
+    if [[ "$kind" == "timeouts" ]]; then
+        _TTY_DROP_TIMEOUTS=$((_TTY_DROP_TIMEOUTS + 1))
+        _TTY_DROP_UNTIL=$((_UTIL_NOW + ${TAVS_TTY_WRITE_BACKOFF:-5}))
+    else
+        _TTY_DROP_SKIPPED=$((_TTY_DROP_SKIPPED + 1))
+    fi
+    [[ "${DEBUG_ALL:-0}" == "1" ]] && \
+        echo "[TAVS] TTY write dropped ($kind): $TTY_DEVICE" >&2
+    util_tmpfile "$file"
+    printf 'timeouts=%s\nskipped=%s\nlast=%s\nuntil=%s\n' \
+        "$_TTY_DROP_TIMEOUTS" "$_TTY_DROP_SKIPPED" "$_TTY_DROP_LAST" "$_TTY_DROP_UNTIL" \
+        > "$_UTIL_TMPFILE" 2>/dev/null &&
+        mv -f "$_UTIL_TMPFILE" "$file" 2>/dev/null ||
+        rm -f "$_UTIL_TMPFILE" 2>/dev/null
+}
+BELL_ON_PROCESSING=false
+BELL_ON_PERMISSION=true
+BELL_ON_COMPLETE=true
+BELL_ON_IDLE=false
+BELL_ON_COMPACTING=false
+BELL_ON_RESET=false
+BELL_ON_SUBAGENT=false
+BELL_ON_TOOL_ERROR=false
+send_bell_if_enabled() {
+    local state="$1"
+    local should_bell=false
+    case "$state" in
+        processing)  [[ "$BELL_ON_PROCESSING" == "true" ]] && should_bell=true ;;
+        permission)  [[ "$BELL_ON_PERMISSION" == "true" ]] && should_bell=true ;;
+        complete)    [[ "$BELL_ON_COMPLETE" == "true" ]] && should_bell=true ;;
+        idle)        [[ "$BELL_ON_IDLE" == "true" ]] && should_bell=true ;;
+        compacting)  [[ "$BELL_ON_COMPACTING" == "true" ]] && should_bell=true ;;
+        reset)       [[ "$BELL_ON_RESET" == "true" ]] && should_bell=true ;;
+        subagent)    [[ "$BELL_ON_SUBAGENT" == "true" ]] && should_bell=true ;;
+        tool_error)  [[ "$BELL_ON_TOOL_ERROR" == "true" ]] && should_bell=true ;;
+    esac
+    [[ "$should_bell" == "true" ]] && tty_write "\007"
+}
+resolve_tty() {
+    local tty_dev
+    tty_dev=$(ps -o tty= -p $PPID 2>/dev/null)
+    tty_dev="${tty_dev// /}"
+    if [[ -n "$tty_dev" && "$tty_dev" != "??" && "$tty_dev" != "-" ]]; then
+        [[ "$tty_dev" != /dev/* ]] && tty_dev="/dev/$tty_dev"
+        [[ -w "$tty_dev" ]] && echo "$tty_dev" && return 0
+    fi
+    if { echo -n "" > /dev/tty; } 2>/dev/null; then
+        echo "/dev/tty"
+        return 0
+    fi
+    return 1
+}
+if [[ -z "${TTY_DEVICE:-}" ]]; then
+    TTY_DEVICE=$(resolve_tty)
+fi
+if [[ -n "${TTY_DEVICE:-}" ]]; then
+    TTY_SAFE="${TTY_DEVICE//\//_}"
+fi
+send_osc_bg() {
+    local color="$1"
+    [[ -z "$TTY_DEVICE" ]] && return
+    if [[ "$color" == "reset" ]]; then
+        tty_write "\033]111\033\\"
+    else
+        tty_write "\033]11;%s\033\\" "$color"
+    fi
+}
+_hex_to_x11() {
+    local hex="${1#\#}"
+    printf "rgb:%s/%s/%s" "${hex:0:2}" "${hex:2:2}" "${hex:4:2}"
+}
+_build_osc_palette_seq() {
+    local mode="$1"
+    local mode_upper
+    util_upper "$mode"
+    mode_upper="$_UTIL_UPPER"
+    local seq="\033]4"
+    local var_name color x11_color
+    local has_colors=false
+    for i in {0..15}; do
+        var_name="PALETTE_${mode_upper}_${i}"
+        color="${!var_name}"
+        if [[ -n "$color" ]]; then
+            x11_color=$(_hex_to_x11 "$color")
+            seq+=";${i};${x11_color}"
+            has_colors=true
+        fi
+    done
+    seq+="\033\\"
+    [[ "$has_colors" == "true" ]] && printf "%s" "$seq"
+}
+send_osc_palette() {
+    local mode="$1"
+    [[ -z "$TTY_DEVICE" ]] && return
+    local seq
+    seq=$(_build_osc_palette_seq "$mode")
+    [[ -n "$seq" ]] && tty_write "%b" "$seq"
+}
+send_osc_palette_reset() {
+    [[ -z "$TTY_DEVICE" ]] && return
+    tty_write "\033]104\033\\"
+}
+send_osc_title() {
+    local status_icon="$1"
+    local text="$2"
+    local state="${3:-}"
+    [[ -z "$TTY_DEVICE" ]] && return
+    local title=""
+    local face=""
+    if [[ "$state" == "processing" && "$TAVS_TITLE_MODE" == "full" ]]; then
+        local spinner_result=""
+        if type get_spinner_eyes &>/dev/null; then
+            spinner_result=$(get_spinner_eyes)
+        fi
+        if [[ "$spinner_result" == "FACE_VARIANT" ]]; then
+            if [[ "$ENABLE_ANTHROPOMORPHISING" == "true" ]]; then
+                if type get_random_face &>/dev/null; then
+                    face=$(get_random_face "$state")
+                fi
+                title="$status_icon $face $text"
+            else
+                title="$status_icon $text"
+            fi
+        elif [[ -n "$spinner_result" && "$ENABLE_ANTHROPOMORPHISING" == "true" ]]; then
+            local left_eye="${spinner_result%% *}"
+            local right_eye="${spinner_result##* }"
+            local frame="${SPINNER_FACE_FRAME:-[{L} {R}]}"
+            face="${frame//\{L\}/$left_eye}"
+            face="${face//\{R\}/$right_eye}"
+            if [[ "$FACE_POSITION" == "before" ]]; then
+                title="$face $status_icon $text"
+            else
+                title="$status_icon $face $text"
+            fi
+        elif [[ -n "$spinner_result" ]]; then
+            local single_spinner="${spinner_result%% *}"
+            title="$status_icon $single_spinner $text"
+        else
+            title="$status_icon $text"
+        fi
+    else
+        if [[ "$ENABLE_ANTHROPOMORPHISING" == "true" && -n "$state" ]]; then
+            if type get_random_face &>/dev/null; then
+                face=$(get_random_face "$state")
+            elif type get_face &>/dev/null; then
+                face=$(get_face "${FACE_THEME:-minimal}" "$state")
+            fi
+        fi
+        if [[ -n "$status_icon" && -n "$face" ]]; then
+            if [[ "$FACE_POSITION" == "before" ]]; then
+                title="$face $status_icon $text"
+            else
+                title="$status_icon $face $text"
+            fi
+        elif [[ -n "$face" ]]; then
+            title="$face $text"
+        elif [[ -n "$status_icon" ]]; then
+            title="$status_icon $text"
+        else
+            title="$text"
+        fi
+    fi
+    tty_write "\033]0;%s\033\\" "$title"
+}
+sanitize_for_terminal() {
+    util_strip_ctrl "$1"
+    printf '%s' "$_UTIL_STRIPPED"
+}
+get_short_cwd() {
+    local cwd
+    cwd=$(sanitize_for_terminal "$PWD")
+    cwd="${cwd/#$HOME/\~}"
+    local tmp="${cwd//[!\/]/}"
+    local slash_count=${#tmp}
+    if [[ "$slash_count" -gt 2 ]]; then
+        local parent="${cwd%/*}"
+        parent="${parent##*/}"
+        local base="${cwd##*/}"
+        cwd="…/$parent/$base"
+    fi
+    echo "$cwd"
+}
+get_spinner_state_dir() {
+    local state_dir
+    if [[ -n "$XDG_RUNTIME_DIR" && -d "$XDG_RUNTIME_DIR" ]]; then
+        state_dir="$XDG_RUNTIME_DIR/tavs"
+    else
+        state_dir="${HOME}/.cache/tavs"
+    fi
+    if [[ ! -d "$state_dir" ]]; then
+        mkdir -p "$state_dir" 2>/dev/null
+        chmod 700 "$state_dir" 2>/dev/null
+    fi
+    echo "$state_dir"
+}
+get_session_spinner_file() {
+    local state_dir
+    state_dir=$(get_spinner_state_dir)
+    echo "${state_dir}/session-spinner.${TTY_SAFE:-unknown}"
+}
+get_spinner_index_file() {
+    local state_dir
+    state_dir=$(get_spinner_state_dir)
+    echo "${state_dir}/spinner-idx.${TTY_SAFE:-unknown}"
+}
+read_state_value() {
+    local file="$1"
+    local key="$2"
+    local value=""
+    [[ ! -f "$file" ]] && return 1
+    while IFS='=' read -r k v; do
+        v="${v%\"}"
+        v="${v#\"}"
+        if [[ "$k" == "$key" ]]; then
+            value="$v"
+            break
+        fi
+    done < "$file"
+    echo "$value"
+}
+validate_integer() {
+    local val="$1"
+    [[ "$val" =~ ^[0-9]+$ ]]
+}
+write_state_file() {
+    local file="$1"
+    local style="$2"
+    local eye_mode="$3"
+    local left_idx="$4"
+    local right_idx="$5"
+    local tmp_file="${file}.tmp.$$"
+    {
+        echo "STYLE=$style"
+        echo "EYE_MODE=$eye_mode"
+        echo "LEFT_INDEX=$left_idx"
+        echo "RIGHT_INDEX=$right_idx"
+    } > "$tmp_file" 2>/dev/null
+    mv "$tmp_file" "$file" 2>/dev/null || {
+        rm -f "$tmp_file" 2>/dev/null
+        return 1
+    }
+    return 0
+}
+write_index_file() {
+    local file="$1"
+    local index="$2"
+    local tmp_file="${file}.tmp.$$"
+    echo "$index" > "$tmp_file" 2>/dev/null
+    mv "$tmp_file" "$file" 2>/dev/null || {
+        rm -f "$tmp_file" 2>/dev/null
+        return 1
+    }
+}
+init_session_spinner() {
+    [[ "$TAVS_SESSION_IDENTITY" != "true" ]] && return 0
+    local session_file
+    session_file=$(get_session_spinner_file)
+    local style="${TAVS_SPINNER_STYLE:-random}"
+    local eye_mode="${TAVS_SPINNER_EYE_MODE:-random}"
+    if [[ "$style" == "random" ]]; then
+        local styles=("braille" "circle" "block" "eye-animate" "none")
+        style="${styles[$RANDOM % ${#styles[@]}]}"
+    fi
+    if [[ "$eye_mode" == "random" ]]; then
+        local eye_modes=("sync" "opposite" "stagger" "clockwise" "counter" "mirror" "mirror_inv")
+        eye_mode="${eye_modes[$RANDOM % ${#eye_modes[@]}]}"
+    fi
+    write_state_file "$session_file" "$style" "$eye_mode" "0" "0"
+}
+reset_spinner() {
+    local session_file index_file
+    session_file=$(get_session_spinner_file)
+    index_file=$(get_spinner_index_file)
+    rm -f "$session_file" 2>/dev/null || true
+    rm -f "$index_file" 2>/dev/null || true
+}
+get_spinner_eyes() {
+    local style eye_mode left_idx right_idx
+    local session_file index_file
+    local need_cache_random=false
+    session_file=$(get_session_spinner_file)
+    index_file=$(get_spinner_index_file)
+    if [[ -f "$session_file" ]]; then
+        style=$(read_state_value "$session_file" "STYLE")
+        eye_mode=$(read_state_value "$session_file" "EYE_MODE")
+        left_idx=$(read_state_value "$session_file" "LEFT_INDEX")
+        right_idx=$(read_state_value "$session_file" "RIGHT_INDEX")
+        style="${style:-braille}"
+        eye_mode="${eye_mode:-sync}"
+        left_idx="${left_idx:-0}"
+        right_idx="${right_idx:-0}"
+    else
+        style="${TAVS_SPINNER_STYLE:-random}"
+        eye_mode="${TAVS_SPINNER_EYE_MODE:-random}"
+        if util_read_file "$index_file"; then
+            left_idx="$_UTIL_FILE"
+        else
+            left_idx=0
+        fi
+        right_idx=0
+        if [[ "$style" == "random" || "$eye_mode" == "random" ]]; then
+            need_cache_random=true
+            if [[ "$style" == "random" ]]; then
+                local styles=("braille" "circle" "block" "eye-animate" "none")
+                style="${styles[$RANDOM % ${#styles[@]}]}"
+            fi
+            if [[ "$eye_mode" == "random" ]]; then
+                local eye_modes=("sync" "opposite" "stagger" "clockwise" "counter" "mirror" "mirror_inv")
+                eye_mode="${eye_modes[$RANDOM % ${#eye_modes[@]}]}"
+            fi
+        fi
+    fi
+    if ! validate_integer "$left_idx"; then
+        left_idx=0
+    fi
+    if ! validate_integer "$right_idx"; then
+        right_idx=0
+    fi
+    if [[ "$style" == "none" ]]; then
+        if [[ "$need_cache_random" == "true" ]]; then
+            write_state_file "$session_file" "$style" "$eye_mode" "$left_idx" "$right_idx"
+        fi
+        echo "FACE_VARIANT"
+        return 0
+    fi
+    if [[ "$style" == "eye-animate" ]]; then
+        local eye_chars=("${TAVS_SPINNER_FRAMES_EYE_ANIMATE[@]}")
+        if [[ ${#eye_chars[@]} -eq 0 ]]; then
+            eye_chars=("•" "◦" "·" "°" "○" "◌" "◎" "●" "◉" "⊙" "⊚" "⦿")
+        fi
+        local left_eye="${eye_chars[$RANDOM % ${#eye_chars[@]}]}"
+        local right_eye="${eye_chars[$RANDOM % ${#eye_chars[@]}]}"
+        if [[ "$need_cache_random" == "true" ]]; then
+            write_state_file "$session_file" "$style" "$eye_mode" "0" "0"
+        fi
+        echo "$left_eye $right_eye"
+        return 0
+    fi
+    local frames=()
+    case "$style" in
+        braille)
+            frames=("${TAVS_SPINNER_FRAMES_BRAILLE[@]}")
+            [[ ${#frames[@]} -eq 0 ]] && frames=("⠋" "⠙" "⠹" "⠸" "⠼" "⠴" "⠦" "⠧" "⠇" "⠏")
+            ;;
+        circle)
+            frames=("${TAVS_SPINNER_FRAMES_CIRCLE[@]}")
+            [[ ${#frames[@]} -eq 0 ]] && frames=("○" "◔" "◑" "◕" "●" "◕" "◑" "◔")
+            ;;
+        block)
+            frames=("${TAVS_SPINNER_FRAMES_BLOCK[@]}")
+            [[ ${#frames[@]} -eq 0 ]] && frames=("▁" "▂" "▃" "▄" "▅" "▆" "▇" "█" "▇" "▆" "▅" "▄" "▃" "▂")
+            ;;
+        *)
+            frames=("⠋" "⠙" "⠹" "⠸" "⠼" "⠴" "⠦" "⠧" "⠇" "⠏")
+            ;;
+    esac
+    local frame_count=${#frames[@]}
+    [[ $frame_count -eq 0 ]] && frame_count=1
+    left_idx=$(( left_idx % frame_count ))
+    local left_frame right_frame
+    case "$eye_mode" in
+        sync)
+            left_frame="${frames[$left_idx]}"
+            right_frame="${frames[$left_idx]}"
+            right_idx=$left_idx
+            ;;
+        opposite)
+            right_idx=$(( (left_idx + frame_count/2) % frame_count ))
+            left_frame="${frames[$left_idx]}"
+            right_frame="${frames[$right_idx]}"
+            ;;
+        stagger)
+            right_idx=$(( (left_idx - 2 + frame_count) % frame_count ))
+            left_frame="${frames[$left_idx]}"
+            right_frame="${frames[$right_idx]}"
+            ;;
+        clockwise)
+            left_frame="${frames[$left_idx]}"
+            right_frame="${frames[$left_idx]}"
+            right_idx=$left_idx
+            ;;
+        counter)
+            local ccw_frames=("${TAVS_SPINNER_FRAMES_BRAILLE_CCW[@]}")
+            if [[ ${#ccw_frames[@]} -gt 0 && "$style" == "braille" ]]; then
+                local ccw_idx=$(( left_idx % ${#ccw_frames[@]} ))
+                left_frame="${ccw_frames[$ccw_idx]}"
+                right_frame="${ccw_frames[$ccw_idx]}"
+            else
+                local rev_idx=$(( (frame_count - 1 - left_idx + frame_count) % frame_count ))
+                left_frame="${frames[$rev_idx]}"
+                right_frame="${frames[$rev_idx]}"
+            fi
+            right_idx=$left_idx
+            ;;
+        mirror)
+            right_idx=$(( (frame_count - left_idx) % frame_count ))
+            left_frame="${frames[$left_idx]}"
+            right_frame="${frames[$right_idx]}"
+            ;;
+        mirror_inv)
+            local temp_idx=$(( (frame_count - left_idx) % frame_count ))
+            left_frame="${frames[$temp_idx]}"
+            right_frame="${frames[$left_idx]}"
+            ;;
+        *)
+            left_frame="${frames[$left_idx]}"
+            right_frame="${frames[$left_idx]}"
+            right_idx=$left_idx
+            ;;
+    esac
+    echo "$left_frame $right_frame"
+    local next_left=$(( (left_idx + 1) % frame_count ))
+    if [[ -f "$session_file" || "$need_cache_random" == "true" ]]; then
+        write_state_file "$session_file" "$style" "$eye_mode" "$next_left" "$right_idx"
+    else
+        write_index_file "$index_file" "$next_left"
+    fi
+}
+get_single_spinner() {
+    local eyes
+    eyes=$(get_spinner_eyes)
+    if [[ "$eyes" == "FACE_VARIANT" ]]; then
+        echo ""
+    else
+        echo "${eyes%% *}"
+    fi
+}
+is_spinner_active() {
+    [[ "$TAVS_TITLE_MODE" == "full" ]] && return 0
+    return 1
+}
+should_send_bg_color() {
+    [[ "$ENABLE_BACKGROUND_CHANGE" != "true" ]] && return 1
+    if [[ "$STYLISH_SKIP_BG_TINT" == "true" ]] && \
+       [[ "$ENABLE_STYLISH_BACKGROUNDS" == "true" ]] && \
+       type supports_background_images &>/dev/null && \
+       supports_background_images; then
+        return 1
+    fi
+    return 0
+}
+_get_palette_mode() {
+    if [[ "$FORCE_MODE" == "light" ]]; then
+        echo "light"
+        return
+    elif [[ "$FORCE_MODE" == "dark" ]]; then
+        echo "dark"
+        return
+    fi
+    if [[ "$IS_DARK_THEME" == "false" ]]; then
+        echo "light"
+        return
+    elif [[ "$IS_DARK_THEME" == "true" ]]; then
+        echo "dark"
+        return
+    fi
+    if [[ "$FORCE_MODE" == "auto" ]] && [[ "$ENABLE_LIGHT_DARK_SWITCHING" == "true" ]]; then
+        if type get_system_mode &>/dev/null; then
+            local system_mode
+            system_mode=$(get_system_mode)
+            if [[ "$system_mode" == "light" ]]; then
+                echo "light"
+                return
+            fi
+        fi
+    fi
+    echo "dark"
+}
+_idle_send_palette() {
+    local mode="$1"
+    type should_enable_palette_theming &>/dev/null || return 0
+    should_enable_palette_theming || return 0
+    type _build_osc_palette_seq &>/dev/null || return 0
+    local seq
+    seq=$(_build_osc_palette_seq "$mode")
+    [[ -n "$seq" ]] && tty_write "%b" "$seq"
+}
+_idle_reset_palette() {
+    type should_enable_palette_theming &>/dev/null || return 0
+    should_enable_palette_theming || return 0
+    tty_write "\033]104\033\\"
+}
+get_unified_stage() {
+    local elapsed=$1
+    local cumulative=0
+    RESULT_STAGE=0
+    for duration in "${UNIFIED_STAGE_DURATIONS[@]}"; do
+        cumulative=$((cumulative + duration))
+        if [[ $elapsed -lt $cumulative ]]; then
+            return
+        fi
+        RESULT_STAGE=$((RESULT_STAGE + 1))
+    done
+}
+kill_idle_timer() {
+    read_session_state || return 0
+    if [[ -n "$SESSION_TIMER_PID" ]] && kill -0 "$SESSION_TIMER_PID" 2>/dev/null; then
+        kill "$SESSION_TIMER_PID" 2>/dev/null || true
+        [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" kill_idle_timer "pid=$SESSION_TIMER_PID"
+    fi
+}
+cleanup_stale_timers() {
+    local stale_pids
+    stale_pids=$(pgrep -f "unified_timer_worker.*${TTY_DEVICE}" 2>/dev/null) || true
+    if [[ -n "$stale_pids" ]]; then
+        for pid in $stale_pids;
+ do
+            kill "$pid" 2>/dev/null || true
+            [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" kill_stale_timer "pid=$pid"
+        done
+    fi
+}
+unified_timer_worker() {
+    local tty_device="$1"
+    local start_seconds=$SECONDS
+    _TAVS_FRAME_OPEN=""
+    local TTY_DEVICE="$tty_device"
+    local current_stage=0
+    local last_applied_stage=-1
+    local max_runtime=${MAX_TIMER_RUNTIME:-450}
+    trap 'exit 0' TERM INT
+    local my_pid
+    my_pid=$( sh -c 'echo $PPID' )
+    local SHORT_CWD
+    SHORT_CWD=$(get_short_cwd)
+    local SESSION_ICON=""
+    if [[ "${ENABLE_SESSION_ICONS:-false}" == "true" ]] && type get_session_icon &>/dev/null; then
+        SESSION_ICON=$(get_session_icon 2>/dev/null)
+    fi
+    write_session_state "complete" "$my_pid" || exit 0
+    [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" timer_started "tty=$tty_device" "pid=$my_pid"
+    while true; do
+        sleep "$UNIFIED_CHECK_INTERVAL"
+        [[ ! -w "$tty_device" ]] && continue
+        if check_and_clear_skip_signal && [[ $current_stage -eq 0 ]]; then
+            [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" timer_skip_signal
+            start_seconds=$((SECONDS - UNIFIED_STAGE_DURATIONS[0]))
+        fi
+        if [[ "$ENABLE_LIGHT_DARK_SWITCHING" == "true" && -n "$_CACHED_SYSTEM_MODE" ]] && \
+           type _read_shared_system_mode &>/dev/null && _read_shared_system_mode && \
+           [[ "$_SHARED_SYSTEM_MODE" != "$_CACHED_SYSTEM_MODE" ]]; then
+            _CACHED_SYSTEM_MODE="$_SHARED_SYSTEM_MODE"
+            _resolve_colors
+            last_applied_stage=-1
+        fi
+        local elapsed=$(( SECONDS - start_seconds ))
+        get_unified_stage $elapsed
+        current_stage=$RESULT_STAGE
+        if [[ $elapsed -ge $max_runtime ]]; then
+            [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" timer_max_runtime
+            metrics_count tavs_idle_max_runtime_total
+            tty_frame_begin
+            _idle_reset_palette 2>/dev/null || true
+            should_send_bg_color && tty_write "\033]111\033\\"
+            tty_write "\033]0;%s\033\\" "$SHORT_CWD"
+            tty_frame_flush "reset"
+            kill -TERM $my_pid 2>/dev/null
+            exit 0
+        fi
+        if [[ $current_stage -ge ${#UNIFIED_STAGE_COLORS[@]} ]]; then
+            write_session_state "reset" "$my_pid"
+            continue
+        fi
+        if [[ $current_stage -ne $last_applied_stage ]]; then
+            last_applied_stage=$current_stage
+            if [[ $current_stage -eq 0 ]]; then
+                write_session_state "complete" "$my_pid" || exit 0
+            else
+                write_session_state "idle" "$my_pid" || exit 0
+            fi
+            local stage_color="${UNIFIED_STAGE_COLORS[$current_stage]}"
+            local stage_status_icon="${UNIFIED_STAGE_STATUS_ICONS[$current_stage]}"
+            tty_frame_begin
+            if [[ "$stage_color" == "reset" ]]; then
+                _idle_reset_palette
+            else
+                _idle_send_palette "$(_get_palette_mode)"
+            fi
+            if should_send_bg_color; then
+                if [[ "$stage_color" == "reset" ]]; then
+                    tty_write "\033]111\033\\"
+                else
+                    tty_write "\033]11;%s\033\\" "$stage_color"
+                fi
+            fi
+            if [[ "$ENABLE_TITLE_PREFIX" == "true" ]] && type compose_title &>/dev/null; then
+                _TAVS_CONTEXT_LOADED=""
+                local title_state
+                if [[ $current_stage -eq 0 ]]; then
+                    title_state="complete"
+                else
+                    title_state="idle_${current_stage}"
+                fi
+                local title
+                title=$(compose_title "$title_state" "$SHORT_CWD")
+                tty_write "\033]0;%s\033\\" "$title"
+            fi
+            if [[ $current_stage -eq 0 ]]; then
+                tty_frame_flush "complete"
+            else
+                tty_frame_flush "idle"
+            fi
+        fi
+    done
+}
+if [[ -n "$CORE_DIR/terminal-detection.sh" ]]; then
+    _DETECT_THIS_SCRIPT="$CORE_DIR/terminal-detection.sh"
+elif [[ -n "${(%):-%x}" ]] 2>/dev/null; then
+    _DETECT_THIS_SCRIPT="${(%):-%x}"
+else
+    _DETECT_THIS_SCRIPT="$0"
+fi
+_DETECT_SCRIPT_DIR="${_DETECT_THIS_SCRIPT%/*}"
+[[ "$_DETECT_SCRIPT_DIR" == "$_DETECT_THIS_SCRIPT" ]] && _DETECT_SCRIPT_DIR="."
+[[ -z "${OSC_QUERY_TIMEOUT:-}" ]] && readonly OSC_QUERY_TIMEOUT=0.1
+get_terminal_type() {
+    _terminal_type_var
+    echo "$_TERMINAL_TYPE"
+}
+_terminal_type_var() {
+    if [[ -n "$ITERM_SESSION_ID" ]]; then
+        _TERMINAL_TYPE="iterm2"
+    elif [[ -n "$GHOSTTY_RESOURCES_DIR" ]] || [[ "$TERM_PROGRAM" == "ghostty" ]]; then
+        _TERMINAL_TYPE="ghostty"
+    elif [[ -n "$KITTY_PID" ]] || [[ -n "$KITTY_WINDOW_ID" ]]; then
+        _TERMINAL_TYPE="kitty"
+    elif [[ "$TERM_PROGRAM" == "WezTerm" ]]; then
+        _TERMINAL_TYPE="wezterm"
+    elif [[ "$TERM_PROGRAM" == "vscode" ]] || [[ -n "$VSCODE_GIT_ASKPASS_NODE" ]]; then
+        _TERMINAL_TYPE="vscode"
+    elif [[ -n "$VTE_VERSION" ]]; then
+        _TERMINAL_TYPE="gnome-terminal"
+    elif [[ "$TERM_PROGRAM" == "Apple_Terminal" ]]; then
+        _TERMINAL_TYPE="terminal.app"
+    elif [[ -n "$TERM_PROGRAM" ]]; then
+        _TERMINAL_TYPE="${TERM_PROGRAM,,}"
+    else
+        _TERMINAL_TYPE="unknown"
+    fi
+}
+supports_osc10() {
+    load_terminal_caps
+    [[ "$TAVS_CAP_OSC10" == "true" ]]
+}
+_caps_osc10() {
+    case "$1" in
+        iterm2|ghostty|kitty|wezterm|vscode|gnome-terminal|foot|alacritty)
+            return 0
+            ;;
+        terminal.app)
+            return 1
+            ;;
+        *)
+            return 0
+            ;;
+    esac
+}
+supports_osc1337() {
+    load_terminal_caps
+    [[ "$TAVS_CAP_OSC1337" == "true" ]]
+}
+_caps_osc1337() {
+    case "$1" in
+        iterm2)
+            return 0
+            ;;
+        wezterm)
+            return 0
+            ;;
+        ghostty)
+            return 1
+            ;;
+        *)
+            return 1
+            ;;
+    esac
+}
+supports_osc11_query() {
+    load_terminal_caps
+    [[ "$TAVS_CAP_OSC11" == "true" ]]
+}
+_caps_osc11_query() {
+    case "$1" in
+        iterm2|ghostty|kitty|wezterm|vscode|gnome-terminal|foot|alacritty)
+            return 0
+            ;;
+        terminal.app)
+            return 1
+            ;;
+        *)
+            return 0
+            ;;
+    esac
+}
+is_truecolor_mode() {
+    [[ "${COLORTERM:-}" == "truecolor" ]] || [[ "${COLORTERM:-}" == "24bit" ]]
+}
+should_enable_palette_theming() {
+    [[ "$ENABLE_PALETTE_THEMING" == "false" ]] && return 1
+    [[ "$ENABLE_PALETTE_THEMING" == "true" ]] && return 0
+    if [[ "$ENABLE_PALETTE_THEMING" == "auto" ]]; then
+        ! is_truecolor_mode && return 0
+    fi
+    return 1
+}
+get_color_mode() {
+    if is_truecolor_mode; then
+        echo "truecolor"
+    elif [[ -n "$COLORTERM" ]]; then
+        echo "$COLORTERM"
+    elif [[ "$TERM" == *"256color"* ]]; then
+        echo "256color"
+    else
+        echo "basic"
+    fi
+}
+is_ssh_session() {
+    [[ -n "$SSH_TTY" ]] && return 0
+    [[ -n "$SSH_CLIENT" ]] && return 0
+    [[ -n "$SSH_CONNECTION" ]] && return 0
+    if [[ -n "$TMUX" ]] || [[ "$TERM" == screen* ]]; then
+        [[ "$SSH_AUTH_SOCK" == */agent.* ]] && return 0
+    fi
+    return 1
+}
+_terminal_caps_env() {
+    _TERMINAL_CAPS_ENV="${ITERM_SESSION_ID:+iterm}|${GHOSTTY_RESOURCES_DIR:+ghostty}|${KITTY_PID:+kitty}${KITTY_WINDOW_ID:+kitty}"
+    _TERMINAL_CAPS_ENV+="|${TERM_PROGRAM:-}|${VSCODE_GIT_ASKPASS_NODE:+vscode}|${VTE_VERSION:+vte}|${TERM:-}|${COLORTERM:-}"
+    _TERMINAL_CAPS_ENV+="|${SSH_TTY:+ssh}${SSH_CLIENT:+ssh}${SSH_CONNECTION:+ssh}|${TMUX:+tmux}"
+}
+_terminal_caps_file() {
+    _TERMINAL_CAPS_FILE=""
+    [[ -n "${TTY_SAFE:-}" ]] && _TERMINAL_CAPS_FILE="${TAVS_TMP_DIR:-/tmp/tavs}/caps.${TTY_SAFE}"
+}
+_apply_terminal_caps() {
+    TAVS_CAP_TERMINAL="$1"
+    TAVS_CAP_TRUECOLOR="false"; is_truecolor_mode && TAVS_CAP_TRUECOLOR="true"
+    TAVS_CAP_SSH="false";       is_ssh_session && TAVS_CAP_SSH="true"
+    TAVS_CAP_OSC10="false";     _caps_osc10 "$1" && TAVS_CAP_OSC10="true"
+    TAVS_CAP_OSC11="false";     _caps_osc11_query "$1" && TAVS_CAP_OSC11="true"
+    TAVS_CAP_OSC1337="false";   _caps_osc1337 "$1" && TAVS_CAP_OSC1337="true"
+    TAVS_CAP_BG_IMAGES="false"
+    case "$1" in
+        iterm2) TAVS_CAP_BG_IMAGES="true" ;;
+        kitty)  command -v kitten &>/dev/null && TAVS_CAP_BG_IMAGES="true" ;;
+    esac
+}
+compute_terminal_caps() {
+    _terminal_type_var
+    _apply_terminal_caps "$_TERMINAL_TYPE"
+    TAVS_CAP_XTVERSION=""
+    TAVS_CAP_DA1=""
+    _TERMINAL_CAPS_LOADED="true"
+}
+_terminal_raw_mode() {
+    local tty_device="$1" timeout="${2:-$OSC_QUERY_TIMEOUT}" mode="min 1 time 0"
+    _TERMINAL_READ_TIMEOUT="$timeout"
+    _TERMINAL_PENDING=""
+    if [[ -n "${BASH_VERSION:-}" && "${BASH_VERSION%%.*}" -lt 4 ]]; then
+        local whole="${timeout%%.*}" frac="0"
+        [[ "$timeout" == *.* ]] && frac="${timeout#*.}0"
+        local tenths=$(( 10#${whole:-0} * 10 + 10#${frac:0:1} ))
+        (( tenths < 1 )) && tenths=1
+        (( tenths > 255 )) && tenths=255
+        mode="min 0 time $tenths"
+        _TERMINAL_READ_TIMEOUT=""
+    fi
+    stty raw -echo $mode < "$tty_device" 2>/dev/null
+}
+_terminal_read_reply() {
+    local tty_device="$1" delim="$2" st="" chunk
+    [[ -n "${3:-}" ]] && st=$'\033\\'
+    _TERMINAL_REPLY=""
+    if [[ -n "$_TERMINAL_READ_TIMEOUT" ]]; then
+        if [[ -z "$st" ]]; then
+            IFS= read -r -s -t "$_TERMINAL_READ_TIMEOUT" -d "$delim" _TERMINAL_REPLY < "$tty_device"
+            return
+        fi
+        local n=0
+        while (( n < 256 )); do
+            IFS= read -r -s -n 1 -t "$_TERMINAL_READ_TIMEOUT" -d '' chunk < "$tty_device" || return 1
+            [[ "$chunk" == "$delim" ]] && return 0
+            _TERMINAL_REPLY+="$chunk"
+            if [[ "$_TERMINAL_REPLY" == *"$st" ]]; then
+                _TERMINAL_REPLY="${_TERMINAL_REPLY%"$st"}"
+                return 0
+            fi
+            n=$((n + 1))
+        done
+        return 1
+    fi
+    while [[ "$_TERMINAL_PENDING" != *"$delim"* && ( -z "$st" || "$_TERMINAL_PENDING" != *"$st"* ) ]]; do
+        chunk=$(dd bs=64 count=1 < "$tty_device" 2>/dev/null)
+        if [[ -z "$chunk" ]]; then
+            _TERMINAL_REPLY="$_TERMINAL_PENDING"
+            _TERMINAL_PENDING=""
+            return 1
+        fi
+        _TERMINAL_PENDING+="$chunk"
+    done
+    local end="$delim" head="${_TERMINAL_PENDING%%"$delim"*}"
+    if [[ -n "$st" ]]; then
+        local st_head="${_TERMINAL_PENDING%%"$st"*}"
+        (( ${#st_head} < ${#head} )) && end="$st"
+    fi
+    _TERMINAL_REPLY="${_TERMINAL_PENDING%%"$end"*}"
+    _TERMINAL_PENDING="${_TERMINAL_PENDING#*"$end"}"
+}
+probe_terminal_caps() {
+    local tty_device="${1:-${TTY_DEVICE:-}}"
+    local timeout="${2:-$OSC_QUERY_TIMEOUT}"
+    [[ -n "$tty_device" && -w "$tty_device" ]] || return 1
+    [[ "$TAVS_CAP_SSH" == "true" ]] && return 1
+    local old_stty
+    old_stty=$(stty -g < "$tty_device" 2>/dev/null) || return 1
+    _terminal_raw_mode "$tty_device" "$timeout" || {
+        stty "$old_stty" < "$tty_device" 2>/dev/null
+        return 1
+    }
+    local TTY_DEVICE="$tty_device"
+    if ! tty_write_now '\033[>0q\033[c'; then
+        stty "$old_stty" < "$tty_device" 2>/dev/null
+        return 1
+    fi
+    local response="" tries=0
+    local da1_end_re=$'\033''\[\?[0-9;]*c$'
+    while (( tries < 4 )); do
+        _terminal_read_reply "$tty_device" c || { response+="$_TERMINAL_REPLY"; break; }
+        response+="${_TERMINAL_REPLY}c"
+        [[ "$response" =~ $da1_end_re ]] && break
+        tries=$((tries + 1))
+    done
+    stty "$old_stty" < "$tty_device" 2>/dev/null
+    _parse_terminal_probe "$response"
+}
+_parse_terminal_probe() {
+    local response="$1"
+    local da1_re=$'\033''\[(\?[0-9;]*)c'
+    local xtv_re=$'\033''P>\|([^'$'\033'']*)'
+    [[ "$response" =~ $da1_re ]] || return 1
+    TAVS_CAP_DA1="${BASH_REMATCH[1]}"
+    if [[ "$response" =~ $xtv_re ]]; then
+        TAVS_CAP_XTVERSION="${BASH_REMATCH[1]}"
+    fi
+    if [[ "$TAVS_CAP_TERMINAL" == "unknown" && -n "$TAVS_CAP_XTVERSION" ]]; then
+        local refined=""
+        case "$TAVS_CAP_XTVERSION" in
+            iTerm2*)         refined="iterm2" ;;
+            kitty*)          refined="kitty" ;;
+            WezTerm*)        refined="wezterm" ;;
+            ghostty*)        refined="ghostty" ;;
+            foot*)           refined="foot" ;;
+            XTerm*)          refined="xterm" ;;
+            *[Aa]lacritty*)  refined="alacritty" ;;
+        esac
+        [[ -n "$refined" ]] && _apply_terminal_caps "$refined"
+    fi
+    return 0
+}
+save_terminal_caps() {
+    _terminal_caps_file
+    [[ -z "$_TERMINAL_CAPS_FILE" ]] && return 1
+    _terminal_caps_env
+    local cache_dir="${_TERMINAL_CAPS_FILE%/*}"
+    if [[ ! -d "$cache_dir" ]]; then
+        mkdir -p "$cache_dir" 2>/dev/null
+        chmod 700 "$cache_dir" 2>/dev/null
+    fi
+    local tmp_file="${_TERMINAL_CAPS_FILE}.tmp.$$"
+    {
+        printf 'env=%s\n' "$_TERMINAL_CAPS_ENV"
+        printf 'terminal=%s\n' "$TAVS_CAP_TERMINAL"
+        printf 'truecolor=%s\n' "$TAVS_CAP_TRUECOLOR"
+        printf 'ssh=%s\n' "$TAVS_CAP_SSH"
+        printf 'osc10=%s\n' "$TAVS_CAP_OSC10"
+        printf 'osc11=%s\n' "$TAVS_CAP_OSC11"
+        printf 'osc1337=%s\n' "$TAVS_CAP_OSC1337"
+        printf 'bg_images=%s\n' "$TAVS_CAP_BG_IMAGES"
+        printf 'xtversion=%s\n' "$TAVS_CAP_XTVERSION"
+        printf 'da1=%s\n' "$TAVS_CAP_DA1"
+    } > "$tmp_file" 2>/dev/null && mv "$tmp_file" "$_TERMINAL_CAPS_FILE" 2>/dev/null
+}
+load_terminal_caps() {
+    [[ "${_TERMINAL_CAPS_LOADED:-}" == "true" ]] && return 0
+    _terminal_caps_file
+    if [[ -n "$_TERMINAL_CAPS_FILE" && -f "$_TERMINAL_CAPS_FILE" ]]; then
+        _terminal_caps_env
+        local key value env_ok="false"
+        while IFS='=' read -r key value; do
+            case "$key" in
+                env)       [[ "$value" == "$_TERMINAL_CAPS_ENV" ]] && env_ok="true" ;;
+                terminal)  TAVS_CAP_TERMINAL="$value" ;;
+                truecolor) TAVS_CAP_TRUECOLOR="$value" ;;
+                ssh)       TAVS_CAP_SSH="$value" ;;
+                osc10)     TAVS_CAP_OSC10="$value" ;;
+                osc11)     TAVS_CAP_OSC11="$value" ;;
+                osc1337)   TAVS_CAP_OSC1337="$value" ;;
+                bg_images) TAVS_CAP_BG_IMAGES="$value" ;;
+                xtversion) TAVS_CAP_XTVERSION="$value" ;;
+                da1)       TAVS_CAP_DA1="$value" ;;
+            esac
+        done < "$_TERMINAL_CAPS_FILE"
+        if [[ "$env_ok" == "true" && -n "$TAVS_CAP_TERMINAL" ]]; then
+            _TERMINAL_CAPS_LOADED="true"
+            return 0
+        fi
+    fi
+    compute_terminal_caps
+    [[ -n "$_TERMINAL_CAPS_FILE" ]] && save_terminal_caps
+    return 0
+}
+init_terminal_caps() {
+    compute_terminal_caps
+    if [[ "${ENABLE_CAPABILITY_PROBE:-false}" == "true" ]]; then
+        probe_terminal_caps "${1:-${TTY_DEVICE:-}}" "${CAPABILITY_PROBE_TIMEOUT:-$OSC_QUERY_TIMEOUT}"
+    fi
+    save_terminal_caps
+    return 0
+}
+detect_system_dark_mode() {
+    case "$(uname -s)" in
+        Darwin)
+            if defaults read -g AppleInterfaceStyle &>/dev/null; then
+                return 0
+            else
+                return 1
+            fi
+            ;;
+        Linux)
+            if command -v gsettings &>/dev/null; then
+                local color_scheme
+                color_scheme=$(gsettings get org.gnome.desktop.interface color-scheme 2>/dev/null)
+                if [[ "$color_scheme" == *"dark"* ]]; then
+                    return 0
+                elif [[ "$color_scheme" == *"light"* ]] || [[ "$color_scheme" == *"default"* ]]; then
+                    return 1
+                fi
+            fi
+            if command -v gsettings &>/dev/null; then
+                local prefer_dark
+                prefer_dark=$(gsettings get org.gnome.desktop.interface gtk-theme 2>/dev/null)
+                if [[ "$prefer_dark" == *"dark"* ]] || [[ "$prefer_dark" == *"Dark"* ]]; then
+                    return 0
+                fi
+            fi
+            if [[ "$GTK_THEME" == *"dark"* ]] || [[ "$GTK_THEME" == *"Dark"* ]]; then
+                return 0
+            fi
+            if [[ "$XDG_CURRENT_DESKTOP" == *"KDE"* ]]; then
+                local kde_scheme
+                kde_scheme=$(kreadconfig5 --group "General" --key "ColorScheme" 2>/dev/null)
+                if [[ "$kde_scheme" == *"Dark"* ]] || [[ "$kde_scheme" == *"dark"* ]]; then
+                    return 0
+                elif [[ -n "$kde_scheme" ]]; then
+                    return 1
+                fi
+            fi
+            return 2
+            ;;
+        MINGW*|CYGWIN*|MSYS*)
+            if command -v reg &>/dev/null; then
+                local apps_theme
+                apps_theme=$(reg query "HKCU\Software\Microsoft\Windows\CurrentVersion\Themes\Personalize" /v AppsUseLightTheme 2>/dev/null | grep -o "0x[0-9]*")
+                if [[ "$apps_theme" == "0x0" ]]; then
+                    return 0
+                elif [[ "$apps_theme" == "0x1" ]]; then
+                    return 1
+                fi
+            fi
+            return 2
+            ;;
+        *)
+            return 2
+            ;;
+    esac
+}
+get_system_mode() {
+    detect_system_dark_mode
+    case $? in
+        0) echo "dark" ;;
+        1) echo "light" ;;
+        *) echo "unknown" ;;
+    esac
+}
+query_terminal_bg() {
+    local tty_device="${1:-}"
+    local timeout="${2:-$OSC_QUERY_TIMEOUT}"
+    if [[ -z "$tty_device" ]]; then
+        tty_device=$(ps -o tty= -p $PPID 2>/dev/null | tr -d ' ')
+        if [[ -z "$tty_device" ]] || [[ "$tty_device" == "??" ]] || [[ "$tty_device" == "-" ]]; then
+            tty_device="/dev/tty"
+        else
+            [[ "$tty_device" != /dev/* ]] && tty_device="/dev/$tty_device"
+        fi
+    fi
+    if ! [[ -w "$tty_device" ]]; then
+        return 1
+    fi
+    if ! supports_osc11_query; then
+        return 1
+    fi
+    if is_ssh_session; then
+        return 1
+    fi
+    local old_stty
+    old_stty=$(stty -g < "$tty_device" 2>/dev/null) || return 1
+    _terminal_raw_mode "$tty_device" "$timeout" || {
+        stty "$old_stty" < "$tty_device" 2>/dev/null
+        return 1
+    }
+    local TTY_DEVICE="$tty_device" response=""
+    if tty_write_now '\033]11;?\007'; then
+        _terminal_read_reply "$tty_device" $'\a' st
+        response="$_TERMINAL_REPLY"
+    fi
+    stty "$old_stty" < "$tty_device" 2>/dev/null
+    _parse_osc11_response "$response"
+}
+_parse_osc11_response() {
+    local response="$1"
+    if [[ "$response" =~ rgb:([0-9a-fA-F]+)/([0-9a-fA-F]+)/([0-9a-fA-F]+) ]]; then
+        local r_hex="${BASH_REMATCH[1]}"
+        local g_hex="${BASH_REMATCH[2]}"
+        local b_hex="${BASH_REMATCH[3]}"
+        [[ ${#r_hex} -eq 1 ]] && r_hex="$r_hex$r_hex"
+        [[ ${#g_hex} -eq 1 ]] && g_hex="$g_hex$g_hex"
+        [[ ${#b_hex} -eq 1 ]] && b_hex="$b_hex$b_hex"
+        local r="${r_hex:0:2}"
+        local g="${g_hex:0:2}"
+        local b="${b_hex:0:2}"
+        printf '#%02X%02X%02X\n' "$((16#$r))" "$((16#$g))" "$((16#$b))"
+        return 0
+    fi
+    return 1
+}
+query_terminal_bg_with_timeout() {
+    local tty_device="${1:-}"
+    local timeout="${2:-$OSC_QUERY_TIMEOUT}"
+    query_terminal_bg "$tty_device" "$timeout"
+}
+_terminal_bg_cache_file() {
+    local tty_device="${1:-${TTY_DEVICE:-/dev/tty}}"
+    _TERMBG_CACHE_FILE="${TAVS_TMP_DIR:-/tmp/tavs}/termbg.${tty_device//\//_}"
+}
+get_terminal_bg_cached() {
+    local tty_device="${1:-${TTY_DEVICE:-}}"
+    local timeout="${2:-$OSC_QUERY_TIMEOUT}"
+    [[ -z "$tty_device" ]] && tty_device="/dev/tty"
+    local profile="${TERM_PROGRAM:-}|${ITERM_PROFILE:-}|${TERM:-}|${COLORFGBG:-}"
+    local cache_file key value
+    local cached_profile="" cached_bg="" have_bg=false
+    _terminal_bg_cache_file "$tty_device"
+    cache_file="$_TERMBG_CACHE_FILE"
+    if [[ -f "$cache_file" ]]; then
+        while IFS='=' read -r key value; do
+            case "$key" in
+                profile) cached_profile="$value" ;;
+                bg)      cached_bg="$value"; have_bg=true ;;
+            esac
+        done < "$cache_file"
+        if [[ "$have_bg" == "true" && "$cached_profile" == "$profile" ]]; then
+            [[ -z "$cached_bg" ]] && return 1
+            printf '%s\n' "$cached_bg"
+            return 0
+        fi
+    fi
+    local bg
+    bg=$(query_terminal_bg "$tty_device" "$timeout")
+    [[ "$bg" =~ ^#[0-9A-F]{6}$ ]] || bg=""
+    local cache_dir="${cache_file%/*}"
+    if [[ ! -d "$cache_dir" ]]; then
+        mkdir -p "$cache_dir" 2>/dev/null
+        chmod 700 "$cache_dir" 2>/dev/null
+    fi
+    printf 'profile=%s\nbg=%s\n' "$profile" "$bg" > "${cache_file}.tmp.$$" 2>/dev/null && \
+        mv "${cache_file}.tmp.$$" "$cache_file" 2>/dev/null
+    [[ -z "$bg" ]] && return 1
+    printf '%s\n' "$bg"
+}
+clear_terminal_bg_cache() {
+    _terminal_bg_cache_file "$@"
+    [[ -f "$_TERMBG_CACHE_FILE" ]] && rm -f "$_TERMBG_CACHE_FILE" 2>/dev/null
+    return 0
+}
+get_terminal_info() {
+    echo "Terminal Type: $(get_terminal_type)"
+    echo "SSH Session: $(is_ssh_session && echo "yes" || echo "no")"
+    echo "System Mode: $(get_system_mode)"
+    echo "Color Mode: $(get_color_mode)"
+    echo "TrueColor Active: $(is_truecolor_mode && echo "yes" || echo "no")"
+    echo "Palette Theming: $(should_enable_palette_theming && echo "enabled" || echo "disabled")"
+    echo "OSC 10 Support (foreground): $(supports_osc10 && echo "yes" || echo "no")"
+    echo "OSC 11 Support (background): $(supports_osc11_query && echo "yes" || echo "no")"
+    echo "OSC 1337 Support (iTerm2 ext): $(supports_osc1337 && echo "yes" || echo "no")"
+    echo "TERM: ${TERM:-unset}"
+    echo "TERM_PROGRAM: ${TERM_PROGRAM:-unset}"
+    echo "COLORTERM: ${COLORTERM:-unset}"
+    echo "ENABLE_PALETTE_THEMING: ${ENABLE_PALETTE_THEMING:-unset}"
+}
+_test_detect() {
+    echo "=== Terminal Detection Tests ==="
+    echo
+    echo "Terminal Info:"
+    get_terminal_info
+    echo
+    echo "Testing dark mode detection..."
+    local mode
+    mode=$(get_system_mode)
+    echo "  System mode: $mode"
+    echo
+    echo "Testing OSC 11 query (may not work in all terminals)..."
+    if supports_osc11_query; then
+        echo "  OSC 11 supported by this terminal"
+        local bg
+        bg=$(query_terminal_bg_with_timeout "" 0.5)
+        if [[ -n "$bg" ]]; then
+            echo "  Background color: $bg"
+        else
+            echo "  Could not query background (terminal may not respond)"
+        fi
+    else
+        echo "  OSC 11 NOT supported by this terminal"
+    fi
+    echo
+    echo "=== Tests Complete ==="
+}
+if [[ "${1:-}" == "test" ]]; then
+    _test_detect
+    exit 0
+fi
+_feature_backoff_file() {
+    _FEATURE_BACKOFF_FILE=""
+    [[ -n "${TTY_SAFE:-}" ]] && _FEATURE_BACKOFF_FILE="${TAVS_TMP_DIR:-/tmp/tavs}/backoff.${TTY_SAFE}"
+}
+_feature_backoff_get() {
+    local feature="$1" key value
+    _FEATURE_FAILURES=0
+    _FEATURE_UNTIL=0
+    [[ -n "$_FEATURE_BACKOFF_FILE" && -f "$_FEATURE_BACKOFF_FILE" ]] || return 1
+    while IFS='=' read -r key value; do
+        if [[ "$key" == "$feature" ]]; then
+            _FEATURE_FAILURES="${value%% *}"
+            _FEATURE_UNTIL="${value#* }"
+            [[ "$_FEATURE_FAILURES" =~ ^[0-9]+$ ]] || _FEATURE_FAILURES=0
+            [[ "$_FEATURE_UNTIL" =~ ^[0-9]+$ ]] || _FEATURE_UNTIL=0
+            return 0
+        fi
+    done < "$_FEATURE_BACKOFF_FILE"
+    return 1
+}
+_feature_backoff_put() {
+    local feature="$1" entry="${2:-}" key value
+    local file="$_FEATURE_BACKOFF_FILE"
+    local tmp_file="${file}.tmp.$$"
+    local dir="${file%/*}"
+    if [[ ! -d "$dir" ]]; then
+        mkdir -p "$dir" 2>/dev/null
+        chmod 700 "$dir" 2>/dev/null
+    fi
+    {
+        if [[ -f "$file" ]]; then
+            while IFS='=' read -r key value; do
+                [[ -n "$key" && "$key" != "$feature" ]] && printf '%s=%s\n' "$key" "$value"
+            done < "$file"
+        fi
+        if [[ -n "$entry" ]]; then
+            printf '%s=%s\n' "$feature" "$entry"
+        fi
+    } > "$tmp_file" 2>/dev/null || return 1
+    if [[ -s "$tmp_file" ]]; then
+        mv "$tmp_file" "$file" 2>/dev/null
+    else
+        rm -f "$tmp_file" "$file" 2>/dev/null
+    fi
+}
+feature_backoff_active() {
+    _feature_backoff_file
+    _feature_backoff_get "$1" || return 1
+    [[ "$_FEATURE_UNTIL" -gt 0 ]] || return 1
+    util_now
+    [[ "$_UTIL_NOW" -lt "$_FEATURE_UNTIL" ]]
+}
+record_feature_failure() {
+    local feature="$1"
+    local threshold="${FEATURE_BACKOFF_THRESHOLD:-3}"
+    local seconds="${FEATURE_BACKOFF_SECONDS:-600}"
+    [[ "$threshold" =~ ^[0-9]+$ ]] || threshold=3
+    [[ "$seconds" =~ ^[0-9]+$ ]] || seconds=600
+    _feature_backoff_file
+    [[ -z "$_FEATURE_BACKOFF_FILE" ]] && return 0
+    _feature_backoff_get "$feature"
+    local failures=$((_FEATURE_FAILURES + 1)) until=0
+    if [[ "$threshold" -gt 0 && "$failures" -ge "$threshold" ]]; then
+        util_now
+        until=$((_UTIL_NOW + seconds))
+    fi
+    _feature_backoff_put "$feature" "$failures $until"
+}
+record_feature_success() {
+    _feature_backoff_file
+    _feature_backoff_get "$1" || return 0
+    _feature_backoff_put "$1"
+}
+list_feature_backoff() {
+    local dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    local file tty_safe key value failures until left
+    util_now
+    for file in "$dir"/backoff.*; do
+        [[ -f "$file" ]] || continue
+        tty_safe="${file##*/backoff.}"
+        [[ "$tty_safe" == *.tmp.* ]] && continue
+        while IFS='=' read -r key value; do
+            [[ -z "$key" ]] && continue
+            failures="${value%% *}"
+            until="${value#* }"
+            [[ "$until" =~ ^[0-9]+$ ]] || until=0
+            left=$((until - _UTIL_NOW))
+            [[ $left -lt 0 ]] && left=0
+            printf '%s %s %s %s\n' "$tty_safe" "$key" "$failures" "$left"
+        done < "$file"
+    done
+}
+clear_feature_backoff() {
+    if [[ "${1:-}" == "all" ]]; then
+        rm -f "${TAVS_TMP_DIR:-/tmp/tavs}"/backoff.* 2>/dev/null
+        return 0
+    fi
+    _feature_backoff_file
+    [[ -n "$_FEATURE_BACKOFF_FILE" ]] && rm -f "$_FEATURE_BACKOFF_FILE" 2>/dev/null
+    return 0
+}
+supports_background_images() {
+    [[ "$ENABLE_STYLISH_BACKGROUNDS" != "true" ]] && return 1
+    load_terminal_caps
+    if [[ "$STYLISH_DISABLE_SSH" == "true" ]] && [[ "$TAVS_CAP_SSH" == "true" ]]; then
+        return 1
+    fi
+    [[ "$TAVS_CAP_BG_IMAGES" == "true" ]] || return 1
+    if [[ "$TAVS_CAP_TERMINAL" == "kitty" ]] && type feature_backoff_active &>/dev/null && \
+       feature_backoff_active kitty_remote; then
+        return 1
+    fi
+    return 0
+}
+_set_bg_image_iterm2() {
+    local image_path="$1"
+    local TTY_DEVICE="${TTY_DEVICE:-/dev/tty}"
+    if [[ ! -f "$image_path" ]]; then
+        return 1
+    fi
+    local encoded_path
+    encoded_path=$(printf "%s" "$image_path" | base64 | tr -d '\n')
+    tty_write '\033]1337;SetBackgroundImageFile=%s\007' "$encoded_path"
+    return 0
+}
+_clear_bg_image_iterm2() {
+    local TTY_DEVICE="${TTY_DEVICE:-/dev/tty}"
+    tty_write '\033]1337;SetBackgroundImageFile=\007'
+    return 0
+}
+_kitty_bg_file() {
+    local tty_safe="${TTY_SAFE:-${TTY_DEVICE//\//_}}"
+    _KITTY_BG_FILE="${TAVS_TMP_DIR:-/tmp/tavs}/kitty-bg.${tty_safe:-_dev_tty}"
+}
+_kitty_set_background() {
+    local image="$1"
+    local args=(@)
+    local socket="${KITTY_REMOTE_SOCKET:-${KITTY_LISTEN_ON:-}}"
+    [[ -n "$socket" ]] && args+=(--to "$socket")
+    args+=(set-background-image)
+    if [[ "$image" != "none" ]]; then
+        local tint="${KITTY_IMAGE_TINT:-}"
+        args+=("--layout=${KITTY_IMAGE_LAYOUT:-scaled}")
+        if [[ -n "$tint" ]] && [[ "$tint" != "0" ]]; then
+            args+=("--tint=$tint")
+        fi
+    fi
+    args+=("$image")
+    kitten "${args[@]}" </dev/null >/dev/null 2>&1
+}
+_kitty_bg_apply_loop() {
+    local base="$1"
+    local want current rc
+    while :; do
+        want="" current=""
+        [[ -f "${base}.want" ]] && read -r want < "${base}.want"
+        [[ -f "${base}.current" ]] && read -r current < "${base}.current"
+        if [[ -z "$want" || "$want" == "$current" ]]; then
+            rm -f "${base}.lock/pid" 2>/dev/null
+            rmdir "${base}.lock" 2>/dev/null
+            want=""
+            [[ -f "${base}.want" ]] && read -r want < "${base}.want"
+            [[ -n "$want" && "$want" != "$current" ]] || return 0
+            mkdir "${base}.lock" 2>/dev/null || return 0
+            echo "$_KITTY_BG_APPLIER_PID" > "${base}.lock/pid" 2>/dev/null
+            continue
+        fi
+        _kitty_set_background "$want"
+        rc=$?
+        _record_kitty_remote_result "$rc"
+        if [[ $rc -ne 0 ]]; then
+            rm -f "${base}.want" "${base}.lock/pid" 2>/dev/null
+            rmdir "${base}.lock" 2>/dev/null
+            return 1
+        fi
+        printf '%s\n' "$want" > "${base}.current.tmp.$$" 2>/dev/null && \
+            mv "${base}.current.tmp.$$" "${base}.current" 2>/dev/null
+    done
+}
+_kitty_bg_request() {
+    local image="$1"
+    local current="" lock_pid=""
+    if ! command -v kitten &>/dev/null; then
+        return 1
+    fi
+    _kitty_bg_file
+    local base="$_KITTY_BG_FILE"
+    local dir="${base%/*}"
+    if [[ ! -d "$dir" ]]; then
+        mkdir -p "$dir" 2>/dev/null
+        chmod 700 "$dir" 2>/dev/null
+    fi
+    if [[ ! -d "${base}.lock" && -f "${base}.current" ]]; then
+        read -r current < "${base}.current"
+        [[ "$current" == "$image" ]] && return 0
+    fi
+    printf '%s\n' "$image" > "${base}.want.tmp.$$" 2>/dev/null && \
+        mv "${base}.want.tmp.$$" "${base}.want" 2>/dev/null || return 1
+    if ! mkdir "${base}.lock" 2>/dev/null; then
+        [[ -f "${base}.lock/pid" ]] && read -r lock_pid < "${base}.lock/pid" 2>/dev/null
+        if [[ -n "$lock_pid" ]] && kill -0 "$lock_pid" 2>/dev/null; then
+            return 0
+        fi
+        rm -rf "${base}.lock" 2>/dev/null
+        mkdir "${base}.lock" 2>/dev/null || return 0
+    fi
+    (
+        _KITTY_BG_APPLIER_PID="${BASHPID:-$(sh -c 'echo $PPID')}"
+        echo "$_KITTY_BG_APPLIER_PID" > "${base}.lock/pid" 2>/dev/null
+        _kitty_bg_apply_loop "$base"
+    ) </dev/null >/dev/null 2>&1 &
+    disown 2>/dev/null || true
+    return 0
+}
+_set_bg_image_kitty() {
+    local image_path="$1"
+    if [[ ! -f "$image_path" ]]; then
+        return 1
+    fi
+    _kitty_bg_request "$image_path"
+}
+_clear_bg_image_kitty() {
+    _kitty_bg_request "none"
+}
+_record_kitty_remote_result() {
+    type record_feature_failure &>/dev/null || return 0
+    if [[ "$1" -eq 0 ]]; then
+        record_feature_success kitty_remote
+    else
+        record_feature_failure kitty_remote
+    fi
+}
+_BACKGROUNDS_AGENTS_DIR="$CORE_DIR/backgrounds.sh"
+_BACKGROUNDS_AGENTS_DIR="${_BACKGROUNDS_AGENTS_DIR%/*}/../agents"
+_BACKGROUND_INDEX_STATES=(processing permission complete idle compacting subagent tool_error)
+_resolve_background_image() {
+    local mode_dir="$1" filename="$2"
+    local agent="${TAVS_AGENT:-claude}"
+    local image_path=""
+    local user_agent_dir="$HOME/.tavs/agents/$agent/backgrounds"
+    local src_agent_dir="${3-}"
+    if [[ $# -lt 3 ]]; then
+        src_agent_dir="$( cd "$_BACKGROUNDS_AGENTS_DIR/$agent/data/backgrounds" 2>/dev/null && pwd )" || true
+    fi
+    local global_dir="${STYLISH_BACKGROUNDS_DIR:-$HOME/.tavs/backgrounds}"
+    if [[ -f "${user_agent_dir}/${mode_dir}/${filename}" ]]; then
+        image_path="${user_agent_dir}/${mode_dir}/${filename}"
+    elif [[ -f "${user_agent_dir}/${filename}" ]]; then
+        image_path="${user_agent_dir}/${filename}"
+    elif [[ -n "$src_agent_dir" ]] && [[ -f "${src_agent_dir}/${mode_dir}/${filename}" ]]; then
+        image_path="${src_agent_dir}/${mode_dir}/${filename}"
+    elif [[ -n "$src_agent_dir" ]] && [[ -f "${src_agent_dir}/${filename}" ]]; then
+        image_path="${src_agent_dir}/${filename}"
+    elif [[ -f "${global_dir}/${mode_dir}/${filename}" ]]; then
+        image_path="${global_dir}/${mode_dir}/${filename}"
+    elif [[ -f "${global_dir}/${filename}" ]]; then
+        image_path="${global_dir}/${filename}"
+    elif [[ -n "$STYLISH_SINGLE_IMAGE" ]] && [[ -f "$STYLISH_SINGLE_IMAGE" ]]; then
+        image_path="$STYLISH_SINGLE_IMAGE"
+    elif [[ -f "${global_dir}/${mode_dir}/default.png" ]]; then
+        image_path="${global_dir}/${mode_dir}/default.png"
+    elif [[ -f "${global_dir}/default.png" ]]; then
+        image_path="${global_dir}/default.png"
+    fi
+    _BG_IMAGE_PATH="$image_path"
+}
+_background_index_file() {
+    _BG_INDEX_FILE=""
+    type _snapshot_dir &>/dev/null || return 1
+    _snapshot_dir
+    _BG_INDEX_FILE="$_SNAPSHOT_DIR/images/${TAVS_AGENT:-claude}.idx"
+}
+_background_index_is_fresh() {
+    local index="$1" mode_dir="$2"
+    local agent="${TAVS_AGENT:-claude}"
+    local global_dir="${STYLISH_BACKGROUNDS_DIR:-$HOME/.tavs/backgrounds}"
+    local dir
+    for dir in "$HOME/.tavs/agents/$agent/backgrounds" \
+               "$_BACKGROUNDS_AGENTS_DIR/$agent/data/backgrounds" \
+               "$global_dir"; do
+        [[ -d "$dir" && "$dir" -nt "$index" ]] && return 1
+        [[ -d "$dir/$mode_dir" && "$dir/$mode_dir" -nt "$index" ]] && return 1
+    done
+    return 0
+}
+_build_background_index() {
+    local index="$1"
+    local agent="${TAVS_AGENT:-claude}"
+    local src_agent_dir mode_dir name
+    src_agent_dir="$( cd "$_BACKGROUNDS_AGENTS_DIR/$agent/data/backgrounds" 2>/dev/null && pwd )" || true
+    if [[ ! -d "${index%/*}" ]]; then
+        mkdir -p "${index%/*}" 2>/dev/null || return 1
+        chmod 700 "${index%/*/*}" 2>/dev/null
+    fi
+    {
+        printf 'config=%s|%s\n' "${STYLISH_BACKGROUNDS_DIR:-}" "${STYLISH_SINGLE_IMAGE:-}"
+        for mode_dir in dark light; do
+            for name in "${_BACKGROUND_INDEX_STATES[@]}"; do
+                _resolve_background_image "$mode_dir" "${name}.png" "$src_agent_dir"
+                printf '%s/%s=%s\n' "$mode_dir" "$name" "$_BG_IMAGE_PATH"
+            done
+        done
+    } > "${index}.tmp.$$" 2>/dev/null && mv "${index}.tmp.$$" "$index" 2>/dev/null
+}
+lookup_background_image() {
+    local mode_dir="$1" name="$2"
+    local key value config="" found=false attempt
+    _BG_IMAGE_PATH=""
+    _background_index_file || return 1
+    for attempt in 1 2; do
+        if [[ -f "$_BG_INDEX_FILE" ]] && _background_index_is_fresh "$_BG_INDEX_FILE" "$mode_dir"; then
+            config="" found=false
+            while IFS='=' read -r key value; do
+                case "$key" in
+                    config) config="$value" ;;
+                    "$mode_dir/$name") _BG_IMAGE_PATH="$value"; found=true; break ;;
+                esac
+            done < "$_BG_INDEX_FILE"
+            if [[ "$config" == "${STYLISH_BACKGROUNDS_DIR:-}|${STYLISH_SINGLE_IMAGE:-}" ]]; then
+                [[ "$found" == "true" ]] || return 1
+                [[ -z "$_BG_IMAGE_PATH" || -f "$_BG_IMAGE_PATH" ]] && return 0
+            fi
+        fi
+        [[ $attempt -eq 1 ]] && _build_background_index "$_BG_INDEX_FILE"
+    done
+    _BG_IMAGE_PATH=""
+    return 1
+}
+_prerendered_background_image() {
+    local src="$1"
+    _BG_IMAGE_PATH="$src"
+    local manifest="${TAVS_PRERENDER_DIR:-${XDG_CACHE_HOME:-$HOME/.cache}/tavs/backgrounds}/manifest"
+    [[ -n "$src" && -f "$manifest" ]] || return 1
+    local key value target="" variants=""
+    while IFS='=' read -r key value; do
+        case "$key" in
+            target) target="$value" ;;
+            "$src") variants="$value"; break ;;
+        esac
+    done < "$manifest"
+    [[ -n "$variants" ]] || return 1
+    target="${STYLISH_PRERENDER_TARGET:-$target}"
+    local tw=0 th=0
+    if [[ "$target" =~ ^([0-9]+)x([0-9]+)$ ]]; then
+        tw="${BASH_REMATCH[1]}" th="${BASH_REMATCH[2]}"
+    fi
+    local entry size path w h
+    local best="" best_area=0 largest="" largest_area=0
+    while IFS= read -r -d '|' entry; do
+        size="${entry%%:*}" path="${entry#*:}"
+        [[ "$size" =~ ^([0-9]+)x([0-9]+)$ ]] || continue
+        w="${BASH_REMATCH[1]}" h="${BASH_REMATCH[2]}"
+        [[ -f "$path" && ! "$src" -nt "$path" ]] || continue
+        if [[ $((w * h)) -gt $largest_area ]]; then
+            largest="$path" largest_area=$((w * h))
+        fi
+        if [[ $w -ge $tw && $h -ge $th ]] && [[ -z "$best" || $((w * h)) -lt $best_area ]]; then
+            best="$path" best_area=$((w * h))
+        fi
+    done <<< "${variants}|"
+    [[ $tw -eq 0 ]] && best="$largest"
+    [[ -n "$best" ]] || best="$largest"
+    [[ -n "$best" ]] || return 1
+    _BG_IMAGE_PATH="$best"
+}
+set_state_background_image() {
+    local state="$1"
+    [[ "$ENABLE_STYLISH_BACKGROUNDS" != "true" ]] && return 0
+    if ! supports_background_images; then
+        return 0
+    fi
+    [[ "$state" != "reset" ]] && ! latency_budget_allows image && return 0
+    if [[ "$state" == "reset" ]]; then
+        clear_background_image
+        return $?
+    fi
+    local mode_dir=""
+    if [[ "$ENABLE_LIGHT_DARK_SWITCHING" == "true" ]]; then
+        if type _load_system_mode &>/dev/null; then
+            _load_system_mode
+            [[ "$_CACHED_SYSTEM_MODE" == "dark" ]] && mode_dir="dark" || mode_dir="light"
+        elif detect_system_dark_mode; then
+            mode_dir="dark"
+        else
+            mode_dir="light"
+        fi
+    elif [[ "$FORCE_MODE" == "light" ]]; then
+        mode_dir="light"
+    else
+        mode_dir="dark"
+    fi
+    local name
+    case "$state" in
+        idle_*) name="idle" ;;
+        *)      name="$state" ;;
+    esac
+    if ! lookup_background_image "$mode_dir" "$name"; then
+        _resolve_background_image "$mode_dir" "${name}.png"
+    fi
+    _prerendered_background_image "$_BG_IMAGE_PATH"
+    local image_path="$_BG_IMAGE_PATH"
+    if [[ -z "$image_path" ]]; then
+        return 0
+    fi
+    case "$TAVS_CAP_TERMINAL" in
+        iterm2)
+            _set_bg_image_iterm2 "$image_path"
+            ;;
+        kitty)
+            _set_bg_image_kitty "$image_path"
+            ;;
+    esac
+    return $?
+}
+clear_background_image() {
+    [[ "$ENABLE_STYLISH_BACKGROUNDS" != "true" ]] && return 0
+    if ! supports_background_images; then
+        return 0
+    fi
+    case "$TAVS_CAP_TERMINAL" in
+        iterm2)
+            _clear_bg_image_iterm2
+            ;;
+        kitty)
+            _clear_bg_image_kitty
+            ;;
+    esac
+    return $?
+}
+get_background_info() {
+    echo "Stylish Backgrounds: ${ENABLE_STYLISH_BACKGROUNDS:-false}"
+    echo "Backgrounds Directory: ${STYLISH_BACKGROUNDS_DIR:-<default>}"
+    echo "Single Image: ${STYLISH_SINGLE_IMAGE:-<none>}"
+    echo "Terminal Type: $(get_terminal_type)"
+    echo "Supports Images: $(supports_background_images && echo "yes" || echo "no")"
+    local dir="${STYLISH_BACKGROUNDS_DIR:-$HOME/.tavs/backgrounds}"
+    if [[ -d "$dir" ]]; then
+        echo "Available Images:"
+        find "$dir" -name "*.png" -o -name "*.jpg" 2>/dev/null | while read -r img; do
+            echo "  - $img"
+        done
+    else
+        echo "Backgrounds directory not found: $dir"
+    fi
+}
+_test_backgrounds() {
+    echo "=== Background Image Support Tests ==="
+    echo
+    get_background_info
+    echo
+    echo "Testing terminal detection..."
+    local terminal_type
+    terminal_type=$(get_terminal_type)
+    echo "  Terminal: $terminal_type"
+    echo
+    echo "Testing support detection..."
+    if supports_background_images; then
+        echo "  Supported: YES"
+        echo
+        echo "Testing image setting (will set then clear in 2s)..."
+        local test_dir="${STYLISH_BACKGROUNDS_DIR:-$HOME/.tavs/backgrounds}"
+        if [[ -f "${test_dir}/processing.png" ]] || [[ -f "${test_dir}/dark/processing.png" ]]; then
+            set_state_background_image "processing"
+            echo "  Set processing image"
+            sleep 2
+            clear_background_image
+            echo "  Cleared image"
+        else
+            echo "  No test images found in: $test_dir"
+        fi
+    else
+        echo "  Supported: NO (this is expected for most terminals)"
+    fi
+    echo
+    echo "=== Tests Complete ==="
+}
+if [[ "${1:-}" == "test" ]]; then
+    SCRIPT_DIR="$CORE_DIR"
+    source "$SCRIPT_DIR/terminal-detection.sh"
+    _test_backgrounds
+    exit 0
+fi
+if [[ -n "$CORE_DIR/title-management.sh" ]]; then
+    _TITLE_THIS_SCRIPT="$CORE_DIR/title-management.sh"
+elif [[ -n "${(%):-%x}" ]] 2>/dev/null; then
+    _TITLE_THIS_SCRIPT="${(%):-%x}"
+else
+    _TITLE_THIS_SCRIPT="$0"
+fi
+_TITLE_SCRIPT_DIR="$CORE_DIR"
+TITLE_STATE_DB="${_TAVS_TMP_DIR:-/tmp/tavs}/title"
+get_title_state_file() {
+    echo "${TITLE_STATE_DB}.${TTY_SAFE:-unknown}"
+}
+_generate_session_id() {
+    local state_file
+    state_file=$(get_title_state_file)
+    if [[ -f "$state_file" ]]; then
+        local existing_id
+        existing_id=$(_read_title_state_value "SESSION_ID")
+        if [[ -n "$existing_id" ]]; then
+            echo "$existing_id"
+            return 0
+        fi
+    fi
+    local uuid
+    if command -v uuidgen &>/dev/null; then
+        uuid=$(uuidgen)
+        util_lower "${uuid:0:8}"
+        echo "$_UTIL_LOWER"
+    elif [[ -f /proc/sys/kernel/random/uuid ]]; then
+        read -r uuid < /proc/sys/kernel/random/uuid
+        echo "${uuid:0:8}"
+    elif [[ -c /dev/urandom ]]; then
+        head -c 4 /dev/urandom | od -An -t x4 | tr -d ' \n'
+        echo
+    else
+        local seed
+        util_now
+        seed="$(( (PPID + _UTIL_NOW) % 0xFFFFFFFF ))"
+        if command -v md5sum &>/dev/null; then
+            printf '%s' "$seed" | md5sum | cut -c1-8
+        elif command -v cksum &>/dev/null; then
+            printf '%08x\n' "$(printf '%s' "$seed" | cksum | awk '{print $1}')"
+        else
+            printf '%08x\n' "$seed"
+        fi
+    fi
+}
+init_session_id() {
+    SESSION_ID=$(_generate_session_id)
+}
+_read_title_state_value() {
+    local key="$1"
+    local state_file
+    state_file=$(get_title_state_file)
+    [[ ! -f "$state_file" ]] && return 1
+    local value=""
+    while IFS='=' read -r k v; do
+        [[ "$k" =~ ^[[:space:]]*# ]] && continue
+        [[ -z "$k" ]] && continue
+        v="${v%\"}"
+        v="${v#\"}"
+        v="${v%\'}"
+        v="${v#\'}"
+        if [[ "$k" == "$key" ]]; then
+            value="$v"
+            break
+        fi
+    done < "$state_file"
+    echo "$value"
+}
+load_title_state() {
+    TITLE_USER_BASE=""
+    TITLE_LAST_SET=""
+    TITLE_LOCKED="false"
+    SESSION_ID=""
+    local state_file
+    state_file=$(get_title_state_file)
+    [[ ! -f "$state_file" ]] && return 1
+    TITLE_USER_BASE=$(_read_title_state_value "USER_BASE_TITLE")
+    TITLE_LAST_SET=$(_read_title_state_value "LAST_TAVS_TITLE")
+    TITLE_LOCKED=$(_read_title_state_value "TITLE_LOCKED")
+    SESSION_ID=$(_read_title_state_value "SESSION_ID")
+    TITLE_LOCKED="${TITLE_LOCKED:-false}"
+    return 0
+}
+_escape_for_state_file() {
+    local val="$1"
+    val="${val//$'\n'/ }"
+    val="${val//$'\r'/}"
+    val="${val//\\/\\\\}"
+    val="${val//\"/\\\"}"
+    printf '%s' "$val"
+}
+save_title_state() {
+    local user_base="${1:-$TITLE_USER_BASE}"
+    local last_set="${2:-$TITLE_LAST_SET}"
+    local locked="${3:-$TITLE_LOCKED}"
+    local session_id="${4:-$SESSION_ID}"
+    user_base=$(_escape_for_state_file "$user_base")
+    last_set=$(_escape_for_state_file "$last_set")
+    locked=$(_escape_for_state_file "$locked")
+    session_id=$(_escape_for_state_file "$session_id")
+    local state_file
+    state_file=$(get_title_state_file)
+    util_tmpfile "$state_file"
+    local tmp_file="$_UTIL_TMPFILE"
+    {
+        echo "# TAVS Title State - $(date -Iseconds 2>/dev/null || date)"
+        echo "USER_BASE_TITLE=\"$user_base\""
+        echo "LAST_TAVS_TITLE=\"$last_set\""
+        echo "TITLE_LOCKED=\"$locked\""
+        echo "SESSION_ID=\"$session_id\""
+    } > "$tmp_file" 2>/dev/null
+    mv "$tmp_file" "$state_file" 2>/dev/null || {
+        rm -f "$tmp_file" 2>/dev/null
+        return 1
+    }
+    return 0
+}
+clear_title_state() {
+    local state_file
+    state_file=$(get_title_state_file)
+    rm -f "$state_file" 2>/dev/null
+}
+is_title_locked() {
+    load_title_state || return 1
+    [[ "$TITLE_LOCKED" == "true" ]]
+}
+detect_user_title_change() {
+    load_title_state || return 1
+    if [[ "$TERM_PROGRAM" == "iTerm.app" ]] && type iterm2_enhanced_detect_change &>/dev/null; then
+        local user_title
+        if user_title=$(iterm2_enhanced_detect_change); then
+            if [[ -n "$user_title" ]]; then
+                if type sanitize_for_terminal &>/dev/null; then
+                    user_title=$(sanitize_for_terminal "$user_title")
+                fi
+                TITLE_USER_BASE="$user_title"
+                save_title_state
+                return 0
+            fi
+            return 1
+        else
+            return 1
+        fi
+    fi
+    [[ -z "$TITLE_LAST_SET" ]] && return 1
+    local current_title=""
+    case "$TERM_PROGRAM" in
+        "iTerm.app")
+            if type iterm2_get_current_title &>/dev/null; then
+                current_title=$(iterm2_get_current_title)
+            fi
+            ;;
+        *)
+            return 1
+            ;;
+    esac
+    if [[ -n "$current_title" && "$current_title" != "$TITLE_LAST_SET" ]]; then
+        local user_base
+        user_base=$(_extract_base_from_title "$current_title")
+        if [[ -n "$user_base" ]]; then
+            if type sanitize_for_terminal &>/dev/null; then
+                user_base=$(sanitize_for_terminal "$user_base")
+            fi
+            TITLE_USER_BASE="$user_base"
+            save_title_state
+        fi
+        return 0
+    fi
+    return 1
+}
+_extract_base_from_title() {
+    local title="$1"
+    local base="$title"
+    if [[ "$base" =~ ^[Ǝʕฅ\(].*[Eʔฅ\)][[:space:]]+(.*) ]]; then
+        base="${BASH_REMATCH[1]}"
+    fi
+    if [[ "$base" =~ ^[🟠🟢🔴🟣🔄][[:space:]]*(.*) ]]; then
+        base="${BASH_REMATCH[1]}"
+    fi
+    [[ -n "$base" ]] && echo "$base"
+}
+get_base_title() {
+    load_title_state || true
+    if [[ -n "$TITLE_USER_BASE" ]]; then
+        if type sanitize_for_terminal &>/dev/null; then
+            sanitize_for_terminal "$TITLE_USER_BASE"
+        else
+            echo "$TITLE_USER_BASE"
+        fi
+        return 0
+    fi
+    if [[ -n "${TAVS_TITLE_BASE:-}" ]]; then
+        if type sanitize_for_terminal &>/dev/null; then
+            sanitize_for_terminal "$TAVS_TITLE_BASE"
+        else
+            echo "$TAVS_TITLE_BASE"
+        fi
+        return 0
+    fi
+    get_fallback_title
+}
+get_fallback_title() {
+    local fallback="${TAVS_TITLE_FALLBACK:-path}"
+    local path_part
+    local session_part
+    if [[ "${TAVS_TITLE_SHOW_PATH:-true}" == "true" ]]; then
+        path_part=$(get_short_cwd 2>/dev/null) || {
+            local fallback_path="${PWD/#$HOME/\~}"
+            if type sanitize_for_terminal &>/dev/null; then
+                path_part=$(sanitize_for_terminal "$fallback_path")
+            else
+                path_part="$fallback_path"
+            fi
+        }
+    fi
+    if [[ "${TAVS_TITLE_SHOW_SESSION:-true}" == "true" ]]; then
+        [[ -z "$SESSION_ID" ]] && init_session_id
+        session_part="$SESSION_ID"
+    fi
+    case "$fallback" in
+        "session-path")
+            if [[ -n "$session_part" && -n "$path_part" ]]; then
+                echo "$session_part $path_part"
+            elif [[ -n "$session_part" ]]; then
+                echo "$session_part"
+            else
+                echo "$path_part"
+            fi
+            ;;
+        "path-session")
+            if [[ -n "$path_part" && -n "$session_part" ]]; then
+                echo "$path_part $session_part"
+            elif [[ -n "$path_part" ]]; then
+                echo "$path_part"
+            else
+                echo "$session_part"
+            fi
+            ;;
+        "session")
+            echo "${session_part:-Terminal}"
+            ;;
+        "path"|*)
+            echo "${path_part:-Terminal}"
+            ;;
+    esac
+}
+compose_title() {
+    local state="${1:-}"
+    local base_title="${2:-}"
+    [[ -z "$base_title" ]] && base_title=$(get_base_title)
+    local face=""
+    local status_icon=""
+    if [[ "${TAVS_TITLE_SHOW_FACE:-true}" == "true" && "$ENABLE_ANTHROPOMORPHISING" == "true" ]]; then
+        if [[ "${TAVS_FACE_MODE:-standard}" == "compact" ]]; then
+            if type get_compact_face &>/dev/null; then
+                face=$(get_compact_face "$state")
+            fi
+        else
+            if [[ "$state" == "processing" && "${TAVS_TITLE_MODE:-skip-processing}" == "full" ]]; then
+                if type get_spinner_eyes &>/dev/null; then
+                    local spinner_result
+                    spinner_result=$(get_spinner_eyes)
+                    if [[ "$spinner_result" != "FACE_VARIANT" && -n "$spinner_result" ]]; then
+                        local left_eye="${spinner_result%% *}"
+                        local right_eye="${spinner_result##* }"
+                        local _default_frame='[{L} {R}]'
+                        local frame="${SPINNER_FACE_FRAME:-$_default_frame}"
+                        face="${frame//\{L\}/$left_eye}"
+                        face="${face//\{R\}/$right_eye}"
+                    fi
+                fi
+            fi
+            if [[ -z "$face" ]] && type get_random_face &>/dev/null; then
+                local _face_state="$state"
+                [[ "$state" == "reset" && "${_TAVS_RESET_FINAL:-}" == "true" ]] && _face_state="reset_final"
+                face=$(get_random_face "$_face_state")
+            fi
+        fi
+    fi
+    local _compact_with_face=false
+    [[ "${TAVS_FACE_MODE:-standard}" == "compact" && "$ENABLE_ANTHROPOMORPHISING" == "true" ]] && _compact_with_face=true
+    if [[ "$_compact_with_face" != "true" && "${TAVS_TITLE_SHOW_STATUS_ICON:-true}" == "true" ]]; then
+        case "$state" in
+            processing) status_icon="$STATUS_ICON_PROCESSING" ;;
+            permission) status_icon="$STATUS_ICON_PERMISSION" ;;
+            complete)   status_icon="$STATUS_ICON_COMPLETE" ;;
+            idle*)      status_icon="$STATUS_ICON_IDLE" ;;
+            compacting) status_icon="$STATUS_ICON_COMPACTING" ;;
+            subagent*)  status_icon="$STATUS_ICON_SUBAGENT" ;;
+            tool_error) status_icon="$STATUS_ICON_TOOL_ERROR" ;;
+            reset)      status_icon="$STATUS_ICON_RESET" ;;
+            *)          status_icon="" ;;
+        esac
+    fi
+    local agents=""
+    local _context_eye_active=false
+    [[ "$_compact_with_face" == "true" && "${TAVS_COMPACT_CONTEXT_EYE:-mirror}" == "true" ]] && _context_eye_active=true
+    local _mirror_mode=false
+    [[ "$_compact_with_face" == "true" && "${TAVS_COMPACT_CONTEXT_EYE:-mirror}" == "mirror" ]] && _mirror_mode=true
+    if [[ "$_compact_with_face" != "true" ]] || [[ "$_context_eye_active" == "true" ]] || [[ "$_mirror_mode" == "true" ]]; then
+        if [[ "$state" == "processing" || "$state" == subagent* ]] && type get_subagent_title_suffix &>/dev/null; then
+            agents=$(get_subagent_title_suffix 2>/dev/null)
+        fi
+    fi
+    local session_icon=""
+    local _id_mode="${IDENTITY_MODE:-${TAVS_IDENTITY_MODE:-dual}}"
+    if [[ "$_id_mode" != "off" || "${ENABLE_SESSION_ICONS:-false}" == "true" ]] && \
+       type get_session_icon &>/dev/null; then
+        session_icon=$(get_session_icon 2>/dev/null)
+    fi
+    local _default_format='{DIR_ICON} {FACE} {AGENTS} «{CONTEXT_FOOD}{CONTEXT_PCT}» {SESSION_ID} {BASE}'
+    local _format_state="$state"
+    [[ "$_format_state" == idle_* ]] && _format_state="idle"
+    local state_upper
+    util_upper "$_format_state"
+    state_upper="${_UTIL_UPPER//-/_}"
+    local _agent_state_var="TITLE_FORMAT_${state_upper}"
+    local format=""
+    eval "format=\${${_agent_state_var}:-}"
+    [[ -z "$format" ]] && format="${TITLE_FORMAT:-}"
+    if [[ -z "$format" ]]; then
+        eval "format=\${TAVS_TITLE_FORMAT_${state_upper}:-}"
+    fi
+    [[ -z "$format" ]] && format="${TAVS_TITLE_FORMAT:-$_default_format}"
+    local title="$format"
+    if [[ "$_context_eye_active" == "true" ]]; then
+        local _eye_style="${COMPACT_CONTEXT_STYLE:-${TAVS_COMPACT_CONTEXT_STYLE:-food}}"
+        local _eye_token=""
+        _eye_token=$(_context_style_to_token "$_eye_style")
+        [[ -n "$_eye_token" ]] && title="${title//\{${_eye_token}\}/}"
+    fi
+    if [[ "$_id_mode" == "dual" && \
+          "$title" == *"{SESSION_ICON}"* && \
+          "$title" != *"{DIR_ICON}"* ]]; then
+        local _dual_wrap='«{DIR_ICON}|{SESSION_ICON}»'
+        title="${title//\{SESSION_ICON\}/$_dual_wrap}"
+    fi
+    title="${title//\{FACE\}/$face}"
+    title="${title//\{STATUS_ICON\}/$status_icon}"
+    title="${title//\{AGENTS\}/$agents}"
+    title="${title//\{SESSION_ICON\}/$session_icon}"
+    local dir_icon=""
+    if [[ "$_id_mode" == "dual" ]] && type get_dir_icon &>/dev/null; then
+        dir_icon=$(get_dir_icon 2>/dev/null)
+    fi
+    title="${title//\{DIR_ICON\}/$dir_icon}"
+    local session_id_display=""
+    if [[ -n "${TAVS_SESSION_ID:-}" ]]; then
+        session_id_display="${TAVS_SESSION_ID:0:8}"
+    fi
+    title="${title//\{SESSION_ID\}/$session_id_display}"
+    title="${title//\{BASE\}/$base_title}"
+    if [[ "$title" == *"{CONTEXT_"* || "$title" == *"{MODEL}"* || \
+          "$title" == *"{COST}"* || "$title" == *"{DURATION}"* || \
+          "$title" == *"{LINES}"* || "$title" == *"{MODE}"* ]]; then
+        latency_budget_allows context && load_context_data
+        title="${title//\{CONTEXT_PCT\}/$(resolve_context_token CONTEXT_PCT "$TAVS_CONTEXT_PCT")}"
+        title="${title//\{CONTEXT_FOOD\}/$(resolve_context_token CONTEXT_FOOD "$TAVS_CONTEXT_PCT")}"
+        title="${title//\{CONTEXT_FOOD_10\}/$(resolve_context_token CONTEXT_FOOD_10 "$TAVS_CONTEXT_PCT")}"
+        title="${title//\{CONTEXT_BAR_H\}/$(resolve_context_token CONTEXT_BAR_H "$TAVS_CONTEXT_PCT")}"
+        title="${title//\{CONTEXT_BAR_HL\}/$(resolve_context_token CONTEXT_BAR_HL "$TAVS_CONTEXT_PCT")}"
+        title="${title//\{CONTEXT_BAR_V\}/$(resolve_context_token CONTEXT_BAR_V "$TAVS_CONTEXT_PCT")}"
+        title="${title//\{CONTEXT_BAR_VM\}/$(resolve_context_token CONTEXT_BAR_VM "$TAVS_CONTEXT_PCT")}"
+        title="${title//\{CONTEXT_BRAILLE\}/$(resolve_context_token CONTEXT_BRAILLE "$TAVS_CONTEXT_PCT")}"
+        title="${title//\{CONTEXT_NUMBER\}/$(resolve_context_token CONTEXT_NUMBER "$TAVS_CONTEXT_PCT")}"
+        title="${title//\{CONTEXT_ICON\}/$(resolve_context_token CONTEXT_ICON "$TAVS_CONTEXT_PCT")}"
+        title="${title//\{MODEL\}/${TAVS_CONTEXT_MODEL:-}}"
+        title="${title//\{COST\}/$(_format_cost "${TAVS_CONTEXT_COST:-}")}"
+        title="${title//\{DURATION\}/$(_format_duration "${TAVS_CONTEXT_DURATION:-}")}"
+        title="${title//\{LINES\}/$(_format_lines "${TAVS_CONTEXT_LINES_ADD:-}")}"
+        title="${title//\{MODE\}/${TAVS_PERMISSION_MODE:-}}"
+    fi
+    title=$(printf '%s\n' "$title" | sed \
+        -e 's/«|/«/g' \
+        -e 's/|»/»/g' \
+        -e 's/« *»//g' \
+        -e 's/(|/(/' \
+        -e 's/|)/)/g' \
+        -e 's/||*/|/g' \
+        -e 's/  */ /g; s/^ *//; s/ *$//')
+    printf '%s\n' "$title"
+}
+set_tavs_title() {
+    local state="${1:-}"
+    [[ -z "$TTY_DEVICE" ]] && return 0
+    case "${TAVS_TITLE_MODE:-skip-processing}" in
+        "off")
+            return 0
+            ;;
+        "skip-processing")
+            [[ "$state" == "processing" ]] && return 0
+            ;;
+        "prefix-only"|"full")
+            ;;
+    esac
+    load_title_state || true
+    [[ -z "$SESSION_ID" ]] && init_session_id
+    if [[ "$TITLE_LOCKED" == "true" ]]; then
+        return 0
+    fi
+    local respect_mode="${TAVS_RESPECT_USER_TITLE:-prefix}"
+    if [[ "$respect_mode" == "full" ]]; then
+        if [[ -n "$TITLE_USER_BASE" ]]; then
+            return 0
+        fi
+    fi
+    if [[ "$respect_mode" != "ignore" ]]; then
+        if latency_budget_allows user_title && detect_user_title_change; then
+            if [[ "$respect_mode" == "full" ]]; then
+                return 0
+            fi
+        fi
+    else
+        TITLE_USER_BASE=""
+    fi
+    local base_title
+    base_title=$(get_base_title)
+    local full_title
+    full_title=$(compose_title "$state" "$base_title")
+    if tty_write "\033]0;%s\033\\" "$full_title" 2>/dev/null; then
+        TITLE_LAST_SET="$full_title"
+        tty_frame_on_write save_title_state \
+            "$TITLE_USER_BASE" "$TITLE_LAST_SET" "$TITLE_LOCKED" "$SESSION_ID"
+        type debug_log_title_trace &>/dev/null && \
+            debug_log_title_trace "$state" "$full_title" "write=ok"
+    else
+        if type debug_log_title_trace &>/dev/null; then
+            local writable=n
+            [[ -w "$TTY_DEVICE" ]] && writable=y
+            debug_log_title_trace "$state" "$full_title" "write=FAILED writable=$writable"
+        fi
+    fi
+}
+reset_tavs_title() {
+    [[ -z "$TTY_DEVICE" ]] && return 0
+    [[ "${TAVS_TITLE_MODE:-skip-processing}" == "off" ]] && return 0
+    load_title_state || true
+    [[ -z "$SESSION_ID" ]] && init_session_id
+    if [[ "$TITLE_LOCKED" == "true" ]]; then
+        return 0
+    fi
+    local respect_mode="${TAVS_RESPECT_USER_TITLE:-prefix}"
+    if [[ "$respect_mode" == "full" && -n "$TITLE_USER_BASE" ]]; then
+        return 0
+    elif [[ "$respect_mode" == "ignore" ]]; then
+        TITLE_USER_BASE=""
+    fi
+    local base_title
+    base_title=$(get_base_title)
+    if tty_write "\033]0;%s\033\\" "$base_title" 2>/dev/null; then
+        TITLE_LAST_SET="$base_title"
+        tty_frame_on_write save_title_state \
+            "$TITLE_USER_BASE" "$TITLE_LAST_SET" "$TITLE_LOCKED" "$SESSION_ID"
+    fi
+}
+lock_tavs_title() {
+    load_title_state || true
+    TITLE_LOCKED="true"
+    save_title_state
+}
+unlock_tavs_title() {
+    load_title_state || true
+    TITLE_LOCKED="false"
+    save_title_state
+}
+set_user_title() {
+    local user_title="$1"
+    load_title_state || true
+    [[ -z "$SESSION_ID" ]] && init_session_id
+    if type sanitize_for_terminal &>/dev/null; then
+        TITLE_USER_BASE=$(sanitize_for_terminal "$user_title")
+    else
+        TITLE_USER_BASE="$user_title"
+    fi
+    save_title_state
+}
+clear_user_title() {
+    load_title_state || true
+    TITLE_USER_BASE=""
+    save_title_state
+}
+if [[ -n "${TTY_SAFE:-}" ]]; then
+    load_title_state || true
+    [[ -z "$SESSION_ID" ]] && init_session_id && save_title_state
+fi
+_TAVS_SUBAGENT_STATE_DIR=$(get_spinner_state_dir)
+SUBAGENT_COUNT_FILE="${_TAVS_SUBAGENT_STATE_DIR}/subagent-count.${TTY_SAFE:-unknown}"
+increment_subagent_count() {
+    local count=0
+    util_read_file "$SUBAGENT_COUNT_FILE" && count="$_UTIL_FILE"
+    util_tmpfile "$SUBAGENT_COUNT_FILE"
+    echo $((count + 1)) > "$_UTIL_TMPFILE"
+    mv -f "$_UTIL_TMPFILE" "$SUBAGENT_COUNT_FILE"
+    [[ "$DEBUG_ALL" == "1" ]] && echo "[TAVS] Subagent count incremented: $((count + 1))" >&2
+}
+decrement_subagent_count() {
+    local count=0
+    util_read_file "$SUBAGENT_COUNT_FILE" && count="$_UTIL_FILE"
+    if [[ $count -gt 0 ]]; then
+        util_tmpfile "$SUBAGENT_COUNT_FILE"
+        echo $((count - 1)) > "$_UTIL_TMPFILE"
+        mv -f "$_UTIL_TMPFILE" "$SUBAGENT_COUNT_FILE"
+        [[ "$DEBUG_ALL" == "1" ]] && echo "[TAVS] Subagent count decremented: $((count - 1))" >&2
+        echo $((count - 1))
+    else
+        [[ "$DEBUG_ALL" == "1" ]] && echo "[TAVS] Subagent count already at 0" >&2
+        echo 0
+    fi
+}
+get_subagent_count() {
+    if util_read_file "$SUBAGENT_COUNT_FILE"; then
+        echo "$_UTIL_FILE"
+    else
+        echo 0
+    fi
+}
+reset_subagent_count() {
+    rm -f "$SUBAGENT_COUNT_FILE"
+    [[ "$DEBUG_ALL" == "1" ]] && echo "[TAVS] Subagent count reset" >&2
+}
+has_active_subagents() {
+    local count
+    count=$(get_subagent_count)
+    [[ $count -gt 0 ]]
+}
+get_subagent_title_suffix() {
+    local count
+    count=$(get_subagent_count)
+    if [[ $count -gt 0 ]]; then
+        local _default_fmt='+{N}'
+        local fmt="${TAVS_AGENTS_FORMAT:-$_default_fmt}"
+        echo "${fmt//\{N\}/$count}"
+    fi
+}
+_get_session_key() {
+    if [[ -n "${TAVS_SESSION_ID:-}" ]]; then
+        printf '%s' "${TAVS_SESSION_ID:0:8}"
+    else
+        printf '%s' "${TTY_SAFE:-unknown}"
+    fi
+}
+_detect_legacy_icon_file() {
+    local icon_file="$1"
+    [[ ! -f "$icon_file" ]] && return 1
+    local first_line
+    read -r first_line < "$icon_file" 2>/dev/null || return 1
+    [[ "$first_line" != *"="* ]] && return 0
+    return 1
+}
+_legacy_cleanup_stale() {
+    local state_dir registry_file
+    state_dir=$(get_spinner_state_dir)
+    registry_file="${state_dir}/session-icon-registry"
+    [[ ! -f "$registry_file" ]] && return 0
+    local tmp_file="${registry_file}.tmp.$$"
+    local tty_key tty_icon tty_dev
+    while IFS='=' read -r tty_key tty_icon; do
+        [[ -z "$tty_key" || "$tty_key" =~ ^[#] ]] && continue
+        tty_dev="${tty_key//_//}"
+        if [[ -e "$tty_dev" ]]; then
+            printf '%s=%s\n' "$tty_key" "$tty_icon" >> "$tmp_file"
+        else
+            rm -f "${state_dir}/session-icon.${tty_key}" 2>/dev/null
+            [[ "${DEBUG_ALL:-0}" == "1" ]] && echo "[TAVS] Cleaned stale legacy icon: $tty_key=$tty_icon" >&2
+        fi
+    done < "$registry_file"
+    if [[ -f "$tmp_file" ]]; then
+        mv "$tmp_file" "$registry_file" 2>/dev/null
+    else
+        rm -f "$registry_file" 2>/dev/null
+    fi
+}
+_legacy_register() {
+    local icon="$1"
+    local state_dir registry_file
+    state_dir=$(get_spinner_state_dir)
+    registry_file="${state_dir}/session-icon-registry"
+    local tmp_file="${registry_file}.tmp.$$"
+    {
+        grep -v "^${TTY_SAFE}=" "$registry_file" 2>/dev/null
+        printf '%s=%s\n' "$TTY_SAFE" "$icon"
+    } > "$tmp_file" 2>/dev/null
+    mv "$tmp_file" "$registry_file" 2>/dev/null
+}
+_legacy_random_assign() {
+    local state_dir icon_file registry_file
+    state_dir=$(get_spinner_state_dir)
+    icon_file="${state_dir}/session-icon.${TTY_SAFE:-unknown}"
+    registry_file="${state_dir}/session-icon-registry"
+    if [[ -f "$icon_file" ]]; then
+        return 0
+    fi
+    _legacy_cleanup_stale
+    local taken=()
+    if [[ -f "$registry_file" ]]; then
+        while IFS='=' read -r k v; do
+            [[ -z "$k" || "$k" =~ ^[#] ]] && continue
+            taken+=("$v")
+        done < "$registry_file"
+    fi
+    local pool=("${TAVS_SESSION_ICONS[@]}")
+    local available=()
+    local icon found
+    for icon in "${pool[@]}"; do
+        found=false
+        for t in "${taken[@]}"; do
+            [[ "$t" == "$icon" ]] && { found=true; break; }
+        done
+        $found || available+=("$icon")
+    done
+    local selected
+    if [[ ${#available[@]} -gt 0 ]]; then
+        selected="${available[$RANDOM % ${#available[@]}]}"
+    else
+        selected="${pool[$RANDOM % ${#pool[@]}]}"
+    fi
+    local tmp_file="${icon_file}.tmp.$$"
+    printf '%s\n' "$selected" > "$tmp_file" 2>/dev/null
+    mv "$tmp_file" "$icon_file" 2>/dev/null
+    _legacy_register "$selected"
+    [[ "${DEBUG_ALL:-0}" == "1" ]] && echo "[TAVS] Legacy session icon assigned: $selected (TTY=$TTY_SAFE)" >&2
+}
+assign_session_icon() {
+    local state_dir icon_file
+    state_dir=$(get_spinner_state_dir)
+    icon_file="${state_dir}/session-icon.${TTY_SAFE:-unknown}"
+    local _default_mode="dual"
+    local identity_mode="${IDENTITY_MODE:-${TAVS_IDENTITY_MODE:-$_default_mode}}"
+    if [[ "$identity_mode" == "off" ]]; then
+        if [[ -f "$icon_file" ]] && ! _detect_legacy_icon_file "$icon_file"; then
+            rm -f "$icon_file" 2>/dev/null
+        fi
+        _legacy_random_assign
+        return $?
+    fi
+    if _detect_legacy_icon_file "$icon_file"; then
+        rm -f "$icon_file" 2>/dev/null
+        [[ "${DEBUG_ALL:-0}" == "1" ]] && echo "[TAVS] Removed legacy session icon file" >&2
+    fi
+    local session_key
+    session_key=$(_get_session_key)
+    if [[ -f "$icon_file" ]]; then
+        local cached_key="" cached_primary="" cached_secondary="" cached_collision=""
+        while IFS='=' read -r k v; do
+            [[ -z "$k" || "$k" =~ ^[#] ]] && continue
+            case "$k" in
+                session_key) cached_key="$v" ;;
+                primary) cached_primary="$v" ;;
+                secondary) cached_secondary="$v" ;;
+                collision_active) cached_collision="$v" ;;
+            esac
+        done < "$icon_file"
+        if [[ "$cached_key" == "$session_key" && -n "$cached_primary" ]]; then
+            local collision_now=false
+            if type _active_sessions_check_collision &>/dev/null && \
+               _active_sessions_check_collision "$cached_primary" "$session_key"; then
+                collision_now=true
+            fi
+            if [[ "$collision_now" != "$cached_collision" ]]; then
+                local secondary_now="$cached_secondary"
+                if [[ "$collision_now" == "true" && -z "$secondary_now" ]]; then
+                    if type _round_robin_next_locked &>/dev/null; then
+                        secondary_now=$(_round_robin_next_locked "session" "TAVS_SESSION_ICON_POOL")
+                    fi
+                    if [[ -n "$secondary_now" ]] && type _registry_store &>/dev/null; then
+                        _registry_store "session" "$session_key" "$cached_primary" "$secondary_now"
+                    fi
+                fi
+                util_tmpfile "$icon_file"
+                local tmp_file="$_UTIL_TMPFILE"
+                {
+                    printf 'session_key=%s\n' "$session_key"
+                    printf 'primary=%s\n' "$cached_primary"
+                    printf 'secondary=%s\n' "${secondary_now:-}"
+                    printf 'collision_active=%s\n' "$collision_now"
+                } > "$tmp_file"
+                mv "$tmp_file" "$icon_file" 2>/dev/null
+            fi
+            if type _active_sessions_update &>/dev/null; then
+                _active_sessions_update "${TTY_SAFE:-unknown}" "$session_key" "$cached_primary"
+            fi
+            return 0
+        fi
+        rm -f "$icon_file" 2>/dev/null
+    fi
+    if type _active_sessions_cleanup_stale &>/dev/null; then
+        _active_sessions_cleanup_stale
+    fi
+    local _default_ttl=2592000
+    local ttl="${TAVS_IDENTITY_REGISTRY_TTL:-$_default_ttl}"
+    if type _registry_cleanup_expired &>/dev/null; then
+        _registry_cleanup_expired "session" "$ttl"
+    fi
+    local primary="" secondary=""
+    if type _registry_lookup &>/dev/null; then
+        local reg_result
+        reg_result=$(_registry_lookup "session" "$session_key")
+        if [[ -n "$reg_result" ]]; then
+            primary="${reg_result%%|*}"
+            local rest="${reg_result#*|}"
+            secondary="${rest%%|*}"
+        fi
+    fi
+    if [[ -z "$primary" ]]; then
+        if type _round_robin_next_locked &>/dev/null; then
+            primary=$(_round_robin_next_locked "session" "TAVS_SESSION_ICON_POOL")
+        fi
+        if [[ -z "$primary" ]]; then
+            util_hash "$session_key"
+            local hash_val="$_UTIL_HASH"
+            local pool_size="${#TAVS_SESSION_ICON_POOL[@]}"
+            [[ $pool_size -eq 0 ]] && pool_size=1
+            primary="${TAVS_SESSION_ICON_POOL[$((hash_val % pool_size))]}"
+        fi
+        if type _registry_store &>/dev/null; then
+            _registry_store "session" "$session_key" "$primary" ""
+        fi
+    fi
+    local collision_active=false
+    if type _active_sessions_check_collision &>/dev/null && \
+       _active_sessions_check_collision "$primary" "$session_key"; then
+        collision_active=true
+        if [[ -z "$secondary" ]]; then
+            if type _round_robin_next_locked &>/dev/null; then
+                secondary=$(_round_robin_next_locked "session" "TAVS_SESSION_ICON_POOL")
+            fi
+            if [[ -n "$secondary" ]] && type _registry_store &>/dev/null; then
+                _registry_store "session" "$session_key" "$primary" "$secondary"
+            fi
+        fi
+    fi
+    util_tmpfile "$icon_file"
+    local tmp_file="$_UTIL_TMPFILE"
+    {
+        printf 'session_key=%s\n' "$session_key"
+        printf 'primary=%s\n' "$primary"
+        printf 'secondary=%s\n' "${secondary:-}"
+        printf 'collision_active=%s\n' "$collision_active"
+    } > "$tmp_file"
+    mv "$tmp_file" "$icon_file" 2>/dev/null
+    if type _active_sessions_update &>/dev/null; then
+        _active_sessions_update "${TTY_SAFE:-unknown}" "$session_key" "$primary"
+    fi
+    [[ "${DEBUG_ALL:-0}" == "1" ]] && echo "[TAVS] Session icon assigned: $primary (key=$session_key, collision=$collision_active)" >&2
+}
+get_session_icon() {
+    local state_dir icon_file
+    state_dir=$(get_spinner_state_dir)
+    icon_file="${state_dir}/session-icon.${TTY_SAFE:-unknown}"
+    [[ ! -f "$icon_file" ]] && return 0
+    local first_line
+    read -r first_line < "$icon_file" 2>/dev/null || return 0
+    if [[ "$first_line" != *"="* ]]; then
+        printf '%s' "$first_line"
+        return 0
+    fi
+    local primary="" secondary="" collision_active=""
+    while IFS='=' read -r k v; do
+        [[ -z "$k" || "$k" =~ ^[#] ]] && continue
+        case "$k" in
+            primary) primary="$v" ;;
+            secondary) secondary="$v" ;;
+            collision_active) collision_active="$v" ;;
+        esac
+    done < "$icon_file"
+    if [[ "$collision_active" == "true" && -n "$secondary" ]]; then
+        printf '%s %s' "$primary" "$secondary"
+    else
+        printf '%s' "$primary"
+    fi
+}
+release_session_icon() {
+    local state_dir icon_file
+    state_dir=$(get_spinner_state_dir)
+    icon_file="${state_dir}/session-icon.${TTY_SAFE:-unknown}"
+    if _detect_legacy_icon_file "$icon_file" 2>/dev/null; then
+        local registry_file="${state_dir}/session-icon-registry"
+        if [[ -f "$registry_file" ]]; then
+            local tmp_file="${registry_file}.tmp.$$"
+            grep -v "^${TTY_SAFE:-unknown}=" "$registry_file" > "$tmp_file" 2>/dev/null
+            mv "$tmp_file" "$registry_file" 2>/dev/null
+        fi
+    fi
+    rm -f "$icon_file" 2>/dev/null
+    if type _active_sessions_remove &>/dev/null; then
+        _active_sessions_remove "${TTY_SAFE:-unknown}"
+    fi
+    [[ "${DEBUG_ALL:-0}" == "1" ]] && echo "[TAVS] Session icon released (TTY=${TTY_SAFE:-unknown})" >&2
+}
+_git_with_timeout() {
+    if command -v timeout &>/dev/null; then
+        timeout 1 git "$@" 2>/dev/null
+    elif command -v gtimeout &>/dev/null; then
+        gtimeout 1 git "$@" 2>/dev/null
+    else
+        git "$@" 2>/dev/null
+    fi
+}
+_git_repo_cache_dir() {
+    if [[ -z "${_GIT_REPO_CACHE_DIR:-}" ]]; then
+        _GIT_REPO_CACHE_DIR="$(get_spinner_state_dir)/git-repo"
+    fi
+}
+_find_git_entry() {
+    local dir="$1"
+    _GIT_ENTRY=""
+    while [[ -n "$dir" ]]; do
+        if [[ -e "$dir/.git" ]]; then
+            _GIT_ENTRY="$dir/.git"
+            return 0
+        fi
+        [[ "$dir" == "/" ]] && break
+        dir="${dir%/*}"
+        [[ -z "$dir" ]] && dir="/"
+    done
+    return 1
+}
+_git_repo_info() {
+    local cwd="$1"
+    _GIT_REPO_TOPLEVEL=""
+    _GIT_REPO_COMMON_DIR=""
+    command -v git &>/dev/null || return 1
+    _find_git_entry "$cwd"
+    _git_repo_cache_dir
+    local cache_file="${_GIT_REPO_CACHE_DIR}/${cwd//\//_}"
+    [[ ${#cache_file} -gt $(( ${#_GIT_REPO_CACHE_DIR} + 250 )) ]] && cache_file=""
+    local k v
+    if [[ -n "$cache_file" && -f "$cache_file" ]]; then
+        local cached_entry="" cached_top="" cached_common="" have_entry=false
+        while IFS='=' read -r k v; do
+            case "$k" in
+                git_entry)  cached_entry="$v"; have_entry=true ;;
+                toplevel)   cached_top="$v" ;;
+                common_dir) cached_common="$v" ;;
+            esac
+        done < "$cache_file"
+        if [[ "$have_entry" == "true" && "$cached_entry" == "$_GIT_ENTRY" ]] && \
+           [[ -z "$_GIT_ENTRY" || ! "$_GIT_ENTRY" -nt "$cache_file" ]]; then
+            _GIT_REPO_TOPLEVEL="$cached_top"
+            _GIT_REPO_COMMON_DIR="$cached_common"
+            [[ -n "$_GIT_REPO_TOPLEVEL" ]]
+            return
+        fi
+    fi
+    local out="" toplevel="" common_dir=""
+    if [[ -n "$_GIT_ENTRY" ]]; then
+        out=$(cd "$cwd" 2>/dev/null && _git_with_timeout rev-parse --show-toplevel --git-common-dir)
+        toplevel="${out%%$'\n'*}"
+        common_dir="${out#*$'\n'}"
+        [[ "$out" == *$'\n'* && -n "$toplevel" && -n "$common_dir" ]] || { toplevel=""; common_dir=""; }
+    fi
+    if [[ -n "$toplevel" ]]; then
+        [[ "$common_dir" != /* ]] && common_dir="${cwd}/${common_dir}"
+        common_dir=$(cd "$common_dir" 2>/dev/null && pwd -P) || { toplevel=""; common_dir=""; }
+    fi
+    if [[ -n "$cache_file" ]]; then
+        if [[ ! -d "$_GIT_REPO_CACHE_DIR" ]]; then
+            mkdir -p "$_GIT_REPO_CACHE_DIR" 2>/dev/null
+            chmod 700 "$_GIT_REPO_CACHE_DIR" 2>/dev/null
+        fi
+        printf 'git_entry=%s\ntoplevel=%s\ncommon_dir=%s\n' "$_GIT_ENTRY" "$toplevel" "$common_dir" \
+            > "${cache_file}.tmp.$$" 2>/dev/null && mv "${cache_file}.tmp.$$" "$cache_file" 2>/dev/null
+    fi
+    _GIT_REPO_TOPLEVEL="$toplevel"
+    _GIT_REPO_COMMON_DIR="$common_dir"
+    [[ -n "$_GIT_REPO_TOPLEVEL" ]]
+}
+_detect_worktree() {
+    local cwd="$1"
+    [[ "${TAVS_DIR_WORKTREE_DETECTION:-true}" != "true" ]] && return 1
+    _git_repo_info "$cwd" || return 1
+    local toplevel="$_GIT_REPO_TOPLEVEL"
+    local main_repo="${_GIT_REPO_COMMON_DIR%/.git}"
+    if [[ "$main_repo" != "$toplevel" ]]; then
+        printf '%s\t%s' "$main_repo" "$toplevel"
+        return 0
+    fi
+    return 1
+}
+_resolve_dir_identity() {
+    local cwd="$1"
+    local _default_source="cwd"
+    local source="${TAVS_DIR_IDENTITY_SOURCE:-$_default_source}"
+    case "$source" in
+        git-root)
+            if _git_repo_info "$cwd"; then
+                printf '%s' "$_GIT_REPO_TOPLEVEL"
+                return 0
+            fi
+            printf '%s' "$cwd"
+            ;;
+        cwd|*)
+            printf '%s' "$cwd"
+            ;;
+    esac
+}
+_hash_path() {
+    util_hash "$1"
+    printf '%s' "$_UTIL_HASH"
+}
+_select_dir_pool() {
+    local _default_type="flags"
+    local icon_type="${DIR_ICON_TYPE:-${TAVS_DIR_ICON_TYPE:-$_default_type}}"
+    case "$icon_type" in
+        plants)    printf '%s' "TAVS_DIR_FALLBACK_POOL_A" ;;
+        buildings) printf '%s' "TAVS_DIR_FALLBACK_POOL_B" ;;
+        auto)
+            printf '%s' "TAVS_DIR_ICON_POOL"
+            ;;
+        flags|*)
+            printf '%s' "TAVS_DIR_ICON_POOL"
+            ;;
+    esac
+}
+_get_worktree_pool() {
+    local main_pool="$1"
+    case "$main_pool" in
+        TAVS_DIR_FALLBACK_POOL_A) printf '%s' "TAVS_DIR_FALLBACK_POOL_B" ;;
+        TAVS_DIR_FALLBACK_POOL_B) printf '%s' "TAVS_DIR_FALLBACK_POOL_A" ;;
+        *) printf '%s' "$main_pool" ;;
+    esac
+}
+_assign_icon_for_path() {
+    local path="$1"
+    local pool_name="$2"
+    util_hash "$path"
+    local path_hash="$_UTIL_HASH"
+    local existing
+    existing=$(_registry_lookup "dir" "$path_hash")
+    if [[ -n "$existing" ]]; then
+        local primary="${existing%%|*}"
+        printf '%s' "$primary"
+        return 0
+    fi
+    local icon
+    icon=$(_round_robin_next_locked "dir" "$pool_name")
+    if [[ -z "$icon" ]]; then
+        local pool_size
+        eval "pool_size=\${#${pool_name}[@]}"
+        if [[ $pool_size -gt 0 ]]; then
+            local idx=$((path_hash % pool_size))
+            eval "icon=\${${pool_name}[$idx]}"
+        fi
+    fi
+    if [[ -n "$icon" ]]; then
+        _registry_store "dir" "$path_hash" "$icon"
+        printf '%s' "$icon"
+    fi
+}
+assign_dir_icon() {
+    local cwd="${TAVS_CWD:-$PWD}"
+    [[ -z "$cwd" ]] && return 0
+    latency_budget_allows dir_icon || return 0
+    local state_dir
+    state_dir=$(get_spinner_state_dir)
+    local cache_file="${state_dir}/dir-icon.${TTY_SAFE:-unknown}"
+    _GIT_REPO_CACHE_DIR="${state_dir}/git-repo"
+    if [[ -f "$cache_file" ]]; then
+        local cached_cwd=""
+        while IFS='=' read -r k v; do
+            [[ "$k" == "cwd" ]] && cached_cwd="$v"
+        done < "$cache_file"
+        if [[ "$cached_cwd" == "$cwd" ]]; then
+            [[ "${DEBUG_ALL:-0}" == "1" ]] && echo "[TAVS] Dir icon cache hit: $cwd" >&2
+            return 0
+        fi
+    fi
+    local _default_ttl=2592000
+    local ttl="${TAVS_IDENTITY_REGISTRY_TTL:-$_default_ttl}"
+    if type _registry_cleanup_expired &>/dev/null; then
+        _registry_cleanup_expired "dir" "$ttl"
+    fi
+    local resolved_path
+    resolved_path=$(_resolve_dir_identity "$cwd")
+    [[ -z "$resolved_path" ]] && resolved_path="$cwd"
+    local main_pool
+    main_pool=$(_select_dir_pool)
+    local worktree_info main_repo_path wt_toplevel
+    local worktree_path="" worktree_hash="" worktree_icon=""
+    local dir_path="" main_hash="" main_icon=""
+    worktree_info=$(_detect_worktree "$cwd" 2>/dev/null)
+    if [[ -n "$worktree_info" ]]; then
+        local tab=$'\t'
+        main_repo_path="${worktree_info%%$tab*}"
+        wt_toplevel="${worktree_info#*$tab}"
+        dir_path="$main_repo_path"
+        util_hash "$main_repo_path"
+        main_hash="$_UTIL_HASH"
+        main_icon=$(_assign_icon_for_path "$main_repo_path" "$main_pool")
+        local wt_pool
+        wt_pool=$(_get_worktree_pool "$main_pool")
+        worktree_path="$wt_toplevel"
+        util_hash "$wt_toplevel"
+        worktree_hash="$_UTIL_HASH"
+        worktree_icon=$(_assign_icon_for_path "$wt_toplevel" "$wt_pool")
+    else
+        dir_path="$resolved_path"
+        util_hash "$resolved_path"
+        main_hash="$_UTIL_HASH"
+        main_icon=$(_assign_icon_for_path "$resolved_path" "$main_pool")
+    fi
+    [[ -z "$main_icon" ]] && return 1
+    util_tmpfile "$cache_file"
+    local tmp_cache="$_UTIL_TMPFILE"
+    {
+        printf 'cwd=%s\n' "$cwd"
+        printf 'dir_path=%s\n' "$dir_path"
+        printf 'dir_hash=%s\n' "$main_hash"
+        printf 'primary=%s\n' "$main_icon"
+        if [[ -n "$worktree_path" ]]; then
+            printf 'worktree_path=%s\n' "$worktree_path"
+            printf 'worktree_hash=%s\n' "$worktree_hash"
+            printf 'worktree_icon=%s\n' "$worktree_icon"
+        fi
+    } > "$tmp_cache"
+    mv "$tmp_cache" "$cache_file" 2>/dev/null
+    [[ "${DEBUG_ALL:-0}" == "1" ]] && \
+        echo "[TAVS] Dir icon assigned: $main_icon (dir=$dir_path, cwd=$cwd, TTY=$TTY_SAFE)" >&2
+}
+get_dir_icon() {
+    local state_dir
+    state_dir=$(get_spinner_state_dir)
+    local cache_file="${state_dir}/dir-icon.${TTY_SAFE:-unknown}"
+    [[ ! -f "$cache_file" ]] && return 0
+    local primary="" worktree_icon=""
+    while IFS='=' read -r k v; do
+        case "$k" in
+            primary)       primary="$v" ;;
+            worktree_icon) worktree_icon="$v" ;;
+        esac
+    done < "$cache_file"
+    if [[ -n "$worktree_icon" && -n "$primary" ]]; then
+        printf '%s' "${primary}→${worktree_icon}"
+    elif [[ -n "$primary" ]]; then
+        printf '%s' "$primary"
+    fi
+}
+release_dir_icon() {
+    local state_dir
+    state_dir=$(get_spinner_state_dir)
+    local cache_file="${state_dir}/dir-icon.${TTY_SAFE:-unknown}"
+    rm -f "$cache_file" 2>/dev/null
+    [[ "${DEBUG_ALL:-0}" == "1" ]] && echo "[TAVS] Dir icon released (TTY=$TTY_SAFE)" >&2
+}
+TAVS_CONTEXT_PCT=""
+TAVS_CONTEXT_MODEL=""
+TAVS_CONTEXT_COST=""
+TAVS_CONTEXT_DURATION=""
+TAVS_CONTEXT_LINES_ADD=""
+TAVS_CONTEXT_LINES_REM=""
+read_bridge_state() {
+    local state_dir="${_TAVS_CONTEXT_STATE_DIR:-}"
+    if [[ -z "$state_dir" ]]; then
+        if type get_spinner_state_dir &>/dev/null; then
+            state_dir=$(get_spinner_state_dir)
+        else
+            if [[ -n "${XDG_RUNTIME_DIR:-}" && -d "${XDG_RUNTIME_DIR:-}" ]]; then
+                state_dir="$XDG_RUNTIME_DIR/tavs"
+            else
+                state_dir="${HOME}/.cache/tavs"
+            fi
+        fi
+    fi
+    local state_file="${state_dir}/context.${TTY_SAFE:-unknown}"
+    [[ ! -f "$state_file" ]] && return 1
+    local _pct="" _model="" _cost="" _duration="" _lines_add="" _lines_rem="" _ts=""
+    while IFS='=' read -r k v; do
+        [[ "$k" =~ ^[[:space:]]*# ]] && continue
+        [[ -z "$k" ]] && continue
+        v="${v%\"}" ; v="${v#\"}"
+        v="${v%\'}" ; v="${v#\'}"
+        case "$k" in
+            pct)       _pct="$v" ;;
+            model)     _model="$v" ;;
+            cost)      _cost="$v" ;;
+            duration)  _duration="$v" ;;
+            lines_add) _lines_add="$v" ;;
+            lines_rem) _lines_rem="$v" ;;
+            ts)        _ts="$v" ;;
+        esac
+    done < "$state_file"
+    if [[ -n "$_ts" ]]; then
+        local _default_max_age=30
+        local max_age="${TAVS_CONTEXT_BRIDGE_MAX_AGE:-$_default_max_age}"
+        util_now
+        local age=$(( _UTIL_NOW - _ts ))
+        if [[ $age -gt $max_age ]]; then
+            return 1
+        fi
+    else
+        return 1
+    fi
+    TAVS_CONTEXT_PCT="$_pct"
+    TAVS_CONTEXT_MODEL="$_model"
+    TAVS_CONTEXT_COST="$_cost"
+    TAVS_CONTEXT_DURATION="$_duration"
+    TAVS_CONTEXT_LINES_ADD="$_lines_add"
+    TAVS_CONTEXT_LINES_REM="$_lines_rem"
+    return 0
+}
+_estimate_from_transcript() {
+    local transcript_path="${1:-${TAVS_TRANSCRIPT_PATH:-}}"
+    [[ -z "$transcript_path" || ! -f "$transcript_path" ]] && return 1
+    if _parse_jsonl_usage "$transcript_path"; then
+        return 0
+    fi
+    _estimate_from_file_size "$transcript_path"
+}
+_parse_jsonl_usage() {
+    local transcript_path="$1"
+    local _last_assistant
+    _last_assistant=$(tail -500 "$transcript_path" 2>/dev/null \
+        | grep '"type":"assistant"' | tail -1)
+    [[ -z "$_last_assistant" ]] && return 1
+    local _cache_read _cache_create _input_tokens
+    _cache_read=$(printf '%s' "$_last_assistant" | \
+        sed -n 's/.*"cache_read_input_tokens"[[:space:]]*:[[:space:]]*\([0-9]*\).*/\1/p' \
+        | head -1)
+    _cache_create=$(printf '%s' "$_last_assistant" | \
+        sed -n 's/.*"cache_creation_input_tokens"[[:space:]]*:[[:space:]]*\([0-9]*\).*/\1/p' \
+        | head -1)
+    _input_tokens=$(printf '%s' "$_last_assistant" | \
+        sed -n 's/.*"usage"[^}]*"input_tokens"[[:space:]]*:[[:space:]]*\([0-9]*\).*/\1/p' \
+        | head -1)
+    local total=$(( ${_cache_read:-0} + ${_cache_create:-0} + ${_input_tokens:-0} ))
+    [[ $total -eq 0 ]] && return 1
+    local _default_ctx=200000
+    local ctx_size="${CONTEXT_WINDOW_SIZE:-${TAVS_CONTEXT_WINDOW_SIZE:-$_default_ctx}}"
+    if [[ "$ctx_size" -eq "$_default_ctx" ]]; then
+        local _model_id
+        _model_id=$(printf '%s' "$_last_assistant" | \
+            sed -n 's/.*"model"[[:space:]]*:[[:space:]]*"\([^"]*\)".*/\1/p' | head -1)
+        if [[ -n "$_model_id" ]]; then
+            ctx_size=$(_model_context_size "$_model_id" "$ctx_size")
+        fi
+    fi
+    local pct=$(( total * 100 / ctx_size ))
+    [[ $pct -gt 100 ]] && pct=100
+    TAVS_CONTEXT_PCT="$pct"
+    if [[ -z "${TAVS_CONTEXT_MODEL:-}" ]]; then
+        local _model_name
+        _model_name=$(printf '%s' "$_last_assistant" | \
+            sed -n 's/.*"model"[[:space:]]*:[[:space:]]*"\([^"]*\)".*/\1/p' | head -1)
+        [[ -n "$_model_name" ]] && TAVS_CONTEXT_MODEL="$_model_name"
+    fi
+    return 0
+}
+_model_context_size() {
+    local model_id="${1:-}"
+    local default_size="${2:-200000}"
+    case "$model_id" in
+        claude-opus-*|claude-sonnet-*|claude-haiku-*) echo "200000" ;;
+        gemini-*-pro*|gemini-*-flash*) echo "1000000" ;;
+        *) echo "$default_size" ;;
+    esac
+}
+_estimate_from_file_size() {
+    local transcript_path="$1"
+    local file_size
+    file_size=$(stat -f%z "$transcript_path" 2>/dev/null \
+        || stat -c%s "$transcript_path" 2>/dev/null)
+    [[ -z "$file_size" || "$file_size" -eq 0 ]] 2>/dev/null && return 1
+    local _default_ctx=200000
+    local ctx_size="${CONTEXT_WINDOW_SIZE:-${TAVS_CONTEXT_WINDOW_SIZE:-$_default_ctx}}"
+    local estimated_tokens=$(( file_size * 10 / 500 ))
+    local pct=$(( estimated_tokens * 100 / ctx_size ))
+    [[ $pct -gt 100 ]] && pct=100
+    TAVS_CONTEXT_PCT="$pct"
+    return 0
+}
+load_context_data() {
+    [[ -n "${_TAVS_CONTEXT_LOADED:-}" ]] && return 0
+    _TAVS_CONTEXT_LOADED=1
+    TAVS_CONTEXT_PCT=""
+    TAVS_CONTEXT_MODEL=""
+    TAVS_CONTEXT_COST=""
+    TAVS_CONTEXT_DURATION=""
+    TAVS_CONTEXT_LINES_ADD=""
+    TAVS_CONTEXT_LINES_REM=""
+    if read_bridge_state && [[ -n "$TAVS_CONTEXT_PCT" ]]; then
+        return 0
+    fi
+    if _estimate_from_transcript; then
+        return 0
+    fi
+    TAVS_CONTEXT_PCT="0"
+    return 0
+}
+_context_style_to_token() {
+    case "$1" in
+        food)      echo "CONTEXT_FOOD" ;;
+        food_10)   echo "CONTEXT_FOOD_10" ;;
+        circle)    echo "CONTEXT_ICON" ;;
+        block)     echo "CONTEXT_BAR_V" ;;
+        block_max) echo "CONTEXT_BAR_VM" ;;
+        braille)   echo "CONTEXT_BRAILLE" ;;
+        number)    echo "CONTEXT_NUMBER" ;;
+        percent)   echo "CONTEXT_PCT" ;;
+        *)         echo "" ;;
+    esac
+}
+resolve_context_token() {
+    local token="$1"
+    local pct="${2:-}"
+    [[ -z "$pct" ]] && echo "" && return 0
+    [[ "$pct" -gt 100 ]] 2>/dev/null && pct=100
+    [[ "$pct" -lt 0 ]] 2>/dev/null && pct=0
+    case "$token" in
+        CONTEXT_PCT)      _get_percentage "$pct" ;;
+        CONTEXT_FOOD)     _get_icon_from_array "TAVS_CONTEXT_FOOD_21" "$pct" 5 ;;
+        CONTEXT_FOOD_10)  _get_icon_from_array "TAVS_CONTEXT_FOOD_11" "$pct" 10 ;;
+        CONTEXT_ICON)     _get_icon_from_array "TAVS_CONTEXT_CIRCLES_11" "$pct" 10 ;;
+        CONTEXT_NUMBER)   _get_icon_from_array "TAVS_CONTEXT_NUMBERS" "$pct" 10 ;;
+        CONTEXT_BAR_H)    _get_bar_horizontal "$pct" 5 ;;
+        CONTEXT_BAR_HL)   _get_bar_horizontal "$pct" 10 ;;
+        CONTEXT_BAR_V)    _get_bar_vertical "$pct" ;;
+        CONTEXT_BAR_VM)   _get_bar_vertical_max "$pct" ;;
+        CONTEXT_BRAILLE)  _get_braille "$pct" ;;
+        *)                echo "" ;;
+    esac
+}
+_get_icon_from_array() {
+    local array_name="$1"
+    local pct="$2"
+    local step="$3"
+    local index=$(( pct / step ))
+    local arr_len
+    eval "arr_len=\${#${array_name}[@]}" 2>/dev/null
+    if [[ -z "$arr_len" || "$arr_len" -eq 0 ]]; then
+        echo ""
+        return
+    fi
+    local max_index=$(( arr_len - 1 ))
+    [[ $index -gt $max_index ]] && index=$max_index
+    [[ $index -lt 0 ]] && index=0
+    eval "echo \"\${${array_name}[$index]}\""
+}
+_get_bar_horizontal() {
+    local pct="$1"
+    local width="$2"
+    local _fill_char="${TAVS_CONTEXT_BAR_FILL:-▓}"
+    local _empty_char="${TAVS_CONTEXT_BAR_EMPTY:-░}"
+    local filled=$(( pct * width / 100 ))
+    [[ $filled -gt $width ]] && filled=$width
+    [[ $filled -lt 0 ]] && filled=0
+    local empty=$(( width - filled ))
+    local bar=""
+    local i
+    for (( i = 0; i < filled; i++ )); do
+        bar="${bar}${_fill_char}"
+    done
+    for (( i = 0; i < empty; i++ )); do
+        bar="${bar}${_empty_char}"
+    done
+    echo "$bar"
+}
+_get_bar_vertical() {
+    local pct="$1"
+    local arr_len
+    eval "arr_len=\${#TAVS_CONTEXT_BLOCKS[@]}" 2>/dev/null
+    if [[ -z "$arr_len" || "$arr_len" -eq 0 ]]; then
+        echo ""
+        return
+    fi
+    local max_index=$(( arr_len - 1 ))
+    local index=$(( pct * max_index / 100 ))
+    [[ $index -gt $max_index ]] && index=$max_index
+    [[ $index -lt 0 ]] && index=0
+    eval "echo \"\${TAVS_CONTEXT_BLOCKS[$index]}\""
+}
+_get_bar_vertical_max() {
+    local pct="$1"
+    local _max_char="${TAVS_CONTEXT_BAR_MAX:-▒}"
+    local block
+    block=$(_get_bar_vertical "$pct")
+    echo "${block}${_max_char}"
+}
+_get_braille() {
+    local pct="$1"
+    local arr_len
+    eval "arr_len=\${#TAVS_CONTEXT_BRAILLE[@]}" 2>/dev/null
+    if [[ -z "$arr_len" || "$arr_len" -eq 0 ]]; then
+        echo ""
+        return
+    fi
+    local max_index=$(( arr_len - 1 ))
+    local index=$(( pct * max_index / 100 ))
+    [[ $index -gt $max_index ]] && index=$max_index
+    [[ $index -lt 0 ]] && index=0
+    eval "echo \"\${TAVS_CONTEXT_BRAILLE[$index]}\""
+}
+_get_percentage() {
+    local pct="$1"
+    echo "${pct}%"
+}
+_format_cost() {
+    local cost="${1:-}"
+    [[ -z "$cost" ]] && echo "" && return
+    if [[ "$cost" == "0" ]]; then
+        echo "\$0.00"
+        return
+    fi
+    if printf '%f' "$cost" &>/dev/null; then
+        printf '$%.2f' "$cost"
+    else
+        echo "\$$cost"
+    fi
+}
+_format_duration() {
+    local ms="${1:-}"
+    [[ -z "$ms" ]] && echo "" && return
+    local total_secs=$(( ms / 1000 ))
+    local mins=$(( total_secs / 60 ))
+    local secs=$(( total_secs % 60 ))
+    echo "${mins}m${secs}s"
+}
+_format_lines() {
+    local lines="${1:-}"
+    [[ -z "$lines" ]] && echo "" && return
+    echo "+${lines}"
+}
+_SNAPSHOT_SCRIPT="$CORE_DIR/config-snapshot.sh"
+TAVS_SNAPSHOT_AGENTS=(claude gemini codex opencode unknown)
+_SNAPSHOT_STATES=(processing permission complete idle compacting subagent tool_error)
+_snapshot_dir() {
+    local _default_dir="${XDG_CACHE_HOME:-$HOME/.cache}/tavs/snapshot"
+    _SNAPSHOT_DIR="${TAVS_SNAPSHOT_DIR:-$_default_dir}"
+}
+get_snapshot_dir() {
+    _snapshot_dir
+    printf '%s' "$_SNAPSHOT_DIR"
+}
+snapshot_is_fresh() {
+    local agent="${1:-${TAVS_AGENT:-unknown}}"
+    _snapshot_dir
+    local stamp="$_SNAPSHOT_DIR/osc/${agent}/stamp"
+    [[ -f "$stamp" ]] || return 1
+    local src
+    for src in "$_SNAPSHOT_SCRIPT" "${_CONFIG_DIR}/defaults.conf" "$_USER_CONFIG"; do
+        [[ -e "$src" && "$src" -nt "$stamp" ]] && return 1
+    done
+    if [[ "$THEME_MODE" == "preset" && -n "$THEME_PRESET" ]]; then
+        src="${_THEMES_DIR}/${THEME_PRESET}.conf"
+        [[ -e "$src" && "$src" -nt "$stamp" ]] && return 1
+    fi
+    return 0
+}
+get_osc_variant() {
+    local variant="dark"
+    [[ "$IS_DARK_THEME" == "false" ]] && variant="light"
+    [[ "$IS_MUTED_THEME" == "true" ]] && variant="muted-${variant}"
+    printf '%s' "$variant"
+}
+_snapshot_select_variant() {
+    local variant="$1"
+    local prefix=""
+    case "$variant" in
+        dark)        prefix="DARK";       IS_DARK_THEME="true";  IS_MUTED_THEME="false" ;;
+        light)       prefix="LIGHT";      IS_DARK_THEME="false"; IS_MUTED_THEME="false" ;;
+        muted-dark)  prefix="MUTED_DARK"; IS_DARK_THEME="true";  IS_MUTED_THEME="true" ;;
+        muted-light) prefix="MUTED_LIGHT"; IS_DARK_THEME="false"; IS_MUTED_THEME="true" ;;
+        *) return 1 ;;
+    esac
+    local state
+    for state in BASE PROCESSING PERMISSION COMPLETE IDLE COMPACTING SUBAGENT TOOL_ERROR; do
+        eval "COLOR_${state}=\${${prefix}_${state}:-}"
+    done
+    _build_stage_arrays
+}
+_snapshot_write_bundle() {
+    local file="$1"
+    shift
+    printf '%b' "$@" > "$file" 2>/dev/null
+}
+_snapshot_colors_only() {
+    local state="$1"
+    util_upper "$state"
+    local enabled="ENABLE_${_UTIL_UPPER}" bell="BELL_ON_${_UTIL_UPPER}"
+    [[ "${!enabled:-}" == "true" ]] || return 1
+    [[ "${!bell:-}" == "true" ]] && return 1
+    [[ "${ENABLE_STYLISH_BACKGROUNDS:-}" == "true" ]] && return 1
+    if [[ "${ENABLE_TITLE_PREFIX:-}" == "true" ]]; then
+        case "${TAVS_TITLE_MODE:-}" in
+            off) ;;
+            full|prefix-only) return 1 ;;
+            *) [[ "$state" == "processing" ]] || return 1 ;;
+        esac
+    fi
+    return 0
+}
+compile_config_snapshot() {
+    local agents=("$@")
+    [[ ${#agents[@]} -eq 0 ]] && agents=("${TAVS_SNAPSHOT_AGENTS[@]}")
+    _snapshot_dir
+    local snap_dir="$_SNAPSHOT_DIR"
+    mkdir -p "$snap_dir/osc" 2>/dev/null || return 1
+    chmod 700 "$snap_dir" 2>/dev/null
+    local lock_dir="$snap_dir/.lock-compile"
+    if ! mkdir "$lock_dir" 2>/dev/null; then
+        local lock_pid=""
+        [[ -f "$lock_dir/pid" ]] && read -r lock_pid < "$lock_dir/pid" 2>/dev/null
+        if [[ -n "$lock_pid" ]] && kill -0 "$lock_pid" 2>/dev/null; then
+            return 0
+        fi
+        rm -rf "$lock_dir" 2>/dev/null
+        mkdir "$lock_dir" 2>/dev/null || return 0
+    fi
+    echo $$ > "$lock_dir/pid" 2>/dev/null
+    local agent build_dir rc=0
+    for agent in "${agents[@]}"; do
+        build_dir="$snap_dir/osc/.${agent}.tmp.$$"
+        rm -rf "$build_dir" 2>/dev/null
+        (
+            load_agent_config "$agent"
+            local variant out_dir pal_seq state color pmode
+            for variant in dark light muted-dark muted-light; do
+                out_dir="$build_dir/$variant"
+                mkdir -p "$out_dir" || exit 1
+                _snapshot_select_variant "$variant" || continue
+                pal_seq=""
+                if [[ "$IS_DARK_THEME" == "true" ]]; then
+                    pal_seq=$(_build_osc_palette_seq "dark")
+                else
+                    pal_seq=$(_build_osc_palette_seq "light")
+                fi
+                _snapshot_write_bundle "$out_dir/reset.bg" "\033]111\033\\"
+                _snapshot_write_bundle "$out_dir/reset.pal" "\033]104\033\\" "\033]111\033\\"
+                for state in "${_SNAPSHOT_STATES[@]}"; do
+                    case "$state" in
+                        processing) color="$COLOR_PROCESSING" ;;
+                        permission) color="$COLOR_PERMISSION" ;;
+                        complete)   color="$COLOR_COMPLETE" ;;
+                        idle)       color="${UNIFIED_STAGE_COLORS[1]}" ;;
+                        compacting) color="$COLOR_COMPACTING" ;;
+                        subagent)   color="$COLOR_SUBAGENT" ;;
+                        tool_error) color="$COLOR_TOOL_ERROR" ;;
+                    esac
+                    [[ "$color" =~ ^#[0-9A-Fa-f]{6}$ ]] || continue
+                    _snapshot_write_bundle "$out_dir/${state}-${color#\#}.bg" "\033]11;${color}\033\\"
+                    _snapshot_write_bundle "$out_dir/${state}-${color#\#}.pal" "$pal_seq" "\033]11;${color}\033\\"
+                done
+                local base_processing="$COLOR_PROCESSING"
+                for pmode in plan acceptEdits bypassPermissions; do
+                    COLOR_PROCESSING="$base_processing"
+                    TAVS_PERMISSION_MODE="$pmode" _apply_mode_aware_processing
+                    color="$COLOR_PROCESSING"
+                    [[ "$color" =~ ^#[0-9A-Fa-f]{6}$ ]] || continue
+                    _snapshot_write_bundle "$out_dir/processing-${color#\#}.bg" "\033]11;${color}\033\\"
+                    _snapshot_write_bundle "$out_dir/processing-${color#\#}.pal" "$pal_seq" "\033]11;${color}\033\\"
+                done
+                COLOR_PROCESSING="$base_processing"
+                {
+                    for state in "${_SNAPSHOT_STATES[@]}"; do
+                        case "$state" in
+                            processing) color="$COLOR_PROCESSING" ;;
+                            permission) color="$COLOR_PERMISSION" ;;
+                            complete)   color="$COLOR_COMPLETE" ;;
+                            idle)       color="${UNIFIED_STAGE_COLORS[1]}" ;;
+                            compacting) color="$COLOR_COMPACTING" ;;
+                            subagent)   color="$COLOR_SUBAGENT" ;;
+                            tool_error) color="$COLOR_TOOL_ERROR" ;;
+                        esac
+                        if [[ "$color" =~ ^#[0-9A-Fa-f]{6}$ ]] && _snapshot_colors_only "$state"; then
+                            printf '%s=%s\n' "$state" "${color#\#}"
+                        else
+                            printf '%s=-\n' "$state"
+                        fi
+                    done
+                    printf 'grace_ms=%s\nmetrics=%s\njournal=%s\n' "${STATE_GRACE_PERIOD_MS:-400}" \
+                        "${ENABLE_METRICS:-true}" "${ENABLE_JOURNAL:-false}"
+                    printf 'source=%s\n' "$_SNAPSHOT_SCRIPT" "${_CONFIG_DIR}/defaults.conf" "$_USER_CONFIG"
+                    [[ "$THEME_MODE" == "preset" && -n "$THEME_PRESET" ]] && \
+                        printf 'source=%s\n' "${_THEMES_DIR}/${THEME_PRESET}.conf"
+                } > "$out_dir/signals" 2>/dev/null
+            done
+            : > "$build_dir/stamp"
+        ) || { rc=1; rm -rf "$build_dir" 2>/dev/null; continue; }
+        rm -rf "$snap_dir/osc/.${agent}.old.$$" 2>/dev/null
+        [[ -d "$snap_dir/osc/$agent" ]] && mv "$snap_dir/osc/$agent" "$snap_dir/osc/.${agent}.old.$$" 2>/dev/null
+        mv "$build_dir" "$snap_dir/osc/$agent" 2>/dev/null || rc=1
+        rm -rf "$snap_dir/osc/.${agent}.old.$$" "$build_dir" 2>/dev/null
+    done
+    rm -f "$lock_dir/pid" 2>/dev/null
+    rmdir "$lock_dir" 2>/dev/null
+    return $rc
+}
+ensure_config_snapshot() {
+    [[ "${ENABLE_CONFIG_SNAPSHOT:-true}" != "true" ]] && return 1
+    local agent="${TAVS_AGENT:-unknown}"
+    snapshot_is_fresh "$agent" && return 0
+    ( compile_config_snapshot "$agent" ) </dev/null >/dev/null 2>&1 &
+    disown 2>/dev/null || true
+    return 1
+}
+emit_osc_bundle() {
+    local state="$1" color="$2" with_palette="${3:-false}"
+    [[ -z "$TTY_DEVICE" ]] && return 1
+    ensure_config_snapshot || return 1
+    local kind="bg"
+    [[ "$with_palette" == "true" ]] && kind="pal"
+    local variant="dark"
+    [[ "$IS_DARK_THEME" == "false" ]] && variant="light"
+    [[ "$IS_MUTED_THEME" == "true" ]] && variant="muted-${variant}"
+    _snapshot_dir
+    local file="$_SNAPSHOT_DIR/osc/${TAVS_AGENT:-unknown}/${variant}"
+    if [[ "$color" == "reset" ]]; then
+        file+="/reset.${kind}"
+    elif [[ "$color" =~ ^#[0-9A-Fa-f]{6}$ ]]; then
+        file+="/${state}-${color#\#}.${kind}"
+    else
+        return 1
+    fi
+    [[ -f "$file" ]] || return 1
+    local seq=""
+    IFS= read -r -d '' seq < "$file"
+    [[ -n "$seq" ]] || return 1
+    tty_write '%s' "$seq" || return 1
+    _snapshot_note_tty "${file%/*}" "$kind"
+    return 0
+}
+_snapshot_note_tty() {
+    [[ -n "${TTY_SAFE:-}" ]] || return 0
+    local record="${TAVS_TMP_DIR:-/tmp/tavs}/osc.${TTY_SAFE}"
+    local content="dir=$1"$'\n'"kind=$2"
+    util_read_file "$record" && [[ "$_UTIL_FILE" == "$content" ]] && return 0
+    util_tmpfile "$record"
+    printf '%s\n' "$content" > "$_UTIL_TMPFILE" 2>/dev/null &&
+        mv -f "$_UTIL_TMPFILE" "$record" 2>/dev/null ||
+        rm -f "$_UTIL_TMPFILE" 2>/dev/null
+    return 0
+}
+snapshot_forget_tty() {
+    local record="${TAVS_TMP_DIR:-/tmp/tavs}/osc.${TTY_SAFE:-}"
+    [[ -n "${TTY_SAFE:-}" && -f "$record" ]] && rm -f "$record" 2>/dev/null
+    return 0
+}
+_TAVS_JOURNAL_LOADED=1
+journal_file() {
+    local key=""
+    if [[ -n "${TAVS_SESSION_ID:-}" ]]; then
+        key="s.${TAVS_SESSION_ID//[^A-Za-z0-9._-]/_}"
+    elif [[ -n "${TTY_DEVICE:-}" ]]; then
+        key="${TTY_DEVICE//\//_}"
+    fi
+    _JOURNAL_FILE=""
+    [[ -n "$key" ]] && _JOURNAL_FILE="${TAVS_TMP_DIR:-/tmp/tavs}/journal/${key}.log"
+}
+journal_begin() {
+    _JOURNAL_PREV="-"
+    type read_session_state &>/dev/null && read_session_state && \
+        _JOURNAL_PREV="${SESSION_STATE:--}"
+    _JOURNAL_START=""
+    [[ -n "${EPOCHREALTIME:-}" ]] && _JOURNAL_START="${EPOCHREALTIME/[.,]/}"
+    return 0
+}
+journal_record() {
+    local outcome="$1" state="${2:-}" arg="${3:-}"
+    local prev="-" new="-" emit_us="-" subagents="-"
+    journal_file
+    [[ -n "$_JOURNAL_FILE" ]] || return 0
+    if [[ "$outcome" != "dedup" ]]; then
+        prev="${_JOURNAL_PREV:--}"
+        new="$prev"
+        type read_session_state &>/dev/null && read_session_state && \
+            new="${SESSION_STATE:--}"
+        if [[ -n "${_JOURNAL_START:-}" && -n "${EPOCHREALTIME:-}" ]]; then
+            emit_us=$(( ${EPOCHREALTIME/[.,]/} - _JOURNAL_START ))
+        fi
+        subagents=0
+        [[ -n "${SUBAGENT_COUNT_FILE:-}" ]] && util_read_file "$SUBAGENT_COUNT_FILE" && \
+            subagents="$_UTIL_FILE"
+    fi
+    local mode="${TAVS_PERMISSION_MODE:-}" agent="${TAVS_AGENT:-}"
+    state="${state//[^A-Za-z0-9._-]/_}" arg="${arg//[^A-Za-z0-9._-]/_}"
+    mode="${mode//[^A-Za-z0-9._-]/_}" agent="${agent//[^A-Za-z0-9._-]/_}"
+    subagents="${subagents//[^0-9-]/}"
+    local dir="${_JOURNAL_FILE%/*}"
+    if [[ ! -d "$dir" ]]; then
+        mkdir -p "$dir" 2>/dev/null
+        chmod 700 "$dir" 2>/dev/null
+    fi
+    local rerun=0
+    [[ -n "${_TAVS_DEFERRED_ID:-}" ]] && rerun=1
+    printf 'seq=%s state=%s arg=%s agent=%s mode=%s outcome=%s prev=%s new=%s emit_us=%s subagents=%s rerun=%s\n' \
+        "${TAVS_EVENT_SEQ:--}" "${state:--}" "${arg:--}" "${agent:--}" "${mode:--}" \
+        "$outcome" "$prev" "$new" "$emit_us" "${subagents:--}" "$rerun" \
+        >> "$_JOURNAL_FILE" 2>/dev/null
+    return 0
+}
+[[ "$TERM_PROGRAM" == "iTerm.app" && -f "$CORE_DIR/title-iterm2.sh" ]] && \
+    source "$CORE_DIR/title-iterm2.sh"
+debug_log_invocation() {
+    [[ "$DEBUG_ALL" != "1" ]] && return 0
+    local payload="${_TAVS_HOOK_PAYLOAD:-}"
+    if [[ -z "$payload" ]] && read -t 0 2>/dev/null; then
+        IFS= read -r -d '' -n "${TAVS_DEBUG_PAYLOAD_MAX:-2048}" -t 1 payload 2>/dev/null
+    fi
+    debug_log "${DEBUG_LOG_DIR}/trigger.log" invocation \
+        "state=${1:-}" "args=$*" "ppid=$PPID" "pwd=$PWD" \
+        "tty=${TTY_DEVICE:-}" "session=${TAVS_SESSION_ID:-}" \
+        "permission_mode=${TAVS_PERMISSION_MODE:-}" "face_mode=${TAVS_FACE_MODE:-}" \
+        "title_mode=${TAVS_TITLE_MODE:-}" "title_preset=${TAVS_TITLE_PRESET:-}" \
+        "identity_mode=${TAVS_IDENTITY_MODE:-}" "user_config=${_USER_CONFIG:-}" \
+        "payload=$payload"
+}
+debug_log_title_trace() {
+    [[ "$DEBUG_ALL" != "1" ]] && return 0
+    debug_log "${DEBUG_LOG_DIR}/title.log" title "state=$1" \
+        "face_mode=${TAVS_FACE_MODE:-}" "format=${TAVS_TITLE_FORMAT:-}" \
+        "tty=${TTY_DEVICE:-}" "title=$2" "extra=${3:-}"
+}
+debug_log_invocation "$@"
+[[ -z "$TTY_DEVICE" ]] && exit 0
+_apply_palette_if_enabled() {
+    should_enable_palette_theming || return 0
+    local mode
+    mode=$(_get_palette_mode)
+    send_osc_palette "$mode"
+}
+_reset_palette_if_enabled() {
+    should_enable_palette_theming || return 0
+    send_osc_palette_reset
+}
+_emit_state_colors() {
+    local state="$1" color="$2"
+    local with_palette="false"
+    should_enable_palette_theming && with_palette="true"
+    if ! should_send_bg_color; then
+        snapshot_forget_tty
+        if [[ "$color" == "reset" ]]; then
+            _reset_palette_if_enabled
+        else
+            _apply_palette_if_enabled
+        fi
+        return 0
+    fi
+    emit_osc_bundle "$state" "$color" "$with_palette" && return 0
+    snapshot_forget_tty
+    if [[ "$color" == "reset" ]]; then
+        [[ "$with_palette" == "true" ]] && send_osc_palette_reset
+    else
+        [[ "$with_palette" == "true" ]] && send_osc_palette "$(_get_palette_mode)"
+    fi
+    send_osc_bg "$color"
+}
+should_send_title() {
+    local state="${1:-}"
+    [[ "$ENABLE_TITLE_PREFIX" != "true" ]] && return 1
+    case "$TAVS_TITLE_MODE" in
+        "full"|"prefix-only")
+            return 0
+            ;;
+        "skip-processing")
+            [[ "$state" == "processing" ]] && return 1
+            return 0
+            ;;
+        "off")
+            return 1
+            ;;
+        *)
+            [[ "$state" == "processing" ]] && return 1
+            return 0
+            ;;
+    esac
+}
+_load_identity_modules() {
+    [[ "${_TAVS_IDENTITY_LOADED:-}" == "true" ]] && return 0
+    source "$CORE_DIR/identity-registry.sh"
+    source "$CORE_DIR/dir-icon.sh"
+    _TAVS_IDENTITY_LOADED="true"
+}
+_revalidate_identity() {
+    local _default_mode="dual"
+    local _id_mode="${IDENTITY_MODE:-${TAVS_IDENTITY_MODE:-$_default_mode}}"
+    [[ "$_id_mode" == "off" ]] && return 0
+    assign_session_icon
+    [[ "$_id_mode" == "dual" ]] && assign_dir_icon
+}
+_TAVS_PHASE2=""
+_phase2() {
+    if [[ "$ENABLE_TWO_PHASE_TRIGGER" != "true" ]]; then
+        "$@"
+        return
+    fi
+    local cmd
+    printf -v cmd '%q ' "$@"
+    _TAVS_PHASE2+="${cmd};"
+}
+_phase2_start() {
+    [[ -z "$_TAVS_PHASE2" ]] && return 0
+    local pid_file="${TAVS_TMP_DIR:-/tmp/tavs}/phase2.${TTY_SAFE}" pid=""
+    [[ -f "$pid_file" ]] && read -r pid < "$pid_file"
+    [[ "$pid" =~ ^[0-9]+$ ]] && kill "$pid" 2>/dev/null
+    (
+        _TAVS_PHASE2_PID="${BASHPID:-$(sh -c 'echo $PPID')}"
+        trap 'read -r pid < "$pid_file" 2>/dev/null; [[ "$pid" == "$_TAVS_PHASE2_PID" ]] && rm -f "$pid_file"' EXIT
+        trap 'exit 0' TERM INT
+        _TAVS_BUDGET_START=""
+        tty_frame_begin
+        eval "$_TAVS_PHASE2"
+        tty_frame_flush "$STATE"
+    ) </dev/null >/dev/null 2>&1 &
+    printf '%s\n' "$!" > "$pid_file" 2>/dev/null
+    disown 2>/dev/null || true
+    _TAVS_PHASE2=""
+}
+_load_system_mode_watcher() {
+    [[ "${_TAVS_MODE_WATCHER_LOADED:-}" == "true" ]] && return 0
+    source "$CORE_DIR/system-mode-watcher.sh"
+    _TAVS_MODE_WATCHER_LOADED="true"
+}
+STATE="${1:-}"
+_TAVS_OUTCOME="applied"
+_TAVS_EVENT_ARG="${2:-}"
+[[ "$ENABLE_JOURNAL" == "true" ]] && journal_begin
+_trigger_exit() {
+    [[ "$_TAVS_OUTCOME" == "deferred" ]] && event_dedup_forget
+    metrics_trigger "$STATE" "$_TAVS_OUTCOME"
+    [[ "$ENABLE_JOURNAL" == "true" ]] && \
+        journal_record "$_TAVS_OUTCOME" "$STATE" "$_TAVS_EVENT_ARG"
+    return 0
+}
+trap _trigger_exit EXIT
+[[ "$STATE" != "repaint" ]] && is_stale_event && { _TAVS_OUTCOME="stale"; exit 0; }
+tty_frame_begin
+case "$STATE" in
+    processing)
+        if [[ "${2:-}" == "new-prompt" ]]; then
+            reset_subagent_count
+            _default_mode_p="dual"
+            if [[ "${IDENTITY_MODE:-${TAVS_IDENTITY_MODE:-$_default_mode_p}}" != "off" ]]; then
+                _phase2 _load_identity_modules
+                _phase2 _revalidate_identity
+            fi
+        fi
+        should_change_state "$STATE" || { _TAVS_OUTCOME="deferred"; _phase2_start; exit 0; }
+        kill_idle_timer
+        if [[ "$ENABLE_PROCESSING" == "true" ]]; then
+            _emit_state_colors "processing" "$COLOR_PROCESSING"
+            should_send_title "processing" && _phase2 set_tavs_title "processing"
+            _phase2 set_state_background_image "processing"
+        else
+            _emit_state_colors "reset" "reset"
+            should_send_title "processing" && reset_tavs_title
+            clear_background_image
+        fi
+        send_bell_if_enabled "$STATE"
+        record_state "$STATE"
+        ;;
+    permission)
+        kill_idle_timer
+        if [[ "$ENABLE_PERMISSION" == "true" ]]; then
+            _emit_state_colors "permission" "$COLOR_PERMISSION"
+            should_send_title "permission" && _phase2 set_tavs_title "permission"
+            _phase2 set_state_background_image "permission"
+        fi
+        send_bell_if_enabled "$STATE"
+        record_state "$STATE"
+        ;;
+    complete)
+        should_change_state "$STATE" || { _TAVS_OUTCOME="deferred"; exit 0; }
+        kill_idle_timer
+        cleanup_stale_timers
+        reset_subagent_count
+        if [[ "$ENABLE_COMPLETE" == "true" ]]; then
+            _emit_state_colors "complete" "$COLOR_COMPLETE"
+            should_send_title "complete" && _phase2 set_tavs_title "complete"
+            _phase2 set_state_background_image "complete"
+        else
+            _emit_state_colors "reset" "reset"
+            should_send_title "complete" && reset_tavs_title
+            clear_background_image
+        fi
+        send_bell_if_enabled "$STATE"
+        ( unified_timer_worker "$TTY_DEVICE" ) </dev/null >/dev/null 2>&1 &
+        disown 2>/dev/null || true
+        ;;
+    idle)
+        if [[ "$ENABLE_IDLE" == "true" ]]; then
+            read_session_state || true
+            if [[ -n "$SESSION_TIMER_PID" ]] && kill -0 "$SESSION_TIMER_PID" 2>/dev/null; then
+                write_skip_signal
+            else
+                _emit_state_colors "idle" "${UNIFIED_STAGE_COLORS[1]}"
+                should_send_title "idle" && _phase2 set_tavs_title "idle_1"
+                _phase2 set_state_background_image "idle"
+                ( unified_timer_worker "$TTY_DEVICE" ) </dev/null >/dev/null 2>&1 &
+                disown 2>/dev/null || true
+            fi
+        fi
+        ;;
+    compacting)
+        should_change_state "$STATE" || { _TAVS_OUTCOME="deferred"; exit 0; }
+        kill_idle_timer
+        if [[ "$ENABLE_COMPACTING" == "true" ]]; then
+            _emit_state_colors "compacting" "$COLOR_COMPACTING"
+            should_send_title "compacting" && _phase2 set_tavs_title "compacting"
+            _phase2 set_state_background_image "compacting"
+        fi
+        send_bell_if_enabled "$STATE"
+        record_state "$STATE"
+        ;;
+    reset)
+        if [[ "${2:-}" == "session-end" ]]; then
+            _load_identity_modules
+            release_session_icon 2>/dev/null || true
+            release_dir_icon 2>/dev/null || true
+        fi
+        [[ "${2:-}" != "session-end" ]] && init_terminal_caps
+        kill_idle_timer
+        reset_subagent_count
+        _emit_state_colors "reset" "reset"
+        clear_terminal_bg_cache
+        clear_background_image
+        send_bell_if_enabled "$STATE"
+        record_state "$STATE"
+        reset_spinner
+        if [[ "${2:-}" == "session-end" ]]; then
+            if [[ -f "${_SYSTEM_MODE_FILE}.ttys" ]]; then
+                _load_system_mode_watcher
+                unregister_system_mode_tty
+            fi
+        elif [[ "$ENABLE_LIGHT_DARK_SWITCHING" == "true" ]]; then
+            _load_system_mode_watcher
+            if _system_mode_watcher_enabled; then
+                register_system_mode_tty
+                start_system_mode_watcher
+            fi
+        fi
+        if [[ "${2:-}" != "session-end" ]]; then
+            [[ "$TAVS_SESSION_IDENTITY" == "true" ]] && init_session_spinner
+            _default_mode_r="dual"
+            _id_mode_r="${IDENTITY_MODE:-${TAVS_IDENTITY_MODE:-$_default_mode_r}}"
+            if [[ "$_id_mode_r" != "off" ]]; then
+                _phase2 _load_identity_modules
+                _phase2 assign_session_icon
+                if [[ "$_id_mode_r" == "dual" ]]; then
+                    _phase2 assign_dir_icon
+                fi
+            elif [[ "${ENABLE_SESSION_ICONS:-true}" == "true" ]]; then
+                _phase2 assign_session_icon
+            fi
+        fi
+        [[ "${2:-}" == "session-end" ]] && _TAVS_RESET_FINAL="true"
+        _phase2 clear_title_state 2>/dev/null
+        should_send_title "reset" && _phase2 set_tavs_title "reset"
+        ;;
+    subagent|subagent-start)
+        should_change_state "subagent" || { _TAVS_OUTCOME="deferred"; exit 0; }
+        increment_subagent_count
+        kill_idle_timer
+        if [[ "$ENABLE_SUBAGENT" == "true" ]]; then
+            _emit_state_colors "subagent" "$COLOR_SUBAGENT"
+            should_send_title "subagent" && _phase2 set_tavs_title "subagent"
+            _phase2 set_state_background_image "subagent"
+        fi
+        send_bell_if_enabled "subagent"
+        record_state "subagent"
+        ;;
+    subagent-stop)
+        remaining_count=$(decrement_subagent_count)
+        if [[ $remaining_count -eq 0 ]]; then
+            [[ "$DEBUG_ALL" == "1" ]] && echo "[TAVS] All subagents complete, returning to processing" >&2
+            if [[ "$ENABLE_PROCESSING" == "true" ]]; then
+                _emit_state_colors "processing" "$COLOR_PROCESSING"
+                should_send_title "processing" && _phase2 set_tavs_title "processing"
+                _phase2 set_state_background_image "processing"
+            fi
+            record_state "processing"
+        else
+            [[ "$DEBUG_ALL" == "1" ]] && echo "[TAVS] Subagent complete, $remaining_count still active" >&2
+            should_send_title "subagent" && _phase2 set_tavs_title "subagent"
+        fi
+        ;;
+    tool_error|tool-error)
+        kill_idle_timer
+        if [[ "$ENABLE_TOOL_ERROR" == "true" ]]; then
+            _emit_state_colors "tool_error" "$COLOR_TOOL_ERROR"
+            should_send_title "tool_error" && _phase2 set_tavs_title "tool_error"
+            _phase2 set_state_background_image "tool_error"
+        fi
+        send_bell_if_enabled "tool_error"
+        record_state "tool_error"
+        (
+            sleep 1.5
+            if has_active_subagents 2>/dev/null; then
+                _TAVS_RERUN=1 "$_TAVS_TRIGGER" subagent
+            else
+                _TAVS_RERUN=1 "$_TAVS_TRIGGER" processing
+            fi
+        ) </dev/null >/dev/null 2>&1 &
+        disown 2>/dev/null || true
+        ;;
+    repaint)
+        read_session_state || exit 0
+        if [[ "$SESSION_STATE" == "complete" || "$SESSION_STATE" == "idle" ]] && \
+           [[ -n "$SESSION_TIMER_PID" ]] && kill -0 "$SESSION_TIMER_PID" 2>/dev/null; then
+            exit 0
+        fi
+        repaint_color=""
+        case "$SESSION_STATE" in
+            processing) [[ "$ENABLE_PROCESSING" == "true" ]] && repaint_color="$COLOR_PROCESSING" ;;
+            permission) [[ "$ENABLE_PERMISSION" == "true" ]] && repaint_color="$COLOR_PERMISSION" ;;
+            complete)   [[ "$ENABLE_COMPLETE" == "true" ]] && repaint_color="$COLOR_COMPLETE" ;;
+            idle)       [[ "$ENABLE_IDLE" == "true" ]] && repaint_color="${UNIFIED_STAGE_COLORS[1]}" ;;
+            compacting) [[ "$ENABLE_COMPACTING" == "true" ]] && repaint_color="$COLOR_COMPACTING" ;;
+            subagent)   [[ "$ENABLE_SUBAGENT" == "true" ]] && repaint_color="$COLOR_SUBAGENT" ;;
+            tool_error) [[ "$ENABLE_TOOL_ERROR" == "true" ]] && repaint_color="$COLOR_TOOL_ERROR" ;;
+        esac
+        [[ -z "$repaint_color" ]] && exit 0
+        _emit_state_colors "$SESSION_STATE" "$repaint_color"
+        set_state_background_image "$SESSION_STATE"
+        ;;
+    *)
+        echo "Usage: $0 {permission|idle|complete|processing|compacting|reset|subagent|subagent-stop|tool_error}" >&2
+        exit 1
+        ;;
+esac
+tty_frame_flush "$STATE"
+_phase2_start
+event_dedup_record "$@"
+exit 0
@@ -8,6 +8,11 @@
 # NOTE: Codex CLI has limited hook support (completion event only).
 # ==============================================================================
 
+# Stamp arrival before any other work (out-of-order protection, bash 5+;
+# the core trigger stamps otherwise)
+[[ -z "${TAVS_EVENT_SEQ:-}" && -n "${EPOCHREALTIME:-}" ]] && \
+    export TAVS_EVENT_SEQ="${EPOCHREALTIME/[.,]/}"
+
 SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 
 # Set agent identifier for theme loading
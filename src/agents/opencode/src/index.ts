@@ -29,6 +29,8 @@ import type {
 // Re-export types for consumers
 export * from './types';
 export { SignalBridge, getSignalBridge } from './signal-bridge';
+export { OscEngine } from './osc-engine';
+export type { EmitOutcome } from './osc-engine';
 
 /**
  * Create the OpenCode plugin instance
@@ -0,0 +1,458 @@
+/**
+ * TAVS - In-Process OSC Engine
+ *
+ * Applies simple transitions from inside the plugin process instead of
+ * spawning the bash trigger: one read of the per-TTY state, one write of a
+ * precompiled OSC bundle to the TTY, one state record.
+ *
+ * The engine reads what the shell core already produces and keeps the same
+ * per-TTY files, so bash and in-process signals can interleave freely:
+ * - Config snapshot (src/core/config-snapshot.sh): the `signals` manifest and
+ *   OSC bundles of each variant, read once and cached until recompiled
+ * - `osc.{TTY_SAFE}`: the bundle set (variant, palette or not) the shell last
+ *   used for this TTY
+ * - `state`: the per-TTY state records (session-state.sh)
+ * - `frame.{TTY_SAFE}` and its lock: frame ownership (tty-frame.sh)
+ *
+ * Anything it cannot reproduce exactly falls back to the bash trigger:
+ * states outside IN_PROCESS_STATES, states that also need a title, bell or
+ * image, a stale snapshot, a transition the grace period defers, a busy
+ * frame lock, a terminal that does not accept the write right away, and
+ * sessions with the transition journal enabled.
+ */
+
+import { execFileSync } from 'child_process';
+import * as fs from 'fs';
+import * as path from 'path';
+import { performance } from 'perf_hooks';
+
+/**
+ * States applied in-process
+ *
+ * complete, idle and reset stay in bash: they start or stop the idle timer
+ * worker, assign identity icons and probe the terminal.
+ */
+const IN_PROCESS_STATES = new Set<string>(['processing']);
+
+/** State priorities (session-state.sh get_state_priority) */
+const STATE_PRIORITY: Record<string, number> = {
+  permission: 100,
+  compacting: 50,
+  tool_error: 35,
+  processing: 30,
+  subagent: 25,
+  complete: 20,
+  idle: 15,
+  reset: 10
+};
+
+/** States a current state holds off during the grace period (_state_protected_by) */
+const PROTECTED_BY: Record<string, string[]> = {
+  permission: ['compacting', 'tool_error', 'processing', 'subagent', 'complete', 'idle'],
+  compacting: ['tool_error', 'processing', 'subagent', 'complete', 'idle'],
+  tool_error: ['processing', 'subagent', 'complete', 'idle'],
+  processing: ['subagent', 'complete', 'idle'],
+  subagent: ['complete', 'idle'],
+  complete: ['idle']
+};
+
+/** Event stamps further apart are not compared (_STATE_SEQ_MAX_SKEW_US) */
+const MAX_SKEW_US = 60000000;
+
+/**
+ * Outcome of an in-process emit
+ *
+ * - applied: colors written and state recorded
+ * - stale: a newer event already owns the tab (nothing to do)
+ * - fallback: the bash trigger must handle this signal
+ */
+export type EmitOutcome = 'applied' | 'stale' | 'fallback';
+
+/** One variant's compiled manifest and the bundles read from it */
+interface Manifest {
+  stampMtime: number;
+  values: Map<string, string>;
+  sources: string[];
+  bundles: Map<string, Buffer>;
+}
+
+/** A state record from the shared state file */
+interface SessionRecord {
+  state: string;
+  time: number;
+  timerPid: number;
+  seq: number;
+}
+
+/**
+ * Read a key=value file into a map (repeated keys are kept in `repeated`)
+ */
+function readKeyValues(file: string, repeated?: string[]): Map<string, string> | null {
+  let text: string;
+  try {
+    text = fs.readFileSync(file, 'utf8');
+  } catch {
+    return null;
+  }
+  const values = new Map<string, string>();
+  for (const line of text.split('\n')) {
+    const eq = line.indexOf('=');
+    if (eq <= 0 || line.startsWith('#')) {
+      continue;
+    }
+    const key = line.slice(0, eq);
+    const value = line.slice(eq + 1);
+    if (repeated && key === 'source') {
+      repeated.push(value);
+    } else {
+      values.set(key, value);
+    }
+  }
+  return values;
+}
+
+/**
+ * Resolve the controlling TTY like terminal-osc-sequences.sh resolve_tty
+ *
+ * The bash trigger asks `ps` for the TTY of its parent, which is this
+ * process, so both resolve the same device.
+ */
+function resolveTty(): string | null {
+  if (process.env.TTY_DEVICE) {
+    return process.env.TTY_DEVICE;
+  }
+  let tty = '';
+  try {
+    tty = execFileSync('ps', ['-o', 'tty=', '-p', String(process.pid)], {
+      encoding: 'utf8',
+      stdio: ['ignore', 'pipe', 'ignore'],
+      timeout: 2000
+    }).replace(/\s/g, '');
+  } catch {
+    tty = '';
+  }
+  if (tty && tty !== '??' && tty !== '-') {
+    if (!tty.startsWith('/dev/')) {
+      tty = `/dev/${tty}`;
+    }
+    try {
+      fs.accessSync(tty, fs.constants.W_OK);
+      return tty;
+    } catch {
+      // Fall through to /dev/tty
+    }
+  }
+  try {
+    fs.accessSync('/dev/tty', fs.constants.W_OK);
+    return '/dev/tty';
+  } catch {
+    return null;
+  }
+}
+
+/**
+ * Check if a process is alive (kill -0)
+ */
+function isAlive(pid: number): boolean {
+  try {
+    process.kill(pid, 0);
+    return true;
+  } catch {
+    return false;
+  }
+}
+
+/**
+ * OscEngine class
+ *
+ * Applies in-process states for one TTY; see the module comment for what
+ * falls back to bash.
+ */
+export class OscEngine {
+  private ttyDevice: string | null | undefined;
+  private tmpDir: string;
+  private manifests = new Map<string, Manifest>();
+
+  constructor(ttyDevice?: string) {
+    this.ttyDevice = ttyDevice;
+    this.tmpDir = process.env.TAVS_TMP_DIR || '/tmp/tavs';
+  }
+
+  /**
+   * Apply a state in-process
+   *
+   * @param state - Signal state
+   * @param seq - Event arrival stamp (TAVS_EVENT_SEQ, microseconds)
+   * @returns 'fallback' if the bash trigger must run instead
+   */
+  emit(state: string, seq: string): EmitOutcome {
+    const start = performance.now();
+    if (!IN_PROCESS_STATES.has(state)) {
+      return 'fallback';
+    }
+
+    if (this.ttyDevice === undefined) {
+      this.ttyDevice = resolveTty();
+    }
+    const tty = this.ttyDevice;
+    if (!tty) {
+      return 'fallback';
+    }
+    const ttySafe = tty.replace(/\//g, '_');
+
+    // Bundle set the shell last used for this TTY
+    const record = readKeyValues(path.join(this.tmpDir, `osc.${ttySafe}`));
+    const dir = record?.get('dir');
+    const kind = record?.get('kind');
+    if (!dir || (kind !== 'bg' && kind !== 'pal')) {
+      return 'fallback';
+    }
+    const manifest = this.loadManifest(dir);
+    if (!manifest || manifest.values.get('journal') === 'true') {
+      return 'fallback';
+    }
+    const hex = manifest.values.get(state);
+    if (!hex || hex === '-') {
+      return 'fallback';
+    }
+    const bundle = this.loadBundle(manifest, path.join(dir, `${state}-${hex}.${kind}`));
+    if (!bundle) {
+      return 'fallback';
+    }
+
+    // A terminal in write backoff is the shell's to handle (tty-frame.sh)
+    const frameOwner = path.join(this.tmpDir, `frame.${ttySafe}`);
+    if (fs.existsSync(`${frameOwner}.drops`)) {
+      return 'fallback';
+    }
+
+    const eventSeq = /^[0-9]+$/.test(seq) ? Number(seq) : 0;
+    const current = this.readSessionState(ttySafe);
+    if (current && eventSeq > 0) {
+      const ahead = current.seq - eventSeq;
+      if (ahead > 0 && ahead < MAX_SKEW_US) {
+        this.recordMetrics(manifest, dir, state, 'stale', start);
+        return 'stale';
+      }
+    }
+
+    // Protected transitions inside the grace period are deferred by bash
+    if (current && (PROTECTED_BY[current.state] || []).includes(state)) {
+      const graceMs = Number(manifest.values.get('grace_ms') || '400');
+      if (Date.now() - current.time < graceMs) {
+        return 'fallback';
+      }
+    }
+
+    const lock = `${frameOwner}.lock`;
+    try {
+      fs.mkdirSync(lock);
+    } catch {
+      return 'fallback';
+    }
+    let outcome: EmitOutcome = 'applied';
+    try {
+      const owner = readKeyValues(frameOwner);
+      const ownerSeq = Number(owner?.get('seq') || '0');
+      const ahead = ownerSeq - eventSeq;
+      if (eventSeq > 0 && ahead > 0 && ahead < MAX_SKEW_US) {
+        outcome = 'stale';
+      } else {
+        fs.writeFileSync(frameOwner, `state=${state}\nseq=${seq}\npid=${process.pid}\n`);
+        if (this.writeTty(tty, bundle)) {
+          this.stopWorkers(ttySafe, current);
+          this.writeSessionState(ttySafe, state, seq);
+        } else {
+          outcome = 'fallback';
+        }
+      }
+    } catch {
+      outcome = 'fallback';
+    } finally {
+      try {
+        fs.rmdirSync(lock);
+      } catch {
+        // Already taken over as stale
+      }
+    }
+
+    if (outcome !== 'fallback') {
+      this.recordMetrics(manifest, dir, state, outcome, start);
+    }
+    return outcome;
+  }
+
+  /**
+   * Load a variant's manifest (cached until the agent is recompiled)
+   *
+   * Returns null while any config source is newer than the compile stamp;
+   * the next bash trigger schedules the recompile.
+   */
+  private loadManifest(dir: string): Manifest | null {
+    let stampMtime: number;
+    try {
+      stampMtime = fs.statSync(path.join(path.dirname(dir), 'stamp')).mtimeMs;
+    } catch {
+      return null;
+    }
+
+    let manifest = this.manifests.get(dir);
+    if (!manifest || manifest.stampMtime !== stampMtime) {
+      const sources: string[] = [];
+      const values = readKeyValues(path.join(dir, 'signals'), sources);
+      if (!values) {
+        return null;
+      }
+      manifest = { stampMtime, values, sources, bundles: new Map() };
+      this.manifests.set(dir, manifest);
+    }
+
+    for (const source of manifest.sources) {
+      try {
+        if (fs.statSync(source).mtimeMs > stampMtime) {
+          return null;
+        }
+      } catch {
+        // Missing sources do not make the snapshot stale
+      }
+    }
+    return manifest;
+  }
+
+  /**
+   * Read a bundle once per compile
+   */
+  private loadBundle(manifest: Manifest, file: string): Buffer | null {
+    let bundle = manifest.bundles.get(file);
+    if (!bundle) {
+      try {
+        bundle = fs.readFileSync(file);
+      } catch {
+        return null;
+      }
+      if (bundle.length === 0) {
+        return null;
+      }
+      manifest.bundles.set(file, bundle);
+    }
+    return bundle;
+  }
+
+  /**
+   * Write one frame to the TTY without blocking
+   *
+   * A suspended terminal makes a blocking write hang the plugin; with
+   * O_NONBLOCK a full buffer fails right away and bash takes over with its
+   * bounded write and backoff.
+   */
+  private writeTty(tty: string, data: Buffer): boolean {
+    let fd: number;
+    try {
+      fd = fs.openSync(tty, fs.constants.O_WRONLY | fs.constants.O_NONBLOCK | fs.constants.O_APPEND);
+    } catch {
+      return false;
+    }
+    try {
+      return fs.writeSync(fd, data) === data.length;
+    } catch {
+      return false;
+    } finally {
+      fs.closeSync(fd);
+    }
+  }
+
+  /**
+   * Read this TTY's record from the shared state file (last line wins)
+   *
+   * Line format: TTY_SAFE state priority time_ms timer_pid|- event_seq
+   */
+  private readSessionState(ttySafe: string): SessionRecord | null {
+    let text: string;
+    try {
+      text = fs.readFileSync(path.join(this.tmpDir, 'state'), 'utf8');
+    } catch {
+      return null;
+    }
+    let found: SessionRecord | null = null;
+    for (const line of text.split('\n')) {
+      const fields = line.split(' ');
+      if (fields[0] !== ttySafe || fields.length < 4) {
+        continue;
+      }
+      found = {
+        state: fields[1],
+        time: Number(fields[3]) || 0,
+        timerPid: /^[0-9]+$/.test(fields[4] || '') ? Number(fields[4]) : 0,
+        seq: Number(fields[5] || '0') || 0
+      };
+    }
+    return found;
+  }
+
+  /**
+   * Replace this TTY's state record (write + rename, like write_session_state)
+   */
+  private writeSessionState(ttySafe: string, state: string, seq: string): void {
+    const stateDb = path.join(this.tmpDir, 'state');
+    let lines: string[] = [];
+    try {
+      lines = fs.readFileSync(stateDb, 'utf8').split('\n')
+        .filter((line) => line !== '' && !line.startsWith(`${ttySafe} `));
+    } catch {
+      lines = [];
+    }
+    lines.push(`${ttySafe} ${state} ${STATE_PRIORITY[state] ?? 0} ${Date.now()} - ${seq || '0'}`);
+    const tmpFile = `${stateDb}.tmp.${process.pid}`;
+    fs.writeFileSync(tmpFile, `${lines.join('\n')}\n`);
+    fs.renameSync(tmpFile, stateDb);
+  }
+
+  /**
+   * Stop the idle timer and a pending phase 2 worker for this TTY
+   *
+   * Mirrors kill_idle_timer and the "latest wins" rule of _phase2_start.
+   */
+  private stopWorkers(ttySafe: string, current: SessionRecord | null): void {
+    if (current && current.timerPid > 0 && isAlive(current.timerPid)) {
+      try {
+        process.kill(current.timerPid);
+      } catch {
+        // Already gone
+      }
+    }
+    // The killed worker cannot remove its PID file; remove it here so a
+    // later signal never kills a reused PID
+    const pidFile = path.join(this.tmpDir, `phase2.${ttySafe}`);
+    let pid = 0;
+    try {
+      pid = Number(fs.readFileSync(pidFile, 'utf8').trim());
+      fs.unlinkSync(pidFile);
+    } catch {
+      return;  // No pending worker
+    }
+    if (pid > 0 && isAlive(pid)) {
+      try {
+        process.kill(pid);
+      } catch {
+        // Already gone
+      }
+    }
+  }
+
+  /**
+   * Append a trigger line to the pending metrics (metrics.sh format)
+   */
+  private recordMetrics(manifest: Manifest, dir: string, state: string,
+                        outcome: EmitOutcome, start: number): void {
+    if (manifest.values.get('metrics') !== 'true') {
+      return;
+    }
+    const agent = path.basename(path.dirname(dir));
+    const us = Math.round((performance.now() - start) * 1000);
+    try {
+      fs.appendFileSync(path.join(this.tmpDir, 'metrics.log'), `t ${state} ${agent} ${outcome} ${us}\n`);
+    } catch {
+      // Metrics are best effort
+    }
+  }
+}
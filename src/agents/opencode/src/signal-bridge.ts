@@ -2,14 +2,27 @@
  * TAVS - Signal Bridge
  *
  * Bridge module that connects the OpenCode plugin to the core trigger system.
- * Executes the shared trigger.sh script to send OSC escape sequences.
+ * Simple transitions are applied in-process from the compiled config snapshot
+ * (osc-engine.ts); everything else executes the shared trigger.sh script.
  */
 
 import { execSync, spawn } from 'child_process';
 import * as path from 'path';
 import * as fs from 'fs';
+import { performance } from 'perf_hooks';
+import { OscEngine } from './osc-engine';
 import type { SignalState, PluginConfig } from './types';
 
+/**
+ * Event arrival stamp in microseconds since the epoch (TAVS_EVENT_SEQ).
+ *
+ * Triggers run detached, so a slow one can finish after a later one; the
+ * core trigger refuses events older than the state already applied.
+ */
+function eventSeq(): string {
+  return String(Math.round((performance.timeOrigin + performance.now()) * 1000));
+}
+
 /**
  * Find the core trigger script location
  *
@@ -58,6 +71,7 @@ function findTriggerScript(configPath?: string): string | null {
  */
 export class SignalBridge {
   private triggerScript: string | null = null;
+  private engine: OscEngine | null = null;
   private config: PluginConfig;
   private idleTimer: NodeJS.Timeout | null = null;
   private lastState: SignalState | null = null;
@@ -67,10 +81,14 @@ export class SignalBridge {
       enabled: true,
       idleTimeout: 30000,
       debug: false,
+      inProcess: true,
       ...config
     };
 
     this.triggerScript = findTriggerScript(config.triggerScript);
+    if (this.config.inProcess) {
+      this.engine = new OscEngine();
+    }
 
     if (this.config.debug) {
       if (this.triggerScript) {
@@ -105,9 +123,15 @@ export class SignalBridge {
       console.log(`[tavs] Sending signal: ${state}`);
     }
 
+    const seq = eventSeq();
+    if (this.emitInProcess(state, seq)) {
+      return;
+    }
+
     try {
       // Use spawn for async execution (non-blocking)
       const child = spawn('bash', [this.triggerScript, state], {
+        env: { ...process.env, TAVS_EVENT_SEQ: seq },
         stdio: 'ignore',
         detached: true,
         timeout: 5000
@@ -131,8 +155,14 @@ export class SignalBridge {
       return;
     }
 
+    const seq = eventSeq();
+    if (this.emitInProcess(state, seq)) {
+      return;
+    }
+
     try {
       execSync(`bash "${this.triggerScript}" ${state}`, {
+        env: { ...process.env, TAVS_EVENT_SEQ: seq },
         stdio: 'ignore',
         timeout: 5000
       });
@@ -144,6 +174,29 @@ export class SignalBridge {
     }
   }
 
+  /**
+   * Apply a signal with the in-process engine
+   *
+   * Returns false if the trigger script must run instead.
+   */
+  private emitInProcess(state: SignalState, seq: string): boolean {
+    if (!this.engine) {
+      return false;
+    }
+    try {
+      const outcome = this.engine.emit(state, seq);
+      if (this.config.debug && outcome !== 'fallback') {
+        console.log(`[tavs] In-process signal: ${state} (${outcome})`);
+      }
+      return outcome !== 'fallback';
+    } catch (error) {
+      if (this.config.debug) {
+        console.error(`[tavs] In-process signal failed, using trigger script:`, error);
+      }
+      return false;
+    }
+  }
+
   /**
    * Start the idle timer
    *
@@ -59,6 +59,8 @@ export interface PluginConfig {
   idleTimeout?: number;
   /** Enable debug logging */
   debug?: boolean;
+  /** Apply simple signals in-process from the config snapshot (default: true) */
+  inProcess?: boolean;
 }
 
 /**
@@ -0,0 +1,268 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS CLI — backgrounds command
+# ==============================================================================
+# Usage: tavs backgrounds [build|clean|--help]
+#
+# Pre-renders the background images of every agent × mode × state into a
+# content-addressed cache: one variant per configured terminal size (and tint),
+# so iTerm2/Kitty get an image that already has the right pixel size instead of
+# decoding and scaling large art on every state change. set_state_background_image
+# then picks the closest variant from the cache manifest.
+# ==============================================================================
+
+source "$CLI_DIR/cli-utils.sh"
+
+# Agents whose images are pre-rendered (matches config-snapshot.sh)
+_BACKGROUNDS_BUILD_AGENTS=(claude gemini codex opencode unknown)
+
+# Find the local image tool (ImageMagick 7, then 6)
+_backgrounds_image_tool() {
+    if command -v magick &>/dev/null; then
+        echo "magick"
+    elif command -v convert &>/dev/null; then
+        echo "convert"
+    else
+        return 1
+    fi
+}
+
+# Content hash of a file (first 16 hex chars of SHA-256)
+_backgrounds_hash() {
+    local sum
+    if command -v sha256sum &>/dev/null; then
+        sum=$(sha256sum "$1" 2>/dev/null)
+    else
+        sum=$(shasum -a 256 "$1" 2>/dev/null)
+    fi
+    sum="${sum%% *}"
+    [[ -n "$sum" ]] || return 1
+    echo "${sum:0:16}"
+}
+
+# Ask the terminal for its text area size in pixels (XTWINOPS 14)
+# Prints WxH, or nothing when not run in a terminal that answers.
+_backgrounds_terminal_geometry() {
+    [[ -t 0 && -t 1 ]] || return 0
+    local old_stty reply=""
+    old_stty=$(stty -g 2>/dev/null) || return 0
+    stty raw -echo min 0 time 0 2>/dev/null
+    printf '\033[14t' > /dev/tty
+    IFS= read -r -s -t 1 -d 't' reply < /dev/tty 2>/dev/null || true
+    stty "$old_stty" 2>/dev/null
+
+    # Reply: ESC [ 4 ; height ; width t
+    reply="${reply#*[}"
+    if [[ "$reply" =~ ^4\;([0-9]+)\;([0-9]+)$ ]]; then
+        echo "${BASH_REMATCH[2]}x${BASH_REMATCH[1]}"
+    fi
+}
+
+# Print every distinct image the fallback chain resolves to (one per line)
+_backgrounds_sources() {
+    (
+        # Core modules are not written for `set -euo pipefail`
+        set +euo pipefail
+        source "$TAVS_ROOT/src/core/theme-config-loader.sh"
+        source "$TAVS_ROOT/src/core/backgrounds.sh"
+        local agent mode_dir name
+        for agent in "${_BACKGROUNDS_BUILD_AGENTS[@]}"; do
+            load_agent_config "$agent"
+            TAVS_AGENT="$agent"
+            for mode_dir in dark light; do
+                for name in "${_BACKGROUND_INDEX_STATES[@]}"; do
+                    _resolve_background_image "$mode_dir" "${name}.png"
+                    [[ -n "$_BG_IMAGE_PATH" ]] && echo "$_BG_IMAGE_PATH"
+                done
+            done
+        done
+    ) | sort -u
+}
+
+# Render one variant (fill + center-crop to the exact size, optional tint)
+# Args: tool source output WxH tint
+_backgrounds_render() {
+    local tool="$1" src="$2" out="$3" size="$4" tint="$5"
+    local args=("$src" -resize "${size}^" -gravity center -extent "$size")
+
+    # Tint blends toward the mode's base (white for light art, black otherwise)
+    if [[ -n "$tint" && "$tint" != "0" ]]; then
+        local fill="black" pct
+        [[ "$src" == */light/* ]] && fill="white"
+        pct=$(awk -v t="$tint" 'BEGIN { printf "%d", t * 100 }')
+        args+=(-fill "$fill" -colorize "${pct}%")
+    fi
+
+    "$tool" "${args[@]}" -strip "${out}.tmp.$$.png" 2>/dev/null && \
+        mv "${out}.tmp.$$.png" "$out"
+}
+
+# Build all variants and write the manifest
+# Args: [--sizes "WxH ..."] [--jobs N]
+_backgrounds_build() {
+    local sizes="" jobs=""
+    while [[ $# -gt 0 ]]; do
+        case "$1" in
+            --sizes) sizes="${2:-}"; shift 2 ;;
+            --jobs)  jobs="${2:-}"; shift 2 ;;
+            *) cli_error "Unknown option: $1"; return 1 ;;
+        esac
+    done
+
+    # Config chain (defaults + user) for sizes, tint and cache location
+    source "$TAVS_ROOT/src/config/defaults.conf" 2>/dev/null || true
+    load_user_config 2>/dev/null || true
+    sizes="${sizes:-${STYLISH_PRERENDER_SIZES:-1920x1080 2560x1440 3840x2160}}"
+    sizes="${sizes//,/ }"
+    local tint="${STYLISH_PRERENDER_TINT:-0}"
+    if [[ -z "$jobs" ]]; then
+        jobs=$(getconf _NPROCESSORS_ONLN 2>/dev/null || echo 2)
+    fi
+    [[ "$jobs" =~ ^[1-9][0-9]*$ ]] || jobs=2
+
+    local size
+    for size in $sizes; do
+        if [[ ! "$size" =~ ^[1-9][0-9]*x[1-9][0-9]*$ ]]; then
+            cli_error "Invalid size: $size (expected WIDTHxHEIGHT)"
+            return 1
+        fi
+    done
+
+    local tool
+    if ! tool=$(_backgrounds_image_tool); then
+        cli_error "ImageMagick not found (need 'magick' or 'convert')"
+        cli_info "Install it with: brew install imagemagick  |  apt install imagemagick"
+        return 1
+    fi
+
+    local cache_dir="${TAVS_PRERENDER_DIR:-${XDG_CACHE_HOME:-$HOME/.cache}/tavs/backgrounds}"
+    mkdir -p "$cache_dir" && chmod 700 "$cache_dir" 2>/dev/null || true
+
+    local sources=() src
+    while IFS= read -r src; do
+        [[ -n "$src" ]] && sources+=("$src")
+    done < <(_backgrounds_sources)
+    if [[ ${#sources[@]} -eq 0 ]]; then
+        cli_warn "No background images found for any agent"
+        return 0
+    fi
+
+    local target
+    target=$(_backgrounds_terminal_geometry)
+
+    cli_bold "Pre-rendering ${#sources[@]} image(s) × $(echo $sizes | wc -w | tr -d ' ') size(s) with $tool ($jobs jobs)"
+
+    # Content-addressed variants: identical art shares one set of files
+    local manifest_tmp="$cache_dir/manifest.tmp.$$"
+    local hash out entries running=0 rendered=0 cached=0
+    local tint_tag=""
+    [[ -n "$tint" && "$tint" != "0" ]] && tint_tag="-t${tint}"
+    {
+        [[ -n "$target" ]] && echo "target=$target"
+        for src in "${sources[@]}"; do
+            hash=$(_backgrounds_hash "$src") || continue
+            entries=""
+            for size in $sizes; do
+                out="$cache_dir/${hash}-${size}${tint_tag}.png"
+                entries+="${entries:+|}${size}:${out}"
+                if [[ -f "$out" ]]; then
+                    cached=$((cached + 1))
+                    continue
+                fi
+                _backgrounds_render "$tool" "$src" "$out" "$size" "$tint" &
+                rendered=$((rendered + 1))
+                running=$((running + 1))
+                if [[ $running -ge $jobs ]]; then
+                    wait
+                    running=0
+                fi
+            done
+            echo "${src}=${entries}"
+        done
+        wait
+    } > "$manifest_tmp"
+
+    # Only list variants that were actually written
+    local key value entry kept
+    {
+        while IFS='=' read -r key value; do
+            if [[ "$key" == "target" ]]; then
+                echo "target=$value"
+                continue
+            fi
+            kept=""
+            while IFS= read -r -d '|' entry; do
+                if [[ -f "${entry#*:}" ]]; then
+                    kept+="${kept:+|}${entry}"
+                fi
+            done <<< "${value}|"
+            if [[ -n "$kept" ]]; then
+                echo "${key}=${kept}"
+            fi
+        done < "$manifest_tmp"
+    } > "$cache_dir/manifest.tmp2.$$"
+    rm -f "$manifest_tmp"
+    mv "$cache_dir/manifest.tmp2.$$" "$cache_dir/manifest"
+
+    cli_success "Rendered $rendered variant(s), $cached already cached"
+    if [[ -n "$target" ]]; then
+        cli_info "Terminal size: $target (override with STYLISH_PRERENDER_TARGET)"
+    fi
+    cli_info "Cache: $cache_dir"
+}
+
+# Remove the pre-rendered cache (hooks fall back to the original images)
+_backgrounds_clean() {
+    source "$TAVS_ROOT/src/config/defaults.conf" 2>/dev/null || true
+    load_user_config 2>/dev/null || true
+    local cache_dir="${TAVS_PRERENDER_DIR:-${XDG_CACHE_HOME:-$HOME/.cache}/tavs/backgrounds}"
+    rm -rf "$cache_dir"
+    cli_success "Removed $cache_dir"
+}
+
+cmd_backgrounds() {
+    # Handle --help
+    if [[ "${1:-}" == "--help" || "${1:-}" == "-h" || -z "${1:-}" ]]; then
+        cat <<'EOF'
+tavs backgrounds — Pre-render background images for faster switches
+
+Usage:
+  tavs backgrounds build [--sizes "WxH ..."] [--jobs N]
+  tavs backgrounds clean
+
+Build:
+  Resolves the background image of every agent × mode × state and renders
+  one variant per size (STYLISH_PRERENDER_SIZES, default 1920x1080 2560x1440
+  3840x2160) with ImageMagick, in parallel. Variants are stored by content
+  hash, so rebuilding only renders new or changed art.
+
+  Hooks then send the variant closest to the terminal size (measured during
+  the build, or STYLISH_PRERENDER_TARGET) instead of the original file.
+  STYLISH_PRERENDER_TINT (0-1) blends variants toward black (white for
+  light-mode art).
+
+Clean:
+  Delete the cache; hooks fall back to the original images.
+
+Examples:
+  tavs backgrounds build
+  tavs backgrounds build --sizes "3024x1964" --jobs 4
+EOF
+        return 0
+    fi
+
+    case "$1" in
+        build)
+            shift
+            _backgrounds_build "$@"
+            ;;
+        clean)
+            _backgrounds_clean
+            ;;
+        *)
+            cli_error "Unknown action: $1"
+            cli_info "Run 'tavs backgrounds --help' for usage."
+            return 1
+            ;;
+    esac
+}
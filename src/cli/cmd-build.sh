@@ -0,0 +1,269 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS CLI — build command
+# ==============================================================================
+# Usage: tavs build [--check|--help]
+#
+# Concatenates an agent's trigger and every core module it sources at startup
+# into one comment-stripped file, src/agents/{agent}/trigger.bundle.sh, which
+# the hook configs point at. A hook then opens and parses one file instead of
+# ~20, runs in one process instead of agent trigger + core trigger, and
+# resolves its directory once with a string operation instead of a
+# `cd "$(dirname …)" && pwd` subshell per module.
+#
+# The modular sources stay the development copy; rebuild after changing them.
+# Modules loaded lazily at runtime (identity registry, iTerm2 title queries,
+# system mode watcher) are still sourced from src/core.
+#
+# Re-runs the trigger starts itself (deferred events, tool_error return,
+# repaint) go through $_TAVS_TRIGGER, which a bundle sets to its own path, with
+# _TAVS_RERUN=1 so the agent's stdin/payload prologue is skipped.
+#
+# The committed bundles are what Claude Code plugin installs run (no build
+# step there). `tavs sync` and `tavs install` build into their destination
+# instead of the source tree, so a read-only checkout still installs.
+# ==============================================================================
+
+source "$CLI_DIR/cli-utils.sh"
+
+# Agents with hook configs that run trigger.sh
+_BUILD_AGENTS=(claude gemini codex)
+
+# Top-level `source "$DIR/module.sh"` lines (DIR = any module dir variable)
+_BUILD_SOURCE_RE='^source "\$\{?(CORE_DIR|_THEME_SCRIPT_DIR|TERMINAL_SH_DIR|_TITLE_SCRIPT_DIR)\}?/([A-Za-z0-9_-]+\.sh)"'
+# Guarded include of a shared helper module (util.sh, tty-frame.sh)
+_BUILD_GUARD_RE='^\[\[ -n "\$\{_TAVS_[A-Z_]+_LOADED:-\}" \]\] \|\| source "[^"]*/([A-Za-z0-9_-]+\.sh)"'
+# Agent trigger delegating to the core trigger
+_BUILD_DELEGATE_RE='^(exec )?"\$SCRIPT_DIR/\.\./\.\./core/trigger\.sh" "\$@"'
+
+# Rewrite a module's own path lookups to the bundle's constants
+# Usage: _build_rewrite_line line dir_expr file_expr   → sets _BUILD_LINE
+_build_rewrite_line() {
+    local line="$1" dir="$2" file="$3"
+    local lookup_re='"\$\( cd "\$\( dirname "[^"]*" \)" && pwd \)"'
+    if [[ "$line" =~ $lookup_re ]]; then
+        line="${line/"${BASH_REMATCH[0]}"/\"$dir\"}"
+    fi
+    line="${line//'${BASH_SOURCE[0]%/*}'/$dir}"
+    line="${line//'${BASH_SOURCE[0]:-$0}'/$file}"
+    line="${line//'${BASH_SOURCE[0]:-}'/$file}"
+    line="${line//'${BASH_SOURCE[0]}'/$file}"
+    _BUILD_LINE="$line"
+}
+
+# Emit a core module, inlining the modules it sources at top level (once each)
+# Usage: _build_emit_module name.sh
+_build_emit_module() {
+    local name="$1" line
+    case " $_BUILD_INCLUDED " in
+        *" $name "*) return 0 ;;
+    esac
+    _BUILD_INCLUDED+=" $name"
+
+    while IFS= read -r line || [[ -n "$line" ]]; do
+        if [[ "$line" =~ $_BUILD_SOURCE_RE ]]; then
+            _build_emit_module "${BASH_REMATCH[2]}"
+        elif [[ "$line" =~ $_BUILD_GUARD_RE ]]; then
+            _build_emit_module "${BASH_REMATCH[1]}"
+        else
+            _build_rewrite_line "$line" '$CORE_DIR' "\$CORE_DIR/$name"
+            printf '%s\n' "$_BUILD_LINE"
+        fi
+    done < "$TAVS_ROOT/src/core/$name"
+}
+
+# Emit an agent trigger with the core trigger inlined at its delegation point
+# The agent prologue (stdin payload, agent name) is skipped on re-runs.
+# Usage: _build_emit_agent agent
+_build_emit_agent() {
+    local agent="$1" line first=true
+    _BUILD_INCLUDED=""
+    while IFS= read -r line || [[ -n "$line" ]]; do
+        if [[ "$first" == "true" ]]; then
+            first=false
+            printf '%s\n' "$line"
+            echo 'if [[ -z "${_TAVS_RERUN:-}" ]]; then'
+        elif [[ "$line" =~ $_BUILD_DELEGATE_RE ]]; then
+            echo 'fi'
+            _build_emit_module "trigger.sh"
+        else
+            _build_rewrite_line "$line" '$_TAVS_BUNDLE_DIR' '$_TAVS_BUNDLE_DIR/trigger.sh'
+            printf '%s\n' "$_BUILD_LINE"
+        fi
+    done < "$TAVS_ROOT/src/agents/$agent/trigger.sh"
+}
+
+# Drop comment lines, trailing comments and blank lines outside of strings
+# and heredocs (quote state is tracked across lines)
+_build_strip_comments() {
+    awk '
+    function scan(line,    n, i, c, p, rest) {
+        n = length(line)
+        for (i = 1; i <= n; i++) {
+            c = substr(line, i, 1)
+            if (sq) {
+                if (ansi && c == "\\") { i++; continue }
+                if (c == "\047") { sq = 0; ansi = 0 }
+                continue
+            }
+            if (c == "\\") { i++; continue }
+            if (dq) {
+                if (c == "\"") dq = 0
+                continue
+            }
+            p = (i > 1) ? substr(line, i - 1, 1) : " "
+            if (c == "\047") { sq = 1; ansi = (p == "$"); continue }
+            if (c == "\"") { dq = 1; continue }
+            if (c == "#" && p ~ /[ \t;&|()]/) {
+                kept = substr(line, 1, i - 1)
+                sub(/[ \t]+$/, "", kept)
+                return
+            }
+            if (c == "<" && substr(line, i, 3) != "<<<" && substr(line, i, 2) == "<<") {
+                rest = substr(line, i + 2)
+                if (match(rest, /^-?[ \t]*["\047]?[A-Za-z_][A-Za-z0-9_]*/)) {
+                    heredoc = substr(rest, 1, RLENGTH)
+                    gsub(/^-?[ \t]*["\047]?/, "", heredoc)
+                }
+                i++
+            }
+        }
+        kept = line
+    }
+    NR == 1 && /^#!/ { print; next }
+    heredoc != "" {
+        print
+        if ($0 ~ ("^[ \t]*" heredoc "$")) heredoc = ""
+        next
+    }
+    {
+        if (!sq && !dq && ($0 ~ /^[ \t]*#/ || $0 ~ /^[ \t]*$/)) next
+        in_string = sq || dq
+        scan($0)
+        if (in_string || kept != "") print kept
+    }
+    '
+}
+
+# Write one agent bundle
+# Without a root the bundle finds its agent directory at runtime (it sits in
+# src/agents/{agent}); with one, that directory and the bundle's own path are
+# baked in, for bundles installed outside a TAVS tree.
+# Usage: _build_bundle agent output_file [tavs_root installed_path]
+_build_bundle() {
+    local agent="$1" out="$2" root="${3:-}" target="${4:-$2}"
+    {
+        echo '#!/bin/bash'
+        echo "# Generated by 'tavs build' from src/agents/$agent/trigger.sh and src/core/*.sh."
+        echo "# Do not edit: change the sources and rebuild."
+        if [[ -n "$root" ]]; then
+            printf '_TAVS_BUNDLE_DIR=%q\n' "$root/src/agents/$agent"
+            printf '_TAVS_TRIGGER=%q\n' "$target"
+        else
+            echo '_TAVS_BUNDLE_DIR="${BASH_SOURCE[0]%/*}"'
+            echo '[[ "$_TAVS_BUNDLE_DIR" == "${BASH_SOURCE[0]}" ]] && _TAVS_BUNDLE_DIR="."'
+            echo '_TAVS_TRIGGER="$_TAVS_BUNDLE_DIR/trigger.bundle.sh"'
+        fi
+        echo 'CORE_DIR="$_TAVS_BUNDLE_DIR/../../core"'
+        _build_emit_agent "$agent" | _build_strip_comments | sed 1d
+    } > "$out"
+    chmod +x "$out"
+}
+
+# Build agent bundles (every agent unless some are named)
+# Usage: build_trigger_bundles [--check] [--quiet] [--out dir [--root]] [agent...]
+#   --check: only compare with the files on disk, return 1 if any is stale
+#   --out:   write dir/{agent}/trigger.bundle.sh instead of src/agents
+#   --root:  bake this tree's paths into bundles written with --out
+build_trigger_bundles() {
+    local check=false quiet=false out_dir="" root="" agents=()
+    while [[ $# -gt 0 ]]; do
+        case "$1" in
+            --check) check=true ;;
+            --quiet) quiet=true ;;
+            --out) out_dir="$2"; shift ;;
+            --root) root="$TAVS_ROOT" ;;
+            *) agents+=("$1") ;;
+        esac
+        shift
+    done
+    [[ ${#agents[@]} -eq 0 ]] && agents=("${_BUILD_AGENTS[@]}")
+
+    local agent out tmp stale=0
+    for agent in "${agents[@]}"; do
+        out="$TAVS_ROOT/src/agents/$agent/trigger.bundle.sh"
+        if [[ -n "$out_dir" ]]; then
+            out="$out_dir/$agent/trigger.bundle.sh"
+            mkdir -p "${out%/*}" 2>/dev/null || {
+                cli_error "Cannot create ${out%/*}"
+                return 1
+            }
+        fi
+        tmp="${out}.tmp.$$"
+        _build_bundle "$agent" "$tmp" "$root" "$out" 2>/dev/null || {
+            rm -f "$tmp"
+            cli_error "Cannot write ${out%/*}"
+            return 1
+        }
+        if ! bash -n "$tmp" 2>/dev/null; then
+            rm -f "$tmp"
+            cli_error "Bundle for $agent does not parse (bash -n)"
+            return 1
+        fi
+
+        if [[ "$check" == "true" ]]; then
+            if ! cmp -s "$tmp" "$out"; then
+                stale=$((stale + 1))
+                cli_warn "Stale: ${out#"$TAVS_ROOT"/}"
+            fi
+            rm -f "$tmp"
+        else
+            mv -f "$tmp" "$out" || { rm -f "$tmp"; return 1; }
+            if [[ "$quiet" != "true" ]]; then
+                cli_success "${out#"$TAVS_ROOT"/} ($(wc -l < "$out" | tr -d ' ') lines)"
+            fi
+        fi
+    done
+
+    if [[ $stale -gt 0 ]]; then
+        cli_info "Run 'tavs build' to regenerate."
+        return 1
+    fi
+    return 0
+}
+
+cmd_build() {
+    # Handle --help
+    if [[ "${1:-}" == "--help" || "${1:-}" == "-h" ]]; then
+        cat <<'EOF'
+tavs build — Bundle the hook triggers into single files
+
+Usage:
+  tavs build           Regenerate src/agents/{claude,gemini,codex}/trigger.bundle.sh
+  tavs build --check   Exit 1 if a bundle is out of date with its sources
+
+Each bundle is the agent trigger plus every core module loaded at startup,
+concatenated with comments stripped and the script directory resolved once.
+Hook configs point at the bundles; src/core stays the development copy.
+
+Run after editing anything in src/core or src/agents/*/trigger.sh, and
+commit the bundles: plugin installs run them as-is. 'tavs sync' and
+'tavs install' build their own copy into the install location.
+EOF
+        return 0
+    fi
+
+    case "${1:-}" in
+        --check)
+            build_trigger_bundles --check
+            ;;
+        "")
+            build_trigger_bundles
+            ;;
+        *)
+            cli_error "Unknown option: $1"
+            cli_info "Run 'tavs build --help' for usage."
+            return 1
+            ;;
+    esac
+}
@@ -0,0 +1,194 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS CLI — doctor command
+# ==============================================================================
+# Usage: tavs doctor [--reset-caches|--help]
+#
+# Shows the runtime caches TAVS keeps between hooks (terminal capability
+# records, OSC 11 background cache, feature backoff, config snapshot, TTY
+# write drops) and can
+# clear them all, e.g. after fixing kitty's allow_remote_control. Also warns
+# when a plugin update replaced the generated Claude Code hooks.
+# ==============================================================================
+
+source "$CLI_DIR/cli-utils.sh"
+
+# Count files matching a glob (no subshell)
+# Usage: _doctor_count "pattern"   → sets _DOCTOR_COUNT
+_doctor_count() {
+    local f
+    _DOCTOR_COUNT=0
+    for f in $1; do
+        [[ -e "$f" ]] && _DOCTOR_COUNT=$((_DOCTOR_COUNT + 1))
+    done
+    return 0
+}
+
+# Show frames dropped per TTY (frame.*.drops, see tty-frame.sh)
+_doctor_show_drops() {
+    local tmp_dir="$1" file key value tty timeouts skipped until note now shown=false
+    now=$(date +%s)
+    for file in "$tmp_dir"/frame.*.drops; do
+        [[ -f "$file" ]] || continue
+        timeouts=0 skipped=0 until=0
+        while IFS='=' read -r key value; do
+            [[ "$value" =~ ^[0-9]+$ ]] || continue
+            case "$key" in
+                timeouts) timeouts="$value" ;;
+                skipped) skipped="$value" ;;
+                until) until="$value" ;;
+            esac
+        done < "$file"
+        tty="${file##*/frame.}"
+        tty="${tty%.drops}"
+        note=""
+        [[ $until -gt $now ]] && note=", backing off $((until - now))s"
+        printf "    %-22s %s timed out, %s skipped%s\n" \
+            "${tty//_//}" "$timeouts" "$skipped" "$note"
+        shown=true
+    done
+    [[ "$shown" == "true" ]] || printf "    %-22s %s\n" "Status" "no dropped writes"
+}
+
+# Show optional stages shed per TTY (shed.*, see latency-budget.sh)
+_doctor_show_shed() {
+    local tmp_dir="$1" file key value tty counts shown=false
+    for file in "$tmp_dir"/shed.*; do
+        [[ -f "$file" ]] || continue
+        counts=""
+        while IFS='=' read -r key value; do
+            case "$key" in
+                image|dir_icon|context|user_title)
+                    [[ "$value" =~ ^[1-9][0-9]*$ ]] && counts+="${counts:+, }$key ×$value"
+                    ;;
+            esac
+        done < "$file"
+        tty="${file##*/shed.}"
+        printf "    %-22s %s\n" "${tty//_//}" "${counts:-none}"
+        shown=true
+    done
+    [[ "$shown" == "true" ]] || printf "    %-22s %s\n" "Status" "no stages shed"
+}
+
+# Resolve the config snapshot directory via config-snapshot.sh
+_doctor_snapshot_dir() {
+    (
+        # Core modules are not written for `set -euo pipefail`
+        set +euo pipefail
+        source "$TAVS_ROOT/src/core/theme-config-loader.sh"
+        source "$TAVS_ROOT/src/core/config-snapshot.sh"
+        get_snapshot_dir
+    )
+}
+
+# Remove every cache; hooks rebuild them on the next event
+_doctor_reset_caches() {
+    local tmp_dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    local snap_dir
+    snap_dir=$(_doctor_snapshot_dir)
+
+    rm -f "$tmp_dir"/caps.* "$tmp_dir"/termbg.* "$tmp_dir"/backoff.* \
+        "$tmp_dir"/fp.* "$tmp_dir"/frame.*.drops "$tmp_dir"/shed.* \
+        "$tmp_dir"/color-lut.v1 2>/dev/null || true
+    if [[ -n "$snap_dir" ]]; then
+        rm -rf "$snap_dir/osc" "$snap_dir/images" 2>/dev/null || true
+    fi
+    local state_dir
+    state_dir=$(
+        set +euo pipefail
+        source "$TAVS_ROOT/src/core/spinner.sh"
+        get_spinner_state_dir
+    )
+    [[ -n "$state_dir" ]] && rm -rf "$state_dir/git-repo" 2>/dev/null || true
+
+    cli_success "Caches cleared"
+    cli_info "Capability records, OSC 11 background cache, feature backoff,"
+    cli_info "color LUT, config snapshot, image index, git repo cache and event"
+    cli_info "fingerprints are rebuilt by the next hook; TTY write drops and"
+    cli_info "shed stage counts reset."
+}
+
+cmd_doctor() {
+    # Handle --help
+    if [[ "${1:-}" == "--help" || "${1:-}" == "-h" ]]; then
+        cat <<'EOF'
+tavs doctor — Inspect and reset runtime caches
+
+Usage:
+  tavs doctor                  Show cached terminal data and feature backoff
+  tavs doctor --reset-caches   Clear all runtime caches
+
+Caches:
+  Terminal capabilities   Per-TTY record written at session start
+  Terminal background     Per-TTY OSC 11 reply (queried once per session)
+  Feature backoff         Optional features skipped after repeated failures
+                          (Kitty remote control, iTerm2 title queries)
+  Config snapshot         Precompiled OSC bundles (see: tavs theme compile)
+                          and the background image index
+  Git repo cache          Per-directory git toplevel/worktree answers
+  Event fingerprints      Last event per TTY, for dropping repeats
+                          (TAVS_DEDUP_WINDOW)
+  TTY write drops         Frames dropped because a terminal stopped reading
+                          (TAVS_TTY_WRITE_TIMEOUT, TAVS_TTY_WRITE_BACKOFF)
+  Shed stages             Optional stages skipped by hooks over their time
+                          budget (TAVS_LATENCY_BUDGET_MS)
+
+Also checks that the installed Claude Code hooks are still the ones TAVS
+generated (a plugin update restores the full template).
+
+Reset the caches after changing terminal settings, e.g. enabling
+allow_remote_control in kitty.conf, so TAVS retries immediately.
+EOF
+        return 0
+    fi
+
+    if [[ "${1:-}" == "--reset-caches" ]]; then
+        _doctor_reset_caches
+        return 0
+    fi
+
+    if [[ -n "${1:-}" ]]; then
+        cli_error "Unknown option: $1"
+        cli_info "Run 'tavs doctor --help' for usage."
+        return 1
+    fi
+
+    local tmp_dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    local snap_dir
+    snap_dir=$(_doctor_snapshot_dir)
+
+    echo ""
+    echo -e "${_CLR_BOLD}TAVS v${TAVS_VERSION:-3.0.0} — Doctor${_CLR_RESET}"
+
+    cli_section "Runtime Caches"
+    printf "    %-22s %s\n" "State directory" "$tmp_dir"
+    _doctor_count "$tmp_dir/caps.*"
+    printf "    %-22s %s TTY(s)\n" "Capability records" "$_DOCTOR_COUNT"
+    _doctor_count "$tmp_dir/termbg.*"
+    printf "    %-22s %s TTY(s)\n" "Background cache" "$_DOCTOR_COUNT"
+    _doctor_count "$snap_dir/osc/*/stamp"
+    printf "    %-22s %s agent(s) compiled\n" "Config snapshot" "$_DOCTOR_COUNT"
+
+    cli_section "TTY Write Drops"
+    _doctor_show_drops "$tmp_dir"
+
+    cli_section "Shed Stages (TAVS_LATENCY_BUDGET_MS)"
+    _doctor_show_shed "$tmp_dir"
+
+    cli_section "Feature Backoff"
+    source "$CLI_DIR/cmd-status.sh"
+    _show_feature_backoff
+
+    cli_section "Claude Code Hooks"
+    source "$CLI_DIR/cmd-hooks.sh"
+    local stale
+    stale=$(hooks_stale_installed)
+    if [[ -n "$stale" ]]; then
+        _hooks_warn_stale
+    elif [[ -n "$(hooks_installed_files)" ]]; then
+        printf "    %-22s %s\n" "Status" "generated from config"
+    else
+        printf "    %-22s %s\n" "Status" "no plugin installation"
+    fi
+    echo ""
+}
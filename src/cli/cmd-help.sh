@@ -25,11 +25,17 @@ Commands:
   status                Show current configuration with visual preview
   wizard                Run interactive configuration wizard
   theme [name]          List or apply a theme preset
+  backgrounds build     Pre-render background images for faster switches
   test [--quick]        Test visual signals in current terminal
   migrate               Migrate old config to v3 format
   config <action>       Manage configuration (show, edit, reset, validate)
   install <agent>       Install TAVS for an agent (gemini, codex)
   sync                  Sync source to plugin cache (developer tool)
+  build [--check]       Bundle hook triggers into single files (developer tool)
+  doctor                Inspect or reset runtime caches and feature backoff
+  hooks [--write]       Show or regenerate Claude Code hook subscriptions
+  stats [--prom]        Show trigger counts and run times (metrics)
+  replay <journal>      Re-drive a transition journal (debugging, load test)
   help [command]        Show help for a command
   version               Show version information
 
@@ -0,0 +1,287 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS CLI — hooks command
+# ==============================================================================
+# Usage: tavs hooks [--write|--full|--help]
+#
+# The plugin's hooks/hooks.json subscribes every Claude Code event TAVS can
+# use. Each subscription costs a trigger run per event, so the installed copy
+# is generated from the effective config: events whose state is disabled are
+# left out and PostToolUse is narrowed when it only has to end compacting.
+# `tavs install claude` and `tavs sync` write the generated file; `tavs set`
+# rewrites it in installed plugins when a setting it depends on changes.
+#
+# A plugin update replaces the generated file with the full template. The
+# checksum of every file TAVS writes is kept in ~/.tavs/hooks.sums, so
+# `tavs hooks` and `tavs doctor` can tell an overwritten file and ask for
+# `tavs hooks --write`.
+#
+# hooks/hooks.json in the repo stays the full template. Without python3 the
+# template is installed unchanged.
+# ==============================================================================
+
+source "$CLI_DIR/cli-utils.sh"
+
+# Settings the generated file depends on (tavs set regenerates on change)
+_HOOKS_SETTINGS=" ENABLE_PERMISSION ENABLE_COMPACTING ENABLE_TOOL_ERROR ENABLE_SUBAGENT \
+ENABLE_IDLE ENABLE_PROCESSING ENABLE_MODE_AWARE_PROCESSING ENABLE_TITLE_PREFIX \
+TAVS_TITLE_MODE ENABLE_BELL_PERMISSION ENABLE_BELL_COMPACTING ENABLE_BELL_TOOL_ERROR \
+ENABLE_BELL_SUBAGENT "
+
+# True if a setting changes which hooks are generated
+# Usage: hooks_setting_relevant VAR
+hooks_setting_relevant() {
+    [[ "$_HOOKS_SETTINGS" == *" $1 "* ]]
+}
+
+# Decide the subscriptions from the effective config (defaults + user.conf)
+# Prints: omit=<trigger states without hooks>  narrow=<PostToolUse matcher>
+# narrow is "compact" when PostToolUse only has to end compacting; it is
+# applied only if the template has no PreCompact hook left for compacting.
+_hooks_plan() {
+    (
+        # Config files are not written for `set -euo pipefail`
+        set +euo pipefail
+        source "$TAVS_ROOT/src/config/defaults.conf"
+        load_user_config
+
+        local omit="" narrow=""
+        # A state with its colors off still needs its hook for its bell
+        [[ "$ENABLE_PERMISSION" != "true" && "$ENABLE_BELL_PERMISSION" != "true" ]] && \
+            omit+=" permission"
+        [[ "$ENABLE_COMPACTING" != "true" && "$ENABLE_BELL_COMPACTING" != "true" ]] && \
+            omit+=" compacting"
+        [[ "$ENABLE_TOOL_ERROR" != "true" && "$ENABLE_BELL_TOOL_ERROR" != "true" ]] && \
+            omit+=" tool_error"
+        [[ "$ENABLE_SUBAGENT" != "true" && "$ENABLE_BELL_SUBAGENT" != "true" ]] && \
+            omit+=" subagent-start subagent-stop"
+        [[ "$ENABLE_IDLE" != "true" ]] && omit+=" idle"
+
+        # PostToolUse `processing` ends permission and compacting, shifts the
+        # processing color with the permission mode and refreshes processing
+        # titles; tool_error and subagent-stop return to processing on their own
+        local processing_titles=false
+        if [[ "$ENABLE_TITLE_PREFIX" == "true" ]]; then
+            case "$TAVS_TITLE_MODE" in
+                full|prefix-only) processing_titles=true ;;
+            esac
+        fi
+        if [[ " $omit " != *" permission "* || "$processing_titles" == "true" ]] || \
+           [[ "$ENABLE_PROCESSING" == "true" && "$ENABLE_MODE_AWARE_PROCESSING" == "true" ]]; then
+            :
+        elif [[ " $omit " != *" compacting "* ]]; then
+            narrow="compact"
+        else
+            omit+=" processing"
+        fi
+        echo "omit=${omit# }"
+        echo "narrow=$narrow"
+    )
+}
+
+# Write the generated hooks file for a template
+# Usage: hooks_generate template_file out_file   → prints "kept/total" events
+hooks_generate() {
+    local template="$1" out="$2" key value omit="" narrow=""
+    while IFS='=' read -r key value; do
+        case "$key" in
+            omit) omit="$value" ;;
+            narrow) narrow="$value" ;;
+        esac
+    done < <(_hooks_plan)
+
+    local tmp="${out}.tmp.$$"
+    if ! command -v python3 &>/dev/null; then
+        cp "$template" "$tmp" && mv -f "$tmp" "$out" || { rm -f "$tmp"; return 1; }
+        echo "all"
+        return 0
+    fi
+    python3 - "$template" "$tmp" "$omit" "$narrow" <<'END_PYTHON' || { rm -f "$tmp"; return 1; }
+import json, re, sys
+
+template, out, omit, narrow = sys.argv[1], sys.argv[2], sys.argv[3].split(), sys.argv[4]
+with open(template) as f:
+    data = json.load(f)
+
+trigger_re = re.compile(r'trigger(?:\.bundle)?\.sh\s+(\S+)(?:\s+(\S+))?')
+
+def route(entry):
+    """(state, argument) the entry's command passes to the trigger."""
+    for hook in entry.get('hooks', []):
+        m = trigger_re.search(hook.get('command', ''))
+        if m:
+            return m.group(1), m.group(2)
+    return None, None
+
+events = data.get('hooks', {})
+compact_matcher = ''
+for entry in events.get('PreToolUse', []):
+    if route(entry)[0] == 'compacting':
+        compact_matcher = entry.get('matcher', '')
+# Compaction started by PreCompact only ends on the next tool of any kind
+if any(route(entry)[0] == 'compacting' and 'compacting' not in omit
+       for entry in events.get('PreCompact', [])):
+    compact_matcher = ''
+
+kept = {}
+for event, entries in events.items():
+    result = []
+    for entry in entries:
+        state, arg = route(entry)
+        if state in omit and not (state == 'processing' and arg):
+            continue
+        if state == 'processing' and not arg and event == 'PostToolUse' \
+                and narrow == 'compact' and compact_matcher:
+            entry = dict(entry, matcher=compact_matcher)
+        result.append(entry)
+    if result:
+        kept[event] = result
+
+data['hooks'] = kept
+with open(out, 'w') as f:
+    json.dump(data, f, indent=2, ensure_ascii=False)
+    f.write('\n')
+print(f'{len(kept)}/{len(events)}')
+END_PYTHON
+    mv -f "$tmp" "$out"
+}
+
+# Remember the checksum of a hook file TAVS wrote
+# Record lines: "<cksum> <size> <path>"
+# Usage: hooks_record file
+hooks_record() {
+    local file="$1" sums="$HOME/.tavs/hooks.sums" sum tmp crc size path
+    sum=$(cksum < "$file") || return 1
+    mkdir -p "${sums%/*}" || return 1
+    tmp="${sums}.tmp.$$"
+    {
+        if [[ -f "$sums" ]]; then
+            while read -r crc size path; do
+                [[ "$path" == "$file" ]] || echo "$crc $size $path"
+            done < "$sums"
+        fi
+        echo "$sum $file"
+    } > "$tmp" && mv -f "$tmp" "$sums" || { rm -f "$tmp"; return 1; }
+}
+
+# Installed hook files TAVS did not write in their current form (a plugin
+# install or update put the template there)
+# Prints one path per line
+hooks_stale_installed() {
+    local sums="$HOME/.tavs/hooks.sums" file sum recorded crc size path
+    while IFS= read -r file; do
+        recorded=""
+        if [[ -f "$sums" ]]; then
+            while read -r crc size path; do
+                [[ "$path" == "$file" ]] && recorded="$crc $size"
+            done < "$sums"
+        fi
+        sum=$(cksum < "$file")
+        [[ "$recorded" == "$sum" ]] || echo "$file"
+    done < <(hooks_installed_files)
+    return 0
+}
+
+# Hook files of installed Claude Code plugins (cache + marketplace)
+# Prints one path per line
+hooks_installed_files() {
+    local cache_base="$HOME/.claude/plugins/cache/terminal-agent-visual-signals/tavs"
+    local market_dir="$HOME/.claude/plugins/marketplaces/terminal-agent-visual-signals"
+    local dir
+    for dir in "$cache_base"/*/ "$market_dir/"; do
+        [[ -f "${dir}hooks/hooks.json" ]] && echo "${dir}hooks/hooks.json"
+    done
+    return 0
+}
+
+# Regenerate the hook files of installed plugins from the repo template
+# Usage: hooks_refresh_installed   → returns 1 if nothing is installed
+hooks_refresh_installed() {
+    local file kept refreshed=false
+    while IFS= read -r file; do
+        kept=$(hooks_generate "$TAVS_ROOT/hooks/hooks.json" "$file") || continue
+        hooks_record "$file"
+        cli_info "Hook subscriptions: $kept events in ${file/#$HOME/~}"
+        refreshed=true
+    done < <(hooks_installed_files)
+    [[ "$refreshed" == "true" ]]
+}
+
+cmd_hooks() {
+    case "${1:-}" in
+        --help|-h)
+            cat <<'EOF'
+tavs hooks — Claude Code hook subscriptions generated from your config
+
+Usage:
+  tavs hooks            Show which events are subscribed with the current config
+  tavs hooks --write    Regenerate the hooks file of installed plugins
+  tavs hooks --full     Install the full template (every event) instead
+
+Events whose state is disabled (e.g. ENABLE_TOOL_ERROR=false) are left out,
+and PostToolUse is narrowed to the compaction tool when nothing else needs
+it. `tavs install claude`, `tavs sync` and `tavs set` keep installed
+plugins up to date; run `tavs hooks --write` again after a plugin update
+(`tavs hooks` warns when one replaced the file). Restart Claude Code for
+hook changes to apply.
+EOF
+            return 0
+            ;;
+        --write)
+            if ! hooks_refresh_installed; then
+                cli_error "No plugin installation found"
+                return 1
+            fi
+            cli_success "Hooks regenerated. Restart Claude Code to apply."
+            return 0
+            ;;
+        --full)
+            local file found=false
+            while IFS= read -r file; do
+                cp "$TAVS_ROOT/hooks/hooks.json" "$file" && hooks_record "$file" && found=true
+                cli_info "Full template: ${file/#$HOME/~}"
+            done < <(hooks_installed_files)
+            [[ "$found" == "true" ]] || { cli_error "No plugin installation found"; return 1; }
+            return 0
+            ;;
+        "") ;;
+        *)
+            cli_error "Unknown option: $1"
+            cli_info "Run 'tavs hooks --help' for usage."
+            return 1
+            ;;
+    esac
+
+    local key value omit="" narrow=""
+    while IFS='=' read -r key value; do
+        case "$key" in
+            omit) omit="$value" ;;
+            narrow) narrow="$value" ;;
+        esac
+    done < <(_hooks_plan)
+
+    cli_section "Hook Subscriptions"
+    local state
+    for state in processing permission compacting tool_error subagent-start subagent-stop idle; do
+        if [[ " $omit " == *" $state "* ]]; then
+            printf "    %-22s %s\n" "$state" "omitted"
+        elif [[ "$state" == "processing" && "$narrow" == "compact" ]]; then
+            printf "    %-22s %s\n" "$state" "PostToolUse narrowed to the compaction tool"
+        else
+            printf "    %-22s %s\n" "$state" "subscribed"
+        fi
+    done
+    printf "    %-22s %s\n" "prompt/stop/session" "always subscribed"
+    _hooks_warn_stale
+    echo ""
+}
+
+# Warn about installed hook files a plugin install or update overwrote
+_hooks_warn_stale() {
+    local file
+    while IFS= read -r file; do
+        cli_warn "Not generated by TAVS (plugin installed or updated): ${file/#$HOME/~}"
+        cli_info "Run 'tavs hooks --write' and restart Claude Code."
+    done < <(hooks_stale_installed)
+    return 0
+}
@@ -6,6 +6,13 @@
 #
 # Installs TAVS hooks for a specific agent. Delegates to agent-specific
 # install scripts in src/install/.
+#
+# Claude Code hooks ship with the plugin; `tavs install claude` generates
+# the installed plugin's hooks.json from the config (see cmd-hooks.sh).
+#
+# The hooks run a trigger bundle built into ~/.tavs/bundles/{agent} (paths to
+# this checkout baked in), so the checkout itself is never written and may be
+# read-only. If the build fails the hooks run the modular trigger.sh.
 # ==============================================================================
 
 source "$CLI_DIR/cli-utils.sh"
@@ -21,10 +28,12 @@ Usage:
   tavs install            List available agents
 
 Agents:
+  claude    Generate hooks for the installed Claude Code plugin
   gemini    Install for Gemini CLI (8 events, full support)
   codex     Install for Codex CLI (1 event, limited support)
 
-Note: Claude Code uses the plugin system — no manual install needed.
+Note: Claude Code uses the plugin system — install the plugin first; run
+      `tavs install claude` again after a plugin update.
       OpenCode uses an npm package — see docs for setup.
 EOF
         return 0
@@ -36,11 +45,12 @@ EOF
     if [[ $# -eq 0 ]]; then
         cli_bold "Available agents for installation:"
         echo ""
+        echo "  claude    Claude Code (hooks for the installed plugin)"
         echo "  gemini    Gemini CLI (full support, 8 events)"
         echo "  codex     Codex CLI (limited, 1 event)"
         echo ""
         cli_info "Usage: tavs install <agent>"
-        cli_info "Claude Code uses the plugin system (no manual install needed)."
+        cli_info "Claude Code uses the plugin system; install it first."
         return 0
     fi
 
@@ -48,11 +58,22 @@ EOF
 
     # Validate agent name against known agents (prevents path traversal)
     case "$agent" in
+        claude)
+            # The plugin ships the full template; write the generated hooks
+            source "$CLI_DIR/cmd-hooks.sh"
+            if ! hooks_refresh_installed; then
+                cli_error "No plugin installation found"
+                cli_info "Install it first: claude plugin install tavs@terminal-agent-visual-signals"
+                return 1
+            fi
+            cli_success "Hooks generated. Restart Claude Code to apply."
+            return 0
+            ;;
         gemini|codex) ;;
         *)
             cli_error "Unknown agent: $agent"
             echo ""
-            echo "Available agents: gemini, codex"
+            echo "Available agents: claude, gemini, codex"
             return 1
             ;;
     esac
@@ -64,6 +85,15 @@ EOF
         return 1
     fi
 
+    # Hooks run a bundle of the current sources, built outside the checkout
+    source "$CLI_DIR/cmd-build.sh"
+    local bundle_dir="$HOME/.tavs/bundles"
+    local trigger="$bundle_dir/$agent/trigger.bundle.sh"
+    if ! build_trigger_bundles --quiet --out "$bundle_dir" --root "$agent"; then
+        trigger="$TAVS_ROOT/src/agents/$agent/trigger.sh"
+        cli_warn "Bundle build failed; hooks will run ${trigger/#$HOME/~}"
+    fi
+
     # Delegate to the agent-specific installer
-    bash "$script"
+    TAVS_TRIGGER_SCRIPT="$trigger" bash "$script"
 }
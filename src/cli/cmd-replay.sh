@@ -0,0 +1,234 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS CLI — replay command
+# ==============================================================================
+# Usage: tavs replay <journal> [--speed N] [--tty FILE] [--keep]
+#
+# Re-drives src/core/trigger.sh with the events of a transition journal (see
+# src/core/journal.sh) in a scratch TAVS_TMP_DIR so live tabs are not
+# touched. The TTY is a FIFO whose reader appends everything written to a
+# capture file (triggers open the TTY with `>`, which would truncate a plain
+# file on every frame). Events keep their
+# original spacing divided by --speed (default 10) and run concurrently like
+# hooks do; --speed 0 runs them back to back, one at a time, as a load test.
+# Deferred re-runs (rerun=1) are skipped: the replayed triggers schedule
+# their own.
+# ==============================================================================
+
+source "$CLI_DIR/cli-utils.sh"
+
+# Set _REPLAY_<KEY> from one journal line (unknown keys are ignored)
+# Usage: _replay_parse "line"
+_replay_parse() {
+    local field
+    _REPLAY_SEQ="" _REPLAY_STATE="" _REPLAY_ARG="" _REPLAY_AGENT=""
+    _REPLAY_MODE="" _REPLAY_OUTCOME="" _REPLAY_RERUN=0
+    for field in $1; do
+        case "$field" in
+            seq=*) _REPLAY_SEQ="${field#seq=}" ;;
+            state=*) _REPLAY_STATE="${field#state=}" ;;
+            arg=*) _REPLAY_ARG="${field#arg=}" ;;
+            agent=*) _REPLAY_AGENT="${field#agent=}" ;;
+            mode=*) _REPLAY_MODE="${field#mode=}" ;;
+            outcome=*) _REPLAY_OUTCOME="${field#outcome=}" ;;
+            rerun=*) _REPLAY_RERUN="${field#rerun=}" ;;
+        esac
+    done
+    [[ "$_REPLAY_ARG" == "-" ]] && _REPLAY_ARG=""
+    [[ "$_REPLAY_AGENT" == "-" ]] && _REPLAY_AGENT=""
+    [[ "$_REPLAY_MODE" == "-" ]] && _REPLAY_MODE=""
+    return 0
+}
+
+# Run one event against the scratch directory and TTY file
+# Usage: _replay_fire tmp_dir tty state arg agent mode
+_replay_fire() {
+    TAVS_TMP_DIR="$1" TTY_DEVICE="$2" TAVS_AGENT="${5:-claude}" \
+        TAVS_PERMISSION_MODE="$6" TAVS_EVENT_SEQ="" TAVS_SESSION_ID="replay" \
+        bash "$TAVS_ROOT/src/core/trigger.sh" "$3" ${4:+"$4"} </dev/null >/dev/null 2>&1
+}
+
+# Print the effective STATE_GRACE_PERIOD_MS (user config included)
+_replay_grace_ms() {
+    (
+        # Core modules and config are not written for `set -euo pipefail`
+        set +euo pipefail
+        source "$TAVS_ROOT/src/config/defaults.conf"
+        load_user_config
+        source "$TAVS_ROOT/src/core/session-state.sh"
+        printf '%s' "$STATE_GRACE_PERIOD_MS"
+    ) 2>/dev/null
+}
+
+# Wait until no deferred event is pending in the scratch directory, at most
+# the grace period plus a second (a superseded slot can stay behind)
+# Usage: _replay_settle tmp_dir grace_ms
+_replay_settle() {
+    local tmp_dir="$1" grace_ms="$2" waited_ms=0 slot pending
+    [[ "$grace_ms" =~ ^[0-9]+$ ]] || grace_ms=400
+    while [[ $waited_ms -lt $((grace_ms + 1000)) ]]; do
+        pending=false
+        for slot in "$tmp_dir"/state.deferred.*; do
+            [[ -e "$slot" ]] && pending=true
+        done
+        [[ "$pending" == "true" ]] || break
+        sleep 0.1
+        waited_ms=$((waited_ms + 100))
+    done
+}
+
+# Fold the replay's metrics (before the closing reset is counted)
+# Usage: _replay_fold tmp_dir
+_replay_fold() {
+    (
+        # Core modules are not written for `set -euo pipefail`
+        set +euo pipefail
+        TAVS_TMP_DIR="$1"
+        source "$TAVS_ROOT/src/core/metrics.sh"
+        metrics_fold
+    ) >/dev/null 2>&1 || true
+}
+
+# Print outcome counts: journal (from the file) vs replay (from its metrics)
+# Both include deferred re-runs.
+# Usage: _replay_outcomes journal tmp_dir
+_replay_outcomes() {
+    local journal="$1" tmp_dir="$2" outcome series value line
+    printf "    %-22s %8s %8s\n" "Outcome" "Journal" "Replay"
+    for outcome in applied deferred stale dedup; do
+        local journaled=0 replayed=0
+        while IFS= read -r line; do
+            [[ " $line " == *" outcome=$outcome "* ]] && journaled=$((journaled + 1))
+        done < "$journal"
+        if [[ -f "$tmp_dir/metrics.state" ]]; then
+            while read -r series value; do
+                [[ "$series" == tavs_trigger_total*"outcome=\"$outcome\""* ]] && \
+                    replayed=$((replayed + value))
+            done < "$tmp_dir/metrics.state"
+        else
+            replayed="-"
+        fi
+        printf "    %-22s %8s %8s\n" "$outcome" "$journaled" "$replayed"
+    done
+}
+
+cmd_replay() {
+    local journal="" speed=10 tty="" keep=false
+    while [[ $# -gt 0 ]]; do
+        case "$1" in
+            --help|-h)
+                cat <<'EOF'
+tavs replay — Re-drive a transition journal through the trigger
+
+Usage:
+  tavs replay <journal> [--speed N] [--tty FILE] [--keep]
+
+Options:
+  --speed N     Divide the original spacing by N (default 10); 0 runs the
+                events back to back, one at a time (load test)
+  --tty FILE    Append the escape sequences to FILE (default: scratch file)
+  --keep        Keep the scratch state directory and print its path
+
+Journals are written with ENABLE_JOURNAL=true to /tmp/tavs/journal/. The
+replay uses your config but a scratch state directory, so open tabs are not
+affected. Outcomes of the replay are compared with the journal (needs
+ENABLE_METRICS).
+EOF
+                return 0
+                ;;
+            --speed)
+                speed="${2:-}"
+                shift
+                ;;
+            --tty)
+                tty="${2:-}"
+                shift
+                ;;
+            --keep) keep=true ;;
+            -*)
+                cli_error "Unknown option: $1"
+                cli_info "Run 'tavs replay --help' for usage."
+                return 1
+                ;;
+            *) journal="$1" ;;
+        esac
+        shift
+    done
+
+    if [[ -z "$journal" || ! -f "$journal" ]]; then
+        cli_error "Journal not found: ${journal:-<none>}"
+        cli_info "Enable with: tavs set ENABLE_JOURNAL true (journals in /tmp/tavs/journal/)"
+        return 1
+    fi
+    if [[ ! "$speed" =~ ^[0-9]+$ ]]; then
+        cli_error "--speed takes a whole number (0 = no delays)"
+        return 1
+    fi
+
+    local tmp_dir
+    tmp_dir=$(mktemp -d "${TMPDIR:-/tmp}/tavs-replay.XXXXXX") || return 1
+    chmod 700 "$tmp_dir"
+    local capture="${tty:-$tmp_dir/capture}" fifo="$tmp_dir/tty" reader
+    touch "$capture" 2>/dev/null && mkfifo "$fifo" || { rm -rf "$tmp_dir"; return 1; }
+    # Opened read-write, so the reader never sees EOF between frames
+    ( exec 3<>"$fifo"; exec cat <&3 >> "$capture" ) &
+    reader=$!
+
+    cli_section "Replay"
+    printf "    %-22s %s\n" "Journal" "$journal"
+    printf "    %-22s %s\n" "Speed" "$([[ $speed -eq 0 ]] && echo "no delays" || echo "${speed}×")"
+
+    local line prev_seq="" delay_us delay events=0 start end pids="" pid
+    start=$(date +%s)
+    while IFS= read -r line; do
+        _replay_parse "$line"
+        [[ -n "$_REPLAY_STATE" && "$_REPLAY_STATE" != "-" && "$_REPLAY_RERUN" != "1" ]] || continue
+        if [[ $speed -eq 0 ]]; then
+            _replay_fire "$tmp_dir" "$fifo" "$_REPLAY_STATE" "$_REPLAY_ARG" \
+                "$_REPLAY_AGENT" "$_REPLAY_MODE" || true
+        else
+            if [[ "$_REPLAY_SEQ" =~ ^[0-9]+$ && "$prev_seq" =~ ^[0-9]+$ ]]; then
+                delay_us=$(( (_REPLAY_SEQ - prev_seq) / speed ))
+                if [[ $delay_us -gt 0 ]]; then
+                    printf -v delay '%d.%06d' $(( delay_us / 1000000 )) $(( delay_us % 1000000 ))
+                    sleep "$delay"
+                fi
+            fi
+            [[ "$_REPLAY_SEQ" =~ ^[0-9]+$ ]] && prev_seq="$_REPLAY_SEQ"
+            _replay_fire "$tmp_dir" "$fifo" "$_REPLAY_STATE" "$_REPLAY_ARG" \
+                "$_REPLAY_AGENT" "$_REPLAY_MODE" &
+            pids+=" $!"
+        fi
+        events=$((events + 1))
+    done < "$journal"
+    for pid in $pids; do
+        wait "$pid" 2>/dev/null || true
+    done
+    end=$(date +%s)
+
+    # Let deferred events land (their re-runs finish just after the slot is
+    # cleared), then stop the idle timer the replay started
+    _replay_settle "$tmp_dir" "$(_replay_grace_ms)"
+    sleep 0.5
+    _replay_fold "$tmp_dir"
+    _replay_fire "$tmp_dir" "$fifo" reset "" "" "" || true
+    sleep 0.1
+    kill "$reader" 2>/dev/null || true
+
+    local bytes
+    bytes=$(wc -c < "$capture" | tr -d ' ')
+    printf "    %-22s %s\n" "Events" "$events"
+    printf "    %-22s %s\n" "Wall time" "$((end - start))s"
+    printf "    %-22s %s\n" "TTY bytes" "$bytes"
+    echo ""
+    _replay_outcomes "$journal" "$tmp_dir"
+    echo ""
+
+    if [[ "$keep" == "true" ]]; then
+        cli_info "State kept in $tmp_dir"
+    else
+        [[ -n "$tty" ]] && cli_info "Escape sequences in $tty"
+        rm -rf "$tmp_dir"
+    fi
+    return 0
+}
@@ -189,4 +189,11 @@ EOF
     cli_success "Set $key = $value"
     cli_info "$desc"
     cli_info "Takes effect on next state change."
+
+    # Settings that decide which hook events are worth subscribing to
+    source "$CLI_DIR/cmd-hooks.sh"
+    if hooks_setting_relevant "$var" && hooks_refresh_installed; then
+        cli_info "Hook subscriptions take effect when Claude Code restarts."
+    fi
+    return 0
 }
@@ -0,0 +1,141 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS CLI — stats command
+# ==============================================================================
+# Usage: tavs stats [--prom|--reset|--help]
+#
+# Folds the pending metrics lines (see src/core/metrics.sh) and shows trigger
+# counts, outcomes and run times per state and agent, plus lock timeouts and
+# idle workers stopped at MAX_TIMER_RUNTIME.
+# ==============================================================================
+
+source "$CLI_DIR/cli-utils.sh"
+
+# Fold pending lines with the effective config (TAVS_METRICS_TEXTFILE)
+_stats_fold() {
+    (
+        # Core modules and config are not written for `set -euo pipefail`
+        set +euo pipefail
+        source "$TAVS_ROOT/src/config/defaults.conf"
+        load_user_config
+        source "$TAVS_ROOT/src/core/metrics.sh"
+        metrics_fold || true  # Another fold is running
+    )
+}
+
+# Print one row per state/agent from metrics.state
+# Percentiles are the upper bound of the bucket that reaches them.
+# Usage: _stats_table state_file
+_stats_table() {
+    awk '
+        function label(s, key) {
+            if (!match(s, key "=\"[^\"]*\"")) return ""
+            return substr(s, RSTART + length(key) + 2, RLENGTH - length(key) - 3)
+        }
+        function bound(le) { return le == "+Inf" ? ">2500" : sprintf("%g", le * 1000) }
+        {
+            value = $NF
+            series = $0
+            sub(/ [0-9]+$/, "", series)
+            key = label(series, "state") " " label(series, "agent")
+            if (series ~ /^tavs_trigger_total\{/) {
+                rows[key] = 1
+                total[key] += value
+                outcome[key, label(series, "outcome")] += value
+            } else if (series ~ /^tavs_trigger_duration_seconds_bucket\{/) {
+                bucket[key, label(series, "le")] = value
+            } else if (series ~ /^tavs_trigger_duration_seconds_sum\{/) {
+                sum_us[key] = value
+            } else if (series ~ /^tavs_trigger_duration_seconds_count\{/) {
+                count[key] = value
+            }
+        }
+        END {
+            n = split("0.005 0.01 0.025 0.05 0.1 0.25 0.5 1 2.5 +Inf", order, " ")
+            printf "    %-16s %-9s %7s %8s %8s %6s %6s %8s %7s %7s\n", \
+                "State", "Agent", "Events", "Applied", "Deferred", "Stale", "Dedup", \
+                "Mean ms", "p50 ms", "p95 ms"
+            for (key in rows) {
+                split(key, part, " ")
+                mean = p50 = p95 = "-"
+                if (count[key] > 0) {
+                    mean = sprintf("%.1f", sum_us[key] / count[key] / 1000)
+                    for (i = 1; i <= n; i++) {
+                        if (p50 == "-" && bucket[key, order[i]] >= 0.5 * count[key]) p50 = bound(order[i])
+                        if (p95 == "-" && bucket[key, order[i]] >= 0.95 * count[key]) p95 = bound(order[i])
+                    }
+                }
+                printf "    %-16s %-9s %7d %8d %8d %6d %6d %8s %7s %7s\n", \
+                    part[1], part[2], total[key], outcome[key, "applied"], \
+                    outcome[key, "deferred"], outcome[key, "stale"], outcome[key, "dedup"], \
+                    mean, p50, p95 | "sort"
+            }
+        }
+    ' "$1"
+}
+
+cmd_stats() {
+    local tmp_dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    case "${1:-}" in
+        --help|-h)
+            cat <<'EOF'
+tavs stats — Trigger counts and run times (Prometheus textfile metrics)
+
+Usage:
+  tavs stats            Show counts, outcomes and run times per state and agent
+  tavs stats --prom     Print the Prometheus textfile export
+  tavs stats --reset    Clear all metrics
+
+Outcomes: applied, deferred (held by the grace period), stale (older than the
+event on screen), dedup (repeat of the shown event). Run times need bash 5+.
+The export is written to /tmp/tavs/metrics.prom and, if set, to
+TAVS_METRICS_TEXTFILE (e.g. node_exporter's textfile directory).
+EOF
+            return 0
+            ;;
+        --reset)
+            rm -f "$tmp_dir"/metrics.log "$tmp_dir"/metrics.log.fold \
+                "$tmp_dir"/metrics.state "$tmp_dir"/metrics.prom 2>/dev/null || true
+            cli_success "Metrics cleared"
+            return 0
+            ;;
+        --prom)
+            _stats_fold
+            [[ -f "$tmp_dir/metrics.prom" ]] || { cli_info "No metrics recorded yet"; return 0; }
+            cat "$tmp_dir/metrics.prom"
+            return 0
+            ;;
+        "") ;;
+        *)
+            cli_error "Unknown option: $1"
+            cli_info "Run 'tavs stats --help' for usage."
+            return 1
+            ;;
+    esac
+
+    _stats_fold
+    local state_file="$tmp_dir/metrics.state"
+    if [[ ! -s "$state_file" ]]; then
+        cli_info "No metrics recorded yet"
+        return 0
+    fi
+
+    cli_section "Triggers"
+    _stats_table "$state_file"
+    echo ""
+
+    cli_section "Other"
+    local series value lock_timeouts="" idle_max=0
+    while read -r series value; do
+        case "$series" in
+            tavs_lock_timeouts_total*)
+                series="${series#*lock=\"}"
+                lock_timeouts+="${lock_timeouts:+, }${series%%\"*} ×$value"
+                ;;
+            tavs_idle_max_runtime_total) idle_max="$value" ;;
+        esac
+    done < "$state_file"
+    printf "    %-22s %s\n" "Lock timeouts" "${lock_timeouts:-none}"
+    printf "    %-22s %s\n" "Idle max runtime" "$idle_max"
+    echo ""
+}
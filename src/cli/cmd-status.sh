@@ -181,6 +181,14 @@ EOF
         fi
     fi
 
+    # =========================================================================
+    # FEATURE BACKOFF
+    # =========================================================================
+    if [[ -z "$section_filter" ]]; then
+        cli_section "Feature Backoff"
+        _show_feature_backoff
+    fi
+
     # =========================================================================
     # CONFIG FILES
     # =========================================================================
@@ -203,6 +211,35 @@ EOF
     echo ""
 }
 
+# Helper: list optional features skipped after repeated failures (per TTY)
+_show_feature_backoff() {
+    local entries
+    entries=$(
+        # Core modules are not written for `set -euo pipefail`
+        set +euo pipefail
+        source "$TAVS_ROOT/src/core/feature-backoff.sh"
+        list_feature_backoff
+    )
+
+    if [[ -z "$entries" ]]; then
+        printf "    %-20s %s\n" "Status" "all optional features active"
+        return 0
+    fi
+
+    local tty_safe feature failures left
+    while read -r tty_safe feature failures left; do
+        [[ -z "$feature" ]] && continue
+        if [[ "${left:-0}" -gt 0 ]]; then
+            printf "    %-20s skipped for %dm%02ds on %s (%s failures)\n" \
+                "$feature" $((left / 60)) $((left % 60)) "${tty_safe//_//}" "$failures"
+        else
+            printf "    %-20s active on %s (%s recent failures)\n" \
+                "$feature" "${tty_safe//_//}" "$failures"
+        fi
+    done <<< "$entries"
+    cli_info "    Reset with: tavs doctor --reset-caches"
+}
+
 # Helper: show a face from a named array variable
 _show_face() {
     local label="$1"
@@ -19,8 +19,10 @@ tavs sync — Sync source to plugin installations (developer tool)
 Usage:
   tavs sync               Copy source files to all plugin installations
 
-Copies core modules, config, and agent adapter to both the Claude Code
-plugin cache and marketplace directories. Only needed after modifying
+Copies core modules, config and agent adapter, builds the trigger bundle
+from the current sources (tavs build) and writes the hook config generated
+from your settings (tavs hooks), into both the Claude Code plugin cache and
+marketplace directories. Only needed after modifying
 source code — changes to ~/.tavs/user.conf take effect immediately.
 
 Sync targets:
@@ -30,6 +32,9 @@ EOF
         return 0
     fi
 
+    source "$CLI_DIR/cmd-build.sh"
+    source "$CLI_DIR/cmd-hooks.sh"
+
     local synced_any=false
 
     # --- Target 1: Plugin cache ---
@@ -86,10 +91,27 @@ _sync_to_target() {
     cp "$TAVS_ROOT/src/config/"*.conf "$target_dir/src/config/" 2>/dev/null
     echo "  Synced src/config/*.conf"
 
-    # Claude agent adapter
+    # Claude agent adapter; hooks run the bundle, built here from the sources
+    # just synced (the committed one may be stale in a working tree)
     if [[ -d "$target_dir/src/agents/claude" ]]; then
         cp "$TAVS_ROOT/src/agents/claude/trigger.sh" "$target_dir/src/agents/claude/"
-        echo "  Synced src/agents/claude/trigger.sh"
+        if build_trigger_bundles --quiet --out "$target_dir/src/agents" claude; then
+            echo "  Synced src/agents/claude/trigger.sh, built trigger.bundle.sh"
+        else
+            cp "$TAVS_ROOT/src/agents/claude/trigger.bundle.sh" "$target_dir/src/agents/claude/"
+            cli_warn "Bundle build failed; copied the committed trigger.bundle.sh"
+        fi
+    fi
+
+    # Hook config (points at the bundle), only the events the config needs
+    if [[ -d "$target_dir/hooks" ]]; then
+        local kept
+        kept=$(hooks_generate "$TAVS_ROOT/hooks/hooks.json" "$target_dir/hooks/hooks.json") || {
+            cp "$TAVS_ROOT/hooks/hooks.json" "$target_dir/hooks/"
+            kept="all"
+        }
+        hooks_record "$target_dir/hooks/hooks.json"
+        echo "  Synced hooks/hooks.json ($kept events)"
     fi
 
     # Theme files
@@ -2,9 +2,10 @@
 # ==============================================================================
 # TAVS CLI — theme command
 # ==============================================================================
-# Usage: tavs theme [name] [--preview] [--help]
+# Usage: tavs theme [name] [--preview] [compile] [--help]
 #
 # Quick theme switching. Lists available themes or applies one.
+# `compile` precompiles the OSC bundles in the config snapshot.
 # ==============================================================================
 
 source "$CLI_DIR/cli-utils.sh"
@@ -102,6 +103,39 @@ _preview_themes() {
     cli_info "Labels: base | processing | permission | complete | idle"
 }
 
+# Compile the config snapshot (precompiled OSC bundles)
+# Usage: _compile_snapshot [agent...]
+_compile_snapshot() {
+    local snap_dir rc=0
+    snap_dir=$(
+        # Core modules are not written for `set -euo pipefail`
+        set +euo pipefail
+        source "$TAVS_ROOT/src/core/theme-config-loader.sh"
+        source "$TAVS_ROOT/src/core/config-snapshot.sh"
+        get_snapshot_dir
+    )
+
+    (
+        set +euo pipefail
+        source "$TAVS_ROOT/src/core/theme-config-loader.sh"
+        source "$TAVS_ROOT/src/core/terminal-osc-sequences.sh"
+        source "$TAVS_ROOT/src/core/config-snapshot.sh"
+        compile_config_snapshot "$@"
+    ) || rc=$?
+
+    if [[ $rc -ne 0 ]]; then
+        cli_error "Failed to compile config snapshot in $snap_dir"
+        return 1
+    fi
+
+    local count=0 f
+    for f in "$snap_dir"/osc/*/*/*; do
+        [[ -f "$f" ]] && count=$((count + 1))
+    done
+    cli_success "Compiled $count OSC bundles"
+    cli_info "Snapshot: $snap_dir"
+}
+
 cmd_theme() {
     # Handle --help
     if [[ "${1:-}" == "--help" || "${1:-}" == "-h" ]]; then
@@ -112,14 +146,22 @@ Usage:
   tavs theme              List available themes
   tavs theme <name>       Apply a theme preset
   tavs theme --preview    Show color swatches for all themes
+  tavs theme compile      Precompile OSC bundles (state × mode × agent)
 
 Available themes:
   catppuccin-frappe, catppuccin-latte, catppuccin-macchiato, catppuccin-mocha,
   nord, dracula, solarized-dark, solarized-light, tokyo-night
 
+Compile:
+  Hooks emit palette + background from precompiled byte files in the config
+  snapshot (~/.cache/tavs/snapshot). The snapshot recompiles automatically
+  when defaults.conf, user.conf or the theme preset changes; run this to
+  rebuild it eagerly. Optional agent names limit the compile.
+
 Examples:
   tavs theme nord         Apply the Nord theme
   tavs theme --preview    Preview all theme colors
+  tavs theme compile      Rebuild the config snapshot now
 EOF
         return 0
     fi
@@ -136,6 +178,13 @@ EOF
         return $?
     fi
 
+    # Handle compile
+    if [[ "${1:-}" == "compile" ]]; then
+        shift
+        _compile_snapshot "$@"
+        return $?
+    fi
+
     # No args: list themes
     if [[ $# -eq 0 ]]; then
         _list_themes
@@ -161,5 +210,6 @@ EOF
     desc=$(_get_theme_description "$theme_file")
     cli_success "Applied theme: $theme_name"
     cli_info "$desc"
+    _compile_snapshot >/dev/null 2>&1 || true
     cli_info "Takes effect on next state change."
 }
@@ -10,11 +10,22 @@
 #   set_state_background_image "processing"  # Sets state-specific image
 #   clear_background_image                    # Clears background image
 #
+# Image paths are resolved through an index kept next to the config snapshot
+# (see IMAGE RESOLUTION below); without config-snapshot.sh the fallback chain
+# is walked on every call. Images pre-rendered by `tavs backgrounds build` are
+# swapped in for the resolved source (see PRE-RENDERED VARIANTS).
+#
 # Prerequisites:
-#   - detect.sh must be sourced first (provides get_terminal_type)
+#   - terminal-detection.sh must be sourced first (provides load_terminal_caps)
+#   - feature-backoff.sh (optional) skips Kitty remote control after failures
 #   - TTY_DEVICE must be set
+#   - tty-frame.sh: tty_write (iTerm2 sequences join the trigger's frame)
+#   - latency-budget.sh: latency_budget_allows (image stage)
 # ==============================================================================
 
+[[ -n "${_TAVS_TTY_FRAME_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/tty-frame.sh"
+[[ -n "${_TAVS_LATENCY_BUDGET_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/latency-budget.sh"
+
 # ==============================================================================
 # TERMINAL SUPPORT DETECTION
 # ==============================================================================
@@ -25,30 +36,24 @@ supports_background_images() {
     # Disabled by config
     [[ "$ENABLE_STYLISH_BACKGROUNDS" != "true" ]] && return 1
 
+    # Terminal facts come from the per-TTY capability record (no subshells)
+    load_terminal_caps
+
     # Disabled over SSH
-    if [[ "$STYLISH_DISABLE_SSH" == "true" ]] && is_ssh_session; then
+    if [[ "$STYLISH_DISABLE_SSH" == "true" ]] && [[ "$TAVS_CAP_SSH" == "true" ]]; then
         return 1
     fi
 
-    local terminal_type
-    terminal_type=$(get_terminal_type)
+    # iTerm2 (OSC 1337 SetBackgroundImageFile) or Kitty with kitten available
+    # (Kitty also requires allow_remote_control=yes in kitty.conf)
+    [[ "$TAVS_CAP_BG_IMAGES" == "true" ]] || return 1
 
-    case "$terminal_type" in
-        iterm2)
-            # iTerm2 supports OSC 1337 SetBackgroundImageFile
-            return 0
-            ;;
-        kitty)
-            # Kitty requires allow_remote_control=yes in kitty.conf
-            # Check if kitten command is available
-            command -v kitten &>/dev/null && return 0
-            return 1
-            ;;
-        *)
-            # All other terminals: no support
-            return 1
-            ;;
-    esac
+    # Kitty remote control kept failing on this TTY: skip until the backoff ends
+    if [[ "$TAVS_CAP_TERMINAL" == "kitty" ]] && type feature_backoff_active &>/dev/null && \
+       feature_backoff_active kitty_remote; then
+        return 1
+    fi
+    return 0
 }
 
 # ==============================================================================
@@ -64,7 +69,7 @@ supports_background_images() {
 # Args: $1 = absolute path to image file
 _set_bg_image_iterm2() {
     local image_path="$1"
-    local tty="${TTY_DEVICE:-/dev/tty}"
+    local TTY_DEVICE="${TTY_DEVICE:-/dev/tty}"  # Seen by tty_write
 
     # Verify image exists
     if [[ ! -f "$image_path" ]]; then
@@ -77,17 +82,17 @@ _set_bg_image_iterm2() {
 
     # Send OSC 1337 sequence
     # Format: ESC ] 1337 ; SetBackgroundImageFile = <base64> BEL
-    printf '\033]1337;SetBackgroundImageFile=%s\007' "$encoded_path" > "$tty"
+    tty_write '\033]1337;SetBackgroundImageFile=%s\007' "$encoded_path"
 
     return 0
 }
 
 # Clear background image in iTerm2
 _clear_bg_image_iterm2() {
-    local tty="${TTY_DEVICE:-/dev/tty}"
+    local TTY_DEVICE="${TTY_DEVICE:-/dev/tty}"  # Seen by tty_write
 
     # Send empty value to clear
-    printf '\033]1337;SetBackgroundImageFile=\007' > "$tty"
+    tty_write '\033]1337;SetBackgroundImageFile=\007'
 
     return 0
 }
@@ -100,8 +105,133 @@ _clear_bg_image_iterm2() {
 #   kitten @ set-background-image none  # Clear
 #
 # Requires allow_remote_control=yes in kitty.conf
+#
+# `kitten @` is a comparatively heavy client, so hooks never run it directly.
+# They record the desired image per TTY and hand it to a background applier:
+#   - Latest wins: requests arriving while a call is in flight overwrite the
+#     desired image; the applier only applies the newest one afterwards.
+#   - No-op skip: nothing runs when the desired image is already applied.
+#   - Socket: with KITTY_REMOTE_SOCKET (default: $KITTY_LISTEN_ON) the call
+#     goes over kitty's listen_on socket (--to) instead of the terminal.
+#
+# Files (under ${TAVS_TMP_DIR:-/tmp/tavs}):
+#   kitty-bg.{TTY_SAFE}.want     - Desired image path or "none"
+#   kitty-bg.{TTY_SAFE}.current  - Last image kitty confirmed
+#   kitty-bg.{TTY_SAFE}.lock/    - mkdir lock held by the running applier
 # ==============================================================================
 
+# Set _KITTY_BG_FILE to the per-TTY file prefix (no subshell)
+_kitty_bg_file() {
+    local tty_safe="${TTY_SAFE:-${TTY_DEVICE//\//_}}"
+    _KITTY_BG_FILE="${TAVS_TMP_DIR:-/tmp/tavs}/kitty-bg.${tty_safe:-_dev_tty}"
+}
+
+# Run one `kitten @ set-background-image` call
+# Args: $1 = absolute image path or "none"
+_kitty_set_background() {
+    local image="$1"
+    local args=(@)
+    local socket="${KITTY_REMOTE_SOCKET:-${KITTY_LISTEN_ON:-}}"
+    [[ -n "$socket" ]] && args+=(--to "$socket")
+    args+=(set-background-image)
+
+    if [[ "$image" != "none" ]]; then
+        # Layout and tint/opacity (Kitty calls it tint)
+        local tint="${KITTY_IMAGE_TINT:-}"
+        args+=("--layout=${KITTY_IMAGE_LAYOUT:-scaled}")
+        if [[ -n "$tint" ]] && [[ "$tint" != "0" ]]; then
+            args+=("--tint=$tint")
+        fi
+    fi
+    args+=("$image")
+
+    # May fail if remote control is disabled
+    kitten "${args[@]}" </dev/null >/dev/null 2>&1
+}
+
+# Apply desired images until the latest one is current (runs in background)
+# Args: $1 = per-TTY file prefix
+_kitty_bg_apply_loop() {
+    local base="$1"
+    local want current rc
+    while :; do
+        want="" current=""
+        [[ -f "${base}.want" ]] && read -r want < "${base}.want"
+        [[ -f "${base}.current" ]] && read -r current < "${base}.current"
+
+        if [[ -z "$want" || "$want" == "$current" ]]; then
+            rm -f "${base}.lock/pid" 2>/dev/null
+            rmdir "${base}.lock" 2>/dev/null
+            # A request may have landed after the check; take it over if so
+            want=""
+            [[ -f "${base}.want" ]] && read -r want < "${base}.want"
+            [[ -n "$want" && "$want" != "$current" ]] || return 0
+            mkdir "${base}.lock" 2>/dev/null || return 0
+            echo "$_KITTY_BG_APPLIER_PID" > "${base}.lock/pid" 2>/dev/null
+            continue
+        fi
+
+        _kitty_set_background "$want"
+        rc=$?
+        _record_kitty_remote_result "$rc"
+        if [[ $rc -ne 0 ]]; then
+            # Leave "current" untouched so the next request retries
+            rm -f "${base}.want" "${base}.lock/pid" 2>/dev/null
+            rmdir "${base}.lock" 2>/dev/null
+            return 1
+        fi
+        printf '%s\n' "$want" > "${base}.current.tmp.$$" 2>/dev/null && \
+            mv "${base}.current.tmp.$$" "${base}.current" 2>/dev/null
+    done
+}
+
+# Request a Kitty background image; returns without waiting for kitty
+# Args: $1 = absolute image path or "none"
+_kitty_bg_request() {
+    local image="$1"
+    local current="" lock_pid=""
+
+    # Verify kitten command is available
+    if ! command -v kitten &>/dev/null; then
+        return 1
+    fi
+
+    _kitty_bg_file
+    local base="$_KITTY_BG_FILE"
+    local dir="${base%/*}"
+    if [[ ! -d "$dir" ]]; then
+        mkdir -p "$dir" 2>/dev/null
+        chmod 700 "$dir" 2>/dev/null
+    fi
+
+    # Already showing this image and no applier in flight: nothing to do
+    if [[ ! -d "${base}.lock" && -f "${base}.current" ]]; then
+        read -r current < "${base}.current"
+        [[ "$current" == "$image" ]] && return 0
+    fi
+
+    printf '%s\n' "$image" > "${base}.want.tmp.$$" 2>/dev/null && \
+        mv "${base}.want.tmp.$$" "${base}.want" 2>/dev/null || return 1
+
+    # A running applier picks up the new request after its current call
+    if ! mkdir "${base}.lock" 2>/dev/null; then
+        [[ -f "${base}.lock/pid" ]] && read -r lock_pid < "${base}.lock/pid" 2>/dev/null
+        if [[ -n "$lock_pid" ]] && kill -0 "$lock_pid" 2>/dev/null; then
+            return 0
+        fi
+        rm -rf "${base}.lock" 2>/dev/null
+        mkdir "${base}.lock" 2>/dev/null || return 0
+    fi
+
+    (
+        _KITTY_BG_APPLIER_PID="${BASHPID:-$(sh -c 'echo $PPID')}"
+        echo "$_KITTY_BG_APPLIER_PID" > "${base}.lock/pid" 2>/dev/null
+        _kitty_bg_apply_loop "$base"
+    ) </dev/null >/dev/null 2>&1 &
+    disown 2>/dev/null || true
+    return 0
+}
+
 # Set background image in Kitty
 # Args: $1 = absolute path to image file
 _set_bg_image_kitty() {
@@ -112,43 +242,240 @@ _set_bg_image_kitty() {
         return 1
     fi
 
-    # Verify kitten command is available
-    if ! command -v kitten &>/dev/null; then
-        return 1
+    _kitty_bg_request "$image_path"
+}
+
+# Clear background image in Kitty
+_clear_bg_image_kitty() {
+    _kitty_bg_request "none"
+}
+
+# Feed a `kitten @` exit code into the feature backoff (if loaded)
+# Args: $1 = exit code
+_record_kitty_remote_result() {
+    type record_feature_failure &>/dev/null || return 0
+    if [[ "$1" -eq 0 ]]; then
+        record_feature_success kitty_remote
+    else
+        record_feature_failure kitty_remote
     fi
+}
+
+# ==============================================================================
+# IMAGE RESOLUTION
+# ==============================================================================
+# Each (mode, state) resolves through a 9-level fallback chain:
+#   1-2. ~/.tavs/agents/{agent}/backgrounds/[{mode}/]{state}.png
+#   3-4. src/agents/{agent}/data/backgrounds/[{mode}/]{state}.png
+#   5-6. STYLISH_BACKGROUNDS_DIR/[{mode}/]{state}.png
+#   7.   STYLISH_SINGLE_IMAGE
+#   8-9. STYLISH_BACKGROUNDS_DIR/[{mode}/]default.png
+#
+# The results for all modes × states of an agent are kept in an index next to
+# the config snapshot (images/{agent}.idx), so a state change is one lookup.
+# The index is rebuilt when any directory of the chain is newer than it (a
+# directory's mtime changes when images are added, removed or renamed), when
+# STYLISH_BACKGROUNDS_DIR/STYLISH_SINGLE_IMAGE change, or when the indexed
+# image no longer exists.
+#
+# Index format (key=value, never sourced):
+#   config=<STYLISH_BACKGROUNDS_DIR>|<STYLISH_SINGLE_IMAGE>
+#   {mode}/{state}=<absolute image path, empty if none>
+# ==============================================================================
 
-    # Build kitten command with configured options
-    local layout="${KITTY_IMAGE_LAYOUT:-scaled}"
-    local tint="${KITTY_IMAGE_TINT:-}"
+# Packaged agent data root (string ops only, no subshell)
+_BACKGROUNDS_AGENTS_DIR="${BASH_SOURCE[0]:-$0}"
+_BACKGROUNDS_AGENTS_DIR="${_BACKGROUNDS_AGENTS_DIR%/*}/../agents"
 
-    local cmd="kitten @ set-background-image"
+# States with a background image (idle_* stages share idle.png)
+_BACKGROUND_INDEX_STATES=(processing permission complete idle compacting subagent tool_error)
 
-    # Add layout option
-    cmd+=" --layout=$layout"
+# Resolve one image through the fallback chain
+# Args: $1 = mode dir (dark/light), $2 = file name (e.g. processing.png),
+#       $3 = packaged agent dir (optional, resolved if omitted)
+# Sets: _BG_IMAGE_PATH (empty if no image)
+_resolve_background_image() {
+    local mode_dir="$1" filename="$2"
+    local agent="${TAVS_AGENT:-claude}"
+    local image_path=""
 
-    # Add tint/opacity if specified (Kitty calls it tint)
-    if [[ -n "$tint" ]] && [[ "$tint" != "0" ]]; then
-        cmd+=" --tint=$tint"
+    # Get paths
+    local user_agent_dir="$HOME/.tavs/agents/$agent/backgrounds"
+    local src_agent_dir="${3-}"
+    if [[ $# -lt 3 ]]; then
+        src_agent_dir="$( cd "$_BACKGROUNDS_AGENTS_DIR/$agent/data/backgrounds" 2>/dev/null && pwd )" || true
     fi
+    local global_dir="${STYLISH_BACKGROUNDS_DIR:-$HOME/.tavs/backgrounds}"
 
-    # Add image path
-    cmd+=" '$image_path'"
+    # Priority 1: User agent override with mode
+    if [[ -f "${user_agent_dir}/${mode_dir}/${filename}" ]]; then
+        image_path="${user_agent_dir}/${mode_dir}/${filename}"
+    # Priority 2: User agent override without mode
+    elif [[ -f "${user_agent_dir}/${filename}" ]]; then
+        image_path="${user_agent_dir}/${filename}"
+    # Priority 3: Source agent data with mode
+    elif [[ -n "$src_agent_dir" ]] && [[ -f "${src_agent_dir}/${mode_dir}/${filename}" ]]; then
+        image_path="${src_agent_dir}/${mode_dir}/${filename}"
+    # Priority 4: Source agent data without mode
+    elif [[ -n "$src_agent_dir" ]] && [[ -f "${src_agent_dir}/${filename}" ]]; then
+        image_path="${src_agent_dir}/${filename}"
+    # Priority 5: Global user backgrounds with mode (legacy)
+    elif [[ -f "${global_dir}/${mode_dir}/${filename}" ]]; then
+        image_path="${global_dir}/${mode_dir}/${filename}"
+    # Priority 6: Global user backgrounds without mode
+    elif [[ -f "${global_dir}/${filename}" ]]; then
+        image_path="${global_dir}/${filename}"
+    # Priority 7: Single image fallback
+    elif [[ -n "$STYLISH_SINGLE_IMAGE" ]] && [[ -f "$STYLISH_SINGLE_IMAGE" ]]; then
+        image_path="$STYLISH_SINGLE_IMAGE"
+    # Priority 8: Default image in global mode directory
+    elif [[ -f "${global_dir}/${mode_dir}/default.png" ]]; then
+        image_path="${global_dir}/${mode_dir}/default.png"
+    # Priority 9: Default image in global root
+    elif [[ -f "${global_dir}/default.png" ]]; then
+        image_path="${global_dir}/default.png"
+    fi
 
-    # Execute (suppress errors - may fail if remote control disabled)
-    eval "$cmd" 2>/dev/null
+    _BG_IMAGE_PATH="$image_path"
+}
 
-    return $?
+# Set _BG_INDEX_FILE for the current agent (empty without config-snapshot.sh)
+_background_index_file() {
+    _BG_INDEX_FILE=""
+    type _snapshot_dir &>/dev/null || return 1
+    _snapshot_dir
+    _BG_INDEX_FILE="$_SNAPSHOT_DIR/images/${TAVS_AGENT:-claude}.idx"
 }
 
-# Clear background image in Kitty
-_clear_bg_image_kitty() {
-    if ! command -v kitten &>/dev/null; then
-        return 1
+# Check that no directory of the chain changed since the index was written
+# Args: $1 = index file, $2 = mode dir
+_background_index_is_fresh() {
+    local index="$1" mode_dir="$2"
+    local agent="${TAVS_AGENT:-claude}"
+    local global_dir="${STYLISH_BACKGROUNDS_DIR:-$HOME/.tavs/backgrounds}"
+    local dir
+    for dir in "$HOME/.tavs/agents/$agent/backgrounds" \
+               "$_BACKGROUNDS_AGENTS_DIR/$agent/data/backgrounds" \
+               "$global_dir"; do
+        [[ -d "$dir" && "$dir" -nt "$index" ]] && return 1
+        [[ -d "$dir/$mode_dir" && "$dir/$mode_dir" -nt "$index" ]] && return 1
+    done
+    return 0
+}
+
+# Resolve every mode × state for the current agent and write the index
+# Args: $1 = index file
+_build_background_index() {
+    local index="$1"
+    local agent="${TAVS_AGENT:-claude}"
+    local src_agent_dir mode_dir name
+    src_agent_dir="$( cd "$_BACKGROUNDS_AGENTS_DIR/$agent/data/backgrounds" 2>/dev/null && pwd )" || true
+
+    if [[ ! -d "${index%/*}" ]]; then
+        mkdir -p "${index%/*}" 2>/dev/null || return 1
+        chmod 700 "${index%/*/*}" 2>/dev/null
     fi
+    {
+        printf 'config=%s|%s\n' "${STYLISH_BACKGROUNDS_DIR:-}" "${STYLISH_SINGLE_IMAGE:-}"
+        for mode_dir in dark light; do
+            for name in "${_BACKGROUND_INDEX_STATES[@]}"; do
+                _resolve_background_image "$mode_dir" "${name}.png" "$src_agent_dir"
+                printf '%s/%s=%s\n' "$mode_dir" "$name" "$_BG_IMAGE_PATH"
+            done
+        done
+    } > "${index}.tmp.$$" 2>/dev/null && mv "${index}.tmp.$$" "$index" 2>/dev/null
+}
 
-    kitten @ set-background-image none 2>/dev/null
+# Look up a state's image in the index, rebuilding it when stale
+# Args: $1 = mode dir (dark/light), $2 = state name (without .png)
+# Sets: _BG_IMAGE_PATH. Returns 1 if the state is not indexed or no index
+# can be used (caller falls back to _resolve_background_image).
+lookup_background_image() {
+    local mode_dir="$1" name="$2"
+    local key value config="" found=false attempt
+    _BG_IMAGE_PATH=""
+    _background_index_file || return 1
+
+    for attempt in 1 2; do
+        if [[ -f "$_BG_INDEX_FILE" ]] && _background_index_is_fresh "$_BG_INDEX_FILE" "$mode_dir"; then
+            config="" found=false
+            while IFS='=' read -r key value; do
+                case "$key" in
+                    config) config="$value" ;;
+                    "$mode_dir/$name") _BG_IMAGE_PATH="$value"; found=true; break ;;
+                esac
+            done < "$_BG_INDEX_FILE"
+
+            if [[ "$config" == "${STYLISH_BACKGROUNDS_DIR:-}|${STYLISH_SINGLE_IMAGE:-}" ]]; then
+                [[ "$found" == "true" ]] || return 1
+                [[ -z "$_BG_IMAGE_PATH" || -f "$_BG_IMAGE_PATH" ]] && return 0
+            fi
+        fi
+        [[ $attempt -eq 1 ]] && _build_background_index "$_BG_INDEX_FILE"
+    done
+    _BG_IMAGE_PATH=""
+    return 1
+}
 
-    return $?
+# ==============================================================================
+# PRE-RENDERED VARIANTS
+# ==============================================================================
+# `tavs backgrounds build` renders each source image at several terminal sizes
+# into a content-addressed cache and writes a manifest (key=value, never
+# sourced):
+#   target=<WxH measured in the terminal during the build>
+#   <source path>=<WxH>:<variant path>|<WxH>:<variant path>|...
+#
+# The hook swaps the resolved source for the smallest variant that covers the
+# target size (STYLISH_PRERENDER_TARGET overrides the measured one), or the
+# largest variant when none covers it. Variants older than their source are
+# ignored, so edited art is shown as-is until the next build.
+# ==============================================================================
+
+# Replace a resolved image with its closest pre-rendered variant
+# Args: $1 = source image path
+# Sets: _BG_IMAGE_PATH (the variant, or $1 when there is none)
+_prerendered_background_image() {
+    local src="$1"
+    _BG_IMAGE_PATH="$src"
+    local manifest="${TAVS_PRERENDER_DIR:-${XDG_CACHE_HOME:-$HOME/.cache}/tavs/backgrounds}/manifest"
+    [[ -n "$src" && -f "$manifest" ]] || return 1
+
+    local key value target="" variants=""
+    while IFS='=' read -r key value; do
+        case "$key" in
+            target) target="$value" ;;
+            "$src") variants="$value"; break ;;
+        esac
+    done < "$manifest"
+    [[ -n "$variants" ]] || return 1
+    target="${STYLISH_PRERENDER_TARGET:-$target}"
+
+    local tw=0 th=0
+    if [[ "$target" =~ ^([0-9]+)x([0-9]+)$ ]]; then
+        tw="${BASH_REMATCH[1]}" th="${BASH_REMATCH[2]}"
+    fi
+
+    local entry size path w h
+    local best="" best_area=0 largest="" largest_area=0
+    while IFS= read -r -d '|' entry; do
+        size="${entry%%:*}" path="${entry#*:}"
+        [[ "$size" =~ ^([0-9]+)x([0-9]+)$ ]] || continue
+        w="${BASH_REMATCH[1]}" h="${BASH_REMATCH[2]}"
+        [[ -f "$path" && ! "$src" -nt "$path" ]] || continue
+        if [[ $((w * h)) -gt $largest_area ]]; then
+            largest="$path" largest_area=$((w * h))
+        fi
+        if [[ $w -ge $tw && $h -ge $th ]] && [[ -z "$best" || $((w * h)) -lt $best_area ]]; then
+            best="$path" best_area=$((w * h))
+        fi
+    done <<< "${variants}|"
+
+    # No measured target: the largest variant is the safe choice
+    [[ $tw -eq 0 ]] && best="$largest"
+    [[ -n "$best" ]] || best="$largest"
+    [[ -n "$best" ]] || return 1
+    _BG_IMAGE_PATH="$best"
 }
 
 # ==============================================================================
@@ -168,6 +495,9 @@ set_state_background_image() {
         return 0  # Silent fallback
     fi
 
+    # First stage shed when the hook runs over budget (latency-budget.sh)
+    [[ "$state" != "reset" ]] && ! latency_budget_allows image && return 0
+
     # Handle reset state
     if [[ "$state" == "reset" ]]; then
         clear_background_image
@@ -177,7 +507,11 @@ set_state_background_image() {
     # Determine mode directory (dark/light based on settings)
     local mode_dir=""
     if [[ "$ENABLE_LIGHT_DARK_SWITCHING" == "true" ]]; then
-        if detect_system_dark_mode; then
+        # Reuse the mode resolved at config load (watcher file or one probe)
+        if type _load_system_mode &>/dev/null; then
+            _load_system_mode
+            [[ "$_CACHED_SYSTEM_MODE" == "dark" ]] && mode_dir="dark" || mode_dir="light"
+        elif detect_system_dark_mode; then
             mode_dir="dark"
         else
             mode_dir="light"
@@ -188,51 +522,19 @@ set_state_background_image() {
         mode_dir="dark"  # Default to dark
     fi
 
-    # Map state to image filename (idle_* variants use idle.png)
-    local filename
+    # Map state to image name (idle_* variants use idle.png)
+    local name
     case "$state" in
-        idle_*) filename="idle.png" ;;
-        *)      filename="${state}.png" ;;
+        idle_*) name="idle" ;;
+        *)      name="$state" ;;
     esac
 
-    # Look for image with agent-specific priority
-    local image_path=""
-    local agent="${TAVS_AGENT:-claude}"
-
-    # Get paths
-    local user_agent_dir="$HOME/.tavs/agents/$agent/backgrounds"
-    local src_agent_dir
-    src_agent_dir="$( cd "$( dirname "${BASH_SOURCE[0]}" )/../agents/$agent/data/backgrounds" 2>/dev/null && pwd )" || true
-    local global_dir="${STYLISH_BACKGROUNDS_DIR:-$HOME/.tavs/backgrounds}"
-
-    # Priority 1: User agent override with mode
-    if [[ -f "${user_agent_dir}/${mode_dir}/${filename}" ]]; then
-        image_path="${user_agent_dir}/${mode_dir}/${filename}"
-    # Priority 2: User agent override without mode
-    elif [[ -f "${user_agent_dir}/${filename}" ]]; then
-        image_path="${user_agent_dir}/${filename}"
-    # Priority 3: Source agent data with mode
-    elif [[ -n "$src_agent_dir" ]] && [[ -f "${src_agent_dir}/${mode_dir}/${filename}" ]]; then
-        image_path="${src_agent_dir}/${mode_dir}/${filename}"
-    # Priority 4: Source agent data without mode
-    elif [[ -n "$src_agent_dir" ]] && [[ -f "${src_agent_dir}/${filename}" ]]; then
-        image_path="${src_agent_dir}/${filename}"
-    # Priority 5: Global user backgrounds with mode (legacy)
-    elif [[ -f "${global_dir}/${mode_dir}/${filename}" ]]; then
-        image_path="${global_dir}/${mode_dir}/${filename}"
-    # Priority 6: Global user backgrounds without mode
-    elif [[ -f "${global_dir}/${filename}" ]]; then
-        image_path="${global_dir}/${filename}"
-    # Priority 7: Single image fallback
-    elif [[ -n "$STYLISH_SINGLE_IMAGE" ]] && [[ -f "$STYLISH_SINGLE_IMAGE" ]]; then
-        image_path="$STYLISH_SINGLE_IMAGE"
-    # Priority 8: Default image in global mode directory
-    elif [[ -f "${global_dir}/${mode_dir}/default.png" ]]; then
-        image_path="${global_dir}/${mode_dir}/default.png"
-    # Priority 9: Default image in global root
-    elif [[ -f "${global_dir}/default.png" ]]; then
-        image_path="${global_dir}/default.png"
+    # One index lookup; walk the fallback chain only if no index is available
+    if ! lookup_background_image "$mode_dir" "$name"; then
+        _resolve_background_image "$mode_dir" "${name}.png"
     fi
+    _prerendered_background_image "$_BG_IMAGE_PATH"
+    local image_path="$_BG_IMAGE_PATH"
 
     # No image found - silent fallback
     if [[ -z "$image_path" ]]; then
@@ -240,10 +542,7 @@ set_state_background_image() {
     fi
 
     # Set image based on terminal type
-    local terminal_type
-    terminal_type=$(get_terminal_type)
-
-    case "$terminal_type" in
+    case "$TAVS_CAP_TERMINAL" in
         iterm2)
             _set_bg_image_iterm2 "$image_path"
             ;;
@@ -265,10 +564,7 @@ clear_background_image() {
         return 0
     fi
 
-    local terminal_type
-    terminal_type=$(get_terminal_type)
-
-    case "$terminal_type" in
+    case "$TAVS_CAP_TERMINAL" in
         iterm2)
             _clear_bg_image_iterm2
             ;;
@@ -8,248 +8,375 @@
 # All calculations use integer arithmetic scaled by 1000 for precision.
 # ==============================================================================
 
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+
 # Scale factor for integer arithmetic (1000 = 3 decimal places)
 readonly COLOR_SCALE=1000
 
 # ==============================================================================
-# HEX <-> RGB Conversion
+# Result-Variable Primitives (fork-free)
 # ==============================================================================
+# The echo-style API below is convenient but every `$(…)` costs a subshell.
+# These primitives write into globals (_CLR_*) or a caller-named variable via
+# `printf -v`, so hot paths (config load, idle worker) never fork.
+#
+# Internal globals:
+#   _CLR_R _CLR_G _CLR_B   - last RGB result (0-255)
+#   _CLR_H _CLR_S _CLR_L   - last HSL result (scaled, see below)
+#   _CLR_HUE               - last _hue_to_rgb_var result
+#
+# Output variable names passed to *_into functions must not start with `_ch_`.
 
-# Convert hex color (#RRGGBB or RRGGBB) to space-separated RGB (0-255)
-# Usage: hex_to_rgb "#473D2F" -> "71 61 47"
-hex_to_rgb() {
-    local hex="${1#\#}"  # Remove leading # if present
+# Parse hex color into _CLR_R/_CLR_G/_CLR_B. Returns 1 (and black) if invalid.
+_hex_to_rgb_vars() {
+    local _ch_hex="${1#\#}"  # Remove leading # if present
 
     # Handle short hex format (#RGB -> #RRGGBB)
-    if [[ ${#hex} -eq 3 ]]; then
-        hex="${hex:0:1}${hex:0:1}${hex:1:1}${hex:1:1}${hex:2:1}${hex:2:1}"
+    if [[ ${#_ch_hex} -eq 3 ]]; then
+        _ch_hex="${_ch_hex:0:1}${_ch_hex:0:1}${_ch_hex:1:1}${_ch_hex:1:1}${_ch_hex:2:1}${_ch_hex:2:1}"
     fi
 
     # Validate length
-    if [[ ${#hex} -ne 6 ]]; then
-        echo "0 0 0"
+    if [[ ${#_ch_hex} -ne 6 ]]; then
+        _CLR_R=0 _CLR_G=0 _CLR_B=0
         return 1
     fi
 
-    # Convert hex to decimal
-    local r=$((16#${hex:0:2}))
-    local g=$((16#${hex:2:2}))
-    local b=$((16#${hex:4:2}))
-
-    echo "$r $g $b"
+    _CLR_R=$((16#${_ch_hex:0:2}))
+    _CLR_G=$((16#${_ch_hex:2:2}))
+    _CLR_B=$((16#${_ch_hex:4:2}))
 }
 
-# Convert RGB (0-255 each) to hex color (#RRGGBB)
-# Usage: rgb_to_hex 71 61 47 -> "#473D2F"
-rgb_to_hex() {
-    local r=$1 g=$2 b=$3
+# Format RGB (0-255, clamped) as #RRGGBB into the named variable
+_rgb_to_hex_into() {
+    local _ch_r=$2 _ch_g=$3 _ch_b=$4
 
     # Clamp values to 0-255
-    (( r < 0 )) && r=0; (( r > 255 )) && r=255
-    (( g < 0 )) && g=0; (( g > 255 )) && g=255
-    (( b < 0 )) && b=0; (( b > 255 )) && b=255
+    (( _ch_r < 0 )) && _ch_r=0; (( _ch_r > 255 )) && _ch_r=255
+    (( _ch_g < 0 )) && _ch_g=0; (( _ch_g > 255 )) && _ch_g=255
+    (( _ch_b < 0 )) && _ch_b=0; (( _ch_b > 255 )) && _ch_b=255
 
-    printf "#%02X%02X%02X" "$r" "$g" "$b"
+    printf -v "$1" "#%02X%02X%02X" "$_ch_r" "$_ch_g" "$_ch_b"
 }
 
-# ==============================================================================
-# RGB <-> HSL Conversion
-# ==============================================================================
-# HSL values are scaled by 1000 for integer arithmetic:
-# - H: 0-360000 (degrees * 1000)
-# - S: 0-1000 (percentage * 10, so 50% = 500)
-# - L: 0-1000 (percentage * 10, so 50% = 500)
-
-# Convert RGB (0-255 each) to HSL (scaled integers)
-# Usage: rgb_to_hsl 71 61 47 -> "37500 203 231"  (H=37.5°, S=20.3%, L=23.1%)
-rgb_to_hsl() {
-    local r=$1 g=$2 b=$3
-
+# Convert RGB (0-255 each) into _CLR_H/_CLR_S/_CLR_L (scaled integers)
+_rgb_to_hsl_vars() {
     # Normalize to 0-1000 scale
-    local r_norm=$(( r * 1000 / 255 ))
-    local g_norm=$(( g * 1000 / 255 ))
-    local b_norm=$(( b * 1000 / 255 ))
+    local _ch_r=$(( $1 * 1000 / 255 ))
+    local _ch_g=$(( $2 * 1000 / 255 ))
+    local _ch_b=$(( $3 * 1000 / 255 ))
 
     # Find min and max
-    local max=$r_norm min=$r_norm
-    (( g_norm > max )) && max=$g_norm
-    (( b_norm > max )) && max=$b_norm
-    (( g_norm < min )) && min=$g_norm
-    (( b_norm < min )) && min=$b_norm
+    local _ch_max=$_ch_r _ch_min=$_ch_r
+    (( _ch_g > _ch_max )) && _ch_max=$_ch_g
+    (( _ch_b > _ch_max )) && _ch_max=$_ch_b
+    (( _ch_g < _ch_min )) && _ch_min=$_ch_g
+    (( _ch_b < _ch_min )) && _ch_min=$_ch_b
 
-    local delta=$(( max - min ))
+    local _ch_delta=$(( _ch_max - _ch_min ))
 
     # Calculate Lightness (0-1000)
-    local l=$(( (max + min) / 2 ))
+    _CLR_L=$(( (_ch_max + _ch_min) / 2 ))
 
     # Calculate Saturation (0-1000)
-    local s=0
-    if (( delta != 0 )); then
-        if (( l <= 500 )); then
-            s=$(( delta * 1000 / (max + min) ))
+    _CLR_S=0
+    if (( _ch_delta != 0 )); then
+        if (( _CLR_L <= 500 )); then
+            _CLR_S=$(( _ch_delta * 1000 / (_ch_max + _ch_min) ))
         else
-            s=$(( delta * 1000 / (2000 - max - min) ))
+            _CLR_S=$(( _ch_delta * 1000 / (2000 - _ch_max - _ch_min) ))
         fi
     fi
 
     # Calculate Hue (0-360000, i.e., degrees * 1000)
-    local h=0
-    if (( delta != 0 )); then
-        if (( max == r_norm )); then
-            h=$(( ((g_norm - b_norm) * 60000 / delta) ))
-            (( h < 0 )) && h=$(( h + 360000 ))
-        elif (( max == g_norm )); then
-            h=$(( 120000 + (b_norm - r_norm) * 60000 / delta ))
+    _CLR_H=0
+    if (( _ch_delta != 0 )); then
+        if (( _ch_max == _ch_r )); then
+            _CLR_H=$(( ((_ch_g - _ch_b) * 60000 / _ch_delta) ))
+            (( _CLR_H < 0 )) && _CLR_H=$(( _CLR_H + 360000 ))
+        elif (( _ch_max == _ch_g )); then
+            _CLR_H=$(( 120000 + (_ch_b - _ch_r) * 60000 / _ch_delta ))
         else
-            h=$(( 240000 + (r_norm - g_norm) * 60000 / delta ))
+            _CLR_H=$(( 240000 + (_ch_r - _ch_g) * 60000 / _ch_delta ))
         fi
     fi
 
     # Normalize hue to 0-360000
-    (( h < 0 )) && h=$(( h + 360000 ))
-    (( h >= 360000 )) && h=$(( h - 360000 ))
-
-    echo "$h $s $l"
+    (( _CLR_H < 0 )) && _CLR_H=$(( _CLR_H + 360000 ))
+    (( _CLR_H >= 360000 )) && _CLR_H=$(( _CLR_H - 360000 ))
+    return 0
 }
 
-# Helper function for HSL to RGB conversion
-_hue_to_rgb() {
-    local p=$1 q=$2 t=$3
+# Helper for HSL to RGB conversion, result in _CLR_HUE
+_hue_to_rgb_var() {
+    local _ch_p=$1 _ch_q=$2 _ch_t=$3
 
     # Normalize t to 0-1000
-    (( t < 0 )) && t=$(( t + 1000 ))
-    (( t > 1000 )) && t=$(( t - 1000 ))
-
-    if (( t < 167 )); then  # t < 1/6
-        echo $(( p + (q - p) * 6 * t / 1000 ))
-    elif (( t < 500 )); then  # t < 1/2
-        echo "$q"
-    elif (( t < 667 )); then  # t < 2/3
-        echo $(( p + (q - p) * (667 - t) * 6 / 1000 ))
+    (( _ch_t < 0 )) && _ch_t=$(( _ch_t + 1000 ))
+    (( _ch_t > 1000 )) && _ch_t=$(( _ch_t - 1000 ))
+
+    if (( _ch_t < 167 )); then  # t < 1/6
+        _CLR_HUE=$(( _ch_p + (_ch_q - _ch_p) * 6 * _ch_t / 1000 ))
+    elif (( _ch_t < 500 )); then  # t < 1/2
+        _CLR_HUE=$_ch_q
+    elif (( _ch_t < 667 )); then  # t < 2/3
+        _CLR_HUE=$(( _ch_p + (_ch_q - _ch_p) * (667 - _ch_t) * 6 / 1000 ))
     else
-        echo "$p"
+        _CLR_HUE=$_ch_p
     fi
 }
 
-# Convert HSL (scaled integers) to RGB (0-255 each)
-# Usage: hsl_to_rgb 37500 203 231 -> "71 61 47"
-hsl_to_rgb() {
-    local h=$1 s=$2 l=$3
+# Convert HSL (scaled integers) into _CLR_R/_CLR_G/_CLR_B (0-255, clamped)
+_hsl_to_rgb_vars() {
+    local _ch_s=$2 _ch_l=$3
 
     # Convert h from 0-360000 to 0-1000 for calculations
-    local h_norm=$(( h * 1000 / 360000 ))
+    local _ch_hn=$(( $1 * 1000 / 360000 ))
 
-    local r g b
-
-    if (( s == 0 )); then
+    if (( _ch_s == 0 )); then
         # Achromatic (gray)
-        r=$(( l * 255 / 1000 ))
-        g=$r
-        b=$r
+        _CLR_R=$(( _ch_l * 255 / 1000 ))
+        _CLR_G=$_CLR_R
+        _CLR_B=$_CLR_R
     else
-        local q p
-        if (( l < 500 )); then
-            q=$(( l * (1000 + s) / 1000 ))
+        local _ch_q _ch_p
+        if (( _ch_l < 500 )); then
+            _ch_q=$(( _ch_l * (1000 + _ch_s) / 1000 ))
         else
-            q=$(( l + s - l * s / 1000 ))
+            _ch_q=$(( _ch_l + _ch_s - _ch_l * _ch_s / 1000 ))
         fi
-        p=$(( 2 * l - q ))
-
-        r=$(_hue_to_rgb $p $q $(( h_norm + 333 )))
-        g=$(_hue_to_rgb $p $q $h_norm)
-        b=$(_hue_to_rgb $p $q $(( h_norm - 333 )))
+        _ch_p=$(( 2 * _ch_l - _ch_q ))
 
         # Convert from 0-1000 to 0-255
-        r=$(( r * 255 / 1000 ))
-        g=$(( g * 255 / 1000 ))
-        b=$(( b * 255 / 1000 ))
+        _hue_to_rgb_var $_ch_p $_ch_q $(( _ch_hn + 333 ))
+        _CLR_R=$(( _CLR_HUE * 255 / 1000 ))
+        _hue_to_rgb_var $_ch_p $_ch_q $_ch_hn
+        _CLR_G=$(( _CLR_HUE * 255 / 1000 ))
+        _hue_to_rgb_var $_ch_p $_ch_q $(( _ch_hn - 333 ))
+        _CLR_B=$(( _CLR_HUE * 255 / 1000 ))
     fi
 
     # Clamp to valid range
-    (( r < 0 )) && r=0; (( r > 255 )) && r=255
-    (( g < 0 )) && g=0; (( g > 255 )) && g=255
-    (( b < 0 )) && b=0; (( b > 255 )) && b=255
+    (( _CLR_R < 0 )) && _CLR_R=0; (( _CLR_R > 255 )) && _CLR_R=255
+    (( _CLR_G < 0 )) && _CLR_G=0; (( _CLR_G > 255 )) && _CLR_G=255
+    (( _CLR_B < 0 )) && _CLR_B=0; (( _CLR_B > 255 )) && _CLR_B=255
+    return 0
+}
 
-    echo "$r $g $b"
+# ==============================================================================
+# Color LUT (memoization)
+# ==============================================================================
+# Results of shift_hue/interpolate_hsl are pure functions of their inputs, so
+# they are memoized in a newline-delimited "key=#RRGGBB" table. The table is
+# held in memory for the life of the process and persisted to a small file so
+# later hook invocations start warm. Keys are "<op>:<base>:<param>".
+#
+# TAVS_COLOR_LUT_FILE overrides the file location; set it to "" to keep the
+# LUT in memory only. Bump the ".v1" suffix if the color math ever changes.
+#
+# The file is shared by concurrent hooks: entries are appended with single
+# small O_APPEND writes, trimming rewrites it via tmp + mv, and only
+# "key=#RRGGBB" lines are ever used (see _color_lut_load/_color_lut_get).
+
+_COLOR_LUT_MAX_ENTRIES=512
+_COLOR_LUT=""
+_COLOR_LUT_LOADED=""
+
+# Load persisted LUT once per process (single read builtin, no forks)
+# A file with bytes no entry can hold, or a torn last line, is filtered line
+# by line; lookups return only #RRGGBB values, so no other line is ever used.
+_color_lut_load() {
+    [[ -n "$_COLOR_LUT_LOADED" ]] && return 0
+    _COLOR_LUT_LOADED=1
+    _COLOR_LUT=$'\n'
+
+    local _ch_file="${TAVS_COLOR_LUT_FILE-${TAVS_TMP_DIR:-/tmp/tavs}/color-lut.v1}"
+    [[ -n "$_ch_file" && -r "$_ch_file" ]] || return 0
+
+    local _ch_data="" _ch_nl=$'\n'
+    IFS= read -r -d '' _ch_data < "$_ch_file" 2>/dev/null
+    # Regex search and a last-byte check (globs here scan quadratically)
+    local _ch_foreign_re="[^0-9A-Za-z:#=.${_ch_nl}-]"
+    if [[ "$_ch_data" =~ $_ch_foreign_re || \
+          ( -n "$_ch_data" && "${_ch_data: -1}" != "$_ch_nl" ) ]]; then
+        local _ch_line _ch_line_re="^[^= ]+=#[0-9a-fA-F]{6}\$"
+        _ch_data=""
+        while IFS= read -r _ch_line; do
+            [[ "$_ch_line" =~ $_ch_line_re ]] && _ch_data+="$_ch_line$_ch_nl"
+        done < "$_ch_file"
+    fi
+    _COLOR_LUT+="$_ch_data"
+    return 0
+}
+
+# Look up key; on hit stores result in named variable and returns 0
+_color_lut_get() {
+    _color_lut_load
+    case "$_COLOR_LUT" in
+        *$'\n'"$2="*) ;;
+        *) return 1 ;;
+    esac
+    local _ch_val="${_COLOR_LUT#*$'\n'"$2="}"
+    _ch_val="${_ch_val%%$'\n'*}"
+    [[ "$_ch_val" == \#[0-9a-fA-F][0-9a-fA-F][0-9a-fA-F][0-9a-fA-F][0-9a-fA-F][0-9a-fA-F] ]] || return 1
+    printf -v "$1" '%s' "$_ch_val"
+}
+
+# Record key=value in memory and append it to the persisted LUT
+_color_lut_put() {
+    _COLOR_LUT+="$1=$2"$'\n'
+
+    local _ch_file="${TAVS_COLOR_LUT_FILE-${TAVS_TMP_DIR:-/tmp/tavs}/color-lut.v1}"
+    [[ -n "$_ch_file" ]] || return 0
+    [[ -d "${_ch_file%/*}" ]] || return 0
+
+    # Count entries with parameter expansion; start over once the cap is hit
+    local _ch_lines="${_COLOR_LUT//[!$'\n']/}"
+    if (( ${#_ch_lines} > _COLOR_LUT_MAX_ENTRIES )); then
+        # Rewrite (never truncate in place) so readers see a whole file
+        _COLOR_LUT=$'\n'"$1=$2"$'\n'
+        util_tmpfile "$_ch_file"
+        if printf '%s=%s\n' "$1" "$2" > "$_UTIL_TMPFILE" 2>/dev/null; then
+            mv -f "$_UTIL_TMPFILE" "$_ch_file" 2>/dev/null || rm -f "$_UTIL_TMPFILE" 2>/dev/null
+        else
+            rm -f "$_UTIL_TMPFILE" 2>/dev/null
+        fi
+    else
+        # Single small O_APPEND write — safe with concurrent hooks
+        printf '%s=%s\n' "$1" "$2" >> "$_ch_file" 2>/dev/null
+    fi
+    return 0
+}
+
+# Forget the in-memory LUT (and optionally the persisted file)
+# Usage: clear_color_lut [--persistent]
+clear_color_lut() {
+    _COLOR_LUT=""
+    _COLOR_LUT_LOADED=""
+    if [[ "${1:-}" == "--persistent" ]]; then
+        local _ch_file="${TAVS_COLOR_LUT_FILE-${TAVS_TMP_DIR:-/tmp/tavs}/color-lut.v1}"
+        [[ -n "$_ch_file" ]] && rm -f "$_ch_file" 2>/dev/null
+    fi
+    return 0
 }
 
 # ==============================================================================
-# Hue Shifting
+# HEX <-> RGB Conversion
 # ==============================================================================
 
-# Shift hue of a hex color to a target hue while preserving saturation/lightness
-# Usage: shift_hue "#473D2F" 30 -> "#4A3D2B" (shift to 30° orange)
-# Target hue is in degrees (0-360)
-shift_hue() {
-    local hex="$1"
-    local target_hue="$2"  # degrees (0-360)
+# Convert hex color (#RRGGBB or RRGGBB) to space-separated RGB (0-255)
+# Usage: hex_to_rgb "#473D2F" -> "71 61 47"
+hex_to_rgb() {
+    if ! _hex_to_rgb_vars "$1"; then
+        echo "0 0 0"
+        return 1
+    fi
+    echo "$_CLR_R $_CLR_G $_CLR_B"
+}
 
-    # Convert hex to RGB
-    local rgb
-    rgb=$(hex_to_rgb "$hex")
-    read -r r g b <<< "$rgb"
+# Convert RGB (0-255 each) to hex color (#RRGGBB)
+# Usage: rgb_to_hex 71 61 47 -> "#473D2F"
+rgb_to_hex() {
+    local hex
+    _rgb_to_hex_into hex "$1" "$2" "$3"
+    printf '%s' "$hex"
+}
 
-    # Convert RGB to HSL
-    local hsl
-    hsl=$(rgb_to_hsl "$r" "$g" "$b")
-    read -r h s l <<< "$hsl"
+# ==============================================================================
+# RGB <-> HSL Conversion
+# ==============================================================================
+# HSL values are scaled by 1000 for integer arithmetic:
+# - H: 0-360000 (degrees * 1000)
+# - S: 0-1000 (percentage * 10, so 50% = 500)
+# - L: 0-1000 (percentage * 10, so 50% = 500)
 
-    # Replace hue with target (convert degrees to scaled value)
-    local new_h=$(( target_hue * 1000 ))
+# Convert RGB (0-255 each) to HSL (scaled integers)
+# Usage: rgb_to_hsl 71 61 47 -> "37500 203 231"  (H=37.5°, S=20.3%, L=23.1%)
+rgb_to_hsl() {
+    _rgb_to_hsl_vars "$1" "$2" "$3"
+    echo "$_CLR_H $_CLR_S $_CLR_L"
+}
 
-    # Convert back to RGB
-    local new_rgb
-    new_rgb=$(hsl_to_rgb "$new_h" "$s" "$l")
-    read -r nr ng nb <<< "$new_rgb"
+# Helper function for HSL to RGB conversion
+_hue_to_rgb() {
+    _hue_to_rgb_var "$1" "$2" "$3"
+    echo "$_CLR_HUE"
+}
 
-    # Convert to hex
-    rgb_to_hex "$nr" "$ng" "$nb"
+# Convert HSL (scaled integers) to RGB (0-255 each)
+# Usage: hsl_to_rgb 37500 203 231 -> "71 61 47"
+hsl_to_rgb() {
+    _hsl_to_rgb_vars "$1" "$2" "$3"
+    echo "$_CLR_R $_CLR_G $_CLR_B"
 }
 
 # ==============================================================================
-# Luminance Calculation
+# Hue Shifting
 # ==============================================================================
 
-# Calculate relative luminance using W3C formula
-# L = 0.2126*R + 0.7152*G + 0.0722*B (with gamma correction)
-# Returns value scaled by 1000 (0-1000 range)
-# Usage: calculate_luminance "#473D2F" -> "185" (0.185 luminance)
-calculate_luminance() {
-    local hex="$1"
+# Shift hue into the named variable (fork-free, memoized)
+# Usage: shift_hue_into result "#473D2F" 30
+shift_hue_into() {
+    local _ch_key="shift:$2:$3"
+    _color_lut_get "$1" "$_ch_key" && return 0
 
-    # Convert hex to RGB
-    local rgb
-    rgb=$(hex_to_rgb "$hex")
-    read -r r g b <<< "$rgb"
+    _hex_to_rgb_vars "$2"
+    _rgb_to_hsl_vars "$_CLR_R" "$_CLR_G" "$_CLR_B"
 
-    # Normalize to 0-1000 scale
-    local r_norm=$(( r * 1000 / 255 ))
-    local g_norm=$(( g * 1000 / 255 ))
-    local b_norm=$(( b * 1000 / 255 ))
-
-    # Apply simplified gamma correction (linearize)
-    # For values <= 0.03928, divide by 12.92
-    # For values > 0.03928, ((value + 0.055) / 1.055) ^ 2.4
-    # Using simplified linear approximation for bash integer math
-    _linearize() {
-        local v=$1
-        if (( v <= 39 )); then  # 0.03928 * 1000 ≈ 39
-            echo $(( v * 1000 / 12920 ))
+    # Replace hue with target (convert degrees to scaled value)
+    _hsl_to_rgb_vars $(( $3 * 1000 )) "$_CLR_S" "$_CLR_L"
+
+    local _ch_hex
+    _rgb_to_hex_into _ch_hex "$_CLR_R" "$_CLR_G" "$_CLR_B"
+    _color_lut_put "$_ch_key" "$_ch_hex"
+    printf -v "$1" '%s' "$_ch_hex"
+}
+
+# Shift hue of a hex color to a target hue while preserving saturation/lightness
+# Usage: shift_hue "#473D2F" 30 -> "#4A3D2B" (shift to 30° orange)
+# Target hue is in degrees (0-360)
+shift_hue() {
+    local hex
+    shift_hue_into hex "$1" "$2"
+    printf '%s' "$hex"
+}
+
+# ==============================================================================
+# Luminance Calculation
+# ==============================================================================
+
+# Calculate luminance into the named variable (fork-free)
+# Usage: calculate_luminance_into lum "#473D2F"
+calculate_luminance_into() {
+    _hex_to_rgb_vars "$2"
+
+    # Normalize to 0-1000 scale, then apply simplified gamma correction
+    # (linearize): values <= 0.03928 divide by 12.92, otherwise use a
+    # quadratic approximation of ((v + 0.055) / 1.055) ^ 2.4
+    local _ch_v _ch_lin _ch_sum=0 _ch_weight
+    for _ch_v in "$_CLR_R:2126" "$_CLR_G:7152" "$_CLR_B:722"; do
+        _ch_weight=${_ch_v#*:}
+        _ch_v=$(( ${_ch_v%%:*} * 1000 / 255 ))
+        if (( _ch_v <= 39 )); then  # 0.03928 * 1000 ≈ 39
+            _ch_lin=$(( _ch_v * 1000 / 12920 ))
         else
-            # Simplified: approximate gamma with power function
-            # Using lookup or polynomial approximation
-            # For simplicity, using linear approximation scaled
-            echo $(( (v + 55) * (v + 55) / 1110 ))
+            _ch_lin=$(( (_ch_v + 55) * (_ch_v + 55) / 1110 ))
         fi
-    }
-
-    local r_lin=$(_linearize $r_norm)
-    local g_lin=$(_linearize $g_norm)
-    local b_lin=$(_linearize $b_norm)
+        _ch_sum=$(( _ch_sum + _ch_weight * _ch_lin ))
+    done
 
     # Calculate luminance: 0.2126*R + 0.7152*G + 0.0722*B
-    local luminance=$(( (2126 * r_lin + 7152 * g_lin + 722 * b_lin) / 10000 ))
+    printf -v "$1" '%s' $(( _ch_sum / 10000 ))
+}
 
+# Calculate relative luminance using W3C formula
+# L = 0.2126*R + 0.7152*G + 0.0722*B (with gamma correction)
+# Returns value scaled by 1000 (0-1000 range)
+# Usage: calculate_luminance "#473D2F" -> "185" (0.185 luminance)
+calculate_luminance() {
+    local luminance
+    calculate_luminance_into luminance "$1"
     echo "$luminance"
 }
 
@@ -257,9 +384,8 @@ calculate_luminance() {
 # Returns 0 (true) for dark, 1 (false) for light
 # Usage: is_dark_color "#473D2F" && echo "dark" || echo "light"
 is_dark_color() {
-    local hex="$1"
     local luminance
-    luminance=$(calculate_luminance "$hex")
+    calculate_luminance_into luminance "$1"
 
     # Threshold at 500 (0.5 * 1000)
     (( luminance < 500 ))
@@ -273,74 +399,72 @@ is_dark_color() {
 # t is the interpolation factor (0-1000, where 0=color1, 1000=color2)
 # Usage: interpolate_color "#473D2F" "#2E3440" 500 -> midpoint color
 interpolate_color() {
-    local hex1="$1"
-    local hex2="$2"
     local t="$3"  # 0-1000
 
     # Clamp t
     (( t < 0 )) && t=0
     (( t > 1000 )) && t=1000
 
-    # Convert both to RGB
-    local rgb1 rgb2
-    rgb1=$(hex_to_rgb "$hex1")
-    rgb2=$(hex_to_rgb "$hex2")
-    read -r r1 g1 b1 <<< "$rgb1"
-    read -r r2 g2 b2 <<< "$rgb2"
+    _hex_to_rgb_vars "$1"
+    local r1=$_CLR_R g1=$_CLR_G b1=$_CLR_B
+    _hex_to_rgb_vars "$2"
 
     # Linear interpolation
-    local r=$(( r1 + (r2 - r1) * t / 1000 ))
-    local g=$(( g1 + (g2 - g1) * t / 1000 ))
-    local b=$(( b1 + (b2 - b1) * t / 1000 ))
-
-    rgb_to_hex "$r" "$g" "$b"
+    local hex
+    _rgb_to_hex_into hex \
+        $(( r1 + (_CLR_R - r1) * t / 1000 )) \
+        $(( g1 + (_CLR_G - g1) * t / 1000 )) \
+        $(( b1 + (_CLR_B - b1) * t / 1000 ))
+    printf '%s' "$hex"
 }
 
-# Interpolate in HSL space (better for hue transitions)
-# Usage: interpolate_hsl "#473D2F" "#2E3440" 500 -> midpoint with hue interpolation
-interpolate_hsl() {
-    local hex1="$1"
-    local hex2="$2"
-    local t="$3"  # 0-1000
+# Interpolate in HSL space into the named variable (fork-free, memoized)
+# Usage: interpolate_hsl_into result "#473D2F" "#2E3440" 500
+interpolate_hsl_into() {
+    local _ch_t="$4"  # 0-1000
 
     # Clamp t
-    (( t < 0 )) && t=0
-    (( t > 1000 )) && t=1000
+    (( _ch_t < 0 )) && _ch_t=0
+    (( _ch_t > 1000 )) && _ch_t=1000
+
+    local _ch_key="ihsl:$2:$3:$_ch_t"
+    _color_lut_get "$1" "$_ch_key" && return 0
 
     # Convert both to HSL
-    local rgb1 rgb2
-    rgb1=$(hex_to_rgb "$hex1")
-    rgb2=$(hex_to_rgb "$hex2")
-    read -r r1 g1 b1 <<< "$rgb1"
-    read -r r2 g2 b2 <<< "$rgb2"
-
-    local hsl1 hsl2
-    hsl1=$(rgb_to_hsl "$r1" "$g1" "$b1")
-    hsl2=$(rgb_to_hsl "$r2" "$g2" "$b2")
-    read -r h1 s1 l1 <<< "$hsl1"
-    read -r h2 s2 l2 <<< "$hsl2"
+    _hex_to_rgb_vars "$2"
+    _rgb_to_hsl_vars "$_CLR_R" "$_CLR_G" "$_CLR_B"
+    local _ch_h1=$_CLR_H _ch_s1=$_CLR_S _ch_l1=$_CLR_L
+    _hex_to_rgb_vars "$3"
+    _rgb_to_hsl_vars "$_CLR_R" "$_CLR_G" "$_CLR_B"
 
     # Interpolate hue (shortest path around the circle)
-    local h_diff=$(( h2 - h1 ))
-    if (( h_diff > 180000 )); then
-        h_diff=$(( h_diff - 360000 ))
-    elif (( h_diff < -180000 )); then
-        h_diff=$(( h_diff + 360000 ))
+    local _ch_hd=$(( _CLR_H - _ch_h1 ))
+    if (( _ch_hd > 180000 )); then
+        _ch_hd=$(( _ch_hd - 360000 ))
+    elif (( _ch_hd < -180000 )); then
+        _ch_hd=$(( _ch_hd + 360000 ))
     fi
-    local h=$(( h1 + h_diff * t / 1000 ))
-    (( h < 0 )) && h=$(( h + 360000 ))
-    (( h >= 360000 )) && h=$(( h - 360000 ))
-
-    # Interpolate saturation and lightness linearly
-    local s=$(( s1 + (s2 - s1) * t / 1000 ))
-    local l=$(( l1 + (l2 - l1) * t / 1000 ))
-
-    # Convert back to RGB then hex
-    local rgb
-    rgb=$(hsl_to_rgb "$h" "$s" "$l")
-    read -r r g b <<< "$rgb"
+    local _ch_h=$(( _ch_h1 + _ch_hd * _ch_t / 1000 ))
+    (( _ch_h < 0 )) && _ch_h=$(( _ch_h + 360000 ))
+    (( _ch_h >= 360000 )) && _ch_h=$(( _ch_h - 360000 ))
+
+    # Interpolate saturation and lightness linearly, then back to hex
+    _hsl_to_rgb_vars "$_ch_h" \
+        $(( _ch_s1 + (_CLR_S - _ch_s1) * _ch_t / 1000 )) \
+        $(( _ch_l1 + (_CLR_L - _ch_l1) * _ch_t / 1000 ))
+
+    local _ch_hex
+    _rgb_to_hex_into _ch_hex "$_CLR_R" "$_CLR_G" "$_CLR_B"
+    _color_lut_put "$_ch_key" "$_ch_hex"
+    printf -v "$1" '%s' "$_ch_hex"
+}
 
-    rgb_to_hex "$r" "$g" "$b"
+# Interpolate in HSL space (better for hue transitions)
+# Usage: interpolate_hsl "#473D2F" "#2E3440" 500 -> midpoint with hue interpolation
+interpolate_hsl() {
+    local hex
+    interpolate_hsl_into hex "$1" "$2" "$3"
+    printf '%s' "$hex"
 }
 
 # ==============================================================================
@@ -351,58 +475,34 @@ interpolate_hsl() {
 # delta is in scaled units (-1000 to 1000)
 # Usage: adjust_lightness "#473D2F" -100 -> slightly darker
 adjust_lightness() {
-    local hex="$1"
-    local delta="$2"  # -1000 to 1000
-
-    # Convert to HSL
-    local rgb
-    rgb=$(hex_to_rgb "$hex")
-    read -r r g b <<< "$rgb"
-
-    local hsl
-    hsl=$(rgb_to_hsl "$r" "$g" "$b")
-    read -r h s l <<< "$hsl"
+    _hex_to_rgb_vars "$1"
+    _rgb_to_hsl_vars "$_CLR_R" "$_CLR_G" "$_CLR_B"
 
     # Adjust lightness
-    l=$(( l + delta ))
+    local l=$(( _CLR_L + $2 ))
     (( l < 0 )) && l=0
     (( l > 1000 )) && l=1000
 
     # Convert back
-    local new_rgb
-    new_rgb=$(hsl_to_rgb "$h" "$s" "$l")
-    read -r nr ng nb <<< "$new_rgb"
-
-    rgb_to_hex "$nr" "$ng" "$nb"
+    _hsl_to_rgb_vars "$_CLR_H" "$_CLR_S" "$l"
+    rgb_to_hex "$_CLR_R" "$_CLR_G" "$_CLR_B"
 }
 
 # Adjust saturation of a color
 # delta is in scaled units (-1000 to 1000)
 # Usage: adjust_saturation "#473D2F" -100 -> less saturated
 adjust_saturation() {
-    local hex="$1"
-    local delta="$2"  # -1000 to 1000
-
-    # Convert to HSL
-    local rgb
-    rgb=$(hex_to_rgb "$hex")
-    read -r r g b <<< "$rgb"
-
-    local hsl
-    hsl=$(rgb_to_hsl "$r" "$g" "$b")
-    read -r h s l <<< "$hsl"
+    _hex_to_rgb_vars "$1"
+    _rgb_to_hsl_vars "$_CLR_R" "$_CLR_G" "$_CLR_B"
 
     # Adjust saturation
-    s=$(( s + delta ))
+    local s=$(( _CLR_S + $2 ))
     (( s < 0 )) && s=0
     (( s > 1000 )) && s=1000
 
     # Convert back
-    local new_rgb
-    new_rgb=$(hsl_to_rgb "$h" "$s" "$l")
-    read -r nr ng nb <<< "$new_rgb"
-
-    rgb_to_hex "$nr" "$ng" "$nb"
+    _hsl_to_rgb_vars "$_CLR_H" "$s" "$_CLR_L"
+    rgb_to_hex "$_CLR_R" "$_CLR_G" "$_CLR_B"
 }
 
 # Calculate all state colors from a base color using fixed target hues
@@ -410,23 +510,58 @@ adjust_saturation() {
 # Usage: calculate_state_colors "#2E3440" -> "#4A3D2B #4A2021 #2E4430 #3E2E44 #2E4443"
 calculate_state_colors() {
     local base_hex="$1"
+    local proc perm comp idle compact
 
-    # Target hues for each state (degrees)
-    local HUE_PROCESSING=30    # Orange
-    local HUE_PERMISSION=0     # Red
-    local HUE_COMPLETE=120     # Green
-    local HUE_IDLE=270         # Purple
-    local HUE_COMPACTING=180   # Teal
-
-    local proc=$(shift_hue "$base_hex" $HUE_PROCESSING)
-    local perm=$(shift_hue "$base_hex" $HUE_PERMISSION)
-    local comp=$(shift_hue "$base_hex" $HUE_COMPLETE)
-    local idle=$(shift_hue "$base_hex" $HUE_IDLE)
-    local compact=$(shift_hue "$base_hex" $HUE_COMPACTING)
+    # Target hues: orange, red, green, purple, teal
+    shift_hue_into proc "$base_hex" 30
+    shift_hue_into perm "$base_hex" 0
+    shift_hue_into comp "$base_hex" 120
+    shift_hue_into idle "$base_hex" 270
+    shift_hue_into compact "$base_hex" 180
 
     echo "$proc $perm $comp $idle $compact"
 }
 
+# ==============================================================================
+# Batch Calculation (fork-free)
+# ==============================================================================
+
+# Calculate the seven idle stage colors
+# Stage 0: complete, 1: idle, 2-5: HSL-interpolated idle -> base (20/40/60/80%),
+# 6: "reset" (terminal default)
+# Sets COLOR_SET_STAGE_0 .. COLOR_SET_STAGE_6
+# Usage: calculate_stage_colors "$COLOR_COMPLETE" "$COLOR_IDLE" "$COLOR_BASE"
+calculate_stage_colors() {
+    local _ch_complete="$1" _ch_idle="$2" _ch_base="$3"
+
+    COLOR_SET_STAGE_0="$_ch_complete"
+    COLOR_SET_STAGE_1="$_ch_idle"
+    interpolate_hsl_into COLOR_SET_STAGE_2 "$_ch_idle" "$_ch_base" 200
+    interpolate_hsl_into COLOR_SET_STAGE_3 "$_ch_idle" "$_ch_base" 400
+    interpolate_hsl_into COLOR_SET_STAGE_4 "$_ch_idle" "$_ch_base" 600
+    interpolate_hsl_into COLOR_SET_STAGE_5 "$_ch_idle" "$_ch_base" 800
+    COLOR_SET_STAGE_6="reset"
+}
+
+# Calculate all seven state colors plus the seven idle stage colors from a
+# base color in one fork-free call. Hues come from HUE_* (defaults.conf).
+# Sets COLOR_SET_{PROCESSING,PERMISSION,COMPLETE,IDLE,COMPACTING,SUBAGENT,
+# TOOL_ERROR} and COLOR_SET_STAGE_0 .. COLOR_SET_STAGE_6
+# Usage: calculate_color_set "#2E3440" [processing_hue]
+calculate_color_set() {
+    local _ch_base="$1"
+
+    shift_hue_into COLOR_SET_PROCESSING "$_ch_base" "${2:-${HUE_PROCESSING:-30}}"
+    shift_hue_into COLOR_SET_PERMISSION "$_ch_base" "${HUE_PERMISSION:-0}"
+    shift_hue_into COLOR_SET_COMPLETE "$_ch_base" "${HUE_COMPLETE:-120}"
+    shift_hue_into COLOR_SET_IDLE "$_ch_base" "${HUE_IDLE:-270}"
+    shift_hue_into COLOR_SET_COMPACTING "$_ch_base" "${HUE_COMPACTING:-180}"
+    shift_hue_into COLOR_SET_SUBAGENT "$_ch_base" "${HUE_SUBAGENT:-50}"
+    shift_hue_into COLOR_SET_TOOL_ERROR "$_ch_base" "${HUE_TOOL_ERROR:-15}"
+
+    calculate_stage_colors "$COLOR_SET_COMPLETE" "$COLOR_SET_IDLE" "$_ch_base"
+}
+
 # ==============================================================================
 # Self-Test (run with: bash colors.sh test)
 # ==============================================================================
@@ -0,0 +1,342 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS - Terminal Agent Visual Signals — Compiled Config Snapshot
+# ==============================================================================
+# Precompiles per-state OSC byte sequences so a hook can emit palette +
+# background with one read and one write, instead of rebuilding the 16-entry
+# OSC 4 palette and OSC 11 background on every transition.
+#
+# Layout (under get_snapshot_dir):
+#   osc/{agent}/stamp                       - Written after the agent compiled
+#   osc/{agent}/{variant}/{state}-{hex}.bg  - OSC 11 background only
+#   osc/{agent}/{variant}/{state}-{hex}.pal - OSC 4 palette + OSC 11 background
+#   osc/{agent}/{variant}/reset.bg|reset.pal - OSC 111 (+ OSC 104)
+#   osc/{agent}/{variant}/signals           - Manifest for in-process emitters
+#
+# signals (key=value lines, never sourced) lets the OpenCode plugin
+# (src/agents/opencode/src/osc-engine.ts) apply a state without running the
+# trigger:
+#   {state}=<hex>|-   bundle color, "-" if the state needs more than colors
+#                     and the state record (title, bell, image, disabled)
+#   grace_ms=<STATE_GRACE_PERIOD_MS>  metrics=<ENABLE_METRICS>
+#   journal=<ENABLE_JOURNAL>          source=<config file> (one per line)
+#
+# Per TTY, emit_osc_bundle records which bundle set it last used, so the
+# plugin emits what the shell would (variant and palette are runtime
+# decisions). Any other emit path removes the record:
+#   ${TAVS_TMP_DIR:-/tmp/tavs}/osc.{TTY_SAFE}
+#     dir=<osc/{agent}/{variant}>  kind=<bg|pal>
+#
+# Variants: dark, light, muted-dark, muted-light
+# The background color is part of the file name, so a bundle is only used when
+# it matches the color the live path would send (mode-aware processing colors
+# are compiled as additional processing-{hex} files).
+#
+# Public functions:
+#   get_snapshot_dir()          - Snapshot root directory
+#   snapshot_is_fresh()         - True if an agent's bundles are newer than all config sources
+#   compile_config_snapshot()   - Compile OSC bundles for agents × variants × states
+#   ensure_config_snapshot()    - Recompile the current agent in the background when stale
+#   get_osc_variant()           - Current variant from IS_DARK_THEME/IS_MUTED_THEME
+#   emit_osc_bundle()           - Write a precompiled bundle to TTY_DEVICE (tty_write)
+#   snapshot_forget_tty()       - Remove the TTY's bundle record (live emit path)
+#
+# Internal functions:
+#   _snapshot_dir()             - Set _SNAPSHOT_DIR (fork-free get_snapshot_dir)
+#   _snapshot_select_variant()  - Point COLOR_* at a variant's resolved colors
+#   _snapshot_write_bundle()    - Write one bundle file
+#   _snapshot_colors_only()     - True if a state needs only colors + state record
+#   _snapshot_note_tty()        - Record the bundle set used for the TTY
+#
+# Dependencies:
+#   - theme-config-loader.sh: load_agent_config, _apply_mode_aware_processing,
+#     _build_stage_arrays, _CONFIG_DIR, _USER_CONFIG, _THEMES_DIR
+#   - terminal-osc-sequences.sh: _build_osc_palette_seq (compile only)
+#   - TTY_DEVICE (emit only)
+#   - tty-frame.sh: tty_write (emit only)
+#   - util.sh: util_upper, util_read_file, util_tmpfile (via tty-frame.sh)
+# ==============================================================================
+
+_SNAPSHOT_SCRIPT="${BASH_SOURCE[0]:-$0}"
+[[ -n "${_TAVS_TTY_FRAME_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/tty-frame.sh"
+
+# Agents compiled by default (matches AGENT_ prefixes in defaults.conf)
+TAVS_SNAPSHOT_AGENTS=(claude gemini codex opencode unknown)
+
+# States with a visual signal (idle uses the stage-1 color like trigger.sh)
+_SNAPSHOT_STATES=(processing permission complete idle compacting subagent tool_error)
+
+# Set _SNAPSHOT_DIR to the snapshot root (no subshell)
+_snapshot_dir() {
+    local _default_dir="${XDG_CACHE_HOME:-$HOME/.cache}/tavs/snapshot"
+    _SNAPSHOT_DIR="${TAVS_SNAPSHOT_DIR:-$_default_dir}"
+}
+
+# Get snapshot root directory
+get_snapshot_dir() {
+    _snapshot_dir
+    printf '%s' "$_SNAPSHOT_DIR"
+}
+
+# Check if an agent's compiled bundles are newer than every config source
+# Uses only builtin file tests (no forks) — safe for the hook hot path.
+# Usage: snapshot_is_fresh [agent]   (default: TAVS_AGENT)
+snapshot_is_fresh() {
+    local agent="${1:-${TAVS_AGENT:-unknown}}"
+    _snapshot_dir
+    local stamp="$_SNAPSHOT_DIR/osc/${agent}/stamp"
+    [[ -f "$stamp" ]] || return 1
+
+    local src
+    for src in "$_SNAPSHOT_SCRIPT" "${_CONFIG_DIR}/defaults.conf" "$_USER_CONFIG"; do
+        [[ -e "$src" && "$src" -nt "$stamp" ]] && return 1
+    done
+    if [[ "$THEME_MODE" == "preset" && -n "$THEME_PRESET" ]]; then
+        src="${_THEMES_DIR}/${THEME_PRESET}.conf"
+        [[ -e "$src" && "$src" -nt "$stamp" ]] && return 1
+    fi
+    return 0
+}
+
+# Get current variant name from the resolved theme flags
+# Usage: get_osc_variant -> "dark" | "light" | "muted-dark" | "muted-light"
+get_osc_variant() {
+    local variant="dark"
+    [[ "$IS_DARK_THEME" == "false" ]] && variant="light"
+    [[ "$IS_MUTED_THEME" == "true" ]] && variant="muted-${variant}"
+    printf '%s' "$variant"
+}
+
+# Point COLOR_* at the resolved colors of one variant (mirrors _resolve_colors)
+_snapshot_select_variant() {
+    local variant="$1"
+    local prefix=""
+    case "$variant" in
+        dark)        prefix="DARK";       IS_DARK_THEME="true";  IS_MUTED_THEME="false" ;;
+        light)       prefix="LIGHT";      IS_DARK_THEME="false"; IS_MUTED_THEME="false" ;;
+        muted-dark)  prefix="MUTED_DARK"; IS_DARK_THEME="true";  IS_MUTED_THEME="true" ;;
+        muted-light) prefix="MUTED_LIGHT"; IS_DARK_THEME="false"; IS_MUTED_THEME="true" ;;
+        *) return 1 ;;
+    esac
+
+    local state
+    for state in BASE PROCESSING PERMISSION COMPLETE IDLE COMPACTING SUBAGENT TOOL_ERROR; do
+        eval "COLOR_${state}=\${${prefix}_${state}:-}"
+    done
+    _build_stage_arrays
+}
+
+# Write one bundle file into the private build directory
+# Each content argument is expanded separately with printf %b, so sequences
+# ending in a string terminator (ESC \) can be concatenated safely.
+# (Atomicity comes from swapping the whole build directory in at the end.)
+# Usage: _snapshot_write_bundle file part...
+_snapshot_write_bundle() {
+    local file="$1"
+    shift
+    printf '%b' "$@" > "$file" 2>/dev/null
+}
+
+# True if applying a state only emits its colors and records it with the
+# current config (mirrors trigger.sh: ENABLE_*, should_send_title,
+# send_bell_if_enabled, set_state_background_image)
+# Usage: _snapshot_colors_only state
+_snapshot_colors_only() {
+    local state="$1"
+    util_upper "$state"
+    local enabled="ENABLE_${_UTIL_UPPER}" bell="BELL_ON_${_UTIL_UPPER}"
+    [[ "${!enabled:-}" == "true" ]] || return 1
+    [[ "${!bell:-}" == "true" ]] && return 1
+    [[ "${ENABLE_STYLISH_BACKGROUNDS:-}" == "true" ]] && return 1
+    if [[ "${ENABLE_TITLE_PREFIX:-}" == "true" ]]; then
+        case "${TAVS_TITLE_MODE:-}" in
+            off) ;;
+            full|prefix-only) return 1 ;;
+            *) [[ "$state" == "processing" ]] || return 1 ;;
+        esac
+    fi
+    return 0
+}
+
+# Compile OSC bundles for every agent × variant × state
+# Runs each agent in a subshell so the caller's config stays untouched, and
+# swaps each agent's tree in separately so readers never see a partial one.
+# Usage: compile_config_snapshot [agent...]
+compile_config_snapshot() {
+    local agents=("$@")
+    [[ ${#agents[@]} -eq 0 ]] && agents=("${TAVS_SNAPSHOT_AGENTS[@]}")
+
+    _snapshot_dir
+    local snap_dir="$_SNAPSHOT_DIR"
+    mkdir -p "$snap_dir/osc" 2>/dev/null || return 1
+    chmod 700 "$snap_dir" 2>/dev/null
+
+    # One compiler at a time; concurrent callers just skip
+    local lock_dir="$snap_dir/.lock-compile"
+    if ! mkdir "$lock_dir" 2>/dev/null; then
+        local lock_pid=""
+        [[ -f "$lock_dir/pid" ]] && read -r lock_pid < "$lock_dir/pid" 2>/dev/null
+        if [[ -n "$lock_pid" ]] && kill -0 "$lock_pid" 2>/dev/null; then
+            return 0
+        fi
+        rm -rf "$lock_dir" 2>/dev/null
+        mkdir "$lock_dir" 2>/dev/null || return 0
+    fi
+    echo $$ > "$lock_dir/pid" 2>/dev/null
+
+    local agent build_dir rc=0
+    for agent in "${agents[@]}"; do
+        build_dir="$snap_dir/osc/.${agent}.tmp.$$"
+        rm -rf "$build_dir" 2>/dev/null
+        (
+            load_agent_config "$agent"
+
+            local variant out_dir pal_seq state color pmode
+            for variant in dark light muted-dark muted-light; do
+                out_dir="$build_dir/$variant"
+                mkdir -p "$out_dir" || exit 1
+                _snapshot_select_variant "$variant" || continue
+
+                pal_seq=""
+                if [[ "$IS_DARK_THEME" == "true" ]]; then
+                    pal_seq=$(_build_osc_palette_seq "dark")
+                else
+                    pal_seq=$(_build_osc_palette_seq "light")
+                fi
+
+                _snapshot_write_bundle "$out_dir/reset.bg" "\033]111\033\\"
+                _snapshot_write_bundle "$out_dir/reset.pal" "\033]104\033\\" "\033]111\033\\"
+
+                for state in "${_SNAPSHOT_STATES[@]}"; do
+                    case "$state" in
+                        processing) color="$COLOR_PROCESSING" ;;
+                        permission) color="$COLOR_PERMISSION" ;;
+                        complete)   color="$COLOR_COMPLETE" ;;
+                        idle)       color="${UNIFIED_STAGE_COLORS[1]}" ;;
+                        compacting) color="$COLOR_COMPACTING" ;;
+                        subagent)   color="$COLOR_SUBAGENT" ;;
+                        tool_error) color="$COLOR_TOOL_ERROR" ;;
+                    esac
+                    [[ "$color" =~ ^#[0-9A-Fa-f]{6}$ ]] || continue
+                    _snapshot_write_bundle "$out_dir/${state}-${color#\#}.bg" "\033]11;${color}\033\\"
+                    _snapshot_write_bundle "$out_dir/${state}-${color#\#}.pal" "$pal_seq" "\033]11;${color}\033\\"
+                done
+
+                # Mode-aware processing variants (plan/acceptEdits/bypassPermissions)
+                local base_processing="$COLOR_PROCESSING"
+                for pmode in plan acceptEdits bypassPermissions; do
+                    COLOR_PROCESSING="$base_processing"
+                    TAVS_PERMISSION_MODE="$pmode" _apply_mode_aware_processing
+                    color="$COLOR_PROCESSING"
+                    [[ "$color" =~ ^#[0-9A-Fa-f]{6}$ ]] || continue
+                    _snapshot_write_bundle "$out_dir/processing-${color#\#}.bg" "\033]11;${color}\033\\"
+                    _snapshot_write_bundle "$out_dir/processing-${color#\#}.pal" "$pal_seq" "\033]11;${color}\033\\"
+                done
+                COLOR_PROCESSING="$base_processing"
+
+                # Manifest for in-process emitters (see signals above)
+                {
+                    for state in "${_SNAPSHOT_STATES[@]}"; do
+                        case "$state" in
+                            processing) color="$COLOR_PROCESSING" ;;
+                            permission) color="$COLOR_PERMISSION" ;;
+                            complete)   color="$COLOR_COMPLETE" ;;
+                            idle)       color="${UNIFIED_STAGE_COLORS[1]}" ;;
+                            compacting) color="$COLOR_COMPACTING" ;;
+                            subagent)   color="$COLOR_SUBAGENT" ;;
+                            tool_error) color="$COLOR_TOOL_ERROR" ;;
+                        esac
+                        if [[ "$color" =~ ^#[0-9A-Fa-f]{6}$ ]] && _snapshot_colors_only "$state"; then
+                            printf '%s=%s\n' "$state" "${color#\#}"
+                        else
+                            printf '%s=-\n' "$state"
+                        fi
+                    done
+                    printf 'grace_ms=%s\nmetrics=%s\njournal=%s\n' "${STATE_GRACE_PERIOD_MS:-400}" \
+                        "${ENABLE_METRICS:-true}" "${ENABLE_JOURNAL:-false}"
+                    printf 'source=%s\n' "$_SNAPSHOT_SCRIPT" "${_CONFIG_DIR}/defaults.conf" "$_USER_CONFIG"
+                    [[ "$THEME_MODE" == "preset" && -n "$THEME_PRESET" ]] && \
+                        printf 'source=%s\n' "${_THEMES_DIR}/${THEME_PRESET}.conf"
+                } > "$out_dir/signals" 2>/dev/null
+            done
+            : > "$build_dir/stamp"
+        ) || { rc=1; rm -rf "$build_dir" 2>/dev/null; continue; }
+
+        # Swap in the new tree (the stamp travels with it)
+        rm -rf "$snap_dir/osc/.${agent}.old.$$" 2>/dev/null
+        [[ -d "$snap_dir/osc/$agent" ]] && mv "$snap_dir/osc/$agent" "$snap_dir/osc/.${agent}.old.$$" 2>/dev/null
+        mv "$build_dir" "$snap_dir/osc/$agent" 2>/dev/null || rc=1
+        rm -rf "$snap_dir/osc/.${agent}.old.$$" "$build_dir" 2>/dev/null
+    done
+
+    rm -f "$lock_dir/pid" 2>/dev/null
+    rmdir "$lock_dir" 2>/dev/null
+    return $rc
+}
+
+# Recompile the current agent in the background if its bundles are stale
+# Returns 0 if the snapshot is fresh right now, 1 if a rebuild was scheduled.
+ensure_config_snapshot() {
+    [[ "${ENABLE_CONFIG_SNAPSHOT:-true}" != "true" ]] && return 1
+    local agent="${TAVS_AGENT:-unknown}"
+    snapshot_is_fresh "$agent" && return 0
+
+    ( compile_config_snapshot "$agent" ) </dev/null >/dev/null 2>&1 &
+    disown 2>/dev/null || true
+    return 1
+}
+
+# Emit a precompiled palette+background bundle for a state
+# Returns 1 (caller falls back to the live path) if no matching bundle exists.
+# Usage: emit_osc_bundle "processing" "$COLOR_PROCESSING" [with_palette]
+emit_osc_bundle() {
+    local state="$1" color="$2" with_palette="${3:-false}"
+    [[ -z "$TTY_DEVICE" ]] && return 1
+    ensure_config_snapshot || return 1
+
+    local kind="bg"
+    [[ "$with_palette" == "true" ]] && kind="pal"
+
+    local variant="dark"
+    [[ "$IS_DARK_THEME" == "false" ]] && variant="light"
+    [[ "$IS_MUTED_THEME" == "true" ]] && variant="muted-${variant}"
+
+    _snapshot_dir
+    local file="$_SNAPSHOT_DIR/osc/${TAVS_AGENT:-unknown}/${variant}"
+    if [[ "$color" == "reset" ]]; then
+        file+="/reset.${kind}"
+    elif [[ "$color" =~ ^#[0-9A-Fa-f]{6}$ ]]; then
+        file+="/${state}-${color#\#}.${kind}"
+    else
+        return 1
+    fi
+    [[ -f "$file" ]] || return 1
+
+    local seq=""
+    IFS= read -r -d '' seq < "$file"
+    [[ -n "$seq" ]] || return 1
+    tty_write '%s' "$seq" || return 1
+    _snapshot_note_tty "${file%/*}" "$kind"
+    return 0
+}
+
+# Record the bundle set used for this TTY (written only when it changed)
+# Usage: _snapshot_note_tty variant_dir kind
+_snapshot_note_tty() {
+    [[ -n "${TTY_SAFE:-}" ]] || return 0
+    local record="${TAVS_TMP_DIR:-/tmp/tavs}/osc.${TTY_SAFE}"
+    local content="dir=$1"$'\n'"kind=$2"
+    util_read_file "$record" && [[ "$_UTIL_FILE" == "$content" ]] && return 0
+    util_tmpfile "$record"
+    printf '%s\n' "$content" > "$_UTIL_TMPFILE" 2>/dev/null &&
+        mv -f "$_UTIL_TMPFILE" "$record" 2>/dev/null ||
+        rm -f "$_UTIL_TMPFILE" 2>/dev/null
+    return 0
+}
+
+# Remove the TTY's bundle record (colors were emitted without a bundle)
+snapshot_forget_tty() {
+    local record="${TAVS_TMP_DIR:-/tmp/tavs}/osc.${TTY_SAFE:-}"
+    [[ -n "${TTY_SAFE:-}" && -f "$record" ]] && rm -f "$record" 2>/dev/null
+    return 0
+}
@@ -7,6 +7,9 @@
 # All context tokens resolve to empty string when no data is available.
 # ==============================================================================
 
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+
 # === GLOBAL STATE ===
 # These are populated by load_context_data() and consumed by compose_title()
 TAVS_CONTEXT_PCT=""
@@ -68,9 +71,8 @@ read_bridge_state() {
     if [[ -n "$_ts" ]]; then
         local _default_max_age=30
         local max_age="${TAVS_CONTEXT_BRIDGE_MAX_AGE:-$_default_max_age}"
-        local now
-        now=$(date +%s)
-        local age=$(( now - _ts ))
+        util_now
+        local age=$(( _UTIL_NOW - _ts ))
         if [[ $age -gt $max_age ]]; then
             return 1
         fi
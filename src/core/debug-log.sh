@@ -0,0 +1,107 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS - Terminal Agent Visual Signals — Structured Debug Log
+# ==============================================================================
+# Debug output (DEBUG_ALL=1, IDLE_DEBUG=1) used to write a file per hook,
+# fork date/pwd/tty/ps for each one and append to logs that never shrank, so
+# turning debugging on changed the timings being debugged and filled /tmp.
+#
+# Each record is one line appended with a single write:
+#
+#   2026-10-19T14:03:07.412 4711 invocation state=processing pwd=/src/app
+#
+# Values are quoted with printf %q, so a record never spans lines; the
+# payload value is cut to TAVS_DEBUG_PAYLOAD_MAX bytes. Timestamps come from
+# EPOCHREALTIME and printf %()T (epoch seconds on bash < 5), without forks.
+#
+# Rotation: once a log passes TAVS_DEBUG_LOG_MAX_KB it is renamed to .1
+# (older copies shift up to TAVS_DEBUG_LOG_KEEP). The size check forks `wc`,
+# so it runs on about one record in _DEBUG_LOG_CHECK_EVERY; a log may pass
+# the limit by that many records before it rotates.
+#
+# Files (${TAVS_TMP_DIR:-/tmp/tavs}):
+#   debug/trigger.log    - one record per trigger invocation
+#   debug/title.log      - title writes
+#   idle-timer.log       - idle worker and state file events (IDLE_DEBUG)
+#
+# Public functions:
+#   debug_log()          - Append one record to a log
+#
+# Internal functions:
+#   _debug_log_rotate()  - Rotate a log past its size limit
+#
+# Dependencies:
+#   - util.sh: util_now
+# Include with a load guard like util.sh; safe to source from bash 3.2+ and
+# zsh.
+# ==============================================================================
+
+_TAVS_DEBUG_LOG_LOADED=1
+
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+
+# One record in this many checks the log size
+_DEBUG_LOG_CHECK_EVERY=32
+
+# Append one record: "<time> <pid> <event> key=value..."
+# A "payload=" value is truncated to TAVS_DEBUG_PAYLOAD_MAX bytes.
+# Usage: debug_log log_file event [key=value...]
+debug_log() {
+    local file="$1" event="$2" record ts pair key value
+    shift 2
+
+    if [[ -n "${BASH_VERSION:-}" && -n "${EPOCHREALTIME:-}" ]]; then
+        value="${EPOCHREALTIME#*[.,]}"
+        printf -v ts '%(%Y-%m-%dT%H:%M:%S)T.%s' "${EPOCHREALTIME%[.,]*}" "${value:0:3}"
+    else
+        util_now
+        ts="$_UTIL_NOW"
+    fi
+    record="$ts ${BASHPID:-$$} $event"
+
+    for pair in "$@"; do
+        key="${pair%%=*}"
+        value="${pair#*=}"
+        if [[ "$key" == "payload" ]]; then
+            local max="${TAVS_DEBUG_PAYLOAD_MAX:-2048}"
+            [[ "$max" =~ ^[0-9]+$ ]] || max=2048
+            [[ ${#value} -gt $max ]] && \
+                value="${value:0:$max}...(+$(( ${#value} - max )) bytes)"
+        fi
+        printf -v value '%q' "$value"
+        record+=" $key=$value"
+    done
+
+    [[ -d "${file%/*}" ]] || mkdir -p "${file%/*}" 2>/dev/null
+    printf '%s\n' "$record" >> "$file" 2>/dev/null
+    (( RANDOM % _DEBUG_LOG_CHECK_EVERY )) || _debug_log_rotate "$file"
+    return 0
+}
+
+# Rotate a log that passed TAVS_DEBUG_LOG_MAX_KB
+# Concurrent writers may both rotate; at worst a few records are lost.
+# Usage: _debug_log_rotate log_file
+_debug_log_rotate() {
+    local file="$1" size
+    local max_kb="${TAVS_DEBUG_LOG_MAX_KB:-1024}" keep="${TAVS_DEBUG_LOG_KEEP:-2}"
+    [[ "$max_kb" =~ ^[0-9]+$ && $max_kb -gt 0 ]] || return 0
+    [[ "$keep" =~ ^[0-9]+$ ]] || keep=2
+    [[ -f "$file" ]] || return 0
+    size=$(wc -c < "$file" 2>/dev/null) || return 0
+    size="${size//[[:space:]]/}"
+    [[ "$size" =~ ^[0-9]+$ && $size -gt $(( max_kb * 1024 )) ]] || return 0
+
+    if [[ $keep -eq 0 ]]; then
+        : > "$file"
+        return 0
+    fi
+    local i=$keep
+    rm -f "${file}.${keep}" 2>/dev/null
+    while [[ $i -gt 1 ]]; do
+        [[ -f "${file}.$((i - 1))" ]] && mv -f "${file}.$((i - 1))" "${file}.${i}" 2>/dev/null
+        i=$((i - 1))
+    done
+    mv -f "$file" "${file}.1" 2>/dev/null
+    return 0
+}
@@ -13,11 +13,14 @@
 #
 # Internal functions:
 #   _git_with_timeout()           - Platform-aware git command with 1s timeout
+#   _git_repo_info(cwd)           - Cached toplevel/common dir (zero git calls on a hit)
+#   _find_git_entry(cwd)          - Nearest .git entry above cwd (builtins only)
+#   _git_repo_cache_dir()         - Set _GIT_REPO_CACHE_DIR
 #   _detect_worktree(cwd)         - Detect git worktree → "main_path\twt_path"
 #   _resolve_dir_identity(cwd)    - Resolve path via cwd or git-root mode
 #   _select_dir_pool()            - Select icon pool by TAVS_DIR_ICON_TYPE
 #   _get_worktree_pool(main_pool) - Get alternate pool for worktree dirs
-#   _hash_path(path)              - Stable numeric hash via cksum
+#   _hash_path(path)              - Stable numeric hash (cksum-compatible)
 #   _assign_icon_for_path(path, pool_name) - Registry lookup → round-robin
 #
 # Per-TTY cache format (dir-icon.{TTY_SAFE}):
@@ -35,8 +38,14 @@
 #   - TTY_SAFE environment variable
 #   - TAVS_DIR_ICON_POOL, TAVS_DIR_FALLBACK_POOL_A/B from defaults.conf
 #   - TAVS_DIR_IDENTITY_SOURCE, TAVS_DIR_WORKTREE_DETECTION from defaults.conf
+#   - util.sh: util_hash, util_tmpfile
+#   - latency-budget.sh: latency_budget_allows (dir_icon stage)
 # ==============================================================================
 
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+[[ -n "${_TAVS_LATENCY_BUDGET_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/latency-budget.sh"
+
 # ==============================================================================
 # GIT HELPERS
 # ==============================================================================
@@ -54,8 +63,115 @@ _git_with_timeout() {
     fi
 }
 
+# ==============================================================================
+# GIT REPO CACHE
+# ==============================================================================
+# Resolving toplevel/common dir costs git invocations (each up to 1s on large
+# monorepos or network filesystems). Results are cached per cwd and shared by
+# all tabs, so revisiting a directory costs zero git calls.
+#
+# Cache files (${state_dir}/git-repo/{cwd with / replaced by _}):
+#   git_entry=/path/to/.git        (nearest .git dir/file above cwd, may be empty)
+#   toplevel=/path/to/worktree     (empty outside a work tree)
+#   common_dir=/path/to/main/.git  (absolute)
+#
+# Validation (builtins only): the nearest .git entry found by walking up from
+# cwd must be the recorded one and must not be newer than the cache file.
+# Creating, removing or re-pointing a repo/worktree changes one of the two.
+# ==============================================================================
+
+# Set _GIT_REPO_CACHE_DIR (per-user state dir; callers may preset it)
+_git_repo_cache_dir() {
+    if [[ -z "${_GIT_REPO_CACHE_DIR:-}" ]]; then
+        _GIT_REPO_CACHE_DIR="$(get_spinner_state_dir)/git-repo"
+    fi
+}
+
+# Set _GIT_ENTRY to the nearest .git dir/file at or above a directory
+# Args: cwd. Empty when no .git exists up to /.
+_find_git_entry() {
+    local dir="$1"
+    _GIT_ENTRY=""
+    while [[ -n "$dir" ]]; do
+        if [[ -e "$dir/.git" ]]; then
+            _GIT_ENTRY="$dir/.git"
+            return 0
+        fi
+        [[ "$dir" == "/" ]] && break
+        dir="${dir%/*}"
+        [[ -z "$dir" ]] && dir="/"
+    done
+    return 1
+}
+
+# Resolve git toplevel and common dir for a directory (cached per cwd)
+# Args: cwd
+# Sets: _GIT_REPO_TOPLEVEL (empty outside a work tree), _GIT_REPO_COMMON_DIR
+# Returns: 0 inside a work tree, 1 otherwise (or git unavailable)
+_git_repo_info() {
+    local cwd="$1"
+    _GIT_REPO_TOPLEVEL=""
+    _GIT_REPO_COMMON_DIR=""
+
+    # Guard: git must be installed
+    command -v git &>/dev/null || return 1
+
+    _find_git_entry "$cwd"
+    _git_repo_cache_dir
+    local cache_file="${_GIT_REPO_CACHE_DIR}/${cwd//\//_}"
+    # Over-long names cannot be cached (NAME_MAX); resolve every time
+    [[ ${#cache_file} -gt $(( ${#_GIT_REPO_CACHE_DIR} + 250 )) ]] && cache_file=""
+
+    local k v
+    if [[ -n "$cache_file" && -f "$cache_file" ]]; then
+        local cached_entry="" cached_top="" cached_common="" have_entry=false
+        while IFS='=' read -r k v; do
+            case "$k" in
+                git_entry)  cached_entry="$v"; have_entry=true ;;
+                toplevel)   cached_top="$v" ;;
+                common_dir) cached_common="$v" ;;
+            esac
+        done < "$cache_file"
+
+        if [[ "$have_entry" == "true" && "$cached_entry" == "$_GIT_ENTRY" ]] && \
+           [[ -z "$_GIT_ENTRY" || ! "$_GIT_ENTRY" -nt "$cache_file" ]]; then
+            _GIT_REPO_TOPLEVEL="$cached_top"
+            _GIT_REPO_COMMON_DIR="$cached_common"
+            [[ -n "$_GIT_REPO_TOPLEVEL" ]]
+            return
+        fi
+    fi
+
+    # Miss: one git call for both values (no .git above cwd means no repo)
+    local out="" toplevel="" common_dir=""
+    if [[ -n "$_GIT_ENTRY" ]]; then
+        out=$(cd "$cwd" 2>/dev/null && _git_with_timeout rev-parse --show-toplevel --git-common-dir)
+        toplevel="${out%%$'\n'*}"
+        common_dir="${out#*$'\n'}"
+        [[ "$out" == *$'\n'* && -n "$toplevel" && -n "$common_dir" ]] || { toplevel=""; common_dir=""; }
+    fi
+
+    if [[ -n "$toplevel" ]]; then
+        # Normalize common_dir to absolute path (git prints it relative to cwd)
+        [[ "$common_dir" != /* ]] && common_dir="${cwd}/${common_dir}"
+        common_dir=$(cd "$common_dir" 2>/dev/null && pwd -P) || { toplevel=""; common_dir=""; }
+    fi
+
+    if [[ -n "$cache_file" ]]; then
+        if [[ ! -d "$_GIT_REPO_CACHE_DIR" ]]; then
+            mkdir -p "$_GIT_REPO_CACHE_DIR" 2>/dev/null
+            chmod 700 "$_GIT_REPO_CACHE_DIR" 2>/dev/null
+        fi
+        printf 'git_entry=%s\ntoplevel=%s\ncommon_dir=%s\n' "$_GIT_ENTRY" "$toplevel" "$common_dir" \
+            > "${cache_file}.tmp.$$" 2>/dev/null && mv "${cache_file}.tmp.$$" "$cache_file" 2>/dev/null
+    fi
+
+    _GIT_REPO_TOPLEVEL="$toplevel"
+    _GIT_REPO_COMMON_DIR="$common_dir"
+    [[ -n "$_GIT_REPO_TOPLEVEL" ]]
+}
+
 # Detect if a directory is inside a git worktree.
-# Uses subshell to protect caller's cwd.
 #
 # Args: cwd - directory to check
 # Output: "main_repo_path\tworktree_path" on stdout if worktree detected (tab-delimited)
@@ -63,39 +179,23 @@ _git_with_timeout() {
 _detect_worktree() {
     local cwd="$1"
 
-    # Guard: git must be installed
-    command -v git &>/dev/null || return 1
-
     # Guard: worktree detection must be enabled
     [[ "${TAVS_DIR_WORKTREE_DETECTION:-true}" != "true" ]] && return 1
 
-    # Subshell protects caller's working directory
-    (
-        cd "$cwd" || return 1
-
-        # Fast-fail for non-git directories
-        _git_with_timeout rev-parse --is-inside-work-tree &>/dev/null || return 1
-
-        local toplevel common_dir main_repo
-        toplevel=$(_git_with_timeout rev-parse --show-toplevel) || return 1
-        common_dir=$(_git_with_timeout rev-parse --git-common-dir) || return 1
-
-        # Normalize common_dir to absolute path
-        [[ "$common_dir" != /* ]] && common_dir="${toplevel}/${common_dir}"
-        common_dir=$(cd "$common_dir" 2>/dev/null && pwd) || return 1
+    _git_repo_info "$cwd" || return 1
 
-        # Strip /.git suffix to get main repo path
-        main_repo="${common_dir%/.git}"
+    # Strip /.git suffix to get main repo path
+    local toplevel="$_GIT_REPO_TOPLEVEL"
+    local main_repo="${_GIT_REPO_COMMON_DIR%/.git}"
 
-        if [[ "$main_repo" != "$toplevel" ]]; then
-            # We're in a worktree: toplevel is the worktree dir
-            # Tab delimiter: can't appear in filesystem paths (unlike spaces)
-            printf '%s\t%s' "$main_repo" "$toplevel"
-            return 0
-        fi
+    if [[ "$main_repo" != "$toplevel" ]]; then
+        # We're in a worktree: toplevel is the worktree dir
+        # Tab delimiter: can't appear in filesystem paths (unlike spaces)
+        printf '%s\t%s' "$main_repo" "$toplevel"
+        return 0
+    fi
 
-        return 1  # Not a worktree (or is the main repo itself)
-    )
+    return 1  # Not a worktree (or is the main repo itself)
 }
 
 # ==============================================================================
@@ -118,13 +218,9 @@ _resolve_dir_identity() {
     case "$source" in
         git-root)
             # Normalize to git repo root (groups subdirectories together)
-            if command -v git &>/dev/null; then
-                local git_root
-                git_root=$(cd "$cwd" 2>/dev/null && _git_with_timeout rev-parse --show-toplevel)
-                if [[ -n "$git_root" ]]; then
-                    printf '%s' "$git_root"
-                    return 0
-                fi
+            if _git_repo_info "$cwd"; then
+                printf '%s' "$_GIT_REPO_TOPLEVEL"
+                return 0
             fi
             # Fallback to cwd if not in a git repo
             printf '%s' "$cwd"
@@ -135,10 +231,11 @@ _resolve_dir_identity() {
     esac
 }
 
-# Generate a stable numeric hash for a path using cksum.
+# Generate a stable numeric hash for a path (same value as cksum).
 # Output: hash value (numeric string, no newline)
 _hash_path() {
-    printf '%s' "$1" | cksum | cut -d' ' -f1
+    util_hash "$1"
+    printf '%s' "$_UTIL_HASH"
 }
 
 # ==============================================================================
@@ -198,8 +295,8 @@ _assign_icon_for_path() {
     local path="$1"
     local pool_name="$2"
 
-    local path_hash
-    path_hash=$(_hash_path "$path")
+    util_hash "$path"
+    local path_hash="$_UTIL_HASH"
 
     # Check registry for existing mapping
     local existing
@@ -244,9 +341,13 @@ assign_dir_icon() {
     local cwd="${TAVS_CWD:-$PWD}"
     [[ -z "$cwd" ]] && return 0
 
+    # Git lookups are shed when the hook runs over budget; the cached icon stays
+    latency_budget_allows dir_icon || return 0
+
     local state_dir
     state_dir=$(get_spinner_state_dir)
     local cache_file="${state_dir}/dir-icon.${TTY_SAFE:-unknown}"
+    _GIT_REPO_CACHE_DIR="${state_dir}/git-repo"
 
     # Idempotent: check if cache matches the same raw cwd
     if [[ -f "$cache_file" ]]; then
@@ -292,27 +393,30 @@ assign_dir_icon() {
 
         # Main repo gets its icon from the main pool
         dir_path="$main_repo_path"
-        main_hash=$(_hash_path "$main_repo_path")
+        util_hash "$main_repo_path"
+        main_hash="$_UTIL_HASH"
         main_icon=$(_assign_icon_for_path "$main_repo_path" "$main_pool")
 
         # Worktree gets its icon from the worktree pool (alternate for fallbacks)
         local wt_pool
         wt_pool=$(_get_worktree_pool "$main_pool")
         worktree_path="$wt_toplevel"
-        worktree_hash=$(_hash_path "$wt_toplevel")
+        util_hash "$wt_toplevel"
+        worktree_hash="$_UTIL_HASH"
         worktree_icon=$(_assign_icon_for_path "$wt_toplevel" "$wt_pool")
     else
         # Not a worktree: use resolved path directly
         dir_path="$resolved_path"
-        main_hash=$(_hash_path "$resolved_path")
+        util_hash "$resolved_path"
+        main_hash="$_UTIL_HASH"
         main_icon=$(_assign_icon_for_path "$resolved_path" "$main_pool")
     fi
 
     [[ -z "$main_icon" ]] && return 1
 
-    # Write per-TTY cache (atomic: mktemp + mv)
-    local tmp_cache
-    tmp_cache=$(mktemp "${cache_file}.XXXXXX" 2>/dev/null) || tmp_cache="${cache_file}.tmp.$$"
+    # Write per-TTY cache (atomic: temp file + mv)
+    util_tmpfile "$cache_file"
+    local tmp_cache="$_UTIL_TMPFILE"
     {
         printf 'cwd=%s\n' "$cwd"
         printf 'dir_path=%s\n' "$dir_path"
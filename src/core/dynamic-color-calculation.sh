@@ -17,15 +17,15 @@
 #
 # Dependencies (from theme-config-loader.sh when sourced):
 #   - _THEME_SCRIPT_DIR - path to core directory
-#   - _detect_system_mode() - detect system dark/light mode
+#   - _current_system_mode() - system dark/light mode (watcher file or probe)
 #   - _resolve_colors() - resolve color variables
 #   - _build_stage_arrays() - build idle stage arrays
 #   - clear_mode_cache() - clear mode detection cache
 #   - COLOR_* variables - theme color values
 #
 # Dependencies (from other modules):
-#   - colors.sh: hex_to_rgb, rgb_to_hex, is_dark_color, shift_hue, etc.
-#   - terminal-detection.sh: query_terminal_bg_with_timeout, is_ssh_session, is_truecolor_mode
+#   - colors.sh: is_dark_color, calculate_color_set, etc.
+#   - terminal-detection.sh: get_terminal_bg_cached, is_ssh_session, is_truecolor_mode
 #   - session-state.sh: read_session_colors, write_session_colors, has_session_colors
 # ==============================================================================
 
@@ -91,7 +91,7 @@ initialize_dynamic_colors() {
 
     # Query terminal background
     local base_color
-    base_color=$(query_terminal_bg_with_timeout "$tty_device" "$DYNAMIC_QUERY_TIMEOUT")
+    base_color=$(get_terminal_bg_cached "$tty_device" "$DYNAMIC_QUERY_TIMEOUT")
 
     if [[ -z "$base_color" ]]; then
         # Query failed - use agent default base color
@@ -106,29 +106,31 @@ initialize_dynamic_colors() {
 
     # Detect system mode for comparison
     local system_mode
-    system_mode=$(_detect_system_mode)
-
-    # Calculate state colors using hue-shift
-    local color_proc color_perm color_comp color_idle color_compact color_subagent color_tool_error
-    color_proc=$(shift_hue "$base_color" "$HUE_PROCESSING")
-    color_perm=$(shift_hue "$base_color" "$HUE_PERMISSION")
-    color_comp=$(shift_hue "$base_color" "$HUE_COMPLETE")
-    color_idle=$(shift_hue "$base_color" "$HUE_IDLE")
-    color_compact=$(shift_hue "$base_color" "$HUE_COMPACTING")
-    color_subagent=$(shift_hue "$base_color" "${HUE_SUBAGENT:-50}")
-    color_tool_error=$(shift_hue "$base_color" "${HUE_TOOL_ERROR:-15}")
-
-    # Override processing hue for permission mode (plan/acceptEdits/bypassPermissions)
+    _current_system_mode
+    system_mode="$_CURRENT_SYSTEM_MODE"
+
+    # Processing hue follows permission mode (plan/acceptEdits/bypassPermissions)
+    local proc_hue="$HUE_PROCESSING"
     if [[ "${ENABLE_MODE_AWARE_PROCESSING:-true}" == "true" ]]; then
         local _pmode="${TAVS_PERMISSION_MODE:-default}"
         [[ "$_pmode" == "dontAsk" ]] && _pmode="acceptEdits"
         case "$_pmode" in
-            plan)              color_proc=$(shift_hue "$base_color" "${HUE_PROCESSING_PLAN:-50}") ;;
-            acceptEdits)       color_proc=$(shift_hue "$base_color" "${HUE_PROCESSING_ACCEPT:-33}") ;;
-            bypassPermissions) color_proc=$(shift_hue "$base_color" "${HUE_PROCESSING_BYPASS:-12}") ;;
+            plan)              proc_hue="${HUE_PROCESSING_PLAN:-50}" ;;
+            acceptEdits)       proc_hue="${HUE_PROCESSING_ACCEPT:-33}" ;;
+            bypassPermissions) proc_hue="${HUE_PROCESSING_BYPASS:-12}" ;;
         esac
     fi
 
+    # Calculate all state + stage colors in one fork-free, memoized batch
+    calculate_color_set "$base_color" "$proc_hue"
+    local color_proc="$COLOR_SET_PROCESSING"
+    local color_perm="$COLOR_SET_PERMISSION"
+    local color_comp="$COLOR_SET_COMPLETE"
+    local color_idle="$COLOR_SET_IDLE"
+    local color_compact="$COLOR_SET_COMPACTING"
+    local color_subagent="$COLOR_SET_SUBAGENT"
+    local color_tool_error="$COLOR_SET_TOOL_ERROR"
+
     # Store in session colors
     if [[ -n "$TTY_SAFE" ]]; then
         write_session_colors "$TAVS_AGENT" "$base_color" "$is_dark" "$system_mode" \
@@ -182,7 +184,8 @@ load_session_colors_or_defaults() {
         # Check if system mode changed (for auto-dark mode switching)
         if [[ "$ENABLE_LIGHT_DARK_SWITCHING" == "true" ]]; then
             local current_mode
-            current_mode=$(_detect_system_mode)
+            _current_system_mode
+            current_mode="$_CURRENT_SYSTEM_MODE"
             if [[ "$current_mode" != "$SESSION_SYSTEM_MODE" ]]; then
                 # System mode changed - trigger a refresh
                 # This will use the new mode with agent defaults
@@ -213,7 +216,8 @@ refresh_colors_if_needed() {
 
     # Check if system mode changed
     local current_mode
-    current_mode=$(_detect_system_mode)
+    _current_system_mode
+    current_mode="$_CURRENT_SYSTEM_MODE"
 
     if [[ "$current_mode" != "$_CACHED_SYSTEM_MODE" ]]; then
         _CACHED_SYSTEM_MODE="$current_mode"
@@ -0,0 +1,152 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS - Terminal Agent Visual Signals — Event Dedup (Early-Exit Fast Path)
+# ==============================================================================
+# Many hook events repeat the state the terminal already shows: PostToolUse
+# `processing` while processing, the PermissionRequest + Notification pair
+# that both fire `permission`, PreToolUse + PreCompact both firing
+# `compacting`. The full trigger sources every module before it can tell.
+#
+# After each completed event the trigger records a fingerprint of it. The next
+# event is compared against that record before any other module is loaded and
+# exits immediately when nothing visible would change.
+#
+# Fingerprint: state + arguments | permission mode | agent | subagent count |
+# minute bucket (so context-window title tokens still refresh once a minute)
+#
+# Only processing (not new-prompt), permission and compacting are dropped;
+# every other state has side effects (timers, counters, identity). A record
+# older than its window is never matched. The window (TAVS_DEDUP_WINDOW, from
+# the loaded config) is written into the record because the check runs before
+# the config is loaded. It is recorded as 0 for processing when the title
+# spinner advances per event (TAVS_TITLE_MODE=full) and while DEBUG_ALL=1.
+#
+# File: ${TAVS_TMP_DIR:-/tmp/tavs}/fp.{key}
+#   key = TTY_SAFE when TTY_DEVICE is set by the environment, otherwise
+#   s.{TAVS_SESSION_ID}; without either (or in a deferred re-run, see
+#   session-state.sh) the fast path is skipped.
+#   fp=<fingerprint>  ts=<epoch>  window=<seconds>  count_file=<path>
+#   metrics=<ENABLE_METRICS>  (whether a dropped event is counted, metrics.sh)
+#   journal=<ENABLE_JOURNAL>  (whether it is journaled, journal.sh)
+# (key=value lines, never sourced)
+#
+# A deferred event (session-state.sh) removes the record: its re-run applies
+# a state without one, and a repeat of the shown event must still run the
+# full trigger so it supersedes the pending one.
+#
+# Public functions:
+#   event_dedup_check()    - True if the event repeats the recorded one
+#   event_dedup_record()   - Record the event that just completed
+#   event_dedup_forget()   - Remove the record (event deferred)
+#
+# Internal functions:
+#   _event_dedup_init()    - Set _TAVS_DEDUP_FILE for this event
+#   _event_dedup_fp()      - Set _TAVS_DEDUP_FP for an event + count file
+#
+# Dependencies:
+#   - util.sh: util_now, util_tmpfile
+#   - Recording: SUBAGENT_COUNT_FILE (subagent-counter.sh), TAVS_DEDUP_WINDOW,
+#     ENABLE_METRICS, ENABLE_JOURNAL
+# ==============================================================================
+
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+
+# Set _TAVS_DEDUP_FILE once per event (empty without a key)
+# The key is fixed before terminal-osc-sequences.sh resolves the TTY so the
+# check and the record of an event always agree.
+_event_dedup_init() {
+    [[ -n "${_TAVS_DEDUP_INIT:-}" ]] && return 0
+    _TAVS_DEDUP_INIT=1
+    _TAVS_DEDUP_FILE=""
+    [[ -n "${_TAVS_DEFERRED_ID:-}" ]] && return 0  # Deferred re-run (session-state.sh)
+    local dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    if [[ -n "${TTY_DEVICE:-}" ]]; then
+        _TAVS_DEDUP_FILE="$dir/fp.${TTY_DEVICE//\//_}"
+    elif [[ -n "${TAVS_SESSION_ID:-}" ]]; then
+        _TAVS_DEDUP_FILE="$dir/fp.s.${TAVS_SESSION_ID//\//_}"
+    fi
+}
+
+# Build the fingerprint of an event
+# Usage: _event_dedup_fp count_file state [args...]   → sets _TAVS_DEDUP_FP
+_event_dedup_fp() {
+    local count_file="$1" count=0
+    shift
+    [[ -n "$count_file" && -f "$count_file" ]] && read -r count < "$count_file"
+    util_now
+    _TAVS_DEDUP_FP="$*|${TAVS_PERMISSION_MODE:-}|${TAVS_AGENT:-}|${count:-0}|$((_UTIL_NOW / 60))"
+}
+
+# True if this event repeats the recorded one within its window
+# Sets _TAVS_DEDUP_METRICS and _TAVS_DEDUP_JOURNAL to the recorded
+# ENABLE_METRICS and ENABLE_JOURNAL.
+# Usage: event_dedup_check state [args...]
+event_dedup_check() {
+    _TAVS_DEDUP_METRICS="" _TAVS_DEDUP_JOURNAL=""
+    case "${1:-}" in
+        processing) [[ "${2:-}" == "new-prompt" ]] && return 1 ;;
+        permission|compacting) ;;
+        *) return 1 ;;
+    esac
+    _event_dedup_init
+    [[ -n "$_TAVS_DEDUP_FILE" && -f "$_TAVS_DEDUP_FILE" ]] || return 1
+
+    local key value fp="" ts=0 window=0 count_file="" metrics="" journal=""
+    while IFS='=' read -r key value; do
+        case "$key" in
+            fp) fp="$value" ;;
+            ts) ts="$value" ;;
+            window) window="$value" ;;
+            count_file) count_file="$value" ;;
+            metrics) metrics="$value" ;;
+            journal) journal="$value" ;;
+        esac
+    done < "$_TAVS_DEDUP_FILE"
+    [[ "$ts" =~ ^[0-9]+$ && "$window" =~ ^[0-9]+$ ]] || return 1
+    [[ $window -gt 0 ]] || return 1
+
+    _event_dedup_fp "$count_file" "$@"
+    [[ "$_TAVS_DEDUP_FP" == "$fp" ]] || return 1
+    [[ $((_UTIL_NOW - ts)) -lt $window ]] || return 1
+    _TAVS_DEDUP_METRICS="$metrics" _TAVS_DEDUP_JOURNAL="$journal"
+    return 0
+}
+
+# Record the event that just completed (after all visuals were sent)
+# Usage: event_dedup_record state [args...]
+event_dedup_record() {
+    _event_dedup_init
+    [[ -n "$_TAVS_DEDUP_FILE" ]] || return 0
+
+    local window="${TAVS_DEDUP_WINDOW:-0}"
+    [[ "$window" =~ ^[0-9]+$ ]] || window=0
+    if [[ "${1:-}" == "processing" && "${TAVS_TITLE_MODE:-}" == "full" ]]; then
+        window=0  # Spinner eyes advance once per event
+    fi
+    [[ "${DEBUG_ALL:-0}" == "1" ]] && window=0  # Log every invocation
+
+    local count_file="${SUBAGENT_COUNT_FILE:-}"
+    _event_dedup_fp "$count_file" "$@"
+
+    local dir="${_TAVS_DEDUP_FILE%/*}"
+    if [[ ! -d "$dir" ]]; then
+        mkdir -p "$dir" 2>/dev/null
+        chmod 700 "$dir" 2>/dev/null
+    fi
+    util_tmpfile "$_TAVS_DEDUP_FILE"
+    printf 'fp=%s\nts=%s\nwindow=%s\ncount_file=%s\nmetrics=%s\njournal=%s\n' \
+        "$_TAVS_DEDUP_FP" "$_UTIL_NOW" "$window" "$count_file" "${ENABLE_METRICS:-true}" "${ENABLE_JOURNAL:-false}" \
+        > "$_UTIL_TMPFILE" 2>/dev/null &&
+        mv -f "$_UTIL_TMPFILE" "$_TAVS_DEDUP_FILE" 2>/dev/null ||
+        rm -f "$_UTIL_TMPFILE" 2>/dev/null
+    return 0
+}
+
+# Remove the record (the event was deferred; see above)
+event_dedup_forget() {
+    _event_dedup_init
+    [[ -n "$_TAVS_DEDUP_FILE" && -f "$_TAVS_DEDUP_FILE" ]] && \
+        rm -f "$_TAVS_DEDUP_FILE" 2>/dev/null
+    return 0
+}
@@ -12,6 +12,7 @@
 # Dependencies:
 #   - FACES_* arrays must be populated (by _resolve_agent_faces or config)
 #   - UNKNOWN_FACES_* arrays for fallback (from defaults.conf)
+#   - util.sh: util_upper (sourced by theme-config-loader.sh)
 #
 # Usage:
 #   source face-selection.sh
@@ -19,6 +20,9 @@
 #   face=$(get_random_face "processing")
 # ==============================================================================
 
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+
 # ==============================================================================
 # AGENT FACE RESOLUTION
 # ==============================================================================
@@ -42,9 +46,10 @@ _resolve_agent_faces() {
             ;;
     esac
 
-    # Convert to uppercase for prefix (Bash 3.2 compatible)
+    # Convert to uppercase for prefix (util.sh, Bash 3.2 compatible)
     local prefix
-    prefix="$(echo "$agent" | tr '[:lower:]' '[:upper:]')_"  # CLAUDE_, GEMINI_, etc.
+    util_upper "$agent"
+    prefix="${_UTIL_UPPER}_"  # CLAUDE_, GEMINI_, etc.
 
     # Face states to resolve
     local states=(
@@ -147,9 +152,10 @@ get_compact_face() {
     local state="$1"
     local theme="${TAVS_COMPACT_THEME:-squares}"
     local theme_upper
-    theme_upper="$(echo "$theme" | tr '[:lower:]' '[:upper:]')"
+    util_upper "$theme"
+    theme_upper="$_UTIL_UPPER"
 
-    # Map state to array suffix (Bash 3.2 compatible - use tr instead of ^^)
+    # Map state to array suffix (fixed set, no conversion needed)
     local state_upper
     case "$state" in
         processing) state_upper="PROCESSING" ;;
@@ -0,0 +1,170 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS - Terminal Agent Visual Signals — Feature Backoff (Negative Cache)
+# ==============================================================================
+# Optional features that talk to the terminal can fail on every hook when the
+# terminal is misconfigured: `kitten @` without allow_remote_control, or an
+# iTerm2 ReportVariable query that never gets an answer through tmux. Each of
+# those costs a failed round-trip or a full timeout per trigger.
+#
+# Failures are counted per TTY and feature. After FEATURE_BACKOFF_THRESHOLD
+# consecutive failures the feature is skipped for FEATURE_BACKOFF_SECONDS.
+# When the window expires the feature is tried once more; one more failure
+# starts a new window, a success clears the entry.
+#
+# Features:
+#   kitty_remote  - kitten @ set-background-image (backgrounds.sh)
+#   iterm2_query  - OSC 1337 ReportVariable title queries (title-iterm2.sh)
+#
+# File: ${TAVS_TMP_DIR:-/tmp/tavs}/backoff.{TTY_SAFE}
+#   <feature>=<consecutive_failures> <skip_until_epoch>
+# (key=value lines, never sourced; skip_until is 0 until the threshold is hit)
+#
+# Public functions:
+#   feature_backoff_active()   - True while a feature is being skipped
+#   record_feature_failure()   - Count a failure, start a window at the threshold
+#   record_feature_success()   - Clear a feature's entry
+#   list_feature_backoff()     - Print all entries for status/doctor output
+#   clear_feature_backoff()    - Remove entries (one TTY or all)
+#
+# Internal functions:
+#   _feature_backoff_file()    - Set _FEATURE_BACKOFF_FILE for the current TTY
+#   _feature_backoff_get()     - Set _FEATURE_FAILURES/_FEATURE_UNTIL for a feature
+#   _feature_backoff_put()     - Rewrite one feature's entry atomically
+#
+# Dependencies:
+#   - TTY_SAFE (set by session-state.sh / agent triggers)
+#   - util.sh: util_now
+# ==============================================================================
+
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+
+# Set _FEATURE_BACKOFF_FILE for the current TTY (empty without TTY_SAFE)
+_feature_backoff_file() {
+    _FEATURE_BACKOFF_FILE=""
+    [[ -n "${TTY_SAFE:-}" ]] && _FEATURE_BACKOFF_FILE="${TAVS_TMP_DIR:-/tmp/tavs}/backoff.${TTY_SAFE}"
+}
+
+# Read one feature's entry into _FEATURE_FAILURES and _FEATURE_UNTIL
+# Usage: _feature_backoff_get feature
+_feature_backoff_get() {
+    local feature="$1" key value
+    _FEATURE_FAILURES=0
+    _FEATURE_UNTIL=0
+    [[ -n "$_FEATURE_BACKOFF_FILE" && -f "$_FEATURE_BACKOFF_FILE" ]] || return 1
+    while IFS='=' read -r key value; do
+        if [[ "$key" == "$feature" ]]; then
+            _FEATURE_FAILURES="${value%% *}"
+            _FEATURE_UNTIL="${value#* }"
+            [[ "$_FEATURE_FAILURES" =~ ^[0-9]+$ ]] || _FEATURE_FAILURES=0
+            [[ "$_FEATURE_UNTIL" =~ ^[0-9]+$ ]] || _FEATURE_UNTIL=0
+            return 0
+        fi
+    done < "$_FEATURE_BACKOFF_FILE"
+    return 1
+}
+
+# Rewrite one feature's entry (empty value removes it), keeping the others
+# Usage: _feature_backoff_put feature ["failures until"]
+_feature_backoff_put() {
+    local feature="$1" entry="${2:-}" key value
+    local file="$_FEATURE_BACKOFF_FILE"
+    local tmp_file="${file}.tmp.$$"
+    local dir="${file%/*}"
+    if [[ ! -d "$dir" ]]; then
+        mkdir -p "$dir" 2>/dev/null
+        chmod 700 "$dir" 2>/dev/null
+    fi
+
+    {
+        if [[ -f "$file" ]]; then
+            while IFS='=' read -r key value; do
+                [[ -n "$key" && "$key" != "$feature" ]] && printf '%s=%s\n' "$key" "$value"
+            done < "$file"
+        fi
+        if [[ -n "$entry" ]]; then
+            printf '%s=%s\n' "$feature" "$entry"
+        fi
+    } > "$tmp_file" 2>/dev/null || return 1
+
+    if [[ -s "$tmp_file" ]]; then
+        mv "$tmp_file" "$file" 2>/dev/null
+    else
+        rm -f "$tmp_file" "$file" 2>/dev/null
+    fi
+}
+
+# Check whether a feature is inside its backoff window
+# Builtin-only unless an entry exists (then at most one `date` on bash 3.2).
+# Usage: feature_backoff_active feature   → 0 = skip it, 1 = try it
+feature_backoff_active() {
+    _feature_backoff_file
+    _feature_backoff_get "$1" || return 1
+    [[ "$_FEATURE_UNTIL" -gt 0 ]] || return 1
+    util_now
+    [[ "$_UTIL_NOW" -lt "$_FEATURE_UNTIL" ]]
+}
+
+# Count a consecutive failure; start a backoff window at the threshold
+# Usage: record_feature_failure feature
+record_feature_failure() {
+    local feature="$1"
+    local threshold="${FEATURE_BACKOFF_THRESHOLD:-3}"
+    local seconds="${FEATURE_BACKOFF_SECONDS:-600}"
+    [[ "$threshold" =~ ^[0-9]+$ ]] || threshold=3
+    [[ "$seconds" =~ ^[0-9]+$ ]] || seconds=600
+
+    _feature_backoff_file
+    [[ -z "$_FEATURE_BACKOFF_FILE" ]] && return 0
+    _feature_backoff_get "$feature"
+
+    local failures=$((_FEATURE_FAILURES + 1)) until=0
+    if [[ "$threshold" -gt 0 && "$failures" -ge "$threshold" ]]; then
+        util_now
+        until=$((_UTIL_NOW + seconds))
+    fi
+    _feature_backoff_put "$feature" "$failures $until"
+}
+
+# Clear a feature's failure count after it worked
+# Usage: record_feature_success feature
+record_feature_success() {
+    _feature_backoff_file
+    _feature_backoff_get "$1" || return 0
+    _feature_backoff_put "$1"
+}
+
+# Print every entry as "<tty_safe> <feature> <failures> <seconds_left>"
+# (seconds_left is 0 while the feature is still being tried)
+list_feature_backoff() {
+    local dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    local file tty_safe key value failures until left
+    util_now
+    for file in "$dir"/backoff.*; do
+        [[ -f "$file" ]] || continue
+        tty_safe="${file##*/backoff.}"
+        [[ "$tty_safe" == *.tmp.* ]] && continue
+        while IFS='=' read -r key value; do
+            [[ -z "$key" ]] && continue
+            failures="${value%% *}"
+            until="${value#* }"
+            [[ "$until" =~ ^[0-9]+$ ]] || until=0
+            left=$((until - _UTIL_NOW))
+            [[ $left -lt 0 ]] && left=0
+            printf '%s %s %s %s\n' "$tty_safe" "$key" "$failures" "$left"
+        done < "$file"
+    done
+}
+
+# Remove backoff entries for the current TTY, or for every TTY with "all"
+# Usage: clear_feature_backoff [all]
+clear_feature_backoff() {
+    if [[ "${1:-}" == "all" ]]; then
+        rm -f "${TAVS_TMP_DIR:-/tmp/tavs}"/backoff.* 2>/dev/null
+        return 0
+    fi
+    _feature_backoff_file
+    [[ -n "$_FEATURE_BACKOFF_FILE" ]] && rm -f "$_FEATURE_BACKOFF_FILE" 2>/dev/null
+    return 0
+}
@@ -38,8 +38,14 @@
 #   - get_spinner_state_dir() from spinner.sh (for persistent mode)
 #   - TAVS_IDENTITY_PERSISTENCE from defaults.conf
 #   - TTY_SAFE for stale TTY detection
+#   - util.sh: util_now, util_tmpfile
+#   - metrics.sh: metrics_count (lock timeouts)
 # ==============================================================================
 
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+[[ -n "${_TAVS_METRICS_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/metrics.sh"
+
 # ==============================================================================
 # PERSISTENCE ROUTING
 # ==============================================================================
@@ -103,6 +109,7 @@ _acquire_lock() {
         attempts=$((attempts + 1))
         if [[ $attempts -ge $max_attempts ]]; then
             [[ "${DEBUG_ALL:-0}" == "1" ]] && echo "[TAVS] Lock timeout: $lock_dir" >&2
+            metrics_count 'tavs_lock_timeouts_total{lock="identity"}'
             return 1
         fi
     done
@@ -163,9 +170,9 @@ _round_robin_next_locked() {
     # Increment counter with wrap
     local next_counter=$(( (counter + 1) % pool_size ))
 
-    # Write counter atomically (mktemp + mv on same filesystem)
-    local tmp_counter
-    tmp_counter=$(mktemp "${counter_file}.XXXXXX" 2>/dev/null) || tmp_counter="${counter_file}.tmp.$$"
+    # Write counter atomically (temp file + mv on same filesystem)
+    util_tmpfile "$counter_file"
+    local tmp_counter="$_UTIL_TMPFILE"
     printf '%s\n' "$next_counter" > "$tmp_counter"
     mv "$tmp_counter" "$counter_file" 2>/dev/null
 
@@ -219,8 +226,8 @@ _registry_store() {
     local registry_file="${reg_dir}/${type}-registry"
     local lock_dir="${reg_dir}/.lock-${type}"
 
-    local timestamp
-    timestamp=$(date +%s 2>/dev/null || printf '%s' "0")
+    util_now
+    local timestamp="$_UTIL_NOW"
 
     local entry="${primary}|${secondary}|${timestamp}"
 
@@ -228,8 +235,8 @@ _registry_store() {
     _acquire_lock "$lock_dir" || return 1
 
     # Atomic write: filter out old entry, append new
-    local tmp_file
-    tmp_file=$(mktemp "${registry_file}.XXXXXX" 2>/dev/null) || tmp_file="${registry_file}.tmp.$$"
+    util_tmpfile "$registry_file"
+    local tmp_file="$_UTIL_TMPFILE"
     {
         # Preserve entries for other keys
         if [[ -f "$registry_file" ]]; then
@@ -263,8 +270,9 @@ _registry_remove() {
     # Lock: serialize concurrent read-modify-write on same registry
     _acquire_lock "$lock_dir" || return 0
 
-    local tmp_file
-    tmp_file=$(mktemp "${registry_file}.XXXXXX" 2>/dev/null) || tmp_file="${registry_file}.tmp.$$"
+    util_tmpfile "$registry_file"
+
+    local tmp_file="$_UTIL_TMPFILE"
     {
         local k v
         while IFS='=' read -r k v; do
@@ -299,8 +307,8 @@ _active_sessions_update() {
     _acquire_lock "$lock_dir" || return 1
 
     local entry="${session_key}|${primary_icon}"
-    local tmp_file
-    tmp_file=$(mktemp "${index_file}.XXXXXX" 2>/dev/null) || tmp_file="${index_file}.tmp.$$"
+    util_tmpfile "$index_file"
+    local tmp_file="$_UTIL_TMPFILE"
     {
         # Preserve entries for other TTYs
         if [[ -f "$index_file" ]]; then
@@ -332,8 +340,9 @@ _active_sessions_remove() {
 
     _acquire_lock "$lock_dir" || return 0
 
-    local tmp_file
-    tmp_file=$(mktemp "${index_file}.XXXXXX" 2>/dev/null) || tmp_file="${index_file}.tmp.$$"
+    util_tmpfile "$index_file"
+
+    local tmp_file="$_UTIL_TMPFILE"
     {
         local k v
         while IFS='=' read -r k v; do
@@ -387,8 +396,9 @@ _active_sessions_cleanup_stale() {
 
     _acquire_lock "$lock_dir" || return 0
 
-    local tmp_file
-    tmp_file=$(mktemp "${index_file}.XXXXXX" 2>/dev/null) || tmp_file="${index_file}.tmp.$$"
+    util_tmpfile "$index_file"
+
+    local tmp_file="$_UTIL_TMPFILE"
     local has_entries=false
 
     local k v tty_dev
@@ -432,14 +442,15 @@ _registry_cleanup_expired() {
 
     [[ ! -f "$registry_file" ]] && return 0
 
-    local now
-    now=$(date +%s 2>/dev/null) || return 0
+    util_now
+    local now="$_UTIL_NOW"
 
     # Lock: serialize with concurrent store/remove on same registry
     _acquire_lock "$lock_dir" || return 0
 
-    local tmp_file
-    tmp_file=$(mktemp "${registry_file}.XXXXXX" 2>/dev/null) || tmp_file="${registry_file}.tmp.$$"
+    util_tmpfile "$registry_file"
+
+    local tmp_file="$_UTIL_TMPFILE"
     local has_entries=false
 
     local k v timestamp
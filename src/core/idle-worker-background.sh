@@ -11,8 +11,8 @@
 # These are sourced by trigger.sh before idle-worker-background.sh, so they are available.
 # ==============================================================================
 
-# Helper: Send OSC 4 palette in idle worker (using file descriptor)
-# Usage: _idle_send_palette "dark" or "light" via fd 3
+# Helper: Send OSC 4 palette in idle worker (into the stage frame)
+# Usage: _idle_send_palette "dark" or "light"
 # Uses shared _build_osc_palette_seq from terminal.sh to avoid code duplication
 _idle_send_palette() {
     local mode="$1"
@@ -24,17 +24,17 @@ _idle_send_palette() {
     # Check if shared builder function is available
     type _build_osc_palette_seq &>/dev/null || return 0
 
-    # Build and send palette sequence via fd 3
+    # Build and send palette sequence
     local seq
     seq=$(_build_osc_palette_seq "$mode")
-    [[ -n "$seq" ]] && printf "%b" "$seq" >&3
+    [[ -n "$seq" ]] && tty_write "%b" "$seq"
 }
 
-# Helper: Reset OSC 4 palette in idle worker (using file descriptor)
+# Helper: Reset OSC 4 palette in idle worker (into the stage frame)
 _idle_reset_palette() {
     type should_enable_palette_theming &>/dev/null || return 0
     should_enable_palette_theming || return 0
-    printf "\033]104\033\\" >&3
+    tty_write "\033]104\033\\"
 }
 
 # Calculate current stage from elapsed seconds
@@ -56,7 +56,7 @@ kill_idle_timer() {
     read_session_state || return 0
     if [[ -n "$SESSION_TIMER_PID" ]] && kill -0 "$SESSION_TIMER_PID" 2>/dev/null; then
         kill "$SESSION_TIMER_PID" 2>/dev/null || true
-        [[ "$IDLE_DEBUG" == "1" ]] && echo "[$(date)] kill_idle_timer: killed PID $SESSION_TIMER_PID" >> "$IDLE_DEBUG_LOG"
+        [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" kill_idle_timer "pid=$SESSION_TIMER_PID"
     fi
 }
 
@@ -69,7 +69,7 @@ cleanup_stale_timers() {
         for pid in $stale_pids;
  do
             kill "$pid" 2>/dev/null || true
-            [[ "$IDLE_DEBUG" == "1" ]] && echo "[$(date)] cleanup_stale_timers: killed stale PID $pid" >> "$IDLE_DEBUG_LOG"
+            [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" kill_stale_timer "pid=$pid"
         done
     fi
 }
@@ -78,19 +78,19 @@ cleanup_stale_timers() {
 unified_timer_worker() {
     local tty_device="$1"
     local start_seconds=$SECONDS
+    _TAVS_FRAME_OPEN=""  # Forked mid-frame by trigger.sh
+    local TTY_DEVICE="$tty_device"  # Seen by tty_write
     local current_stage=0
     local last_applied_stage=-1
     
     # MAX_TIMER_RUNTIME definition (defaults if not set)
     local max_runtime=${MAX_TIMER_RUNTIME:-450}
 
-    trap 'exec 3>&-; exit 0' TERM INT
+    trap 'exit 0' TERM INT
 
     local my_pid
     my_pid=$( sh -c 'echo $PPID' )
 
-    exec 3>"$tty_device"
-
     local SHORT_CWD
     SHORT_CWD=$(get_short_cwd)
 
@@ -100,10 +100,10 @@ unified_timer_worker() {
         SESSION_ICON=$(get_session_icon 2>/dev/null)
     fi
 
-    # Initial state: complete
-    write_session_state "complete" "$my_pid"
+    # Initial state: complete (refused if a newer event already applied)
+    write_session_state "complete" "$my_pid" || exit 0
 
-    [[ "$IDLE_DEBUG" == "1" ]] && echo "[$(date)] Unified timer started, tty=$tty_device, pid=$my_pid" >> "$IDLE_DEBUG_LOG"
+    [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" timer_started "tty=$tty_device" "pid=$my_pid"
 
     while true; do
         sleep "$UNIFIED_CHECK_INTERVAL"
@@ -112,27 +112,36 @@ unified_timer_worker() {
 
         # Check for skip signal (Jump form Complete -> Idle)
         if check_and_clear_skip_signal && [[ $current_stage -eq 0 ]]; then
-            [[ "$IDLE_DEBUG" == "1" ]] && echo "[$(date)] Skip signal received" >> "$IDLE_DEBUG_LOG"
+            [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" timer_skip_signal
             start_seconds=$((SECONDS - UNIFIED_STAGE_DURATIONS[0]))
         fi
 
+        # System light/dark flip published by the mode watcher: re-resolve
+        # colors and repaint the current stage (builtin file read, no probe)
+        if [[ "$ENABLE_LIGHT_DARK_SWITCHING" == "true" && -n "$_CACHED_SYSTEM_MODE" ]] && \
+           type _read_shared_system_mode &>/dev/null && _read_shared_system_mode && \
+           [[ "$_SHARED_SYSTEM_MODE" != "$_CACHED_SYSTEM_MODE" ]]; then
+            _CACHED_SYSTEM_MODE="$_SHARED_SYSTEM_MODE"
+            _resolve_colors
+            last_applied_stage=-1
+        fi
+
         local elapsed=$(( SECONDS - start_seconds ))
         get_unified_stage $elapsed
         current_stage=$RESULT_STAGE
 
         # Safety Timeout
         if [[ $elapsed -ge $max_runtime ]]; then
-            [[ "$IDLE_DEBUG" == "1" ]] && echo "[$(date)] Max runtime reached" >> "$IDLE_DEBUG_LOG"
-
-            # Best effort reset (palette + background + title)
-            {
-                _idle_reset_palette 2>/dev/null || true
-                should_send_bg_color && printf "\033]111\033\\" >&3 2>/dev/null || true
-                printf "\033]0;%s\033\\" "$SHORT_CWD" >&3 2>/dev/null || true
-            } &
-            local reset_pid=$!
-            sleep 1
-            kill $reset_pid 2>/dev/null || true
+            [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" timer_max_runtime
+            metrics_count tavs_idle_max_runtime_total
+
+            # Best effort reset (palette + background + title), one
+            # bounded-time write like the stages
+            tty_frame_begin
+            _idle_reset_palette 2>/dev/null || true
+            should_send_bg_color && tty_write "\033]111\033\\"
+            tty_write "\033]0;%s\033\\" "$SHORT_CWD"
+            tty_frame_flush "reset"
 
             kill -TERM $my_pid 2>/dev/null
             exit 0
@@ -149,14 +158,18 @@ unified_timer_worker() {
             last_applied_stage=$current_stage
 
             if [[ $current_stage -eq 0 ]]; then
-                write_session_state "complete" "$my_pid"
+                write_session_state "complete" "$my_pid" || exit 0
             else
-                write_session_state "idle" "$my_pid"
+                write_session_state "idle" "$my_pid" || exit 0
             fi
 
             local stage_color="${UNIFIED_STAGE_COLORS[$current_stage]}"
             local stage_status_icon="${UNIFIED_STAGE_STATUS_ICONS[$current_stage]}"
 
+            # One bounded-time write per stage (tty-frame.sh); a stuck
+            # terminal drops the frame instead of hanging the worker
+            tty_frame_begin
+
             # Apply Palette FIRST (prevents contrast flicker)
             if [[ "$stage_color" == "reset" ]]; then
                 _idle_reset_palette
@@ -167,9 +180,9 @@ unified_timer_worker() {
             # Apply Background Color (respects ENABLE_BACKGROUND_CHANGE and STYLISH_SKIP_BG_TINT)
             if should_send_bg_color; then
                 if [[ "$stage_color" == "reset" ]]; then
-                    printf "\033]111\033\\" >&3
+                    tty_write "\033]111\033\\"
                 else
-                    printf "\033]11;%s\033\\" "$stage_color" >&3
+                    tty_write "\033]11;%s\033\\" "$stage_color"
                 fi
             fi
 
@@ -190,7 +203,13 @@ unified_timer_worker() {
 
                 local title
                 title=$(compose_title "$title_state" "$SHORT_CWD")
-                printf "\033]0;%s\033\\" "$title" >&3
+                tty_write "\033]0;%s\033\\" "$title"
+            fi
+
+            if [[ $current_stage -eq 0 ]]; then
+                tty_frame_flush "complete"
+            else
+                tty_frame_flush "idle"
             fi
         fi
     done
@@ -0,0 +1,102 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS - Terminal Agent Visual Signals — Transition Journal
+# ==============================================================================
+# Optional (ENABLE_JOURNAL) per-session record of every event a tab received,
+# for flicker reports and as input to `tavs replay`. One line per event,
+# appended with a single write when the trigger exits:
+#
+#   seq=<TAVS_EVENT_SEQ> state=<event> arg=<$2> agent=<TAVS_AGENT>
+#   mode=<permission mode> outcome=<applied|deferred|stale|dedup>
+#   prev=<state before> new=<state after> emit_us=<dispatch time>
+#   subagents=<count after>  rerun=<1 for a deferred event applied late>
+#
+# Deferred events are re-run by session-state.sh at the end of the grace
+# period; those runs are journaled with rerun=1 and skipped by replay, which
+# produces its own.
+#
+# Values are reduced to [A-Za-z0-9._-] ("-" when empty). Deduped events exit
+# before the session state is read, so they carry prev/new/subagents "-".
+#
+# File: ${TAVS_TMP_DIR:-/tmp/tavs}/journal/{key}.log
+#   key = s.{TAVS_SESSION_ID} when known, otherwise TTY_SAFE
+#
+# Public functions:
+#   journal_file()    - Set _JOURNAL_FILE for this event
+#   journal_begin()   - Note the state before this event and start the clock
+#   journal_record()  - Append this event's line
+#
+# Dependencies:
+#   - util.sh: util_read_file
+#   - read_session_state (session-state.sh), SUBAGENT_COUNT_FILE
+#     (subagent-counter.sh); optional, "-" without them
+# Include with a load guard like util.sh; safe to source from bash 3.2+ and
+# zsh (written by the bash trigger).
+# ==============================================================================
+
+_TAVS_JOURNAL_LOADED=1
+
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+
+# Set _JOURNAL_FILE (empty without a session id or TTY)
+journal_file() {
+    local key=""
+    if [[ -n "${TAVS_SESSION_ID:-}" ]]; then
+        key="s.${TAVS_SESSION_ID//[^A-Za-z0-9._-]/_}"
+    elif [[ -n "${TTY_DEVICE:-}" ]]; then
+        key="${TTY_DEVICE//\//_}"
+    fi
+    _JOURNAL_FILE=""
+    [[ -n "$key" ]] && _JOURNAL_FILE="${TAVS_TMP_DIR:-/tmp/tavs}/journal/${key}.log"
+}
+
+# Note the state before this event and start the dispatch clock
+journal_begin() {
+    _JOURNAL_PREV="-"
+    type read_session_state &>/dev/null && read_session_state && \
+        _JOURNAL_PREV="${SESSION_STATE:--}"
+    _JOURNAL_START=""
+    [[ -n "${EPOCHREALTIME:-}" ]] && _JOURNAL_START="${EPOCHREALTIME/[.,]/}"
+    return 0
+}
+
+# Append this event's line
+# Usage: journal_record outcome state [arg]
+journal_record() {
+    local outcome="$1" state="${2:-}" arg="${3:-}"
+    local prev="-" new="-" emit_us="-" subagents="-"
+    journal_file
+    [[ -n "$_JOURNAL_FILE" ]] || return 0
+
+    if [[ "$outcome" != "dedup" ]]; then
+        prev="${_JOURNAL_PREV:--}"
+        new="$prev"
+        type read_session_state &>/dev/null && read_session_state && \
+            new="${SESSION_STATE:--}"
+        if [[ -n "${_JOURNAL_START:-}" && -n "${EPOCHREALTIME:-}" ]]; then
+            emit_us=$(( ${EPOCHREALTIME/[.,]/} - _JOURNAL_START ))
+        fi
+        subagents=0
+        [[ -n "${SUBAGENT_COUNT_FILE:-}" ]] && util_read_file "$SUBAGENT_COUNT_FILE" && \
+            subagents="$_UTIL_FILE"
+    fi
+
+    local mode="${TAVS_PERMISSION_MODE:-}" agent="${TAVS_AGENT:-}"
+    state="${state//[^A-Za-z0-9._-]/_}" arg="${arg//[^A-Za-z0-9._-]/_}"
+    mode="${mode//[^A-Za-z0-9._-]/_}" agent="${agent//[^A-Za-z0-9._-]/_}"
+    subagents="${subagents//[^0-9-]/}"
+
+    local dir="${_JOURNAL_FILE%/*}"
+    if [[ ! -d "$dir" ]]; then
+        mkdir -p "$dir" 2>/dev/null
+        chmod 700 "$dir" 2>/dev/null
+    fi
+    local rerun=0
+    [[ -n "${_TAVS_DEFERRED_ID:-}" ]] && rerun=1
+    printf 'seq=%s state=%s arg=%s agent=%s mode=%s outcome=%s prev=%s new=%s emit_us=%s subagents=%s rerun=%s\n' \
+        "${TAVS_EVENT_SEQ:--}" "${state:--}" "${arg:--}" "${agent:--}" "${mode:--}" \
+        "$outcome" "$prev" "$new" "$emit_us" "${subagents:--}" "$rerun" \
+        >> "$_JOURNAL_FILE" 2>/dev/null
+    return 0
+}
@@ -0,0 +1,131 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS - Terminal Agent Visual Signals — Hook Latency Budget
+# ==============================================================================
+# Nothing else bounds how long a trigger runs: one slow `git rev-parse`,
+# transcript tail or iTerm2 ReportVariable wait can push a hook towards the
+# agent's hook timeout. The trigger starts a per-invocation clock
+# (util_now_ms) and optional stages ask before they run. Stages are shed in
+# rank order: each gets a threshold of TAVS_LATENCY_BUDGET_MS × its rank, so
+# the cheapest-to-lose stage goes first and the user title only when the
+# trigger is far over budget:
+#
+#   rank 1  image       - background image lookup/switch (backgrounds.sh)
+#   rank 2  dir_icon    - directory icon assignment, git calls (dir-icon.sh)
+#   rank 3  context     - context window data for title tokens
+#   rank 4  user_title  - user title detection (iTerm2 queries)
+#
+# Colors, bell and state are never shed. Without a started clock (CLI, the
+# two-phase worker) every stage runs. Bash 3.2 has no EPOCHREALTIME; there
+# util_now_ms forks gdate/perl, so the clock costs a few milliseconds per
+# check but the budget still applies. Time spent recording a shed stage is
+# not counted against the budget.
+#
+# File: ${TAVS_TMP_DIR:-/tmp/tavs}/shed.{TTY_SAFE}  (key=value, never sourced)
+#   image=<n>  dir_icon=<n>  context=<n>  user_title=<n>
+#   last=<epoch>  last_stage=<stage>  elapsed_ms=<ms at the last shed>
+#
+# Public functions:
+#   latency_budget_start()   - Start the clock for this invocation
+#   latency_budget_allows()  - True if a stage still fits the budget
+#   latency_budget_shed()    - Set _LATENCY_SHED_* from a TTY's record
+#
+# Internal functions:
+#   _latency_budget_record() - Count a shed stage
+#
+# Dependencies:
+#   - util.sh: util_now, util_now_ms, util_tmpfile
+# Include with a load guard like util.sh; safe to source from bash 3.2+ and
+# zsh (the clock is only started by the bash trigger).
+# ==============================================================================
+
+_TAVS_LATENCY_BUDGET_LOADED=1
+
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+
+# Start the clock (epoch milliseconds)
+latency_budget_start() {
+    util_now_ms
+    _TAVS_BUDGET_START="$_UTIL_NOW_MS"
+    return 0
+}
+
+# True if the stage may still run; records it when shed
+# Usage: latency_budget_allows image|dir_icon|context|user_title
+latency_budget_allows() {
+    [[ -z "${_TAVS_BUDGET_START:-}" ]] && return 0
+    local budget="${TAVS_LATENCY_BUDGET_MS:-0}" rank
+    [[ "$budget" =~ ^[0-9]+$ && $budget -gt 0 ]] || return 0
+    case "$1" in
+        image) rank=1 ;;
+        dir_icon) rank=2 ;;
+        context) rank=3 ;;
+        user_title) rank=4 ;;
+        *) return 0 ;;
+    esac
+    util_now_ms
+    local now="$_UTIL_NOW_MS"
+    local elapsed=$(( now - _TAVS_BUDGET_START ))
+    [[ $elapsed -le $(( budget * rank )) ]] && return 0
+    _latency_budget_record "$1" "$elapsed"
+    # Move the start past the recording so its I/O does not shed later stages
+    util_now_ms
+    _TAVS_BUDGET_START=$(( _TAVS_BUDGET_START + _UTIL_NOW_MS - now ))
+    return 1
+}
+
+# Set _LATENCY_SHED_IMAGE, _DIR_ICON, _CONTEXT, _USER_TITLE (counts) and
+# _LATENCY_SHED_LAST, _LAST_STAGE, _ELAPSED_MS from a TTY's record
+# Usage: latency_budget_shed tty_device
+latency_budget_shed() {
+    local file="${TAVS_TMP_DIR:-/tmp/tavs}/shed.${1//\//_}" key value
+    _LATENCY_SHED_IMAGE=0 _LATENCY_SHED_DIR_ICON=0 _LATENCY_SHED_CONTEXT=0
+    _LATENCY_SHED_USER_TITLE=0 _LATENCY_SHED_LAST=0 _LATENCY_SHED_LAST_STAGE=""
+    _LATENCY_SHED_ELAPSED_MS=0
+    [[ -f "$file" ]] || return 1
+    while IFS='=' read -r key value; do
+        case "$key" in
+            last_stage) _LATENCY_SHED_LAST_STAGE="$value"; continue ;;
+        esac
+        [[ "$value" =~ ^[0-9]+$ ]] || continue
+        case "$key" in
+            image) _LATENCY_SHED_IMAGE="$value" ;;
+            dir_icon) _LATENCY_SHED_DIR_ICON="$value" ;;
+            context) _LATENCY_SHED_CONTEXT="$value" ;;
+            user_title) _LATENCY_SHED_USER_TITLE="$value" ;;
+            last) _LATENCY_SHED_LAST="$value" ;;
+            elapsed_ms) _LATENCY_SHED_ELAPSED_MS="$value" ;;
+        esac
+    done < "$file"
+    return 0
+}
+
+# Count a shed stage in the TTY's record
+# Written at once (not at exit): title stages run in $(...) subshells.
+# Usage: _latency_budget_record stage elapsed_ms
+_latency_budget_record() {
+    local stage="$1" elapsed_ms="$2"
+    [[ "${DEBUG_ALL:-0}" == "1" ]] && \
+        echo "[TAVS] Latency budget: shed $stage after ${elapsed_ms}ms" >&2
+    [[ -z "${TTY_DEVICE:-}" ]] && return 0
+
+    latency_budget_shed "$TTY_DEVICE"
+    case "$stage" in
+        image) _LATENCY_SHED_IMAGE=$((_LATENCY_SHED_IMAGE + 1)) ;;
+        dir_icon) _LATENCY_SHED_DIR_ICON=$((_LATENCY_SHED_DIR_ICON + 1)) ;;
+        context) _LATENCY_SHED_CONTEXT=$((_LATENCY_SHED_CONTEXT + 1)) ;;
+        user_title) _LATENCY_SHED_USER_TITLE=$((_LATENCY_SHED_USER_TITLE + 1)) ;;
+    esac
+    util_now
+
+    local file="${TAVS_TMP_DIR:-/tmp/tavs}/shed.${TTY_DEVICE//\//_}"
+    util_tmpfile "$file"
+    printf 'image=%s\ndir_icon=%s\ncontext=%s\nuser_title=%s\nlast=%s\nlast_stage=%s\nelapsed_ms=%s\n' \
+        "$_LATENCY_SHED_IMAGE" "$_LATENCY_SHED_DIR_ICON" "$_LATENCY_SHED_CONTEXT" \
+        "$_LATENCY_SHED_USER_TITLE" "$_UTIL_NOW" "$stage" "$elapsed_ms" \
+        > "$_UTIL_TMPFILE" 2>/dev/null &&
+        mv -f "$_UTIL_TMPFILE" "$file" 2>/dev/null ||
+        rm -f "$_UTIL_TMPFILE" 2>/dev/null
+    return 0
+}
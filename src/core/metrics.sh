@@ -0,0 +1,217 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS - Terminal Agent Visual Signals — Metrics
+# ==============================================================================
+# Counters and latency histograms in Prometheus textfile format, so hook
+# overhead can be tracked per state and agent (and scraped by node_exporter's
+# textfile collector).
+#
+# Recording must cost about nothing per hook, so it is split in two:
+#   - Each trigger appends one line to metrics.log when it exits (one write,
+#     O_APPEND, no lock). Rare events (lock timeouts, idle max runtime) are
+#     appended the same way when they happen.
+#   - About one trigger in TAVS_METRICS_FOLD_EVERY starts a detached fold
+#     that adds the pending lines to metrics.state and rewrites metrics.prom.
+#     `tavs stats` folds before reading.
+#
+# Metrics:
+#   tavs_trigger_total{state,agent,outcome}        counter
+#     outcome: applied | deferred (should_change_state) | stale (older than
+#     the shown event) | dedup (early exit, see event-dedup.sh)
+#   tavs_trigger_duration_seconds{state,agent}      histogram (bash 5+)
+#   tavs_lock_timeouts_total{lock}                  counter (frame, identity)
+#   tavs_idle_max_runtime_total                     counter
+#
+# Files (${TAVS_TMP_DIR:-/tmp/tavs}):
+#   metrics.log     - pending lines:  t <state> <agent> <outcome> <us|->
+#                                     c <series>
+#   metrics.state   - folded totals:  <series> <value>  (sum in microseconds)
+#   metrics.prom    - textfile export (also copied to TAVS_METRICS_TEXTFILE)
+#   metrics.lock/   - mkdir lock held while folding
+#
+# Public functions:
+#   metrics_start()    - Start the latency clock for this invocation
+#   metrics_trigger()  - Record this invocation (called on trigger exit)
+#   metrics_count()    - Count one occurrence of a series
+#   metrics_fold()     - Fold pending lines into the totals and export
+#
+# Internal functions:
+#   _metrics_add()     - Add to a series during a fold
+#   _metrics_write()   - Write metrics.state and metrics.prom
+#
+# Dependencies:
+#   - util.sh: util_tmpfile
+# Include with a load guard like util.sh. Recording works in bash 3.2+ and
+# zsh; folding needs bash.
+# ==============================================================================
+
+_TAVS_METRICS_LOADED=1
+
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+
+# Histogram upper bounds: milliseconds and their `le` labels (seconds)
+_METRICS_BUCKETS_MS="5 10 25 50 100 250 500 1000 2500"
+_METRICS_BUCKETS_LE="0.005 0.01 0.025 0.05 0.1 0.25 0.5 1 2.5"
+
+# Start the clock (left unset without EPOCHREALTIME, i.e. bash < 5)
+metrics_start() {
+    _TAVS_METRICS_START=""
+    [[ -n "${EPOCHREALTIME:-}" ]] && _TAVS_METRICS_START="${EPOCHREALTIME/[.,]/}"
+    return 0
+}
+
+# Record one invocation and maybe start a fold
+# Usage: metrics_trigger state outcome
+metrics_trigger() {
+    [[ "${ENABLE_METRICS:-true}" == "true" ]] || return 0
+    local state="${1:-none}" outcome="$2" agent="${TAVS_AGENT:-unknown}" us="-"
+    [[ "$state" =~ ^[a-z_-]+$ ]] || state="other"
+    [[ "$agent" =~ ^[a-z0-9_-]+$ ]] || agent="other"
+    if [[ -n "${_TAVS_METRICS_START:-}" && -n "${EPOCHREALTIME:-}" ]]; then
+        us=$(( ${EPOCHREALTIME/[.,]/} - _TAVS_METRICS_START ))
+    fi
+    local dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    [[ -d "$dir" ]] || return 0
+    printf 't %s %s %s %s\n' "$state" "$agent" "$outcome" "$us" \
+        >> "$dir/metrics.log" 2>/dev/null
+
+    local every="${TAVS_METRICS_FOLD_EVERY:-64}"
+    [[ "$every" =~ ^[1-9][0-9]*$ ]] || every=64
+    if (( RANDOM % every == 0 )) && [[ -n "${BASH_VERSION:-}" ]]; then
+        ( metrics_fold ) </dev/null >/dev/null 2>&1 &
+        disown 2>/dev/null
+    fi
+    return 0
+}
+
+# Count one occurrence of a series, e.g. 'tavs_lock_timeouts_total{lock="frame"}'
+# Usage: metrics_count series
+metrics_count() {
+    [[ "${ENABLE_METRICS:-true}" == "true" ]] || return 0
+    local dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    [[ -d "$dir" ]] || return 0
+    printf 'c %s\n' "$1" >> "$dir/metrics.log" 2>/dev/null
+    return 0
+}
+
+# Fold pending lines into metrics.state and rewrite metrics.prom
+# Skipped while another fold holds the lock (taken over if its holder died).
+# A line appended while the log is being renamed can be lost.
+metrics_fold() {
+    local dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    local lock="$dir/metrics.lock" fold="$dir/metrics.log.fold" holder=""
+    if ! mkdir "$lock" 2>/dev/null; then
+        [[ -f "$lock/pid" ]] && read -r holder < "$lock/pid" 2>/dev/null
+        [[ -n "$holder" ]] && kill -0 "$holder" 2>/dev/null && return 1
+        rm -rf "$lock" 2>/dev/null
+        mkdir "$lock" 2>/dev/null || return 1
+    fi
+    echo "${BASHPID:-$$}" > "$lock/pid" 2>/dev/null
+
+    # A fold file left by a fold that died is folded first
+    [[ -f "$fold" ]] || mv -f "$dir/metrics.log" "$fold" 2>/dev/null
+
+    local series value _METRICS_KEYS=""
+    if [[ -f "$dir/metrics.state" ]]; then
+        while read -r series value; do
+            [[ "$value" =~ ^[0-9]+$ ]] && _metrics_add "$series" "$value"
+        done < "$dir/metrics.state"
+    fi
+
+    local kind state agent outcome us labels hit i
+    local series_re='^tavs_[a-z_]+(\{[^ ]*\})?$'
+    local -a buckets les
+    buckets=($_METRICS_BUCKETS_MS)
+    les=($_METRICS_BUCKETS_LE)
+    if [[ -f "$fold" ]]; then
+        while read -r kind state agent outcome us; do
+            case "$kind" in
+                t)
+                    labels="state=\"$state\",agent=\"$agent\""
+                    _metrics_add "tavs_trigger_total{$labels,outcome=\"$outcome\"}" 1
+                    [[ "$us" =~ ^[0-9]+$ ]] || continue
+                    # Every bucket is written, empty ones as 0
+                    for (( i = 0; i < ${#buckets[@]}; i++ )); do
+                        hit=0
+                        [[ $us -le $(( ${buckets[$i]} * 1000 )) ]] && hit=1
+                        _metrics_add "tavs_trigger_duration_seconds_bucket{$labels,le=\"${les[$i]}\"}" $hit
+                    done
+                    _metrics_add "tavs_trigger_duration_seconds_bucket{$labels,le=\"+Inf\"}" 1
+                    _metrics_add "tavs_trigger_duration_seconds_sum{$labels}" "$us"
+                    _metrics_add "tavs_trigger_duration_seconds_count{$labels}" 1
+                    ;;
+                c)
+                    [[ "$state" =~ $series_re ]] && _metrics_add "$state" 1
+                    ;;
+            esac
+        done < "$fold"
+    fi
+
+    _metrics_write "$dir" && rm -f "$fold" 2>/dev/null
+    rm -f "$lock/pid" 2>/dev/null
+    rmdir "$lock" 2>/dev/null
+    return 0
+}
+
+# Add to a series (one variable per series, no associative arrays in 3.2)
+# Usage: _metrics_add series amount
+_metrics_add() {
+    local var="_MX_${1//[^a-zA-Z0-9]/_}"
+    if [[ -z "${!var:-}" ]]; then
+        _METRICS_KEYS+="$1"$'\n'
+        printf -v "$var" '%s' "$2"
+    else
+        printf -v "$var" '%s' $(( ${!var} + $2 ))
+    fi
+}
+
+# Write metrics.state (raw totals) and metrics.prom (textfile export)
+# Usage: _metrics_write dir
+_metrics_write() {
+    local dir="$1" series var state="" prom="" family value
+    local -a sorted
+    sorted=()
+    while IFS= read -r series; do
+        [[ -n "$series" ]] && sorted+=("$series")
+    done < <(printf '%s' "$_METRICS_KEYS" | LC_ALL=C sort)
+
+    for family in \
+        "tavs_trigger_total counter TAVS trigger invocations by state, agent and outcome" \
+        "tavs_trigger_duration_seconds histogram TAVS trigger run time" \
+        "tavs_lock_timeouts_total counter Lock waits that gave up" \
+        "tavs_idle_max_runtime_total counter Idle workers stopped at MAX_TIMER_RUNTIME"; do
+        local name="${family%% *}" rest="${family#* }"
+        prom+="# HELP $name ${rest#* }"$'\n'"# TYPE $name ${rest%% *}"$'\n'
+        for series in "${sorted[@]}"; do
+            case "$series" in
+                "$name"|"$name{"*|"${name}_bucket{"*|"${name}_sum{"*|"${name}_count{"*) ;;
+                *) continue ;;
+            esac
+            var="_MX_${series//[^a-zA-Z0-9]/_}"
+            value="${!var}"
+            if [[ "$series" == *_seconds_sum\{* ]]; then
+                printf -v value '%d.%06d' $(( value / 1000000 )) $(( value % 1000000 ))
+            fi
+            prom+="$series $value"$'\n'
+        done
+    done
+    for series in "${sorted[@]}"; do
+        var="_MX_${series//[^a-zA-Z0-9]/_}"
+        state+="$series ${!var}"$'\n'
+    done
+
+    util_tmpfile "$dir/metrics.state"
+    printf '%s' "$state" > "$_UTIL_TMPFILE" 2>/dev/null &&
+        mv -f "$_UTIL_TMPFILE" "$dir/metrics.state" 2>/dev/null ||
+        { rm -f "$_UTIL_TMPFILE" 2>/dev/null; return 1; }
+
+    local target
+    for target in "$dir/metrics.prom" ${TAVS_METRICS_TEXTFILE:+"$TAVS_METRICS_TEXTFILE"}; do
+        util_tmpfile "$target"
+        printf '%s' "$prom" > "$_UTIL_TMPFILE" 2>/dev/null &&
+            mv -f "$_UTIL_TMPFILE" "$target" 2>/dev/null ||
+            rm -f "$_UTIL_TMPFILE" 2>/dev/null
+    done
+    return 0
+}
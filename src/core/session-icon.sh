@@ -47,9 +47,13 @@
 #     _active_sessions_* (loaded by trigger.sh when identity mode is active)
 #   - get_spinner_state_dir() from spinner.sh
 #   - TTY_SAFE, TAVS_SESSION_ID, TAVS_IDENTITY_MODE
+#   - util.sh: util_hash, util_tmpfile
 #   - TAVS_SESSION_ICON_POOL (77 animals), TAVS_SESSION_ICONS (25, legacy)
 # ==============================================================================
 
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+
 # ==============================================================================
 # SESSION KEY RESOLUTION
 # ==============================================================================
@@ -265,8 +269,8 @@ assign_session_icon() {
                 fi
 
                 # Rewrite cache with updated collision status
-                local tmp_file
-                tmp_file=$(mktemp "${icon_file}.XXXXXX" 2>/dev/null) || tmp_file="${icon_file}.tmp.$$"
+                util_tmpfile "$icon_file"
+                local tmp_file="$_UTIL_TMPFILE"
                 {
                     printf 'session_key=%s\n' "$session_key"
                     printf 'primary=%s\n' "$cached_primary"
@@ -320,8 +324,8 @@ assign_session_icon() {
         fi
         if [[ -z "$primary" ]]; then
             # Fallback: hash-based selection (lock timeout backstop)
-            local hash_val
-            hash_val=$(printf '%s' "$session_key" | cksum | cut -d' ' -f1)
+            util_hash "$session_key"
+            local hash_val="$_UTIL_HASH"
             local pool_size="${#TAVS_SESSION_ICON_POOL[@]}"
             [[ $pool_size -eq 0 ]] && pool_size=1
             primary="${TAVS_SESSION_ICON_POOL[$((hash_val % pool_size))]}"
@@ -350,8 +354,8 @@ assign_session_icon() {
     fi
 
     # Step 7: Write per-TTY cache (v2 structured KV format, atomic)
-    local tmp_file
-    tmp_file=$(mktemp "${icon_file}.XXXXXX" 2>/dev/null) || tmp_file="${icon_file}.tmp.$$"
+    util_tmpfile "$icon_file"
+    local tmp_file="$_UTIL_TMPFILE"
     {
         printf 'session_key=%s\n' "$session_key"
         printf 'primary=%s\n' "$primary"
@@ -2,9 +2,15 @@
 # ==============================================================================
 # TAVS - Terminal Agent Visual Signals — State Management
 # ==============================================================================
-# Handles state persistence, priority locking, and TTY state tracking.
+# Handles state persistence, the state transition table (with deferred
+# events), and TTY state tracking.
 # ==============================================================================
 
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+# One-line debug records (see debug-log.sh)
+[[ -n "${_TAVS_DEBUG_LOG_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/debug-log.sh"
+
 # ==============================================================================
 # EPHEMERAL STATE DIRECTORY
 # ==============================================================================
@@ -29,19 +35,14 @@ _TAVS_TMP_DIR=$(get_tavs_tmp_dir)
 
 # Consolidated state file: TTY_SAFE state priority timestamp timer_pid
 STATE_DB="${_TAVS_TMP_DIR}/state"
-STATE_GRACE_PERIOD_MS=400  # Milliseconds to protect high-priority states
+STATE_GRACE_PERIOD_MS="${STATE_GRACE_PERIOD_MS:-400}"  # Milliseconds to protect high-priority states (user.conf)
 
 # Get current time in milliseconds (for sub-second grace period)
-# macOS doesn't support %N, so we use perl or python as fallback
+# EPOCHREALTIME on bash 5+; macOS date lacks %N, so util_now_ms falls back
+# to gdate or perl there
 get_time_ms() {
-    if command -v gdate &>/dev/null; then
-        gdate +%s%3N
-    elif command -v perl &>/dev/null; then
-        perl -MTime::HiRes=time -e 'printf "%.0f\n", time*1000'
-    else
-        # Fallback: seconds * 1000 (loses millisecond precision)
-        echo "$(( $(date +%s) * 1000 ))"
-    fi
+    util_now_ms
+    echo "$_UTIL_NOW_MS"
 }
 
 # Debug logging
@@ -71,54 +72,164 @@ get_state_priority() {
 }
 
 # Read session state for the current TTY
-# Sets: SESSION_STATE, SESSION_PRIORITY, SESSION_TIME, SESSION_TIMER_PID
+# Sets: SESSION_STATE, SESSION_PRIORITY, SESSION_TIME, SESSION_TIMER_PID,
+#       SESSION_SEQ (event stamp of the state, 0 if unknown)
+# Line format: TTY_SAFE state priority time_ms timer_pid|- event_seq
+# (older records end after timer_pid; the last line for a TTY wins)
 read_session_state() {
-    SESSION_STATE="" SESSION_PRIORITY=0 SESSION_TIME=0 SESSION_TIMER_PID=""
+    SESSION_STATE="" SESSION_PRIORITY=0 SESSION_TIME=0 SESSION_TIMER_PID="" SESSION_SEQ=0
     [[ ! -f "$STATE_DB" ]] && return 1
-    local line
-    line=$(grep "^${TTY_SAFE} " "$STATE_DB" 2>/dev/null | tail -1)
-    [[ -z "$line" ]] && return 1
-    read -r _ SESSION_STATE SESSION_PRIORITY SESSION_TIME SESSION_TIMER_PID <<< "$line"
-    return 0
+    local tty state priority time pid seq found=1
+    while read -r tty state priority time pid seq; do
+        [[ "$tty" == "$TTY_SAFE" ]] || continue
+        SESSION_STATE="$state" SESSION_PRIORITY="$priority" SESSION_TIME="$time"
+        SESSION_TIMER_PID="$pid" SESSION_SEQ="${seq:-0}"
+        found=0
+    done < "$STATE_DB"
+    [[ "$SESSION_TIMER_PID" == "-" ]] && SESSION_TIMER_PID=""
+    return $found
+}
+
+# === EVENT ORDERING ===
+# Hooks run async, so a slow trigger can finish after a later one. Adapters
+# stamp each event on arrival with TAVS_EVENT_SEQ (microseconds since the
+# epoch, taken before any heavy work; trigger.sh stamps events that arrive
+# without one). The stamp is stored with the state, and an event older than
+# the applied one neither emits nor records. Stamps more than
+# _STATE_SEQ_MAX_SKEW_US apart are not compared (wall clock stepped back).
+_STATE_SEQ_MAX_SKEW_US=60000000
+
+# True if a newer event than this one was already applied to this TTY
+is_stale_event() {
+    [[ "${TAVS_EVENT_SEQ:-}" =~ ^[0-9]+$ ]] || return 1
+    read_session_state || return 1
+    [[ "$SESSION_SEQ" =~ ^[0-9]+$ ]] || return 1
+    local ahead=$(( SESSION_SEQ - TAVS_EVENT_SEQ ))
+    [[ $ahead -gt 0 && $ahead -lt $_STATE_SEQ_MAX_SKEW_US ]]
 }
 
 # Write session state to consolidated file (atomic update)
+# Refused when a newer event was applied meanwhile (see EVENT ORDERING)
 write_session_state() {
     local state="$1"
     local timer_pid="${2:-}"
+    is_stale_event && return 1
     local priority
     priority=$(get_state_priority "$state")
     local now_ms
     now_ms=$(get_time_ms)
 
-    [[ "$IDLE_DEBUG" == "1" ]] && echo "[$(date)] write_session_state: tty=$TTY_SAFE state=$state timer_pid='$timer_pid'" >> "$IDLE_DEBUG_LOG"
+    [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" write_session_state "tty=$TTY_SAFE" "state=$state" "timer_pid=$timer_pid"
 
     local tmp_file="${STATE_DB}.tmp.$$"
     {
         grep -v "^${TTY_SAFE} " "$STATE_DB" 2>/dev/null
-        echo "${TTY_SAFE} ${state} ${priority} ${now_ms} ${timer_pid}"
+        echo "${TTY_SAFE} ${state} ${priority} ${now_ms} ${timer_pid:--} ${TAVS_EVENT_SEQ:-0}"
     } > "$tmp_file" 2>/dev/null
     mv "$tmp_file" "$STATE_DB" 2>/dev/null
 }
 
-# Check if state change should proceed based on priority
-should_change_state() {
+# === TRANSITION TABLE ===
+# A state listed for the current state may not replace it until the grace
+# period has passed (e.g. a PostToolUse `processing` landing milliseconds
+# after PermissionRequest). Such an event is deferred, not dropped.
+# States not listed (and any state once the grace period is over) apply now.
+# Set _STATE_PROTECTED to the space-separated list for a current state
+_state_protected_by() {
+    case "$1" in
+        permission) _STATE_PROTECTED="compacting tool_error processing subagent complete idle" ;;
+        compacting) _STATE_PROTECTED="tool_error processing subagent complete idle" ;;
+        tool_error) _STATE_PROTECTED="processing subagent complete idle" ;;
+        processing) _STATE_PROTECTED="subagent complete idle" ;;
+        subagent)   _STATE_PROTECTED="complete idle" ;;
+        complete)   _STATE_PROTECTED="idle" ;;
+        *)          _STATE_PROTECTED="" ;;
+    esac
+}
+
+# Look up a transition for the current TTY
+# Usage: get_state_transition new_state   → sets _STATE_TRANSITION
+#   apply - no state recorded, not protected, or grace period over
+#   defer - protected and inside the grace period (_STATE_DEFER_MS = wait)
+get_state_transition() {
     local new_state="$1"
-    local new_priority
-    new_priority=$(get_state_priority "$new_state")
+    _STATE_TRANSITION="apply"
+    _STATE_DEFER_MS=0
 
-    # Always allow if no state recorded yet
     read_session_state || return 0
+    _state_protected_by "$SESSION_STATE"
+    case " $_STATE_PROTECTED " in
+        *" $new_state "*) ;;
+        *) return 0 ;;
+    esac
+
+    util_now_ms
+    local elapsed_ms=$(( _UTIL_NOW_MS - SESSION_TIME ))
+    if [[ $elapsed_ms -lt $STATE_GRACE_PERIOD_MS ]]; then
+        _STATE_TRANSITION="defer"
+        _STATE_DEFER_MS=$(( STATE_GRACE_PERIOD_MS - elapsed_ms ))
+    fi
+}
 
-    # Always allow same or higher priority
-    [[ $new_priority -ge $SESSION_PRIORITY ]] && return 0
+# === DEFERRED-EVENT SLOT ===
+# One pending event per TTY: ${STATE_DB}.deferred.{TTY_SAFE}
+#   <id> <state> <session_time>
+# A newer deferred event overwrites the slot; a newer recorded state changes
+# SESSION_TIME. Either way the pending event is superseded and dropped when
+# its timer fires. Otherwise the trigger (the bundle when running from one,
+# see _TAVS_TRIGGER in trigger.sh) is re-run for it with _TAVS_DEFERRED_ID set
+# once the grace period is over.
+_STATE_TRIGGER="${_TAVS_TRIGGER:-${BASH_SOURCE[0]%/*}/trigger.sh}"
+
+# Read the slot into _DEFERRED_ID, _DEFERRED_STATE, _DEFERRED_BASIS
+_read_deferred_state() {
+    _DEFERRED_ID="" _DEFERRED_STATE="" _DEFERRED_BASIS=""
+    local file="${STATE_DB}.deferred.${TTY_SAFE}"
+    [[ -f "$file" ]] || return 1
+    read -r _DEFERRED_ID _DEFERRED_STATE _DEFERRED_BASIS < "$file"
+    [[ -n "$_DEFERRED_ID" ]]
+}
 
-    # For lower priority: check if grace period has passed (using milliseconds)
-    local now_ms
-    now_ms=$(get_time_ms)
-    local elapsed_ms=$(( now_ms - SESSION_TIME ))
-    [[ $elapsed_ms -lt $STATE_GRACE_PERIOD_MS ]] && return 1
-    return 0
+# Park an event in the slot and schedule it for the end of the grace period
+# Usage: defer_state_event state delay_ms
+defer_state_event() {
+    local state="$1" delay_ms="$2"
+    local file="${STATE_DB}.deferred.${TTY_SAFE}"
+    util_now_ms
+    local id="${_UTIL_NOW_MS}.$$"
+
+    util_tmpfile "$file"
+    printf '%s %s %s\n' "$id" "$state" "$SESSION_TIME" > "$_UTIL_TMPFILE" 2>/dev/null &&
+        mv -f "$_UTIL_TMPFILE" "$file" 2>/dev/null || return 1
+
+    local delay
+    printf -v delay '%d.%03d' $(( delay_ms / 1000 )) $(( delay_ms % 1000 ))
+    (
+        sleep "$delay"
+        _TAVS_RERUN=1 _TAVS_DEFERRED_ID="$id" TTY_DEVICE="$TTY_DEVICE" \
+            "$_STATE_TRIGGER" "$state"
+    ) </dev/null >/dev/null 2>&1 &
+    disown 2>/dev/null || true
+}
+
+# Check if state change should proceed now
+# Protected transitions inside the grace period are deferred (see above).
+# In a deferred re-run, returns 1 if the event was superseded meanwhile.
+should_change_state() {
+    local new_state="$1"
+
+    if [[ -n "${_TAVS_DEFERRED_ID:-}" ]]; then
+        _read_deferred_state || return 1
+        [[ "$_DEFERRED_ID" == "$_TAVS_DEFERRED_ID" ]] || return 1
+        read_session_state
+        [[ "$SESSION_TIME" == "$_DEFERRED_BASIS" ]] || return 1
+        rm -f "${STATE_DB}.deferred.${TTY_SAFE}" 2>/dev/null
+    fi
+
+    get_state_transition "$new_state"
+    [[ "$_STATE_TRANSITION" == "apply" ]] && return 0
+    defer_state_event "$new_state" "$_STATE_DEFER_MS"
+    return 1
 }
 
 # Wrapper to record state without a timer PID
@@ -132,14 +243,14 @@ record_state() {
 write_skip_signal() {
     local skip_file="${STATE_DB}.skip.${TTY_SAFE}"
     echo "1" > "$skip_file"
-    [[ "$IDLE_DEBUG" == "1" ]] && echo "[$(date)] write_skip_signal: created $skip_file" >> "$IDLE_DEBUG_LOG"
+    [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" write_skip_signal "file=$skip_file"
 }
 
 check_and_clear_skip_signal() {
     local skip_file="${STATE_DB}.skip.${TTY_SAFE}"
     if [[ -f "$skip_file" ]]; then
         rm -f "$skip_file"
-        [[ "$IDLE_DEBUG" == "1" ]] && echo "[$(date)] check_and_clear_skip_signal: found and cleared $skip_file" >> "$IDLE_DEBUG_LOG"
+        [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" clear_skip_signal "file=$skip_file"
         return 0
     fi
     return 1
@@ -178,7 +289,7 @@ write_session_colors() {
     } > "$tmp_file" 2>/dev/null
     mv "$tmp_file" "$SESSION_COLORS_DB" 2>/dev/null
 
-    [[ "$IDLE_DEBUG" == "1" ]] && echo "[$(date)] write_session_colors: tty=$TTY_SAFE agent=$agent base=$base_color" >> "$IDLE_DEBUG_LOG"
+    [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" write_session_colors "tty=$TTY_SAFE" "agent=$agent" "base=$base_color"
 }
 
 # Read session colors for the current TTY
@@ -227,7 +338,7 @@ clear_session_colors() {
     grep -v "^${TTY_SAFE} " "$SESSION_COLORS_DB" > "$tmp_file" 2>/dev/null
     mv "$tmp_file" "$SESSION_COLORS_DB" 2>/dev/null
 
-    [[ "$IDLE_DEBUG" == "1" ]] && echo "[$(date)] clear_session_colors: tty=$TTY_SAFE" >> "$IDLE_DEBUG_LOG"
+    [[ "$IDLE_DEBUG" == "1" ]] && debug_log "$IDLE_DEBUG_LOG" clear_session_colors "tty=$TTY_SAFE"
 }
 
 # Get a specific color from session storage, with fallback to theme default
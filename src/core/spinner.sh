@@ -6,6 +6,9 @@
 # Used when TAVS_TITLE_MODE="full" to replace face eyes with spinners.
 # ==============================================================================
 
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+
 # ==============================================================================
 # SECURE STATE FILE LOCATION
 # ==============================================================================
@@ -201,8 +204,8 @@ get_spinner_eyes() {
         eye_mode="${TAVS_SPINNER_EYE_MODE:-random}"
 
         # Load index from simple index file
-        if [[ -f "$index_file" ]]; then
-            left_idx=$(cat "$index_file" 2>/dev/null)
+        if util_read_file "$index_file"; then
+            left_idx="$_UTIL_FILE"
         else
             left_idx=0
         fi
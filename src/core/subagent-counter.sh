@@ -17,8 +17,12 @@
 # Dependencies:
 #   - get_spinner_state_dir() from spinner.sh (secure dir helper)
 #   - TTY_SAFE environment variable
+#   - util.sh: util_read_file, util_tmpfile
 # ==============================================================================
 
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+
 # Use secure state dir for session isolation (consistent with spinner/session-icon)
 _TAVS_SUBAGENT_STATE_DIR=$(get_spinner_state_dir)
 SUBAGENT_COUNT_FILE="${_TAVS_SUBAGENT_STATE_DIR}/subagent-count.${TTY_SAFE:-unknown}"
@@ -30,11 +34,11 @@ SUBAGENT_COUNT_FILE="${_TAVS_SUBAGENT_STATE_DIR}/subagent-count.${TTY_SAFE:-unkn
 # Called when SubagentStart hook fires.
 # ==============================================================================
 increment_subagent_count() {
-    local count tmp_file
-    count=$(cat "$SUBAGENT_COUNT_FILE" 2>/dev/null || echo 0)
-    tmp_file=$(mktemp "${SUBAGENT_COUNT_FILE}.XXXXXX")
-    echo $((count + 1)) > "$tmp_file"
-    mv -f "$tmp_file" "$SUBAGENT_COUNT_FILE"
+    local count=0
+    util_read_file "$SUBAGENT_COUNT_FILE" && count="$_UTIL_FILE"
+    util_tmpfile "$SUBAGENT_COUNT_FILE"
+    echo $((count + 1)) > "$_UTIL_TMPFILE"
+    mv -f "$_UTIL_TMPFILE" "$SUBAGENT_COUNT_FILE"
 
     [[ "$DEBUG_ALL" == "1" ]] && echo "[TAVS] Subagent count incremented: $((count + 1))" >&2
 }
@@ -47,13 +51,13 @@ increment_subagent_count() {
 # Returns the new count (useful for state transition decisions).
 # ==============================================================================
 decrement_subagent_count() {
-    local count tmp_file
-    count=$(cat "$SUBAGENT_COUNT_FILE" 2>/dev/null || echo 0)
+    local count=0
+    util_read_file "$SUBAGENT_COUNT_FILE" && count="$_UTIL_FILE"
 
     if [[ $count -gt 0 ]]; then
-        tmp_file=$(mktemp "${SUBAGENT_COUNT_FILE}.XXXXXX")
-        echo $((count - 1)) > "$tmp_file"
-        mv -f "$tmp_file" "$SUBAGENT_COUNT_FILE"
+        util_tmpfile "$SUBAGENT_COUNT_FILE"
+        echo $((count - 1)) > "$_UTIL_TMPFILE"
+        mv -f "$_UTIL_TMPFILE" "$SUBAGENT_COUNT_FILE"
         [[ "$DEBUG_ALL" == "1" ]] && echo "[TAVS] Subagent count decremented: $((count - 1))" >&2
         echo $((count - 1))
     else
@@ -69,7 +73,11 @@ decrement_subagent_count() {
 # Returns 0 if no counter file exists.
 # ==============================================================================
 get_subagent_count() {
-    cat "$SUBAGENT_COUNT_FILE" 2>/dev/null || echo 0
+    if util_read_file "$SUBAGENT_COUNT_FILE"; then
+        echo "$_UTIL_FILE"
+    else
+        echo 0
+    fi
 }
 
 # ==============================================================================
@@ -0,0 +1,184 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS - Terminal Agent Visual Signals — System Light/Dark Mode Watcher
+# ==============================================================================
+# One background watcher per machine keeps the current system appearance in a
+# tiny shared file, so hooks read it (no gsettings/defaults fork per event).
+# When the appearance flips, the watcher repaints every registered TTY in its
+# current state via `trigger.sh repaint`.
+#
+# Files (under ${TAVS_TMP_DIR:-/tmp/tavs}):
+#   system-mode        - "dark|light <watcher_pid>" (read by _read_shared_system_mode)
+#   system-mode.ttys   - "<tty_device> <agent>" per line, TTYs to repaint on a flip
+#   system-mode.lock/  - mkdir lock held by the running watcher (pid file inside)
+#
+# Change detection:
+#   Linux (GNOME): `gsettings monitor org.gnome.desktop.interface color-scheme`
+#   Elsewhere:     poll _detect_system_mode every SYSTEM_MODE_POLL_INTERVAL seconds
+# The watcher exits when no registered TTY is writable any more.
+#
+# Public functions:
+#   start_system_mode_watcher()    - Start the watcher if enabled and not running
+#   register_system_mode_tty()     - Add the current TTY to the repaint list
+#   unregister_system_mode_tty()   - Remove the current TTY from the repaint list
+#
+# Internal functions:
+#   _system_mode_watcher_enabled() - Config gate (switching on, no FORCE_MODE)
+#   _system_mode_watch_loop()      - Main loop (monitor or polling)
+#   _system_mode_publish()         - Write the shared file, repaint on a flip
+#   _system_mode_repaint_all()     - Run trigger.sh repaint for each live TTY
+#   _system_mode_prune_ttys()      - Drop TTYs that are no longer writable
+#
+# Dependencies:
+#   - theme-config-loader.sh: _detect_system_mode, _SYSTEM_MODE_FILE
+#   - TTY_DEVICE, TAVS_AGENT (register/unregister)
+# ==============================================================================
+
+_SYSTEM_MODE_CORE_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+_SYSTEM_MODE_TTYS="${_SYSTEM_MODE_FILE}.ttys"
+_SYSTEM_MODE_LOCK="${_SYSTEM_MODE_FILE}.lock"
+
+# Check whether the watcher should run for the current config
+_system_mode_watcher_enabled() {
+    [[ "${ENABLE_SYSTEM_MODE_WATCHER:-true}" == "true" ]] || return 1
+    [[ "$ENABLE_LIGHT_DARK_SWITCHING" == "true" ]] || return 1
+    [[ "$FORCE_MODE" != "dark" && "$FORCE_MODE" != "light" ]]
+}
+
+# Add the current TTY to the repaint list (idempotent)
+register_system_mode_tty() {
+    [[ -z "$TTY_DEVICE" ]] && return 1
+    local dev agent
+    if [[ -f "$_SYSTEM_MODE_TTYS" ]]; then
+        while read -r dev agent; do
+            [[ "$dev" == "$TTY_DEVICE" && "$agent" == "${TAVS_AGENT:-claude}" ]] && return 0
+        done < "$_SYSTEM_MODE_TTYS"
+        unregister_system_mode_tty
+    fi
+    printf '%s %s\n' "$TTY_DEVICE" "${TAVS_AGENT:-claude}" >> "$_SYSTEM_MODE_TTYS" 2>/dev/null
+}
+
+# Remove the current TTY from the repaint list
+unregister_system_mode_tty() {
+    [[ -z "$TTY_DEVICE" || ! -f "$_SYSTEM_MODE_TTYS" ]] && return 0
+    local tmp_file="${_SYSTEM_MODE_TTYS}.tmp.$$"
+    local dev agent
+    while read -r dev agent; do
+        [[ -n "$dev" && "$dev" != "$TTY_DEVICE" ]] && printf '%s %s\n' "$dev" "$agent"
+    done < "$_SYSTEM_MODE_TTYS" > "$tmp_file" 2>/dev/null
+    mv "$tmp_file" "$_SYSTEM_MODE_TTYS" 2>/dev/null
+}
+
+# Drop TTYs that are no longer writable (closed tabs)
+# Returns 1 when no TTY is left, which ends the watcher.
+_system_mode_prune_ttys() {
+    [[ -f "$_SYSTEM_MODE_TTYS" ]] || return 1
+    local dev agent live=0 stale=0
+    while read -r dev agent; do
+        [[ -z "$dev" ]] && continue
+        if [[ -w "$dev" ]]; then
+            live=$((live + 1))
+        else
+            stale=$((stale + 1))
+        fi
+    done < "$_SYSTEM_MODE_TTYS"
+
+    if [[ $stale -gt 0 ]]; then
+        local tmp_file="${_SYSTEM_MODE_TTYS}.tmp.$$"
+        while read -r dev agent; do
+            [[ -n "$dev" && -w "$dev" ]] && printf '%s %s\n' "$dev" "$agent"
+        done < "$_SYSTEM_MODE_TTYS" > "$tmp_file" 2>/dev/null
+        mv "$tmp_file" "$_SYSTEM_MODE_TTYS" 2>/dev/null
+    fi
+    [[ $live -gt 0 ]]
+}
+
+# Repaint every registered TTY in its current state
+_system_mode_repaint_all() {
+    [[ -f "$_SYSTEM_MODE_TTYS" ]] || return 0
+    local dev agent
+    while read -r dev agent; do
+        [[ -n "$dev" && -w "$dev" ]] || continue
+        _TAVS_RERUN=1 TTY_DEVICE="$dev" TAVS_AGENT="${agent:-claude}" \
+            "${_TAVS_TRIGGER:-$_SYSTEM_MODE_CORE_DIR/trigger.sh}" repaint </dev/null >/dev/null 2>&1
+    done < "$_SYSTEM_MODE_TTYS"
+}
+
+# Publish a mode to the shared file; repaint all TTYs if it flipped
+# Usage: _system_mode_publish "dark"|"light"
+_system_mode_publish() {
+    local mode="$1"
+    [[ "$mode" == "dark" || "$mode" == "light" ]] || return 1
+    [[ "$mode" == "$_SYSTEM_MODE_LAST" ]] && return 0
+
+    local previous="$_SYSTEM_MODE_LAST"
+    _SYSTEM_MODE_LAST="$mode"
+    printf '%s %s\n' "$mode" "$_SYSTEM_MODE_WATCHER_PID" > "${_SYSTEM_MODE_FILE}.tmp.$$" 2>/dev/null && \
+        mv "${_SYSTEM_MODE_FILE}.tmp.$$" "$_SYSTEM_MODE_FILE" 2>/dev/null
+
+    [[ -n "$previous" ]] && _system_mode_repaint_all
+    return 0
+}
+
+# Main watcher loop (runs in the background, holds the lock)
+_system_mode_watch_loop() {
+    local interval="${SYSTEM_MODE_POLL_INTERVAL:-5}"
+    local line monitor_pid="" rc
+
+    _SYSTEM_MODE_LAST=""
+    _system_mode_publish "$(_detect_system_mode)"
+
+    # Event-driven on GNOME: one gsettings process for the whole machine
+    if [[ "$(uname -s)" == "Linux" ]] && command -v gsettings &>/dev/null && \
+       gsettings get org.gnome.desktop.interface color-scheme &>/dev/null; then
+        exec 4< <(exec gsettings monitor org.gnome.desktop.interface color-scheme 2>/dev/null)
+        monitor_pid=$!
+        while _system_mode_prune_ttys; do
+            if IFS= read -r -t "$interval" line <&4; then
+                if [[ "$line" == *dark* ]]; then
+                    _system_mode_publish "dark"
+                else
+                    _system_mode_publish "light"
+                fi
+            else
+                rc=$?
+                # Timeout (>128) just re-checks TTYs; EOF means the monitor died
+                [[ $rc -le 128 ]] && break
+            fi
+        done
+        kill "$monitor_pid" 2>/dev/null
+        exec 4<&-
+    fi
+
+    # Polling fallback (macOS, KDE, or monitor unavailable)
+    while _system_mode_prune_ttys; do
+        sleep "$interval"
+        _system_mode_publish "$(_detect_system_mode)"
+    done
+}
+
+# Start the watcher in the background unless one is already running
+# Returns 0 if a watcher is running (or was started), 1 if disabled.
+start_system_mode_watcher() {
+    _system_mode_watcher_enabled || return 1
+
+    local lock_pid=""
+    if ! mkdir "$_SYSTEM_MODE_LOCK" 2>/dev/null; then
+        [[ -f "$_SYSTEM_MODE_LOCK/pid" ]] && read -r lock_pid < "$_SYSTEM_MODE_LOCK/pid" 2>/dev/null
+        if [[ -n "$lock_pid" ]] && kill -0 "$lock_pid" 2>/dev/null; then
+            return 0
+        fi
+        rm -rf "$_SYSTEM_MODE_LOCK" 2>/dev/null
+        mkdir "$_SYSTEM_MODE_LOCK" 2>/dev/null || return 0
+    fi
+
+    (
+        _SYSTEM_MODE_WATCHER_PID="${BASHPID:-$(sh -c 'echo $PPID')}"
+        echo "$_SYSTEM_MODE_WATCHER_PID" > "$_SYSTEM_MODE_LOCK/pid"
+        trap 'rm -f "$_SYSTEM_MODE_LOCK/pid"; rmdir "$_SYSTEM_MODE_LOCK" 2>/dev/null; rm -f "$_SYSTEM_MODE_FILE"' EXIT
+        trap 'exit 0' TERM INT
+        _system_mode_watch_loop
+    ) </dev/null >/dev/null 2>&1 &
+    disown 2>/dev/null || true
+    return 0
+}
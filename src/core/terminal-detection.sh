@@ -6,6 +6,22 @@
 # SSH detection, and terminal type identification.
 # ==============================================================================
 
+# Resolve script directory for sourcing (bash and zsh, as title-management.sh)
+if [[ -n "${BASH_SOURCE[0]:-}" ]]; then
+    _DETECT_THIS_SCRIPT="${BASH_SOURCE[0]}"
+elif [[ -n "${(%):-%x}" ]] 2>/dev/null; then
+    _DETECT_THIS_SCRIPT="${(%):-%x}"  # zsh-specific: current script path
+else
+    _DETECT_THIS_SCRIPT="$0"  # Fallback (may not work when sourced)
+fi
+_DETECT_SCRIPT_DIR="${_DETECT_THIS_SCRIPT%/*}"
+[[ "$_DETECT_SCRIPT_DIR" == "$_DETECT_THIS_SCRIPT" ]] && _DETECT_SCRIPT_DIR="."
+
+# Queries are written with tty_write_now (bounded, drops counted)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${_DETECT_SCRIPT_DIR}/util.sh"
+[[ -n "${_TAVS_METRICS_LOADED:-}" ]] || source "${_DETECT_SCRIPT_DIR}/metrics.sh"
+[[ -n "${_TAVS_TTY_FRAME_LOADED:-}" ]] || source "${_DETECT_SCRIPT_DIR}/tty-frame.sh"
+
 # Timeout for OSC 11 query in seconds (use fractional for milliseconds)
 # Only set if not already defined (prevents readonly error on re-source)
 [[ -z "${OSC_QUERY_TIMEOUT:-}" ]] && readonly OSC_QUERY_TIMEOUT=0.1  # 100ms
@@ -17,26 +33,32 @@
 # Get the terminal emulator type
 # Returns: iterm2, ghostty, kitty, wezterm, vscode, gnome-terminal, terminal.app, or unknown
 get_terminal_type() {
+    _terminal_type_var
+    echo "$_TERMINAL_TYPE"
+}
+
+# Set _TERMINAL_TYPE from the environment (no subshell)
+_terminal_type_var() {
     # Check specific terminal identifiers first
     if [[ -n "$ITERM_SESSION_ID" ]]; then
-        echo "iterm2"
+        _TERMINAL_TYPE="iterm2"
     elif [[ -n "$GHOSTTY_RESOURCES_DIR" ]] || [[ "$TERM_PROGRAM" == "ghostty" ]]; then
         # Ghostty: Check both env var and TERM_PROGRAM (v1.2.0+)
-        echo "ghostty"
+        _TERMINAL_TYPE="ghostty"
     elif [[ -n "$KITTY_PID" ]] || [[ -n "$KITTY_WINDOW_ID" ]]; then
-        echo "kitty"
+        _TERMINAL_TYPE="kitty"
     elif [[ "$TERM_PROGRAM" == "WezTerm" ]]; then
-        echo "wezterm"
+        _TERMINAL_TYPE="wezterm"
     elif [[ "$TERM_PROGRAM" == "vscode" ]] || [[ -n "$VSCODE_GIT_ASKPASS_NODE" ]]; then
-        echo "vscode"
+        _TERMINAL_TYPE="vscode"
     elif [[ -n "$VTE_VERSION" ]]; then
-        echo "gnome-terminal"
+        _TERMINAL_TYPE="gnome-terminal"
     elif [[ "$TERM_PROGRAM" == "Apple_Terminal" ]]; then
-        echo "terminal.app"
+        _TERMINAL_TYPE="terminal.app"
     elif [[ -n "$TERM_PROGRAM" ]]; then
-        echo "${TERM_PROGRAM,,}"  # lowercase
+        _TERMINAL_TYPE="${TERM_PROGRAM,,}"  # lowercase
     else
-        echo "unknown"
+        _TERMINAL_TYPE="unknown"
     fi
 }
 
@@ -44,10 +66,14 @@ get_terminal_type() {
 # Most modern terminals do, but Terminal.app does not
 # Returns 0 (true) if supported, 1 (false) if not
 supports_osc10() {
-    local terminal_type
-    terminal_type=$(get_terminal_type)
+    load_terminal_caps
+    [[ "$TAVS_CAP_OSC10" == "true" ]]
+}
 
-    case "$terminal_type" in
+# Capability rule behind supports_osc10 (pure, no I/O)
+# Usage: _caps_osc10 "$terminal_type"
+_caps_osc10() {
+    case "$1" in
         # Terminals with confirmed OSC 10 support
         iterm2|ghostty|kitty|wezterm|vscode|gnome-terminal|foot|alacritty)
             return 0
@@ -67,10 +93,14 @@ supports_osc10() {
 # Only iTerm2 and WezTerm have partial support
 # Returns 0 (true) if supported, 1 (false) if not
 supports_osc1337() {
-    local terminal_type
-    terminal_type=$(get_terminal_type)
+    load_terminal_caps
+    [[ "$TAVS_CAP_OSC1337" == "true" ]]
+}
 
-    case "$terminal_type" in
+# Capability rule behind supports_osc1337 (pure, no I/O)
+# Usage: _caps_osc1337 "$terminal_type"
+_caps_osc1337() {
+    case "$1" in
         # Full iTerm2 extension support
         iterm2)
             return 0
@@ -93,10 +123,14 @@ supports_osc1337() {
 # Check if terminal supports OSC 11 background query
 # Returns 0 (true) if supported, 1 (false) if not
 supports_osc11_query() {
-    local terminal_type
-    terminal_type=$(get_terminal_type)
+    load_terminal_caps
+    [[ "$TAVS_CAP_OSC11" == "true" ]]
+}
 
-    case "$terminal_type" in
+# Capability rule behind supports_osc11_query (pure, no I/O)
+# Usage: _caps_osc11_query "$terminal_type"
+_caps_osc11_query() {
+    case "$1" in
         iterm2|ghostty|kitty|wezterm|vscode|gnome-terminal|foot|alacritty)
             return 0
             ;;
@@ -120,7 +154,7 @@ supports_osc11_query() {
 # the terminal's 16-color ANSI palette entirely.
 # Returns 0 (true) if TrueColor, 1 (false) if not
 is_truecolor_mode() {
-    [[ "$COLORTERM" == "truecolor" ]] || [[ "$COLORTERM" == "24bit" ]]
+    [[ "${COLORTERM:-}" == "truecolor" ]] || [[ "${COLORTERM:-}" == "24bit" ]]
 }
 
 # Check if palette theming should be enabled
@@ -176,6 +210,284 @@ is_ssh_session() {
     return 1
 }
 
+# ==============================================================================
+# Terminal Capability Record
+# ==============================================================================
+# Capabilities are computed once (SessionStart) and persisted per TTY in
+# ${TAVS_TMP_DIR:-/tmp/tavs}/caps.{TTY_SAFE}. Later triggers and the idle
+# worker read them as plain TAVS_CAP_* variables instead of re-running the
+# detection functions (and their $(get_terminal_type) subshells) per check.
+#
+# Variables:
+#   TAVS_CAP_TERMINAL   - Terminal type (get_terminal_type values)
+#   TAVS_CAP_TRUECOLOR  - true/false (COLORTERM)
+#   TAVS_CAP_SSH        - true/false (is_ssh_session)
+#   TAVS_CAP_OSC10      - true/false
+#   TAVS_CAP_OSC11      - true/false
+#   TAVS_CAP_OSC1337    - true/false
+#   TAVS_CAP_BG_IMAGES  - true/false (terminal can show images; config not applied)
+#   TAVS_CAP_XTVERSION  - XTVERSION reply (probe only, may be empty)
+#   TAVS_CAP_DA1        - DA1 attributes, e.g. "?62;4;22" (probe only)
+#
+# File format (key=value, never sourced). The env= line fingerprints the
+# terminal environment; a record from a different environment is ignored.
+#
+# Probing (ENABLE_CAPABILITY_PROBE="true"): XTVERSION and DA1 are requested in
+# one write. DA1 is answered last by every terminal, so its reply ends the
+# read. A recognized XTVERSION name refines an "unknown" terminal type (e.g.
+# inside tmux or over SSH where TERM_PROGRAM is not forwarded).
+# ==============================================================================
+
+# Fingerprint of the environment variables the capability rules depend on
+_terminal_caps_env() {
+    _TERMINAL_CAPS_ENV="${ITERM_SESSION_ID:+iterm}|${GHOSTTY_RESOURCES_DIR:+ghostty}|${KITTY_PID:+kitty}${KITTY_WINDOW_ID:+kitty}"
+    _TERMINAL_CAPS_ENV+="|${TERM_PROGRAM:-}|${VSCODE_GIT_ASKPASS_NODE:+vscode}|${VTE_VERSION:+vte}|${TERM:-}|${COLORTERM:-}"
+    _TERMINAL_CAPS_ENV+="|${SSH_TTY:+ssh}${SSH_CLIENT:+ssh}${SSH_CONNECTION:+ssh}|${TMUX:+tmux}"
+}
+
+# Set _TERMINAL_CAPS_FILE for the current TTY (empty without TTY_SAFE)
+_terminal_caps_file() {
+    _TERMINAL_CAPS_FILE=""
+    [[ -n "${TTY_SAFE:-}" ]] && _TERMINAL_CAPS_FILE="${TAVS_TMP_DIR:-/tmp/tavs}/caps.${TTY_SAFE}"
+}
+
+# Derive all TAVS_CAP_* flags from a terminal type (pure, no I/O)
+# Usage: _apply_terminal_caps "$terminal_type"
+_apply_terminal_caps() {
+    TAVS_CAP_TERMINAL="$1"
+    TAVS_CAP_TRUECOLOR="false"; is_truecolor_mode && TAVS_CAP_TRUECOLOR="true"
+    TAVS_CAP_SSH="false";       is_ssh_session && TAVS_CAP_SSH="true"
+    TAVS_CAP_OSC10="false";     _caps_osc10 "$1" && TAVS_CAP_OSC10="true"
+    TAVS_CAP_OSC11="false";     _caps_osc11_query "$1" && TAVS_CAP_OSC11="true"
+    TAVS_CAP_OSC1337="false";   _caps_osc1337 "$1" && TAVS_CAP_OSC1337="true"
+    TAVS_CAP_BG_IMAGES="false"
+    case "$1" in
+        iterm2) TAVS_CAP_BG_IMAGES="true" ;;
+        # Kitty requires allow_remote_control=yes and the kitten command
+        kitty)  command -v kitten &>/dev/null && TAVS_CAP_BG_IMAGES="true" ;;
+    esac
+}
+
+# Compute the capability record from the environment (no probing)
+compute_terminal_caps() {
+    _terminal_type_var
+    _apply_terminal_caps "$_TERMINAL_TYPE"
+    TAVS_CAP_XTVERSION=""
+    TAVS_CAP_DA1=""
+    _TERMINAL_CAPS_LOADED="true"
+}
+
+# Put a TTY in raw mode for reading a query reply within timeout seconds
+# min 1: read blocks for bytes and the read -t timeout bounds the wait.
+# read -t only takes whole seconds before bash 4, so there the TTY's own read
+# timer (min 0 time <tenths>) bounds the wait for _terminal_read_reply.
+# Sets _TERMINAL_READ_TIMEOUT (empty when the TTY timer applies).
+# Usage: _terminal_raw_mode tty_device timeout_seconds
+_terminal_raw_mode() {
+    local tty_device="$1" timeout="${2:-$OSC_QUERY_TIMEOUT}" mode="min 1 time 0"
+    _TERMINAL_READ_TIMEOUT="$timeout"
+    _TERMINAL_PENDING=""
+    if [[ -n "${BASH_VERSION:-}" && "${BASH_VERSION%%.*}" -lt 4 ]]; then
+        local whole="${timeout%%.*}" frac="0"
+        [[ "$timeout" == *.* ]] && frac="${timeout#*.}0"
+        local tenths=$(( 10#${whole:-0} * 10 + 10#${frac:0:1} ))
+        (( tenths < 1 )) && tenths=1
+        (( tenths > 255 )) && tenths=255
+        mode="min 0 time $tenths"
+        _TERMINAL_READ_TIMEOUT=""
+    fi
+    stty raw -echo $mode < "$tty_device" 2>/dev/null
+}
+
+# Read a reply up to (not including) delim from a TTY set by _terminal_raw_mode
+# With st, the reply may also end in ST (ESC \), as OSC replies do; a single
+# `read -d` can stop at one delimiter only, so it is then read byte by byte
+# (builtin reads, no forks).
+# Without a read timeout the reply is read in dd chunks: `read -d` puts the
+# TTY back in cbreak mode (min 1), while dd returns empty once the TTY timer
+# expires. Bytes after the terminator are kept for the next call.
+# Sets _TERMINAL_REPLY (partial input on timeout).
+# Usage: _terminal_read_reply tty_device delim [st]   → returns 1 on timeout
+_terminal_read_reply() {
+    local tty_device="$1" delim="$2" st="" chunk
+    [[ -n "${3:-}" ]] && st=$'\033\\'
+    _TERMINAL_REPLY=""
+    if [[ -n "$_TERMINAL_READ_TIMEOUT" ]]; then
+        if [[ -z "$st" ]]; then
+            IFS= read -r -s -t "$_TERMINAL_READ_TIMEOUT" -d "$delim" _TERMINAL_REPLY < "$tty_device"
+            return
+        fi
+        # An OSC reply is a few dozen bytes; cap the loop at 256
+        local n=0
+        while (( n < 256 )); do
+            IFS= read -r -s -n 1 -t "$_TERMINAL_READ_TIMEOUT" -d '' chunk < "$tty_device" || return 1
+            [[ "$chunk" == "$delim" ]] && return 0
+            _TERMINAL_REPLY+="$chunk"
+            if [[ "$_TERMINAL_REPLY" == *"$st" ]]; then
+                _TERMINAL_REPLY="${_TERMINAL_REPLY%"$st"}"
+                return 0
+            fi
+            n=$((n + 1))
+        done
+        return 1
+    fi
+    while [[ "$_TERMINAL_PENDING" != *"$delim"* && ( -z "$st" || "$_TERMINAL_PENDING" != *"$st"* ) ]]; do
+        chunk=$(dd bs=64 count=1 < "$tty_device" 2>/dev/null)
+        if [[ -z "$chunk" ]]; then
+            _TERMINAL_REPLY="$_TERMINAL_PENDING"
+            _TERMINAL_PENDING=""
+            return 1
+        fi
+        _TERMINAL_PENDING+="$chunk"
+    done
+    # The terminator that comes first ends the reply
+    local end="$delim" head="${_TERMINAL_PENDING%%"$delim"*}"
+    if [[ -n "$st" ]]; then
+        local st_head="${_TERMINAL_PENDING%%"$st"*}"
+        (( ${#st_head} < ${#head} )) && end="$st"
+    fi
+    _TERMINAL_REPLY="${_TERMINAL_PENDING%%"$end"*}"
+    _TERMINAL_PENDING="${_TERMINAL_PENDING#*"$end"}"
+}
+
+# Probe XTVERSION + DA1 on the TTY and refine the record
+# Usage: probe_terminal_caps [tty_device] [timeout_seconds]
+# Returns 1 if the terminal did not answer (record left unchanged).
+probe_terminal_caps() {
+    local tty_device="${1:-${TTY_DEVICE:-}}"
+    local timeout="${2:-$OSC_QUERY_TIMEOUT}"
+    [[ -n "$tty_device" && -w "$tty_device" ]] || return 1
+    [[ "$TAVS_CAP_SSH" == "true" ]] && return 1
+
+    local old_stty
+    old_stty=$(stty -g < "$tty_device" 2>/dev/null) || return 1
+    _terminal_raw_mode "$tty_device" "$timeout" || {
+        stty "$old_stty" < "$tty_device" 2>/dev/null
+        return 1
+    }
+
+    # XTVERSION (CSI > 0 q) then DA1 (CSI c); the DA1 reply ends in "c".
+    # A terminal that stopped reading drops the write; nothing to wait for.
+    local TTY_DEVICE="$tty_device"  # Seen by tty_write_now
+    if ! tty_write_now '\033[>0q\033[c'; then
+        stty "$old_stty" < "$tty_device" 2>/dev/null
+        return 1
+    fi
+    local response="" tries=0
+    local da1_end_re=$'\033''\[\?[0-9;]*c$'
+    while (( tries < 4 )); do
+        _terminal_read_reply "$tty_device" c || { response+="$_TERMINAL_REPLY"; break; }
+        response+="${_TERMINAL_REPLY}c"
+        [[ "$response" =~ $da1_end_re ]] && break
+        tries=$((tries + 1))
+    done
+
+    stty "$old_stty" < "$tty_device" 2>/dev/null
+
+    _parse_terminal_probe "$response"
+}
+
+# Parse XTVERSION/DA1 replies into TAVS_CAP_XTVERSION/TAVS_CAP_DA1
+# Usage: _parse_terminal_probe "$response"
+_parse_terminal_probe() {
+    local response="$1"
+    local da1_re=$'\033''\[(\?[0-9;]*)c'
+    local xtv_re=$'\033''P>\|([^'$'\033'']*)'
+    [[ "$response" =~ $da1_re ]] || return 1
+    TAVS_CAP_DA1="${BASH_REMATCH[1]}"
+    if [[ "$response" =~ $xtv_re ]]; then
+        TAVS_CAP_XTVERSION="${BASH_REMATCH[1]}"
+    fi
+
+    # Refine an unknown terminal type from the XTVERSION name
+    if [[ "$TAVS_CAP_TERMINAL" == "unknown" && -n "$TAVS_CAP_XTVERSION" ]]; then
+        local refined=""
+        case "$TAVS_CAP_XTVERSION" in
+            iTerm2*)         refined="iterm2" ;;
+            kitty*)          refined="kitty" ;;
+            WezTerm*)        refined="wezterm" ;;
+            ghostty*)        refined="ghostty" ;;
+            foot*)           refined="foot" ;;
+            XTerm*)          refined="xterm" ;;
+            *[Aa]lacritty*)  refined="alacritty" ;;
+        esac
+        [[ -n "$refined" ]] && _apply_terminal_caps "$refined"
+    fi
+    return 0
+}
+
+# Persist the current record for this TTY (atomic write)
+save_terminal_caps() {
+    _terminal_caps_file
+    [[ -z "$_TERMINAL_CAPS_FILE" ]] && return 1
+    _terminal_caps_env
+
+    local cache_dir="${_TERMINAL_CAPS_FILE%/*}"
+    if [[ ! -d "$cache_dir" ]]; then
+        mkdir -p "$cache_dir" 2>/dev/null
+        chmod 700 "$cache_dir" 2>/dev/null
+    fi
+
+    local tmp_file="${_TERMINAL_CAPS_FILE}.tmp.$$"
+    {
+        printf 'env=%s\n' "$_TERMINAL_CAPS_ENV"
+        printf 'terminal=%s\n' "$TAVS_CAP_TERMINAL"
+        printf 'truecolor=%s\n' "$TAVS_CAP_TRUECOLOR"
+        printf 'ssh=%s\n' "$TAVS_CAP_SSH"
+        printf 'osc10=%s\n' "$TAVS_CAP_OSC10"
+        printf 'osc11=%s\n' "$TAVS_CAP_OSC11"
+        printf 'osc1337=%s\n' "$TAVS_CAP_OSC1337"
+        printf 'bg_images=%s\n' "$TAVS_CAP_BG_IMAGES"
+        printf 'xtversion=%s\n' "$TAVS_CAP_XTVERSION"
+        printf 'da1=%s\n' "$TAVS_CAP_DA1"
+    } > "$tmp_file" 2>/dev/null && mv "$tmp_file" "$_TERMINAL_CAPS_FILE" 2>/dev/null
+}
+
+# Load the capability record once per process
+# Reads the per-TTY file (builtins only); computes and persists it on a miss.
+load_terminal_caps() {
+    [[ "${_TERMINAL_CAPS_LOADED:-}" == "true" ]] && return 0
+
+    _terminal_caps_file
+    if [[ -n "$_TERMINAL_CAPS_FILE" && -f "$_TERMINAL_CAPS_FILE" ]]; then
+        _terminal_caps_env
+        local key value env_ok="false"
+        while IFS='=' read -r key value; do
+            case "$key" in
+                env)       [[ "$value" == "$_TERMINAL_CAPS_ENV" ]] && env_ok="true" ;;
+                terminal)  TAVS_CAP_TERMINAL="$value" ;;
+                truecolor) TAVS_CAP_TRUECOLOR="$value" ;;
+                ssh)       TAVS_CAP_SSH="$value" ;;
+                osc10)     TAVS_CAP_OSC10="$value" ;;
+                osc11)     TAVS_CAP_OSC11="$value" ;;
+                osc1337)   TAVS_CAP_OSC1337="$value" ;;
+                bg_images) TAVS_CAP_BG_IMAGES="$value" ;;
+                xtversion) TAVS_CAP_XTVERSION="$value" ;;
+                da1)       TAVS_CAP_DA1="$value" ;;
+            esac
+        done < "$_TERMINAL_CAPS_FILE"
+        if [[ "$env_ok" == "true" && -n "$TAVS_CAP_TERMINAL" ]]; then
+            _TERMINAL_CAPS_LOADED="true"
+            return 0
+        fi
+    fi
+
+    compute_terminal_caps
+    [[ -n "$_TERMINAL_CAPS_FILE" ]] && save_terminal_caps
+    return 0
+}
+
+# Build a fresh record at SessionStart (optionally probing) and persist it
+# Usage: init_terminal_caps [tty_device]
+init_terminal_caps() {
+    compute_terminal_caps
+    if [[ "${ENABLE_CAPABILITY_PROBE:-false}" == "true" ]]; then
+        probe_terminal_caps "${1:-${TTY_DEVICE:-}}" "${CAPABILITY_PROBE_TIMEOUT:-$OSC_QUERY_TIMEOUT}"
+    fi
+    save_terminal_caps
+    return 0
+}
+
 # ==============================================================================
 # System Dark Mode Detection
 # ==============================================================================
@@ -277,8 +589,12 @@ get_system_mode() {
 # Query terminal background color via OSC 11
 # Returns hex color (#RRGGBB) or empty string on failure
 # Requires a compatible terminal and TTY access
+# The query is written with tty_write_now and the reply read up to BEL or ST
+# within the timeout (see _terminal_read_reply).
+# Usage: query_terminal_bg [tty_device] [timeout_seconds]
 query_terminal_bg() {
     local tty_device="${1:-}"
+    local timeout="${2:-$OSC_QUERY_TIMEOUT}"
 
     # Find TTY if not provided
     if [[ -z "$tty_device" ]]; then
@@ -311,83 +627,138 @@ query_terminal_bg() {
     local old_stty
     old_stty=$(stty -g < "$tty_device" 2>/dev/null) || return 1
 
-    # Set terminal to raw mode for reading response
-    stty raw -echo min 0 time 1 < "$tty_device" 2>/dev/null || {
+    # Set terminal to raw mode so the reply is readable without a newline
+    _terminal_raw_mode "$tty_device" "$timeout" || {
         stty "$old_stty" < "$tty_device" 2>/dev/null
         return 1
     }
 
-    # Send OSC 11 query (request background color)
-    # Format: ESC ] 11 ; ? BEL
-    printf '\033]11;?\007' > "$tty_device"
-
-    # Read response with timeout
-    # Expected format: ESC ] 11 ; rgb:RRRR/GGGG/BBBB BEL (or ST)
-    local response=""
-    local char
-    local timeout_count=0
-    local max_iterations=100  # Safety limit
-
-    while (( timeout_count < max_iterations )); do
-        char=$(dd bs=1 count=1 2>/dev/null < "$tty_device")
-        if [[ -z "$char" ]]; then
-            ((timeout_count++))
-            continue
-        fi
-
-        response+="$char"
-
-        # Check for response terminator (BEL or ST)
-        if [[ "$char" == $'\007' ]] || [[ "$response" == *$'\033\\' ]]; then
-            break
-        fi
-
-        # Safety: if we have enough characters, stop
-        if (( ${#response} > 50 )); then
-            break
-        fi
-    done
+    # Send OSC 11 query (request background color) and read the reply
+    # Query:    ESC ] 11 ; ? BEL
+    # Expected: ESC ] 11 ; rgb:RRRR/GGGG/BBBB BEL (or ST)
+    # The write is bounded; if it is dropped there is no reply to wait for.
+    local TTY_DEVICE="$tty_device" response=""  # TTY_DEVICE seen by tty_write_now
+    if tty_write_now '\033]11;?\007'; then
+        _terminal_read_reply "$tty_device" $'\a' st
+        response="$_TERMINAL_REPLY"
+    fi
 
     # Restore terminal settings
     stty "$old_stty" < "$tty_device" 2>/dev/null
 
-    # Parse response
-    # Expected: ]11;rgb:RRRR/GGGG/BBBB (values are 16-bit hex)
+    _parse_osc11_response "$response"
+}
+
+# Parse an OSC 11 reply into #RRGGBB
+# Usage: _parse_osc11_response "$response"  -> prints "#RRGGBB", returns 1 if unparseable
+_parse_osc11_response() {
+    local response="$1"
+
+    # Expected: ]11;rgb:RRRR/GGGG/BBBB (values are 1-4 hex digits per channel)
     if [[ "$response" =~ rgb:([0-9a-fA-F]+)/([0-9a-fA-F]+)/([0-9a-fA-F]+) ]]; then
         local r_hex="${BASH_REMATCH[1]}"
         local g_hex="${BASH_REMATCH[2]}"
         local b_hex="${BASH_REMATCH[3]}"
 
         # Convert from 16-bit (0000-FFFF) to 8-bit (00-FF)
-        # Take first two characters of each component
+        # Take first two characters of each component (single digits repeat)
+        [[ ${#r_hex} -eq 1 ]] && r_hex="$r_hex$r_hex"
+        [[ ${#g_hex} -eq 1 ]] && g_hex="$g_hex$g_hex"
+        [[ ${#b_hex} -eq 1 ]] && b_hex="$b_hex$b_hex"
         local r="${r_hex:0:2}"
         local g="${g_hex:0:2}"
         local b="${b_hex:0:2}"
 
         # Return uppercase hex
-        echo "#${r^^}${g^^}${b^^}"
+        printf '#%02X%02X%02X\n' "$((16#$r))" "$((16#$g))" "$((16#$b))"
         return 0
     fi
 
     return 1
 }
 
-# Query terminal background with timeout wrapper
+# Query terminal background with a bounded wait
+# The read inside query_terminal_bg is already time-limited, so no timeout(1)
+# re-exec of the function bodies is needed.
 # Usage: query_terminal_bg_with_timeout [tty_device] [timeout_seconds]
 query_terminal_bg_with_timeout() {
     local tty_device="${1:-}"
     local timeout="${2:-$OSC_QUERY_TIMEOUT}"
+    query_terminal_bg "$tty_device" "$timeout"
+}
 
-    # Use timeout command if available
-    if command -v timeout &>/dev/null; then
-        timeout "$timeout" bash -c "$(declare -f query_terminal_bg supports_osc11_query is_ssh_session get_terminal_type); query_terminal_bg '$tty_device'" 2>/dev/null
-    elif command -v gtimeout &>/dev/null; then
-        # macOS with coreutils
-        gtimeout "$timeout" bash -c "$(declare -f query_terminal_bg supports_osc11_query is_ssh_session get_terminal_type); query_terminal_bg '$tty_device'" 2>/dev/null
-    else
-        # Fallback: just run directly (might hang on unsupported terminals)
-        query_terminal_bg "$tty_device"
+# ==============================================================================
+# Terminal Background Cache
+# ==============================================================================
+# The OSC 11 reply only changes when the terminal profile changes, so it is
+# cached per TTY in ${TAVS_TMP_DIR:-/tmp/tavs}/termbg.{TTY_SAFE} together with
+# a profile key. Failed queries are cached too (empty bg=), so an unsupported
+# terminal is probed once per session. trigger.sh clears the entry on reset.
+#
+# File format (key=value, never sourced):
+#   profile=<terminal profile key>
+#   bg=#RRGGBB
+# ==============================================================================
+
+# Set _TERMBG_CACHE_FILE to the cache path for a TTY device (no subshell)
+# Usage: _terminal_bg_cache_file [tty_device]
+_terminal_bg_cache_file() {
+    local tty_device="${1:-${TTY_DEVICE:-/dev/tty}}"
+    _TERMBG_CACHE_FILE="${TAVS_TMP_DIR:-/tmp/tavs}/termbg.${tty_device//\//_}"
+}
+
+# Get terminal background, querying at most once per TTY and profile
+# Usage: get_terminal_bg_cached [tty_device] [timeout_seconds]
+# Prints #RRGGBB on success; returns 1 (no output) if the terminal did not answer.
+get_terminal_bg_cached() {
+    local tty_device="${1:-${TTY_DEVICE:-}}"
+    local timeout="${2:-$OSC_QUERY_TIMEOUT}"
+    [[ -z "$tty_device" ]] && tty_device="/dev/tty"
+
+    # Profile key: the cached color is only valid for the same terminal profile
+    local profile="${TERM_PROGRAM:-}|${ITERM_PROFILE:-}|${TERM:-}|${COLORFGBG:-}"
+    local cache_file key value
+    local cached_profile="" cached_bg="" have_bg=false
+    _terminal_bg_cache_file "$tty_device"
+    cache_file="$_TERMBG_CACHE_FILE"
+
+    if [[ -f "$cache_file" ]]; then
+        while IFS='=' read -r key value; do
+            case "$key" in
+                profile) cached_profile="$value" ;;
+                bg)      cached_bg="$value"; have_bg=true ;;
+            esac
+        done < "$cache_file"
+
+        if [[ "$have_bg" == "true" && "$cached_profile" == "$profile" ]]; then
+            [[ -z "$cached_bg" ]] && return 1
+            printf '%s\n' "$cached_bg"
+            return 0
+        fi
     fi
+
+    local bg
+    bg=$(query_terminal_bg "$tty_device" "$timeout")
+    [[ "$bg" =~ ^#[0-9A-F]{6}$ ]] || bg=""
+
+    local cache_dir="${cache_file%/*}"
+    if [[ ! -d "$cache_dir" ]]; then
+        mkdir -p "$cache_dir" 2>/dev/null
+        chmod 700 "$cache_dir" 2>/dev/null
+    fi
+    printf 'profile=%s\nbg=%s\n' "$profile" "$bg" > "${cache_file}.tmp.$$" 2>/dev/null && \
+        mv "${cache_file}.tmp.$$" "$cache_file" 2>/dev/null
+
+    [[ -z "$bg" ]] && return 1
+    printf '%s\n' "$bg"
+}
+
+# Forget the cached background for a TTY (called on reset)
+# Usage: clear_terminal_bg_cache [tty_device]
+clear_terminal_bg_cache() {
+    _terminal_bg_cache_file "$@"
+    [[ -f "$_TERMBG_CACHE_FILE" ]] && rm -f "$_TERMBG_CACHE_FILE" 2>/dev/null
+    return 0
 }
 
 # ==============================================================================
@@ -9,6 +9,8 @@
 TERMINAL_SH_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 # Note: themes.sh kept for backward compatibility, agent-theme.sh provides get_random_face()
 source "$TERMINAL_SH_DIR/themes.sh"
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "$TERMINAL_SH_DIR/util.sh"
+[[ -n "${_TAVS_TTY_FRAME_LOADED:-}" ]] || source "$TERMINAL_SH_DIR/tty-frame.sh"
 
 # === BELL CONFIGURATION ===
 BELL_ON_PROCESSING=false
@@ -34,7 +36,7 @@ send_bell_if_enabled() {
         subagent)    [[ "$BELL_ON_SUBAGENT" == "true" ]] && should_bell=true ;;
         tool_error)  [[ "$BELL_ON_TOOL_ERROR" == "true" ]] && should_bell=true ;;
     esac
-    [[ "$should_bell" == "true" ]] && printf "\007" > "$TTY_DEVICE"
+    [[ "$should_bell" == "true" ]] && tty_write "\007"
 }
 
 # === TTY RESOLUTION ===
@@ -75,9 +77,9 @@ send_osc_bg() {
     local color="$1"
     [[ -z "$TTY_DEVICE" ]] && return
     if [[ "$color" == "reset" ]]; then
-        printf "\033]111\033\\" > "$TTY_DEVICE"
+        tty_write "\033]111\033\\"
     else
-        printf "\033]11;%s\033\\" "$color" > "$TTY_DEVICE"
+        tty_write "\033]11;%s\033\\" "$color"
     fi
 }
 
@@ -99,9 +101,10 @@ _hex_to_x11() {
 _build_osc_palette_seq() {
     local mode="$1"
 
-    # Convert mode to uppercase (Bash 3.2 compatible - avoid ${var^^})
+    # Convert mode to uppercase (util.sh, Bash 3.2 compatible)
     local mode_upper
-    mode_upper=$(printf '%s' "$mode" | tr '[:lower:]' '[:upper:]')
+    util_upper "$mode"
+    mode_upper="$_UTIL_UPPER"
 
     # Build palette sequence for all 16 colors
     local seq="\033]4"
@@ -132,13 +135,13 @@ send_osc_palette() {
 
     local seq
     seq=$(_build_osc_palette_seq "$mode")
-    [[ -n "$seq" ]] && printf "%b" "$seq" > "$TTY_DEVICE"
+    [[ -n "$seq" ]] && tty_write "%b" "$seq"
 }
 
 # Reset palette to terminal defaults (OSC 104)
 send_osc_palette_reset() {
     [[ -z "$TTY_DEVICE" ]] && return
-    printf "\033]104\033\\" > "$TTY_DEVICE"
+    tty_write "\033]104\033\\"
 }
 
 send_osc_title() {
@@ -219,16 +222,15 @@ send_osc_title() {
         fi
     fi
 
-    printf "\033]0;%s\033\\" "$title" > "$TTY_DEVICE"
+    tty_write "\033]0;%s\033\\" "$title"
 }
 
 # === UTILS ===
 
 sanitize_for_terminal() {
-    local input="$1"
     # Remove ASCII control characters (0x00-0x1f and 0x7f)
-    # Use tr for reliable control character removal
-    printf '%s' "$input" | tr -d '\000-\037\177'
+    util_strip_ctrl "$1"
+    printf '%s' "$_UTIL_STRIPPED"
 }
 
 get_short_cwd() {
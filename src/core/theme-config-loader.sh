@@ -33,6 +33,7 @@ _USER_CONFIG="$_USER_CONFIG_DIR/user.conf"
 # They must be sourced before any code that calls their functions.
 # ==============================================================================
 
+source "${_THEME_SCRIPT_DIR}/util.sh"
 source "${_THEME_SCRIPT_DIR}/face-selection.sh"
 source "${_THEME_SCRIPT_DIR}/dynamic-color-calculation.sh"
 
@@ -172,9 +173,10 @@ load_agent_config() {
 # E.g., CLAUDE_DARK_BASE -> DARK_BASE when agent=claude
 _resolve_agent_variables() {
     local agent="$1"
-    # Convert to uppercase for prefix (Bash 3.2 compatible)
+    # Convert to uppercase for prefix (util.sh, Bash 3.2 compatible)
     local prefix
-    prefix="$(echo "$agent" | tr '[:lower:]' '[:upper:]')_"  # CLAUDE_, GEMINI_, etc.
+    util_upper "$agent"
+    prefix="${_UTIL_UPPER}_"  # CLAUDE_, GEMINI_, etc.
 
     # Variables to resolve (background colors)
     local vars=(
@@ -404,6 +406,9 @@ _apply_mode_aware_processing() {
 # Cached system mode (to avoid repeated detection)
 _CACHED_SYSTEM_MODE=""
 
+# Shared mode file published by the system mode watcher (system-mode-watcher.sh)
+_SYSTEM_MODE_FILE="${TAVS_TMP_DIR:-/tmp/tavs}/system-mode"
+
 # Resolve final COLOR_* values based on mode settings
 _resolve_colors() {
     local use_dark="true"
@@ -427,16 +432,12 @@ _resolve_colors() {
                 "muted")
                     # Allow switching with muted colors
                     use_muted="true"
-                    if [[ -z "$_CACHED_SYSTEM_MODE" ]]; then
-                        _CACHED_SYSTEM_MODE=$(_detect_system_mode)
-                    fi
+                    _load_system_mode
                     [[ "$_CACHED_SYSTEM_MODE" == "dark" ]] && use_dark="true" || use_dark="false"
                     ;;
                 "full")
                     # Allow switching with regular colors (same as non-TrueColor)
-                    if [[ -z "$_CACHED_SYSTEM_MODE" ]]; then
-                        _CACHED_SYSTEM_MODE=$(_detect_system_mode)
-                    fi
+                    _load_system_mode
                     [[ "$_CACHED_SYSTEM_MODE" == "dark" ]] && use_dark="true" || use_dark="false"
                     ;;
                 *)
@@ -446,9 +447,7 @@ _resolve_colors() {
             esac
         else
             # Non-TrueColor: always auto-detect system mode
-            if [[ -z "$_CACHED_SYSTEM_MODE" ]]; then
-                _CACHED_SYSTEM_MODE=$(_detect_system_mode)
-            fi
+            _load_system_mode
             [[ "$_CACHED_SYSTEM_MODE" == "dark" ]] && use_dark="true" || use_dark="false"
         fi
     fi
@@ -541,6 +540,34 @@ _detect_system_mode() {
     esac
 }
 
+# Read the mode published by a live watcher into _SHARED_SYSTEM_MODE (no forks)
+# Returns 1 if no running watcher has published a mode
+_read_shared_system_mode() {
+    local mode="" pid=""
+    _SHARED_SYSTEM_MODE=""
+    [[ -f "$_SYSTEM_MODE_FILE" ]] || return 1
+    read -r mode pid < "$_SYSTEM_MODE_FILE" 2>/dev/null
+    [[ "$mode" == "dark" || "$mode" == "light" ]] || return 1
+    [[ -n "$pid" ]] && kill -0 "$pid" 2>/dev/null || return 1
+    _SHARED_SYSTEM_MODE="$mode"
+}
+
+# Set _CURRENT_SYSTEM_MODE from the shared file, probing only without a watcher
+_current_system_mode() {
+    if _read_shared_system_mode; then
+        _CURRENT_SYSTEM_MODE="$_SHARED_SYSTEM_MODE"
+    else
+        _CURRENT_SYSTEM_MODE=$(_detect_system_mode)
+    fi
+}
+
+# Fill _CACHED_SYSTEM_MODE once per process
+_load_system_mode() {
+    [[ -n "$_CACHED_SYSTEM_MODE" ]] && return 0
+    _current_system_mode
+    _CACHED_SYSTEM_MODE="$_CURRENT_SYSTEM_MODE"
+}
+
 # Clear cached system mode (call when mode might have changed)
 clear_mode_cache() {
     _CACHED_SYSTEM_MODE=""
@@ -565,15 +592,29 @@ _build_stage_arrays() {
     # Stage 0: Complete color
     # Stages 1-5: Interpolate from Idle color toward Base color
     # Stage 6: Reset (terminal default)
-    UNIFIED_STAGE_COLORS=(
-        "${IDLE_STAGE_0_COLOR:-$COLOR_COMPLETE}"
-        "${IDLE_STAGE_1_COLOR:-$COLOR_IDLE}"
-        "${IDLE_STAGE_2_COLOR:-$(_interpolate_stage_color 2)}"
-        "${IDLE_STAGE_3_COLOR:-$(_interpolate_stage_color 3)}"
-        "${IDLE_STAGE_4_COLOR:-$(_interpolate_stage_color 4)}"
-        "${IDLE_STAGE_5_COLOR:-$(_interpolate_stage_color 5)}"
-        "${IDLE_STAGE_6_COLOR:-reset}"
-    )
+    if type calculate_stage_colors &>/dev/null; then
+        # Fork-free batch (memoized HSL interpolation from colors.sh)
+        calculate_stage_colors "$COLOR_COMPLETE" "$COLOR_IDLE" "$COLOR_BASE"
+        UNIFIED_STAGE_COLORS=(
+            "${IDLE_STAGE_0_COLOR:-$COLOR_SET_STAGE_0}"
+            "${IDLE_STAGE_1_COLOR:-$COLOR_SET_STAGE_1}"
+            "${IDLE_STAGE_2_COLOR:-$COLOR_SET_STAGE_2}"
+            "${IDLE_STAGE_3_COLOR:-$COLOR_SET_STAGE_3}"
+            "${IDLE_STAGE_4_COLOR:-$COLOR_SET_STAGE_4}"
+            "${IDLE_STAGE_5_COLOR:-$COLOR_SET_STAGE_5}"
+            "${IDLE_STAGE_6_COLOR:-$COLOR_SET_STAGE_6}"
+        )
+    else
+        UNIFIED_STAGE_COLORS=(
+            "${IDLE_STAGE_0_COLOR:-$COLOR_COMPLETE}"
+            "${IDLE_STAGE_1_COLOR:-$COLOR_IDLE}"
+            "${IDLE_STAGE_2_COLOR:-$(_interpolate_stage_color 2)}"
+            "${IDLE_STAGE_3_COLOR:-$(_interpolate_stage_color 3)}"
+            "${IDLE_STAGE_4_COLOR:-$(_interpolate_stage_color 4)}"
+            "${IDLE_STAGE_5_COLOR:-$(_interpolate_stage_color 5)}"
+            "${IDLE_STAGE_6_COLOR:-reset}"
+        )
+    fi
 
     # Status Icons: Complete -> Idle stages -> Empty (reset)
     UNIFIED_STAGE_STATUS_ICONS=(
@@ -9,7 +9,12 @@
 #   session.termTitle (what app requested) vs session.presentationName (what's shown)
 # ==============================================================================
 
+# Bounded TTY writes (see tty-frame.sh)
+[[ -n "${_TAVS_TTY_FRAME_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/tty-frame.sh"
+
 # Query timeout in seconds
+# Repeated timeouts (e.g. tmux without passthrough) put the queries into the
+# feature backoff (iterm2_query) so they stop costing a timeout per hook.
 ITERM2_QUERY_TIMEOUT="${ITERM2_QUERY_TIMEOUT:-1}"
 
 # Debug mode
@@ -35,6 +40,14 @@ iterm2_get_var() {
     # Ensure we have TTY
     [[ -z "$TTY_DEVICE" ]] && return 1
 
+    # Skip while queries are backed off after repeated timeouts
+    local backoff=false
+    type feature_backoff_active &>/dev/null && backoff=true
+    if [[ "$backoff" == "true" ]] && feature_backoff_active iterm2_query; then
+        [[ "$ITERM2_TITLE_DEBUG" == "1" ]] && echo "[iTerm2] Queries backed off, skipping: $var_name" >&2
+        return 1
+    fi
+
     # Base64 encode variable name
     local b64_name
     if [[ "$OSTYPE" == "darwin"* ]]; then
@@ -50,8 +63,9 @@ iterm2_get_var() {
         return 1
     fi
 
-    # Send request to terminal
-    printf "\033]1337;ReportVariable=%s\007" "$b64_name" > "$TTY_DEVICE" 2>/dev/null || {
+    # Send request to terminal (bounded write, see tty-frame.sh; a stuck
+    # terminal drops it instead of blocking the hook)
+    tty_write_now "\033]1337;ReportVariable=%s\007" "$b64_name" 2>/dev/null || {
         [[ "$ITERM2_TITLE_DEBUG" == "1" ]] && echo "[iTerm2] Failed to write to TTY" >&2
         return 1
     }
@@ -61,8 +75,10 @@ iterm2_get_var() {
     local response
     if ! read -r -t "$timeout" -d $'\a' response < "$TTY_DEVICE" 2>/dev/null; then
         [[ "$ITERM2_TITLE_DEBUG" == "1" ]] && echo "[iTerm2] Read timeout for: $var_name" >&2
+        [[ "$backoff" == "true" ]] && record_feature_failure iterm2_query
         return 1
     fi
+    [[ "$backoff" == "true" ]] && record_feature_success iterm2_query
 
     # Extract payload (remove everything before ReportVariable=)
     local payload="${response##*ReportVariable=}"
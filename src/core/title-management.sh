@@ -23,6 +23,10 @@ else
 fi
 _TITLE_SCRIPT_DIR="$( cd "$( dirname "$_TITLE_THIS_SCRIPT" )" && pwd )"
 
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${_TITLE_SCRIPT_DIR}/util.sh"
+[[ -n "${_TAVS_METRICS_LOADED:-}" ]] || source "${_TITLE_SCRIPT_DIR}/metrics.sh"
+[[ -n "${_TAVS_TTY_FRAME_LOADED:-}" ]] || source "${_TITLE_SCRIPT_DIR}/tty-frame.sh"
+[[ -n "${_TAVS_LATENCY_BUDGET_LOADED:-}" ]] || source "${_TITLE_SCRIPT_DIR}/latency-budget.sh"
 source "${_TITLE_SCRIPT_DIR}/title-state-persistence.sh"
 
 # ==============================================================================
@@ -344,7 +348,8 @@ compose_title() {
     local _format_state="$state"
     [[ "$_format_state" == idle_* ]] && _format_state="idle"
     local state_upper
-    state_upper=$(printf '%s' "$_format_state" | tr '[:lower:]' '[:upper:]' | tr '-' '_')
+    util_upper "$_format_state"
+    state_upper="${_UTIL_UPPER//-/_}"
 
     # Level 1: Agent-specific + state-specific (e.g., CLAUDE_TITLE_FORMAT_PERMISSION)
     local _agent_state_var="TITLE_FORMAT_${state_upper}"
@@ -415,7 +420,9 @@ compose_title() {
     if [[ "$title" == *"{CONTEXT_"* || "$title" == *"{MODEL}"* || \
           "$title" == *"{COST}"* || "$title" == *"{DURATION}"* || \
           "$title" == *"{LINES}"* || "$title" == *"{MODE}"* ]]; then
-        load_context_data  # From context-data.sh: bridge → transcript → empty
+        # From context-data.sh: bridge → transcript → empty (tokens stay
+        # empty when shed by the latency budget)
+        latency_budget_allows context && load_context_data
         # Context display tokens (10 types)
         title="${title//\{CONTEXT_PCT\}/$(resolve_context_token CONTEXT_PCT "$TAVS_CONTEXT_PCT")}"
         title="${title//\{CONTEXT_FOOD\}/$(resolve_context_token CONTEXT_FOOD "$TAVS_CONTEXT_PCT")}"
@@ -500,8 +507,9 @@ set_tavs_title() {
 
     # "ignore" mode: always overwrite, never detect user titles
     if [[ "$respect_mode" != "ignore" ]]; then
-        # Detect if user changed title since last set (on supported terminals)
-        if detect_user_title_change; then
+        # Detect if user changed title since last set (on supported terminals;
+        # skipped when shed by the latency budget)
+        if latency_budget_allows user_title && detect_user_title_change; then
             # User changed title - respect their base, add our prefix
             if [[ "$respect_mode" == "full" ]]; then
                 return 0
@@ -522,17 +530,22 @@ set_tavs_title() {
     full_title=$(compose_title "$state" "$base_title")
 
     # Send to terminal (only save state if write succeeds)
-    if printf "\033]0;%s\033\\" "$full_title" > "$TTY_DEVICE" 2>/dev/null; then
-        # Save state only after successful write
+    if tty_write "\033]0;%s\033\\" "$full_title" 2>/dev/null; then
+        # Save state once the write reaches the terminal (inside a frame:
+        # when it is flushed; nothing is saved if the frame is dropped)
         TITLE_LAST_SET="$full_title"
-        save_title_state "$TITLE_USER_BASE" "$TITLE_LAST_SET" "$TITLE_LOCKED" "$SESSION_ID"
+        tty_frame_on_write save_title_state \
+            "$TITLE_USER_BASE" "$TITLE_LAST_SET" "$TITLE_LOCKED" "$SESSION_ID"
         # Debug: trace successful title write
         type debug_log_title_trace &>/dev/null && \
             debug_log_title_trace "$state" "$full_title" "write=ok"
     else
         # Debug: trace failed title write
-        type debug_log_title_trace &>/dev/null && \
-            debug_log_title_trace "$state" "$full_title" "write=FAILED tty=$TTY_DEVICE writable=$(test -w "$TTY_DEVICE" && echo y || echo n)"
+        if type debug_log_title_trace &>/dev/null; then
+            local writable=n
+            [[ -w "$TTY_DEVICE" ]] && writable=y
+            debug_log_title_trace "$state" "$full_title" "write=FAILED writable=$writable"
+        fi
     fi
 }
 
@@ -568,10 +581,11 @@ reset_tavs_title() {
     base_title=$(get_base_title)
 
     # Send to terminal (only save state if write succeeds)
-    if printf "\033]0;%s\033\\" "$base_title" > "$TTY_DEVICE" 2>/dev/null; then
-        # Save state only after successful write
+    if tty_write "\033]0;%s\033\\" "$base_title" 2>/dev/null; then
+        # Save state once the write reaches the terminal (see set_tavs_title)
         TITLE_LAST_SET="$base_title"
-        save_title_state "$TITLE_USER_BASE" "$TITLE_LAST_SET" "$TITLE_LOCKED" "$SESSION_ID"
+        tty_frame_on_write save_title_state \
+            "$TITLE_USER_BASE" "$TITLE_LAST_SET" "$TITLE_LOCKED" "$SESSION_ID"
     fi
 }
 
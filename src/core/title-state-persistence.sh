@@ -23,8 +23,12 @@
 #
 # Dependencies:
 #   - TTY_SAFE environment variable (from terminal.sh)
+#   - util.sh: util_now, util_tmpfile
 # ==============================================================================
 
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+
 # ==============================================================================
 # STATE FILE CONFIGURATION
 # ==============================================================================
@@ -62,10 +66,14 @@ _generate_session_id() {
     fi
 
     # Generate new session ID (first 8 chars of UUID or random hex)
+    local uuid
     if command -v uuidgen &>/dev/null; then
-        uuidgen | cut -c1-8 | tr '[:upper:]' '[:lower:]'
+        uuid=$(uuidgen)
+        util_lower "${uuid:0:8}"
+        echo "$_UTIL_LOWER"
     elif [[ -f /proc/sys/kernel/random/uuid ]]; then
-        cut -c1-8 < /proc/sys/kernel/random/uuid
+        read -r uuid < /proc/sys/kernel/random/uuid
+        echo "${uuid:0:8}"
     elif [[ -c /dev/urandom ]]; then
         # Use /dev/urandom for better randomness (available on most Unix systems)
         head -c 4 /dev/urandom | od -An -t x4 | tr -d ' \n'
@@ -73,7 +81,8 @@ _generate_session_id() {
     else
         # Fallback: use hash-like value based on PID + timestamp
         local seed
-        seed="$(( (PPID + $(date +%s)) % 0xFFFFFFFF ))"
+        util_now
+        seed="$(( (PPID + _UTIL_NOW) % 0xFFFFFFFF ))"
         if command -v md5sum &>/dev/null; then
             printf '%s' "$seed" | md5sum | cut -c1-8
         elif command -v cksum &>/dev/null; then
@@ -186,12 +195,9 @@ save_title_state() {
     local state_file
     state_file=$(get_title_state_file)
 
-    # Use mktemp for guaranteed unique temp file (avoids race conditions with $$)
-    local tmp_file
-    tmp_file=$(mktemp "${state_file}.tmp.XXXXXX" 2>/dev/null) || {
-        # Fallback if mktemp fails
-        tmp_file="${state_file}.tmp.$$"
-    }
+    # Unique temp name per call (avoids races between concurrent writers)
+    util_tmpfile "$state_file"
+    local tmp_file="$_UTIL_TMPFILE"
 
     {
         echo "# TAVS Title State - $(date -Iseconds 2>/dev/null || date)"
@@ -16,17 +16,52 @@
 #
 # Recognized disabled values (case-insensitive): false, 0, off, no, disabled
 # ==============================================================================
-_tavs_status_lower=$(printf '%s' "$TAVS_STATUS" | tr '[:upper:]' '[:lower:]')
-case "$_tavs_status_lower" in
+
+# Resolve Script Directory and Project Root
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+CORE_DIR="$SCRIPT_DIR"
+
+# Entry point for the re-runs this trigger starts (deferred events, tool_error
+# return, repaint); a bundle sets it to itself. Re-runs pass _TAVS_RERUN=1.
+_TAVS_TRIGGER="${_TAVS_TRIGGER:-$CORE_DIR/trigger.sh}"
+
+# Builtin helpers (no dependencies) — needed by the kill switch
+source "$CORE_DIR/util.sh"
+
+util_lower "${TAVS_STATUS:-}"
+case "$_UTIL_LOWER" in
     false|0|off|no|disabled)
         exit 0
         ;;
 esac
-unset _tavs_status_lower
 
-# Resolve Script Directory and Project Root
-SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
-CORE_DIR="$SCRIPT_DIR"
+# Arrival stamp for out-of-order protection (adapters stamp earlier when they
+# can; see EVENT ORDERING in session-state.sh). Repaints are stamped fresh:
+# they inherit the stamp of the SessionStart that launched the watcher.
+[[ "${1:-}" == "repaint" ]] && TAVS_EVENT_SEQ=""
+if [[ -z "${TAVS_EVENT_SEQ:-}" ]]; then
+    util_now_ms
+    export TAVS_EVENT_SEQ="$(( _UTIL_NOW_MS * 1000 ))"
+fi
+
+# Per-state counters and run time (see metrics.sh)
+source "$CORE_DIR/metrics.sh"
+metrics_start
+
+# Early exit for events that repeat the one already shown (see event-dedup.sh)
+source "$CORE_DIR/event-dedup.sh"
+if event_dedup_check "$@"; then
+    [[ "$_TAVS_DEDUP_METRICS" == "true" ]] && ENABLE_METRICS=true metrics_trigger "$1" dedup
+    if [[ "$_TAVS_DEDUP_JOURNAL" == "true" ]]; then
+        source "$CORE_DIR/journal.sh"
+        journal_record dedup "$1" "${2:-}"
+    fi
+    exit 0
+fi
+
+# Per-invocation time budget for optional stages (see latency-budget.sh)
+source "$CORE_DIR/latency-budget.sh"
+latency_budget_start
 
 # Source Core Modules
 # Note: palette-mode-helpers.sh must come before idle-worker-background.sh
@@ -38,119 +73,48 @@ source "$CORE_DIR/spinner.sh"
 source "$CORE_DIR/palette-mode-helpers.sh"
 source "$CORE_DIR/idle-worker-background.sh"
 source "$CORE_DIR/terminal-detection.sh"
+source "$CORE_DIR/feature-backoff.sh"  # Negative cache for failing optional features
 source "$CORE_DIR/backgrounds.sh"
 source "$CORE_DIR/title-management.sh"
 source "$CORE_DIR/subagent-counter.sh"  # Subagent tracking
 source "$CORE_DIR/session-icon.sh"     # Session icon per terminal tab
 source "$CORE_DIR/dir-icon.sh"        # Dir icon read (get_dir_icon) — assign needs registry via _load_identity_modules
 source "$CORE_DIR/context-data.sh"    # Context window data for title tokens
+source "$CORE_DIR/config-snapshot.sh" # Precompiled OSC bundles (palette + background)
+source "$CORE_DIR/journal.sh"         # Per-session transition journal (ENABLE_JOURNAL)
 
 # Source iTerm2-specific title detection if applicable
 [[ "$TERM_PROGRAM" == "iTerm.app" && -f "$CORE_DIR/title-iterm2.sh" ]] && \
     source "$CORE_DIR/title-iterm2.sh"
 
 # === DEBUG LOGGING ===
+# One record per invocation in debug/trigger.log (see debug-log.sh)
 debug_log_invocation() {
     [[ "$DEBUG_ALL" != "1" ]] && return 0
 
-    mkdir -p "$DEBUG_LOG_DIR"
-    local ts=$(date +%Y%m%d-%H%M%S)
-    local log_file="${DEBUG_LOG_DIR}/${ts}-$$-${1:-unknown}.log"
-
-    {
-        echo "=== TERMINAL VISUAL SIGNALS DEBUG LOG ==="
-        echo "Timestamp: $(date -Iseconds 2>/dev/null || date)"
-        echo "PID: $$"
-        echo "PPID: $PPID"
-        echo ""
-        echo "=== ARGUMENTS ==="
-        echo "Arg count: $#"
-        echo "All args: $*"
-        echo "Arg 1 (state): ${1:-<empty>}"
-        echo ""
-        echo "=== WORKING DIRECTORY ==="
-        echo "PWD env var: $PWD"
-        echo "pwd command: $(pwd)"
-        echo "get_short_cwd: $(get_short_cwd 2>/dev/null || echo '<function not loaded>')"
-        echo ""
-        echo "=== TTY INFO ==="
-        echo "TTY_DEVICE: ${TTY_DEVICE:-<unset>}"
-        echo "TTY_SAFE: ${TTY_SAFE:-<unset>}"
-        echo "tty command: $(tty 2>/dev/null || echo '<no tty>')"
-        echo ""
-        echo "=== PARENT PROCESS ==="
-        ps -p $PPID -o pid,ppid,comm,args 2>/dev/null || echo "ps failed"
-        echo ""
-        echo "=== SCRIPT PATHS ==="
-        echo "SCRIPT_DIR: $SCRIPT_DIR"
-        echo "CORE_DIR: $CORE_DIR"
-        echo "BASH_SOURCE[0]: ${BASH_SOURCE[0]}"
-        echo ""
-        echo "=== HOOK PAYLOAD / STDIN ==="
-        # Use pre-captured payload from agent trigger (if available)
-        if [[ -n "${_TAVS_HOOK_PAYLOAD:-}" ]]; then
-            echo "$_TAVS_HOOK_PAYLOAD"
-        else
-            # Fallback: try reading stdin directly (non-Claude agents)
-            if read -t 0.1 -r stdin_line 2>/dev/null; then
-                echo "First line: $stdin_line"
-                local count=1
-                while read -t 0.1 -r stdin_line && [[ $count -lt 100 ]]; do
-                    echo "Line $((++count)): $stdin_line"
-                done
-            else
-                echo "(no stdin data)"
-            fi
-        fi
-        echo ""
-        echo "=== PERMISSION MODE ==="
-        echo "TAVS_PERMISSION_MODE: ${TAVS_PERMISSION_MODE:-<unset>}"
-        echo ""
-        echo "=== CONFIG (post-load) ==="
-        echo "TAVS_FACE_MODE: ${TAVS_FACE_MODE:-<unset>}"
-        echo "TAVS_TITLE_PRESET: ${TAVS_TITLE_PRESET:-<unset>}"
-        echo "TAVS_TITLE_MODE: ${TAVS_TITLE_MODE:-<unset>}"
-        echo "TAVS_TITLE_FORMAT: ${TAVS_TITLE_FORMAT:-<unset>}"
-        echo "TAVS_COMPACT_THEME: ${TAVS_COMPACT_THEME:-<unset>}"
-        echo "TAVS_COMPACT_CONTEXT_EYE: ${TAVS_COMPACT_CONTEXT_EYE:-<unset>}"
-        echo "ENABLE_TITLE_PREFIX: ${ENABLE_TITLE_PREFIX:-<unset>}"
-        echo "ENABLE_ANTHROPOMORPHISING: ${ENABLE_ANTHROPOMORPHISING:-<unset>}"
-        echo "TAVS_IDENTITY_MODE: ${TAVS_IDENTITY_MODE:-<unset>}"
-        echo "IDENTITY_MODE: ${IDENTITY_MODE:-<unset>}"
-        echo "_USER_CONFIG: ${_USER_CONFIG:-<unset>}"
-        echo "_USER_CONFIG exists: $(test -f "${_USER_CONFIG:-/nonexistent}" && echo yes || echo no)"
-        echo "TAVS_SESSION_ID: ${TAVS_SESSION_ID:-<unset>}"
-        echo ""
-        echo "=== END DEBUG LOG ==="
-    } > "$log_file" 2>&1
-
-    # Also append summary to consolidated log
-    echo "${ts} pid=$$ state=${1:-?} pwd=$PWD tty=${TTY_DEVICE:-?}" >> "${DEBUG_LOG_DIR}/summary.log"
+    # Pre-captured payload from the agent trigger; otherwise whatever stdin
+    # already holds (non-Claude agents), without waiting for more
+    local payload="${_TAVS_HOOK_PAYLOAD:-}"
+    if [[ -z "$payload" ]] && read -t 0 2>/dev/null; then
+        IFS= read -r -d '' -n "${TAVS_DEBUG_PAYLOAD_MAX:-2048}" -t 1 payload 2>/dev/null
+    fi
+
+    debug_log "${DEBUG_LOG_DIR}/trigger.log" invocation \
+        "state=${1:-}" "args=$*" "ppid=$PPID" "pwd=$PWD" \
+        "tty=${TTY_DEVICE:-}" "session=${TAVS_SESSION_ID:-}" \
+        "permission_mode=${TAVS_PERMISSION_MODE:-}" "face_mode=${TAVS_FACE_MODE:-}" \
+        "title_mode=${TAVS_TITLE_MODE:-}" "title_preset=${TAVS_TITLE_PRESET:-}" \
+        "identity_mode=${TAVS_IDENTITY_MODE:-}" "user_config=${_USER_CONFIG:-}" \
+        "payload=$payload"
 }
 
 # === TITLE TRACE LOGGING ===
-# Dedicated title trace log — records compose_title input/output for each state
+# One record per title write in debug/title.log
 debug_log_title_trace() {
     [[ "$DEBUG_ALL" != "1" ]] && return 0
-    local state="$1"
-    local title_output="$2"
-    local extra_info="${3:-}"
-
-    mkdir -p "$DEBUG_LOG_DIR"
-    local ts=$(date +%Y%m%d-%H%M%S.%N 2>/dev/null || date +%Y%m%d-%H%M%S)
-    {
-        echo "--- TITLE TRACE $ts ---"
-        echo "state=$state"
-        echo "TAVS_FACE_MODE=${TAVS_FACE_MODE:-<unset>}"
-        echo "TAVS_TITLE_FORMAT=${TAVS_TITLE_FORMAT:-<unset>}"
-        echo "session_icon=$(get_session_icon 2>/dev/null || echo '<error>')"
-        echo "dir_icon=$(get_dir_icon 2>/dev/null || echo '<error>')"
-        echo "tty_device=${TTY_DEVICE:-<empty>}"
-        echo "tty_writable=$(test -w "${TTY_DEVICE:-/nonexistent}" && echo yes || echo no)"
-        echo "title_output=$title_output"
-        [[ -n "$extra_info" ]] && echo "extra=$extra_info"
-        echo ""
-    } >> "${DEBUG_LOG_DIR}/title-trace.log" 2>&1
+    debug_log "${DEBUG_LOG_DIR}/title.log" title "state=$1" \
+        "face_mode=${TAVS_FACE_MODE:-}" "format=${TAVS_TITLE_FORMAT:-}" \
+        "tty=${TTY_DEVICE:-}" "title=$2" "extra=${3:-}"
 }
 
 # Log this invocation
@@ -174,6 +138,37 @@ _reset_palette_if_enabled() {
     send_osc_palette_reset
 }
 
+# Helper: Emit palette (if enabled) + background for a state
+# Uses the precompiled snapshot bundle (one read, one write) when available,
+# otherwise falls back to building the sequences live.
+# Usage: _emit_state_colors "processing" "$COLOR_PROCESSING"  (or "reset")
+_emit_state_colors() {
+    local state="$1" color="$2"
+    local with_palette="false"
+    should_enable_palette_theming && with_palette="true"
+
+    if ! should_send_bg_color; then
+        snapshot_forget_tty
+        if [[ "$color" == "reset" ]]; then
+            _reset_palette_if_enabled
+        else
+            _apply_palette_if_enabled
+        fi
+        return 0
+    fi
+
+    emit_osc_bundle "$state" "$color" "$with_palette" && return 0
+    snapshot_forget_tty  # In-process emitters must not reuse a stale bundle set
+
+    # Live path: palette FIRST (prevents contrast flicker), then background
+    if [[ "$color" == "reset" ]]; then
+        [[ "$with_palette" == "true" ]] && send_osc_palette_reset
+    else
+        [[ "$with_palette" == "true" ]] && send_osc_palette "$(_get_palette_mode)"
+    fi
+    send_osc_bg "$color"
+}
+
 # Helper: Check if we should send title for current state
 # Returns 0 (true) if title should be sent, 1 (false) to skip
 # Respects TAVS_TITLE_MODE: full (all), skip-processing (skip processing), off (none)
@@ -233,9 +228,84 @@ _revalidate_identity() {
     [[ "$_id_mode" == "dual" ]] && assign_dir_icon
 }
 
+# === TWO-PHASE TRIGGER ===
+# Time-to-color is what users perceive. With ENABLE_TWO_PHASE_TRIGGER=true
+# the hook only sends the state colors (snapshot bundle), bell and state
+# record before it exits (phase 1). Title composition, background image and
+# identity work queued with _phase2 run afterwards in a detached worker that
+# writes its own frame (phase 2). A newer event's worker replaces one still
+# running for the TTY, and the frame of a superseded event is dropped by
+# tty_frame_flush, so the screen ends up as with a single phase.
+_TAVS_PHASE2=""
+
+# Run a decoration step now, or queue it for the phase 2 worker
+# Usage: _phase2 command [args...]
+_phase2() {
+    if [[ "$ENABLE_TWO_PHASE_TRIGGER" != "true" ]]; then
+        "$@"
+        return
+    fi
+    local cmd
+    printf -v cmd '%q ' "$@"
+    _TAVS_PHASE2+="${cmd};"
+}
+
+# Start the phase 2 worker for the queued steps (latest wins per TTY)
+# Worker PID: ${TAVS_TMP_DIR:-/tmp/tavs}/phase2.{TTY_SAFE}
+_phase2_start() {
+    [[ -z "$_TAVS_PHASE2" ]] && return 0
+    local pid_file="${TAVS_TMP_DIR:-/tmp/tavs}/phase2.${TTY_SAFE}" pid=""
+    [[ -f "$pid_file" ]] && read -r pid < "$pid_file"
+    [[ "$pid" =~ ^[0-9]+$ ]] && kill "$pid" 2>/dev/null
+
+    (
+        # Remove the PID file on any exit (also when killed by a newer
+        # event) unless a newer worker has already replaced it
+        _TAVS_PHASE2_PID="${BASHPID:-$(sh -c 'echo $PPID')}"
+        trap 'read -r pid < "$pid_file" 2>/dev/null; [[ "$pid" == "$_TAVS_PHASE2_PID" ]] && rm -f "$pid_file"' EXIT
+        trap 'exit 0' TERM INT
+        _TAVS_BUDGET_START=""  # The hook has returned; nothing to shed
+        tty_frame_begin
+        eval "$_TAVS_PHASE2"
+        tty_frame_flush "$STATE"
+    ) </dev/null >/dev/null 2>&1 &
+    printf '%s\n' "$!" > "$pid_file" 2>/dev/null
+    disown 2>/dev/null || true
+    _TAVS_PHASE2=""
+}
+
+# === SYSTEM MODE WATCHER ===
+# Lazy-load the light/dark watcher; only needed on SessionStart/SessionEnd.
+_load_system_mode_watcher() {
+    [[ "${_TAVS_MODE_WATCHER_LOADED:-}" == "true" ]] && return 0
+    source "$CORE_DIR/system-mode-watcher.sh"
+    _TAVS_MODE_WATCHER_LOADED="true"
+}
+
 # Main Logic
 STATE="${1:-}"
 
+# Record every exit below (metrics, journal); outcome is set where an event
+# is refused
+_TAVS_OUTCOME="applied"
+_TAVS_EVENT_ARG="${2:-}"
+[[ "$ENABLE_JOURNAL" == "true" ]] && journal_begin
+_trigger_exit() {
+    [[ "$_TAVS_OUTCOME" == "deferred" ]] && event_dedup_forget
+    metrics_trigger "$STATE" "$_TAVS_OUTCOME"
+    [[ "$ENABLE_JOURNAL" == "true" ]] && \
+        journal_record "$_TAVS_OUTCOME" "$STATE" "$_TAVS_EVENT_ARG"
+    return 0
+}
+trap _trigger_exit EXIT
+
+# A slower hook finishing after a newer event must not repaint over it
+# (repaint re-emits the recorded state and is never stale)
+[[ "$STATE" != "repaint" ]] && is_stale_event && { _TAVS_OUTCOME="stale"; exit 0; }
+
+# Collect every TTY write of this transition into one frame (tty-frame.sh)
+tty_frame_begin
+
 case "$STATE" in
     processing)
         # On new prompt (UserPromptSubmit): reset subagent counter + revalidate identity
@@ -244,22 +314,19 @@ case "$STATE" in
             # Revalidate identity: re-check collision status + assign/update dir icon
             _default_mode_p="dual"
             if [[ "${IDENTITY_MODE:-${TAVS_IDENTITY_MODE:-$_default_mode_p}}" != "off" ]]; then
-                _load_identity_modules
-                _revalidate_identity
+                _phase2 _load_identity_modules
+                _phase2 _revalidate_identity
             fi
         fi
-        should_change_state "$STATE" || exit 0
+        should_change_state "$STATE" || { _TAVS_OUTCOME="deferred"; _phase2_start; exit 0; }
         kill_idle_timer
         if [[ "$ENABLE_PROCESSING" == "true" ]]; then
-            # Apply palette FIRST (prevents contrast flicker)
-            _apply_palette_if_enabled
-            should_send_bg_color && send_osc_bg "$COLOR_PROCESSING"
+            _emit_state_colors "processing" "$COLOR_PROCESSING"
             # Use new title system with user override detection
-            should_send_title "processing" && set_tavs_title "processing"
-            set_state_background_image "processing"
+            should_send_title "processing" && _phase2 set_tavs_title "processing"
+            _phase2 set_state_background_image "processing"
         else
-            _reset_palette_if_enabled
-            should_send_bg_color && send_osc_bg "reset"
+            _emit_state_colors "reset" "reset"
             should_send_title "processing" && reset_tavs_title
             clear_background_image
         fi
@@ -270,33 +337,28 @@ case "$STATE" in
     permission)
         kill_idle_timer
         if [[ "$ENABLE_PERMISSION" == "true" ]]; then
-            # Apply palette FIRST (prevents contrast flicker)
-            _apply_palette_if_enabled
-            should_send_bg_color && send_osc_bg "$COLOR_PERMISSION"
+            _emit_state_colors "permission" "$COLOR_PERMISSION"
             # Use new title system with user override detection
-            should_send_title "permission" && set_tavs_title "permission"
-            set_state_background_image "permission"
+            should_send_title "permission" && _phase2 set_tavs_title "permission"
+            _phase2 set_state_background_image "permission"
         fi
         send_bell_if_enabled "$STATE"
         record_state "$STATE"
         ;;
 
     complete)
-        should_change_state "$STATE" || exit 0
+        should_change_state "$STATE" || { _TAVS_OUTCOME="deferred"; exit 0; }
         kill_idle_timer
         cleanup_stale_timers
         reset_subagent_count  # Reset subagent tracking on complete
 
         if [[ "$ENABLE_COMPLETE" == "true" ]]; then
-            # Apply palette FIRST (prevents contrast flicker)
-            _apply_palette_if_enabled
-            should_send_bg_color && send_osc_bg "$COLOR_COMPLETE"
+            _emit_state_colors "complete" "$COLOR_COMPLETE"
             # Use new title system with user override detection
-            should_send_title "complete" && set_tavs_title "complete"
-            set_state_background_image "complete"
+            should_send_title "complete" && _phase2 set_tavs_title "complete"
+            _phase2 set_state_background_image "complete"
         else
-            _reset_palette_if_enabled
-            should_send_bg_color && send_osc_bg "reset"
+            _emit_state_colors "reset" "reset"
             should_send_title "complete" && reset_tavs_title
             clear_background_image
         fi
@@ -316,11 +378,10 @@ case "$STATE" in
                 write_skip_signal
             else
                 # Fallback start - apply palette before background
-                _apply_palette_if_enabled
-                should_send_bg_color && send_osc_bg "${UNIFIED_STAGE_COLORS[1]}"
+                _emit_state_colors "idle" "${UNIFIED_STAGE_COLORS[1]}"
                 # Use new title system with user override detection
-                should_send_title "idle" && set_tavs_title "idle_1"
-                set_state_background_image "idle"
+                should_send_title "idle" && _phase2 set_tavs_title "idle_1"
+                _phase2 set_state_background_image "idle"
                 ( unified_timer_worker "$TTY_DEVICE" ) </dev/null >/dev/null 2>&1 &
                 disown 2>/dev/null || true
             fi
@@ -328,15 +389,13 @@ case "$STATE" in
         ;;
 
     compacting)
-        should_change_state "$STATE" || exit 0
+        should_change_state "$STATE" || { _TAVS_OUTCOME="deferred"; exit 0; }
         kill_idle_timer
         if [[ "$ENABLE_COMPACTING" == "true" ]]; then
-            # Apply palette FIRST (prevents contrast flicker)
-            _apply_palette_if_enabled
-            should_send_bg_color && send_osc_bg "$COLOR_COMPACTING"
+            _emit_state_colors "compacting" "$COLOR_COMPACTING"
             # Use new title system with user override detection
-            should_send_title "compacting" && set_tavs_title "compacting"
-            set_state_background_image "compacting"
+            should_send_title "compacting" && _phase2 set_tavs_title "compacting"
+            _phase2 set_state_background_image "compacting"
         fi
         send_bell_if_enabled "$STATE"
         record_state "$STATE"
@@ -350,16 +409,33 @@ case "$STATE" in
             release_dir_icon 2>/dev/null || true
         fi
 
+        # SessionStart: recompute (and optionally probe) the capability record
+        [[ "${2:-}" != "session-end" ]] && init_terminal_caps
+
         kill_idle_timer
         reset_subagent_count  # Reset subagent tracking on session reset
-        # Reset palette FIRST, then background
-        _reset_palette_if_enabled
-        should_send_bg_color && send_osc_bg "reset"
+        _emit_state_colors "reset" "reset"
+        clear_terminal_bg_cache  # Re-query OSC 11 next session (profile may differ)
         clear_background_image
         send_bell_if_enabled "$STATE"
         record_state "$STATE"
         reset_spinner
 
+        if [[ "${2:-}" == "session-end" ]]; then
+            # SessionEnd: stop repainting this TTY on light/dark flips
+            if [[ -f "${_SYSTEM_MODE_FILE}.ttys" ]]; then
+                _load_system_mode_watcher
+                unregister_system_mode_tty
+            fi
+        elif [[ "$ENABLE_LIGHT_DARK_SWITCHING" == "true" ]]; then
+            # SessionStart: register for repaint + ensure one watcher runs
+            _load_system_mode_watcher
+            if _system_mode_watcher_enabled; then
+                register_system_mode_tty
+                start_system_mode_watcher
+            fi
+        fi
+
         if [[ "${2:-}" != "session-end" ]]; then
             # SessionStart: initialize spinner + assign identity icons
             [[ "$TAVS_SESSION_IDENTITY" == "true" ]] && init_session_spinner
@@ -368,14 +444,14 @@ case "$STATE" in
             _default_mode_r="dual"
             _id_mode_r="${IDENTITY_MODE:-${TAVS_IDENTITY_MODE:-$_default_mode_r}}"
             if [[ "$_id_mode_r" != "off" ]]; then
-                _load_identity_modules
-                assign_session_icon
+                _phase2 _load_identity_modules
+                _phase2 assign_session_icon
                 # Assign dir icon now (dual mode only)
                 if [[ "$_id_mode_r" == "dual" ]]; then
-                    assign_dir_icon
+                    _phase2 assign_dir_icon
                 fi
             elif [[ "${ENABLE_SESSION_ICONS:-true}" == "true" ]]; then
-                assign_session_icon  # Legacy random (IDENTITY_MODE=off)
+                _phase2 assign_session_icon  # Legacy random (IDENTITY_MODE=off)
             fi
         fi
 
@@ -383,8 +459,8 @@ case "$STATE" in
         [[ "${2:-}" == "session-end" ]] && _TAVS_RESET_FINAL="true"
 
         # Clear stale title state, then set composed title (includes session icon)
-        clear_title_state 2>/dev/null || true
-        should_send_title "reset" && set_tavs_title "reset"
+        _phase2 clear_title_state 2>/dev/null
+        should_send_title "reset" && _phase2 set_tavs_title "reset"
         ;;
 
     # ===========================================================================
@@ -392,15 +468,13 @@ case "$STATE" in
     # ===========================================================================
     # Fires when Task tool spawns a subagent (Explore, Plan, Bash, custom)
     subagent|subagent-start)
-        should_change_state "subagent" || exit 0
+        should_change_state "subagent" || { _TAVS_OUTCOME="deferred"; exit 0; }
         increment_subagent_count
         kill_idle_timer
         if [[ "$ENABLE_SUBAGENT" == "true" ]]; then
-            # Apply palette FIRST (prevents contrast flicker)
-            _apply_palette_if_enabled
-            should_send_bg_color && send_osc_bg "$COLOR_SUBAGENT"
-            should_send_title "subagent" && set_tavs_title "subagent"
-            set_state_background_image "subagent"
+            _emit_state_colors "subagent" "$COLOR_SUBAGENT"
+            should_send_title "subagent" && _phase2 set_tavs_title "subagent"
+            _phase2 set_state_background_image "subagent"
         fi
         send_bell_if_enabled "subagent"
         record_state "subagent"
@@ -419,16 +493,15 @@ case "$STATE" in
             [[ "$DEBUG_ALL" == "1" ]] && echo "[TAVS] All subagents complete, returning to processing" >&2
 
             if [[ "$ENABLE_PROCESSING" == "true" ]]; then
-                _apply_palette_if_enabled
-                should_send_bg_color && send_osc_bg "$COLOR_PROCESSING"
-                should_send_title "processing" && set_tavs_title "processing"
-                set_state_background_image "processing"
+                _emit_state_colors "processing" "$COLOR_PROCESSING"
+                should_send_title "processing" && _phase2 set_tavs_title "processing"
+                _phase2 set_state_background_image "processing"
             fi
             record_state "processing"
         else
             [[ "$DEBUG_ALL" == "1" ]] && echo "[TAVS] Subagent complete, $remaining_count still active" >&2
             # Stay in subagent state, update title with new count
-            should_send_title "subagent" && set_tavs_title "subagent"
+            should_send_title "subagent" && _phase2 set_tavs_title "subagent"
         fi
         ;;
 
@@ -440,11 +513,9 @@ case "$STATE" in
         # Don't check should_change_state - errors should always show briefly
         kill_idle_timer
         if [[ "$ENABLE_TOOL_ERROR" == "true" ]]; then
-            # Apply palette FIRST (prevents contrast flicker)
-            _apply_palette_if_enabled
-            should_send_bg_color && send_osc_bg "$COLOR_TOOL_ERROR"
-            should_send_title "tool_error" && set_tavs_title "tool_error"
-            set_state_background_image "tool_error"
+            _emit_state_colors "tool_error" "$COLOR_TOOL_ERROR"
+            should_send_title "tool_error" && _phase2 set_tavs_title "tool_error"
+            _phase2 set_state_background_image "tool_error"
         fi
         send_bell_if_enabled "tool_error"
         record_state "tool_error"
@@ -455,18 +526,49 @@ case "$STATE" in
             sleep 1.5
             # Return to processing or subagent state
             if has_active_subagents 2>/dev/null; then
-                "$SCRIPT_DIR/trigger.sh" subagent
+                _TAVS_RERUN=1 "$_TAVS_TRIGGER" subagent
             else
-                "$SCRIPT_DIR/trigger.sh" processing
+                _TAVS_RERUN=1 "$_TAVS_TRIGGER" processing
             fi
         ) </dev/null >/dev/null 2>&1 &
         disown 2>/dev/null || true
         ;;
 
+    # ===========================================================================
+    # Internal: Repaint (system light/dark flip, from system-mode-watcher.sh)
+    # ===========================================================================
+    # Re-emits colors for the recorded state without touching state or timers.
+    # complete/idle with a live idle timer are left to the worker, which
+    # re-resolves its colors from the shared mode file on its next tick.
+    repaint)
+        read_session_state || exit 0
+        if [[ "$SESSION_STATE" == "complete" || "$SESSION_STATE" == "idle" ]] && \
+           [[ -n "$SESSION_TIMER_PID" ]] && kill -0 "$SESSION_TIMER_PID" 2>/dev/null; then
+            exit 0
+        fi
+        repaint_color=""
+        case "$SESSION_STATE" in
+            processing) [[ "$ENABLE_PROCESSING" == "true" ]] && repaint_color="$COLOR_PROCESSING" ;;
+            permission) [[ "$ENABLE_PERMISSION" == "true" ]] && repaint_color="$COLOR_PERMISSION" ;;
+            complete)   [[ "$ENABLE_COMPLETE" == "true" ]] && repaint_color="$COLOR_COMPLETE" ;;
+            idle)       [[ "$ENABLE_IDLE" == "true" ]] && repaint_color="${UNIFIED_STAGE_COLORS[1]}" ;;
+            compacting) [[ "$ENABLE_COMPACTING" == "true" ]] && repaint_color="$COLOR_COMPACTING" ;;
+            subagent)   [[ "$ENABLE_SUBAGENT" == "true" ]] && repaint_color="$COLOR_SUBAGENT" ;;
+            tool_error) [[ "$ENABLE_TOOL_ERROR" == "true" ]] && repaint_color="$COLOR_TOOL_ERROR" ;;
+        esac
+        [[ -z "$repaint_color" ]] && exit 0
+        _emit_state_colors "$SESSION_STATE" "$repaint_color"
+        set_state_background_image "$SESSION_STATE"
+        ;;
+
     *)
         echo "Usage: $0 {permission|idle|complete|processing|compacting|reset|subagent|subagent-stop|tool_error}" >&2
         exit 1
         ;;
 esac
 
+tty_frame_flush "$STATE"
+_phase2_start  # Title, image and identity (ENABLE_TWO_PHASE_TRIGGER)
+event_dedup_record "$@"
+
 exit 0
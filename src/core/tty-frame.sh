@@ -0,0 +1,254 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS - Terminal Agent Visual Signals — TTY Frame Emission
+# ==============================================================================
+# Two triggers for the same tab (e.g. SubagentStop and PostToolUse) can run at
+# once. With one `printf > $TTY_DEVICE` per sequence, the terminal could get
+# the background of one and the title of the other, or a sequence split by
+# another write.
+#
+# The trigger opens a frame per transition: palette, background, image, title
+# and bell are appended to one buffer, then written with a single write under
+# a per-TTY lock. The frame record names the event that owns what is on
+# screen. Outside a frame (CLI, tests) tty_write writes through.
+#
+# Bounded writes: a suspended terminal (stopped tmux client, frozen SSH
+# session, full PTY buffer) blocks write(2) indefinitely. Frames are written
+# from a process substitution while the caller waits at most
+# TAVS_TTY_WRITE_TIMEOUT seconds (0 = plain blocking write). On timeout the
+# writer is killed and the frame dropped, and frames for that TTY are
+# dropped without trying for TAVS_TTY_WRITE_BACKOFF seconds, so a stuck
+# terminal holds at most one TAVS process at a time. Drops are counted.
+#
+# Files (${TAVS_TMP_DIR:-/tmp/tavs}):
+#   frame.{TTY_SAFE}.lock/   - mkdir lock held while a frame is written
+#   frame.{TTY_SAFE}         - owner of the frame on screen
+#     state=<state>  seq=<TAVS_EVENT_SEQ>  pid=<writer pid>
+#   frame.{TTY_SAFE}.drops   - drop metrics (key=value lines, never sourced)
+#     timeouts=<n>  skipped=<n>  last=<epoch>  until=<epoch>
+#
+# Public functions:
+#   tty_write()         - printf to the TTY, or into the open frame
+#   tty_write_now()     - Bounded-time printf to the TTY, even inside a frame
+#   tty_frame_begin()   - Start buffering writes
+#   tty_frame_on_write() - Run a command once the open frame is written
+#   tty_frame_flush()   - Write the frame under the lock and record its owner
+#   tty_frame_drops()   - Set _TTY_DROP_* from a TTY's drop metrics
+#
+# Internal functions:
+#   _tty_frame_owner()  - Read the frame record
+#   _tty_frame_write()  - Bounded-time write of one frame
+#   _tty_frame_drop()   - Count a drop and (on timeout) start the backoff
+#
+# Dependencies:
+#   - TTY_DEVICE (terminal-osc-sequences.sh)
+#   - TAVS_EVENT_SEQ (trigger.sh, optional)
+#   - util.sh: util_now, util_tmpfile
+#   - metrics.sh: metrics_count (lock timeouts)
+# Include with a load guard like util.sh; safe to source from bash 3.2+ and
+# zsh (frames are only opened by the bash trigger).
+# ==============================================================================
+
+_TAVS_TTY_FRAME_LOADED=1
+
+# Builtin helpers (see util.sh)
+[[ -n "${_TAVS_UTIL_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/util.sh"
+[[ -n "${_TAVS_METRICS_LOADED:-}" ]] || source "${BASH_SOURCE[0]%/*}/metrics.sh"
+
+# Lock wait before a frame is written anyway (attempts × 10ms)
+_TTY_FRAME_LOCK_ATTEMPTS=20
+
+# printf to the TTY, or append to the open frame
+# Usage: tty_write format [args...]
+tty_write() {
+    [[ -z "${TTY_DEVICE:-}" ]] && return 1
+    if [[ -n "${_TAVS_FRAME_OPEN:-}" ]]; then
+        local chunk
+        printf -v chunk "$@"
+        _TAVS_FRAME+="$chunk"
+        return 0
+    fi
+    printf "$@" > "$TTY_DEVICE"
+}
+
+# Write to the TTY at once, bypassing an open frame, for queries whose reply
+# is read right after. Bounded and counted like a frame write.
+# Usage: tty_write_now format [args...]   → returns 1 if failed or dropped
+tty_write_now() {
+    [[ -z "${TTY_DEVICE:-}" ]] && return 1
+    local data
+    printf -v data "$@"
+    _tty_frame_write "$data"
+}
+
+# Start buffering tty_write output
+tty_frame_begin() {
+    _TAVS_FRAME_OPEN=1
+    _TAVS_FRAME=""
+    _TAVS_FRAME_ON_WRITE=""
+}
+
+# Run a command once the open frame has reached the terminal (at once when no
+# frame is open). State that mirrors the screen, like the saved title, is not
+# recorded when the frame is dropped.
+# Usage: tty_frame_on_write command [args...]
+tty_frame_on_write() {
+    if [[ -z "${_TAVS_FRAME_OPEN:-}" ]]; then
+        "$@"
+        return
+    fi
+    local cmd
+    printf -v cmd '%q ' "$@"
+    _TAVS_FRAME_ON_WRITE+="$cmd"$'\n'
+}
+
+# Write the open frame with one write under the per-TTY lock
+# The frame is dropped if the recorded owner is a newer event (see EVENT
+# ORDERING in session-state.sh). A lock still held after 50ms by a writer
+# that died is taken over; a live writer is waited for at most
+# _TTY_FRAME_LOCK_ATTEMPTS × 10ms, then the frame is written unlocked
+# rather than dropped.
+# Usage: tty_frame_flush [owner_state]
+tty_frame_flush() {
+    local state="${1:-}" frame="${_TAVS_FRAME:-}" on_write="${_TAVS_FRAME_ON_WRITE:-}"
+    _TAVS_FRAME_OPEN=""
+    _TAVS_FRAME=""
+    _TAVS_FRAME_ON_WRITE=""
+    [[ -z "${TTY_DEVICE:-}" || -z "$frame" ]] && return 0
+
+    local dir="${TAVS_TMP_DIR:-/tmp/tavs}"
+    local owner="$dir/frame.${TTY_DEVICE//\//_}"
+    local lock="${owner}.lock" attempts=0 locked=true
+    while ! mkdir "$lock" 2>/dev/null; do
+        [[ -d "$dir" ]] || { locked=false; break; }
+        attempts=$((attempts + 1))
+        if [[ $attempts -ge 5 ]]; then
+            _tty_frame_owner "$owner"
+            if [[ -n "$_TTY_FRAME_PID" ]] && ! kill -0 "$_TTY_FRAME_PID" 2>/dev/null; then
+                rmdir "$lock" 2>/dev/null  # Writer died holding the lock
+                continue
+            fi
+        fi
+        if [[ $attempts -ge $_TTY_FRAME_LOCK_ATTEMPTS ]]; then
+            locked=false
+            metrics_count 'tavs_lock_timeouts_total{lock="frame"}'
+            break
+        fi
+        sleep 0.01
+    done
+
+    local rc=0
+    _tty_frame_owner "$owner"
+    local ahead=0
+    [[ "$_TTY_FRAME_SEQ" =~ ^[0-9]+$ && "${TAVS_EVENT_SEQ:-}" =~ ^[0-9]+$ ]] && \
+        ahead=$(( _TTY_FRAME_SEQ - TAVS_EVENT_SEQ ))
+    if [[ $ahead -gt 0 && $ahead -lt ${_STATE_SEQ_MAX_SKEW_US:-60000000} ]]; then
+        rc=1  # A newer event already owns the screen
+    else
+        if [[ "$locked" == "true" ]]; then
+            printf 'state=%s\nseq=%s\npid=%s\n' \
+                "$state" "${TAVS_EVENT_SEQ:-}" "${BASHPID:-$$}" > "$owner" 2>/dev/null
+        fi
+        _tty_frame_write "$frame" || rc=1
+    fi
+    [[ "$locked" == "true" ]] && rmdir "$lock" 2>/dev/null
+    [[ $rc -eq 0 && -n "$on_write" ]] && eval "$on_write"
+    return $rc
+}
+
+# Read the frame record into _TTY_FRAME_STATE, _TTY_FRAME_SEQ, _TTY_FRAME_PID
+_tty_frame_owner() {
+    local key value
+    _TTY_FRAME_STATE="" _TTY_FRAME_SEQ="" _TTY_FRAME_PID=""
+    [[ -f "$1" ]] || return 1
+    while IFS='=' read -r key value; do
+        case "$key" in
+            state) _TTY_FRAME_STATE="$value" ;;
+            seq) _TTY_FRAME_SEQ="$value" ;;
+            pid) _TTY_FRAME_PID="$value" ;;
+        esac
+    done < "$1"
+}
+
+# === BOUNDED WRITES ===
+
+# Write one frame, giving up after TAVS_TTY_WRITE_TIMEOUT seconds
+# The writer (a process substitution) reports its pid, writes, then reports
+# the result; the caller waits for the result with `read -t`.
+# Usage: _tty_frame_write data   → returns 1 if failed or dropped
+_tty_frame_write() {
+    local data="$1" timeout="${TAVS_TTY_WRITE_TIMEOUT:-0.25}"
+    if [[ "$timeout" == "0" ]]; then
+        printf '%s' "$data" > "$TTY_DEVICE" 2>/dev/null
+        return
+    fi
+    local drops="${TAVS_TMP_DIR:-/tmp/tavs}/frame.${TTY_DEVICE//\//_}.drops"
+    if [[ -f "$drops" ]]; then
+        tty_frame_drops "$TTY_DEVICE"
+        util_now
+        if [[ $_TTY_DROP_UNTIL -gt $_UTIL_NOW ]]; then
+            _tty_frame_drop "$drops" skipped
+            return 1
+        fi
+    fi
+    # read -t takes whole seconds before bash 4
+    [[ "${BASH_VERSINFO[0]:-4}" -lt 4 ]] && timeout=1
+
+    local pid="" status=""
+    exec 9< <(
+        echo "${BASHPID:-$(sh -c 'echo $PPID')}"
+        printf '%s' "$data" > "$TTY_DEVICE" 2>/dev/null && echo ok || echo failed
+    )
+    read -r -u 9 pid
+    if read -r -t "$timeout" -u 9 status; then
+        exec 9<&-
+        [[ "$status" == "ok" ]]
+        return
+    fi
+    exec 9<&-
+    [[ -n "$pid" ]] && kill "$pid" 2>/dev/null
+    _tty_frame_drop "$drops" timeouts
+    return 1
+}
+
+# Set _TTY_DROP_TIMEOUTS, _TTY_DROP_SKIPPED, _TTY_DROP_LAST, _TTY_DROP_UNTIL
+# Usage: tty_frame_drops tty_device
+tty_frame_drops() {
+    local file="${TAVS_TMP_DIR:-/tmp/tavs}/frame.${1//\//_}.drops" key value
+    _TTY_DROP_TIMEOUTS=0 _TTY_DROP_SKIPPED=0 _TTY_DROP_LAST=0 _TTY_DROP_UNTIL=0
+    [[ -f "$file" ]] || return 1
+    while IFS='=' read -r key value; do
+        [[ "$value" =~ ^[0-9]+$ ]] || continue
+        case "$key" in
+            timeouts) _TTY_DROP_TIMEOUTS="$value" ;;
+            skipped) _TTY_DROP_SKIPPED="$value" ;;
+            last) _TTY_DROP_LAST="$value" ;;
+            until) _TTY_DROP_UNTIL="$value" ;;
+        esac
+    done < "$file"
+    return 0
+}
+
+# Count a dropped frame; a timeout also starts the backoff window
+# Usage: _tty_frame_drop drops_file timeouts|skipped
+_tty_frame_drop() {
+    local file="$1" kind="$2"
+    tty_frame_drops "$TTY_DEVICE"
+    util_now
+    _TTY_DROP_LAST="$_UTIL_NOW"
+    if [[ "$kind" == "timeouts" ]]; then
+        _TTY_DROP_TIMEOUTS=$((_TTY_DROP_TIMEOUTS + 1))
+        _TTY_DROP_UNTIL=$((_UTIL_NOW + ${TAVS_TTY_WRITE_BACKOFF:-5}))
+    else
+        _TTY_DROP_SKIPPED=$((_TTY_DROP_SKIPPED + 1))
+    fi
+    [[ "${DEBUG_ALL:-0}" == "1" ]] && \
+        echo "[TAVS] TTY write dropped ($kind): $TTY_DEVICE" >&2
+
+    util_tmpfile "$file"
+    printf 'timeouts=%s\nskipped=%s\nlast=%s\nuntil=%s\n' \
+        "$_TTY_DROP_TIMEOUTS" "$_TTY_DROP_SKIPPED" "$_TTY_DROP_LAST" "$_TTY_DROP_UNTIL" \
+        > "$_UTIL_TMPFILE" 2>/dev/null &&
+        mv -f "$_UTIL_TMPFILE" "$file" 2>/dev/null ||
+        rm -f "$_UTIL_TMPFILE" 2>/dev/null
+}
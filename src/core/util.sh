@@ -0,0 +1,189 @@
+#!/bin/bash
+# ==============================================================================
+# TAVS - Terminal Agent Visual Signals — Builtin Utilities
+# ==============================================================================
+# Fork-free replacements for the small external commands the hook path used
+# to spawn: `tr` for case conversion and control-char stripping, `date +%s`,
+# `cat`, `cksum` and `mktemp`. Each helper sets a result variable instead of
+# printing, so callers avoid the command substitution subshell as well.
+#
+# Every helper picks the fastest form the running shell supports and falls
+# back to the external command on old shells (bash 3.2 on macOS):
+#   case conversion  ${var^^} (bash 4+) / ${(U)var} (zsh) → tr
+#   epoch seconds    EPOCHSECONDS (bash 5+) → printf %(%s)T (bash 4.2+) → date
+#   epoch millis     EPOCHREALTIME (bash 5+) → gdate → perl → date × 1000
+#   string hash      table-driven CRC (bash) → cksum (zsh)
+#
+# Public functions:
+#   util_upper()       - Set _UTIL_UPPER to the uppercased argument
+#   util_lower()       - Set _UTIL_LOWER to the lowercased argument
+#   util_strip_ctrl()  - Set _UTIL_STRIPPED to the argument without control chars
+#   util_now()         - Set _UTIL_NOW (epoch seconds)
+#   util_now_ms()      - Set _UTIL_NOW_MS (epoch milliseconds)
+#   util_read_file()   - Set _UTIL_FILE to a file's contents (like $(cat file))
+#   util_hash()        - Set _UTIL_HASH to the POSIX cksum CRC of the argument
+#   util_tmpfile()     - Set _UTIL_TMPFILE to a unique temp name next to a file
+#
+# Dependencies: none (safe to source from bash 3.2+ and zsh)
+# ==============================================================================
+
+_TAVS_UTIL_LOADED=1
+
+# ==============================================================================
+# CASE CONVERSION
+# ==============================================================================
+
+if [[ -n "${ZSH_VERSION:-}" ]]; then
+    util_upper() { _UTIL_UPPER="${(U)1}"; }
+    util_lower() { _UTIL_LOWER="${(L)1}"; }
+elif [[ "${BASH_VERSINFO[0]:-0}" -ge 4 ]]; then
+    util_upper() { _UTIL_UPPER="${1^^}"; }
+    util_lower() { _UTIL_LOWER="${1,,}"; }
+else
+    # Bash 3.2: no case modification operators
+    util_upper() { _UTIL_UPPER=$(printf '%s' "$1" | tr '[:lower:]' '[:upper:]'); }
+    util_lower() { _UTIL_LOWER=$(printf '%s' "$1" | tr '[:upper:]' '[:lower:]'); }
+fi
+
+# Remove ASCII control characters (0x00-0x1f and 0x7f)
+# Usage: util_strip_ctrl "text"   → sets _UTIL_STRIPPED
+util_strip_ctrl() {
+    local LC_ALL=C
+    _UTIL_STRIPPED="${1//[[:cntrl:]]/}"
+}
+
+# ==============================================================================
+# TIME
+# ==============================================================================
+
+# Set _UTIL_NOW to the current epoch seconds
+util_now() {
+    _UTIL_NOW="${EPOCHSECONDS:-}"
+    if [[ -z "$_UTIL_NOW" ]]; then
+        printf -v _UTIL_NOW '%(%s)T' -1 2>/dev/null || _UTIL_NOW=""
+        [[ "$_UTIL_NOW" =~ ^[0-9]+$ ]] || _UTIL_NOW=$(date +%s)
+    fi
+}
+
+# Set _UTIL_NOW_MS to the current epoch milliseconds
+util_now_ms() {
+    local us="${EPOCHREALTIME:-}"
+    if [[ -n "$us" ]]; then
+        # "seconds.micros" (decimal separator follows the locale)
+        us="${us/[.,]/}"
+        _UTIL_NOW_MS=$((10#$us / 1000))
+    elif command -v gdate &>/dev/null; then
+        _UTIL_NOW_MS=$(gdate +%s%3N)
+    elif command -v perl &>/dev/null; then
+        _UTIL_NOW_MS=$(perl -MTime::HiRes=time -e 'printf "%.0f\n", time*1000')
+    else
+        # Fallback: seconds * 1000 (loses millisecond precision)
+        util_now
+        _UTIL_NOW_MS=$((_UTIL_NOW * 1000))
+    fi
+}
+
+# ==============================================================================
+# FILES
+# ==============================================================================
+
+# Read a whole file, trailing newlines removed (same result as $(cat file))
+# Usage: util_read_file path   → sets _UTIL_FILE, returns 1 if unreadable
+util_read_file() {
+    _UTIL_FILE=""
+    [[ -r "$1" && -f "$1" ]] || return 1
+    IFS= read -r -d '' _UTIL_FILE < "$1"
+    while [[ "$_UTIL_FILE" == *$'\n' ]]; do
+        _UTIL_FILE="${_UTIL_FILE%$'\n'}"
+    done
+    return 0
+}
+
+# Unique temp file name next to a target, for write + mv atomic updates.
+# Unlike mktemp the file is not created; the name is unique per process
+# (pid, per-call sequence, random suffix), which is all a same-directory
+# rename needs.
+# Usage: util_tmpfile path   → sets _UTIL_TMPFILE
+_UTIL_TMP_SEQ=0
+util_tmpfile() {
+    _UTIL_TMP_SEQ=$((_UTIL_TMP_SEQ + 1))
+    _UTIL_TMPFILE="${1}.tmp.${BASHPID:-$$}.${_UTIL_TMP_SEQ}${RANDOM}"
+}
+
+# ==============================================================================
+# HASHING
+# ==============================================================================
+
+# Stable numeric hash, identical to the first field of `printf %s str | cksum`
+# so existing registry keys keep their values.
+# Usage: util_hash "string"   → sets _UTIL_HASH
+if [[ -n "${ZSH_VERSION:-}" ]]; then
+    util_hash() {
+        _UTIL_HASH=$(printf '%s' "$1" | cksum)
+        _UTIL_HASH="${_UTIL_HASH%% *}"
+    }
+else
+    # CRC-32 lookup table for the POSIX polynomial 0x04C11DB7 (MSB first)
+    _UTIL_CRC_TABLE=(
+    0 79764919 159529838 222504665 319059676 398814059
+    445009330 507990021 638119352 583659535 797628118 726387553
+    890018660 835552979 1015980042 944750013 1276238704 1221641927
+    1167319070 1095957929 1595256236 1540665371 1452775106 1381403509
+    1780037320 1859660671 1671105958 1733955601 2031960084 2111593891
+    1889500026 1952343757 2552477408 2632100695 2443283854 2506133561
+    2334638140 2414271883 2191915858 2254759653 3190512472 3135915759
+    3081330742 3009969537 2905550212 2850959411 2762807018 2691435357
+    3560074640 3505614887 3719321342 3648080713 3342211916 3287746299
+    3467911202 3396681109 4063920168 4143685023 4223187782 4286162673
+    3779000052 3858754371 3904687514 3967668269 881225847 809987520
+    1023691545 969234094 662832811 591600412 771767749 717299826
+    311336399 374308984 453813921 533576470 25881363 88864420
+    134795389 214552010 2023205639 2086057648 1897238633 1976864222
+    1804852699 1867694188 1645340341 1724971778 1587496639 1516133128
+    1461550545 1406951526 1302016099 1230646740 1142491917 1087903418
+    2896545431 2825181984 2770861561 2716262478 3215044683 3143675388
+    3055782693 3001194130 2326604591 2389456536 2200899649 2280525302
+    2578013683 2640855108 2418763421 2498394922 3769900519 3832873040
+    3912640137 3992402750 4088425275 4151408268 4197601365 4277358050
+    3334271071 3263032808 3476998961 3422541446 3585640067 3514407732
+    3694837229 3640369242 1762451694 1842216281 1619975040 1682949687
+    2047383090 2127137669 1938468188 2001449195 1325665622 1271206113
+    1183200824 1111960463 1543535498 1489069629 1434599652 1363369299
+    622672798 568075817 748617968 677256519 907627842 853037301
+    1067152940 995781531 51762726 131386257 177728840 240578815
+    269590778 349224269 429104020 491947555 4046411278 4126034873
+    4172115296 4234965207 3794477266 3874110821 3953728444 4016571915
+    3609705398 3555108353 3735388376 3664026991 3290680682 3236090077
+    3449943556 3378572211 3174993278 3120533705 3032266256 2961025959
+    2923101090 2868635157 2813903052 2742672763 2604032198 2683796849
+    2461293480 2524268063 2284983834 2364738477 2175806836 2238787779
+    1569362073 1498123566 1409854455 1355396672 1317987909 1246755826
+    1192025387 1137557660 2072149281 2135122070 1912620623 1992383480
+    1753615357 1816598090 1627664531 1707420964 295390185 358241886
+    404320391 483945776 43990325 106832002 186451547 266083308
+    932423249 861060070 1041341759 986742920 613929101 542559546
+    756411363 701822548 3316196985 3244833742 3425377559 3370778784
+    3601682597 3530312978 3744426955 3689838204 3819031489 3881883254
+    3928223919 4007849240 4037393693 4100235434 4180117107 4259748804
+    2310601993 2373574846 2151335527 2231098320 2596047829 2659030626
+    2470359227 2550115596 2947551409 2876312838 2788305887 2733848168
+    3165939309 3094707162 3040238851 2985771188
+    )
+
+    util_hash() {
+        local LC_ALL=C
+        local str="$1" crc=0 i len byte
+        len=${#str}
+        for (( i = 0; i < len; i++ )); do
+            printf -v byte '%d' "'${str:i:1}"
+            (( byte < 0 )) && byte=$((byte + 256))
+            crc=$(( ((crc << 8) & 0xFFFFFFFF) ^ _UTIL_CRC_TABLE[((crc >> 24) ^ byte) & 0xFF] ))
+        done
+        # cksum appends the length, least significant byte first
+        while (( len > 0 )); do
+            crc=$(( ((crc << 8) & 0xFFFFFFFF) ^ _UTIL_CRC_TABLE[((crc >> 24) ^ len) & 0xFF] ))
+            len=$((len >> 8))
+        done
+        _UTIL_HASH=$(( ~crc & 0xFFFFFFFF ))
+    }
+fi
@@ -23,7 +23,9 @@ NC='\033[0m' # No Color
 REPO_ROOT="$( cd "$( dirname "${BASH_SOURCE[0]}" )/../.." && pwd )"
 CODEX_CONFIG_DIR="$HOME/.codex"
 CONFIG_FILE="$CODEX_CONFIG_DIR/config.toml"
-TRIGGER_SCRIPT="$REPO_ROOT/src/agents/codex/trigger.sh"
+# tavs install passes the bundle it built (or the modular trigger)
+TRIGGER_SCRIPT="${TAVS_TRIGGER_SCRIPT:-$REPO_ROOT/src/agents/codex/trigger.bundle.sh}"
+[[ -f "$TRIGGER_SCRIPT" ]] || TRIGGER_SCRIPT="$REPO_ROOT/src/agents/codex/trigger.sh"
 
 echo -e "${BLUE}=== TAVS - Terminal Agent Visual Signals - Codex CLI Installer ===${NC}"
 echo -e "Repository: $REPO_ROOT"
@@ -72,7 +74,7 @@ fi
 # Check if notify is already configured
 NOTIFY_LINE="notify = [\"bash\", \"-lc\", \"$TRIGGER_SCRIPT complete\"]"
 
-if echo "$EXISTING_CONFIG" | grep -q "tavs.*trigger.sh"; then
+if echo "$EXISTING_CONFIG" | grep -qE "tavs.*trigger(\.bundle)?\.sh"; then
     echo -e "${GREEN}✓ Visual signals already configured in $CONFIG_FILE${NC}"
     echo ""
     echo "Current notify configuration:"
@@ -21,6 +21,8 @@ NC='\033[0m' # No Color
 
 # Paths
 REPO_ROOT="$( cd "$( dirname "${BASH_SOURCE[0]}" )/../.." && pwd )"
+# tavs install passes the bundle it built (or the modular trigger)
+TRIGGER_SCRIPT="${TAVS_TRIGGER_SCRIPT:-}"
 GEMINI_CONFIG_DIR="$HOME/.gemini"
 SETTINGS_FILE="$GEMINI_CONFIG_DIR/settings.json"
 HOOKS_SOURCE="$REPO_ROOT/src/agents/gemini/hooks.json"
@@ -43,13 +45,17 @@ fi
 
 # Python script to handle JSON safely
 PYTHON_SCRIPT=$(cat <<'END_PYTHON'
-import sys, json, os, shutil, tempfile
+import sys, json, os, re, shutil, tempfile
 
 target_file = sys.argv[1]
 new_hooks_file = sys.argv[2]
 placeholder = sys.argv[3]
 repo_path = sys.argv[4]
 mode = sys.argv[5]
+trigger_path = sys.argv[6] if len(sys.argv) > 6 else ''
+
+# A TAVS hook at another trigger path (modular, repo bundle, installed bundle)
+tavs_trigger_re = re.compile(r'\S*/gemini/trigger(?:\.bundle)?\.sh(?=\s|$)')
 
 try:
     # 1. Load Existing Settings
@@ -67,6 +73,9 @@ try:
     # 2. Load New Hooks Template
     with open(new_hooks_file, 'r') as f:
         content = f.read().replace(placeholder, repo_path)
+        if trigger_path:
+            content = content.replace(
+                repo_path + '/src/agents/gemini/trigger.bundle.sh', trigger_path)
         new_data = json.loads(content)
         new_hooks_map = new_data.get('hooks', {})
 
@@ -96,17 +105,21 @@ try:
                 new_cmd = new_hook.get('command', '')
 
             is_duplicate = False
+            new_key = tavs_trigger_re.sub('TRIGGER', new_cmd)
 
-            # Check for duplicates
+            # Check for duplicates; point TAVS hooks at the new trigger path
             for existing in existing_hooks_section[event]:
                 existing_inner = existing.get('hooks', [])
-                if existing_inner:
-                    existing_cmd = existing_inner[0].get('command', '')
-                else:
-                    existing_cmd = existing.get('command', '')
+                holder = existing_inner[0] if existing_inner else existing
+                existing_cmd = holder.get('command', '')
                 if existing_cmd == new_cmd:
                     is_duplicate = True
                     break
+                if new_key != new_cmd and tavs_trigger_re.sub('TRIGGER', existing_cmd) == new_key:
+                    holder['command'] = new_cmd
+                    is_duplicate = True
+                    changes_log.append(f"  [~] {event}: Updated trigger path")
+                    break
 
             if not is_duplicate:
                 existing_hooks_section[event].insert(0, new_hook)
@@ -161,7 +174,7 @@ echo -e "${CYAN}Analyzing changes...${NC}"
 echo ""
 
 # 1. PREVIEW
-output=$(python3 -c "$PYTHON_SCRIPT" "$SETTINGS_FILE" "$HOOKS_SOURCE" '${GEMINI_EXTENSION_ROOT}' "$REPO_ROOT" "preview" 2>&1)
+output=$(python3 -c "$PYTHON_SCRIPT" "$SETTINGS_FILE" "$HOOKS_SOURCE" '${GEMINI_EXTENSION_ROOT}' "$REPO_ROOT" "preview" "$TRIGGER_SCRIPT" 2>&1)
 
 if [[ "$output" == *"Python Error:"* ]] || [[ "$output" == *"Error:"* ]]; then
     echo -e "${RED}$output${NC}"
@@ -181,7 +194,7 @@ read -p "Apply these changes? [y/N] " response
 
 if [[ "$response" =~ ^[yY] ]]; then
     # 3. APPLY
-    python3 -c "$PYTHON_SCRIPT" "$SETTINGS_FILE" "$HOOKS_SOURCE" '${GEMINI_EXTENSION_ROOT}' "$REPO_ROOT" "apply"
+    python3 -c "$PYTHON_SCRIPT" "$SETTINGS_FILE" "$HOOKS_SOURCE" '${GEMINI_EXTENSION_ROOT}' "$REPO_ROOT" "apply" "$TRIGGER_SCRIPT"
     echo ""
     echo -e "${GREEN}✓ Gemini CLI visual signals installed!${NC}"
     echo ""
@@ -588,6 +588,87 @@ if [[ -f "$STATE_FILE" ]]; then
     assert_eq "Overwritten model=Opus" "Opus" "$_model"
 fi
 
+# ==============================================================================
+echo -e "${YELLOW}=== Test: Unchanged payload skips the write ===${NC}"
+# ==============================================================================
+
+_read_ts() {
+    local k v ts=""
+    while IFS='=' read -r k v; do
+        [[ "$k" == "ts" ]] && ts="$v"
+    done < "$1"
+    echo "$ts"
+}
+
+rm -f "$TEST_DIR"/context.*
+STATE_FILE="$TEST_DIR/context._dev_ttys999"
+printf '%s' "$FULL_JSON" | \
+    _TAVS_BRIDGE_STATE_DIR="$TEST_DIR" \
+    _TAVS_BRIDGE_TTY_SAFE="_dev_ttys999" \
+    _TAVS_BRIDGE_NOW=1000000 \
+    bash "$BRIDGE_SCRIPT" 2>/dev/null || true
+assert_eq "Initial write ts" "1000000" "$(_read_ts "$STATE_FILE")"
+
+# Same payload 5s later — within refresh interval, file untouched
+printf '%s' "$FULL_JSON" | \
+    _TAVS_BRIDGE_STATE_DIR="$TEST_DIR" \
+    _TAVS_BRIDGE_TTY_SAFE="_dev_ttys999" \
+    _TAVS_BRIDGE_NOW=1000005 \
+    bash "$BRIDGE_SCRIPT" 2>/dev/null || true
+assert_eq "Unchanged payload keeps ts" "1000000" "$(_read_ts "$STATE_FILE")"
+
+# Same payload past the refresh interval — ts refreshed
+printf '%s' "$FULL_JSON" | \
+    _TAVS_BRIDGE_STATE_DIR="$TEST_DIR" \
+    _TAVS_BRIDGE_TTY_SAFE="_dev_ttys999" \
+    _TAVS_BRIDGE_NOW=1000012 \
+    bash "$BRIDGE_SCRIPT" 2>/dev/null || true
+assert_eq "Unchanged payload refreshes stale ts" "1000012" "$(_read_ts "$STATE_FILE")"
+
+# Changed payload within the interval — written immediately
+printf '%s' '{"context_window":{"used_percentage":73}}' | \
+    _TAVS_BRIDGE_STATE_DIR="$TEST_DIR" \
+    _TAVS_BRIDGE_TTY_SAFE="_dev_ttys999" \
+    _TAVS_BRIDGE_NOW=1000013 \
+    bash "$BRIDGE_SCRIPT" 2>/dev/null || true
+assert_eq "Changed payload writes immediately" "1000013" "$(_read_ts "$STATE_FILE")"
+
+# No temp files left behind
+_leftover=""
+for _f in "$TEST_DIR"/*.tmp.*; do
+    [[ -e "$_f" ]] && _leftover="$_f"
+done
+assert_empty "No temp files left behind" "$_leftover"
+
+# ==============================================================================
+echo -e "${YELLOW}=== Test: TTY resolution cached per session ===${NC}"
+# ==============================================================================
+
+# Pre-seed the cache for the session in the payload (_dev_null stands in for
+# a TTY device that exists)
+rm -f "$TEST_DIR"/context.* "$TEST_DIR/bridge-tty.cache"
+printf '%s\n' "other-session=_dev_other" "sess-1=_dev_null" > "$TEST_DIR/bridge-tty.cache"
+cp "$TEST_DIR/bridge-tty.cache" "$TEST_DIR/cache.before"
+printf '%s' '{"session_id":"sess-1","context_window":{"used_percentage":12}}' > "$TEST_DIR/payload.json"
+_TAVS_BRIDGE_STATE_DIR="$TEST_DIR" bash "$BRIDGE_SCRIPT" < "$TEST_DIR/payload.json" 2>/dev/null || true
+assert_file_exists "Cached TTY used for state file" "$TEST_DIR/context._dev_null"
+assert_eq "Cache hit leaves the cache file alone" \
+    "$(cat "$TEST_DIR/cache.before")" "$(cat "$TEST_DIR/bridge-tty.cache")"
+
+# An entry whose device is gone is not trusted
+rm -f "$TEST_DIR"/context.*
+printf '%s\n' "sess-1=_dev_ttysgone" > "$TEST_DIR/bridge-tty.cache"
+_TAVS_BRIDGE_STATE_DIR="$TEST_DIR" bash "$BRIDGE_SCRIPT" < "$TEST_DIR/payload.json" 2>/dev/null || true
+assert_file_not_exists "Entry for a missing device ignored" "$TEST_DIR/context._dev_ttysgone"
+
+# Entries are not keyed on the (reusable) parent PID
+rm -f "$TEST_DIR"/context.*
+printf '%s\n' "$$=_dev_null" > "$TEST_DIR/bridge-tty.cache"
+printf '%s' '{"context_window":{"used_percentage":12}}' > "$TEST_DIR/payload.json"
+_TAVS_BRIDGE_STATE_DIR="$TEST_DIR" bash "$BRIDGE_SCRIPT" < "$TEST_DIR/payload.json" 2>/dev/null || true
+assert_file_not_exists "PPID entry not used" "$TEST_DIR/context._dev_null"
+rm -f "$TEST_DIR/payload.json" "$TEST_DIR/bridge-tty.cache" "$TEST_DIR/cache.before"
+
 # ==============================================================================
 # RESULTS
 # ==============================================================================
@@ -0,0 +1,262 @@
+"""
+Tests for src/core/backgrounds.sh - Image resolution index and Kitty applier.
+
+Verifies:
+- Index lookups resolve the same paths as the fallback chain
+- Adding an image to a chain directory invalidates the index
+- A changed STYLISH_SINGLE_IMAGE invalidates the index
+- Without config-snapshot.sh the chain is walked directly
+- Kitty requests return immediately, coalesce to the latest image,
+  skip the image already shown and use the listen_on socket
+- tavs backgrounds build renders content-addressed variants and the hook
+  picks the smallest one covering the terminal size
+"""
+
+import os
+import subprocess
+import time
+import pytest
+from conftest import run_bash, PROJECT_ROOT
+
+
+SOURCES = (
+    f'source "{PROJECT_ROOT}/src/core/theme-config-loader.sh" && '
+    f'source "{PROJECT_ROOT}/src/core/backgrounds.sh" && '
+    f'source "{PROJECT_ROOT}/src/core/config-snapshot.sh"'
+)
+
+
+@pytest.fixture
+def bg_env(tmp_path):
+    """Isolated HOME, global backgrounds dir and snapshot directory."""
+    env = os.environ.copy()
+    env['HOME'] = str(tmp_path / 'home')
+    env['TAVS_SNAPSHOT_DIR'] = str(tmp_path / 'snapshot')
+    env['TAVS_AGENT'] = 'unknown'
+    env['STYLISH_BACKGROUNDS_DIR'] = str(tmp_path / 'global')
+    env['STYLISH_SINGLE_IMAGE'] = ''
+    os.makedirs(tmp_path / 'global' / 'dark')
+    os.makedirs(tmp_path / 'home')
+    return env
+
+
+def _lookup(env, mode='dark', state='processing', sources=SOURCES):
+    # defaults.conf (sourced by the loader) overrides env, so set after it
+    result = run_bash(
+        f'{sources} && '
+        f'STYLISH_BACKGROUNDS_DIR="{env["STYLISH_BACKGROUNDS_DIR"]}"; '
+        f'STYLISH_SINGLE_IMAGE="{env["STYLISH_SINGLE_IMAGE"]}"; '
+        f'if lookup_background_image {mode} {state}; then '
+        'echo "hit:$_BG_IMAGE_PATH"; else '
+        f'_resolve_background_image {mode} {state}.png; '
+        'echo "miss:$_BG_IMAGE_PATH"; fi', env=env)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+
+def _age_index(env):
+    """Backdate the index so a directory change is strictly newer."""
+    index = os.path.join(env['TAVS_SNAPSHOT_DIR'], 'images', 'unknown.idx')
+    past = time.time() - 60
+    os.utime(index, (past, past))
+
+
+class TestIndexLookup:
+    """Test lookup_background_image against the fallback chain."""
+
+    def test_lookup_matches_chain(self, bg_env, tmp_path):
+        image = tmp_path / 'global' / 'dark' / 'processing.png'
+        image.write_bytes(b'png')
+        assert _lookup(bg_env) == f'hit:{image}'
+        assert os.path.isfile(os.path.join(
+            bg_env['TAVS_SNAPSHOT_DIR'], 'images', 'unknown.idx'))
+        assert _lookup(bg_env, state='complete') == 'hit:'
+
+    def test_new_image_invalidates_index(self, bg_env, tmp_path):
+        default = tmp_path / 'global' / 'default.png'
+        default.write_bytes(b'png')
+        assert _lookup(bg_env) == f'hit:{default}'
+        _age_index(bg_env)
+
+        user_dir = tmp_path / 'home' / '.tavs' / 'agents' / 'unknown' / \
+            'backgrounds'
+        os.makedirs(user_dir)
+        (user_dir / 'processing.png').write_bytes(b'png')
+        assert _lookup(bg_env) == f'hit:{user_dir}/processing.png'
+
+    def test_single_image_change_invalidates_index(self, bg_env, tmp_path):
+        assert _lookup(bg_env) == 'hit:'
+        single = tmp_path / 'single.png'
+        single.write_bytes(b'png')
+        bg_env['STYLISH_SINGLE_IMAGE'] = str(single)
+        assert _lookup(bg_env) == f'hit:{single}'
+
+    def test_without_snapshot_module_walks_chain(self, bg_env, tmp_path):
+        image = tmp_path / 'global' / 'dark' / 'idle.png'
+        image.write_bytes(b'png')
+        sources = f'source "{PROJECT_ROOT}/src/core/backgrounds.sh"'
+        assert _lookup(bg_env, state='idle', sources=sources) == \
+            f'miss:{image}'
+
+    def test_packaged_image_path_is_absolute(self, bg_env):
+        bg_env['TAVS_AGENT'] = 'claude'
+        expected = os.path.join(PROJECT_ROOT, 'src', 'agents', 'claude',
+                                'data', 'backgrounds', 'light', 'complete.png')
+        assert _lookup(bg_env, mode='light', state='complete') == \
+            f'hit:{expected}'
+
+
+FAKE_KITTEN = """#!/bin/bash
+printf '%s\\n' "$*" >> "$KITTEN_LOG"
+sleep 0.5
+"""
+
+
+@pytest.fixture
+def kitty_env(tmp_path):
+    """Fake `kitten` on PATH that logs its arguments slowly."""
+    env = os.environ.copy()
+    bin_dir = tmp_path / 'bin'
+    os.makedirs(bin_dir)
+    kitten = bin_dir / 'kitten'
+    kitten.write_text(FAKE_KITTEN)
+    kitten.chmod(0o755)
+    env['PATH'] = f'{bin_dir}:{env["PATH"]}'
+    env['KITTEN_LOG'] = str(tmp_path / 'kitten.log')
+    env['TAVS_TMP_DIR'] = str(tmp_path / 'tavs')
+    env['TTY_SAFE'] = '_dev_pts_9'
+    env.pop('KITTY_LISTEN_ON', None)
+    env.pop('KITTY_REMOTE_SOCKET', None)
+    for name in ('a.png', 'b.png', 'c.png'):
+        (tmp_path / name).write_bytes(b'png')
+    return env
+
+
+def _wait_idle(tmp_path, timeout=15):
+    lock = tmp_path / 'tavs' / 'kitty-bg._dev_pts_9.lock'
+    deadline = time.time() + timeout
+    while lock.exists() and time.time() < deadline:
+        time.sleep(0.05)
+    assert not lock.exists()
+
+
+def _kitten_calls(tmp_path):
+    log = tmp_path / 'kitten.log'
+    return log.read_text().splitlines() if log.exists() else []
+
+
+class TestKittyApplier:
+    """Test the asynchronous latest-wins Kitty applier."""
+
+    def test_requests_coalesce_to_latest(self, kitty_env, tmp_path):
+        start = time.time()
+        result = run_bash(
+            f'source "{PROJECT_ROOT}/src/core/backgrounds.sh" && '
+            f'_set_bg_image_kitty "{tmp_path}/a.png" && '
+            f'_set_bg_image_kitty "{tmp_path}/b.png" && '
+            f'_set_bg_image_kitty "{tmp_path}/c.png"', env=kitty_env)
+        assert result.returncode == 0, result.stderr
+        assert time.time() - start < 0.5
+
+        _wait_idle(tmp_path)
+        calls = _kitten_calls(tmp_path)
+        assert calls[-1].endswith(f'{tmp_path}/c.png')
+        # Whatever was in flight, at most one more call lands: the latest
+        assert len(calls) <= 2
+        current = tmp_path / 'tavs' / 'kitty-bg._dev_pts_9.current'
+        assert current.read_text() == f'{tmp_path}/c.png\n'
+
+    def test_current_image_is_skipped(self, kitty_env, tmp_path):
+        cmd = (f'source "{PROJECT_ROOT}/src/core/backgrounds.sh" && '
+               f'_set_bg_image_kitty "{tmp_path}/a.png"')
+        run_bash(cmd, env=kitty_env)
+        _wait_idle(tmp_path)
+        run_bash(cmd, env=kitty_env)
+        _wait_idle(tmp_path)
+        assert len(_kitten_calls(tmp_path)) == 1
+
+    def test_listen_socket_is_used(self, kitty_env, tmp_path):
+        kitty_env['KITTY_LISTEN_ON'] = 'unix:/tmp/kitty-test'
+        run_bash(f'source "{PROJECT_ROOT}/src/core/backgrounds.sh" && '
+                 '_clear_bg_image_kitty', env=kitty_env)
+        _wait_idle(tmp_path)
+        assert _kitten_calls(tmp_path) == [
+            '@ --to unix:/tmp/kitty-test set-background-image none']
+
+
+FAKE_MAGICK = """#!/bin/bash
+printf '%s\\n' "$*" >> "$MAGICK_LOG"
+cp "$1" "${@: -1}"
+"""
+
+
+@pytest.fixture
+def build_env(tmp_path):
+    """Fake ImageMagick, isolated HOME and prerender cache."""
+    env = os.environ.copy()
+    bin_dir = tmp_path / 'bin'
+    os.makedirs(bin_dir)
+    magick = bin_dir / 'magick'
+    magick.write_text(FAKE_MAGICK)
+    magick.chmod(0o755)
+    env['PATH'] = f'{bin_dir}:{env["PATH"]}'
+    env['MAGICK_LOG'] = str(tmp_path / 'magick.log')
+    env['HOME'] = str(tmp_path / 'home')
+    env['TAVS_PRERENDER_DIR'] = str(tmp_path / 'prerender')
+    os.makedirs(tmp_path / 'home')
+    return env
+
+
+def _build(env, *args):
+    return subprocess.run(
+        [os.path.join(PROJECT_ROOT, 'tavs'), 'backgrounds', 'build',
+         '--sizes', '1280x800 2560x1600', '--jobs', '2', *args],
+        capture_output=True, text=True, env=env, timeout=60,
+        stdin=subprocess.DEVNULL)
+
+
+class TestPrerender:
+    """Test tavs backgrounds build and variant selection."""
+
+    def test_build_is_content_addressed(self, build_env, tmp_path):
+        result = _build(build_env)
+        assert result.returncode == 0, result.stderr
+        calls = (tmp_path / 'magick.log').read_text().splitlines()
+        variants = [f for f in os.listdir(tmp_path / 'prerender')
+                    if f.endswith('.png')]
+        # One render per distinct (content, size); reruns hit the cache
+        assert len(variants) == len(calls)
+        assert all('-resize' in c and '-extent' in c for c in calls)
+
+        result = _build(build_env)
+        assert result.returncode == 0, result.stderr
+        assert len((tmp_path / 'magick.log').read_text().splitlines()) == \
+            len(calls)
+
+    @pytest.mark.parametrize('target,size', [
+        ('1280x800', '1280x800'),
+        ('1440x900', '2560x1600'),
+        ('', '2560x1600'),
+        ('5000x3000', '2560x1600'),
+    ])
+    def test_hook_picks_closest_variant(self, build_env, target, size):
+        assert _build(build_env).returncode == 0
+        src = os.path.join(PROJECT_ROOT, 'src', 'agents', 'claude', 'data',
+                           'backgrounds', 'dark', 'processing.png')
+        result = run_bash(
+            f'source "{PROJECT_ROOT}/src/core/backgrounds.sh" && '
+            f'STYLISH_PRERENDER_TARGET="{target}" '
+            f'_prerendered_background_image "{src}"; echo "$_BG_IMAGE_PATH"',
+            env=build_env)
+        chosen = result.stdout.strip()
+        assert chosen.startswith(build_env['TAVS_PRERENDER_DIR'])
+        assert chosen.endswith(f'-{size}.png')
+
+    def test_missing_variant_keeps_source(self, build_env, tmp_path):
+        src = tmp_path / 'art.png'
+        src.write_bytes(b'png')
+        result = run_bash(
+            f'source "{PROJECT_ROOT}/src/core/backgrounds.sh" && '
+            f'_prerendered_background_image "{src}"; echo "$_BG_IMAGE_PATH"',
+            env=build_env)
+        assert result.stdout.strip() == str(src)
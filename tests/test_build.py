@@ -0,0 +1,110 @@
+"""
+Tests for src/cli/cmd-build.sh - Single-file trigger bundles.
+
+Verifies:
+- The committed bundles match their sources (tavs build --check)
+- Bundles carry no comments and no per-module directory subshells
+- A bundle writes the same bytes to the TTY as the modular trigger
+- A bundle built outside the tree runs its own re-runs (tool_error return)
+"""
+
+import os
+import subprocess
+import time
+import pytest
+from conftest import PROJECT_ROOT
+
+
+AGENTS = ('claude', 'gemini', 'codex')
+
+
+def _bundle(agent):
+    return os.path.join(PROJECT_ROOT, 'src', 'agents', agent,
+                        'trigger.bundle.sh')
+
+
+class TestBundleFiles:
+    """Test the generated files on disk."""
+
+    def test_bundles_are_current(self):
+        result = subprocess.run(
+            [os.path.join(PROJECT_ROOT, 'tavs'), 'build', '--check'],
+            capture_output=True, text=True, timeout=60)
+        assert result.returncode == 0, \
+            f"Run './tavs build' and commit the bundles:\n{result.stdout}"
+
+    @pytest.mark.parametrize('agent', AGENTS)
+    def test_bundle_is_stripped(self, agent):
+        with open(_bundle(agent)) as f:
+            lines = f.read().splitlines()
+        body = lines[3:]  # shebang + "generated" notice
+        assert not [l for l in body if l.lstrip().startswith('#')]
+        assert not [l for l in body if not l.strip()]
+        assert not [l for l in body if 'dirname "${BASH_SOURCE' in l]
+        assert os.access(_bundle(agent), os.X_OK)
+
+
+def _env(tmp_path):
+    return {
+        'PATH': os.environ['PATH'],
+        'HOME': str(tmp_path / 'home'),
+        'TAVS_TMP_DIR': str(tmp_path / 'tavs'),
+        'TTY_DEVICE': str(tmp_path / 'tty'),
+        'TERM': 'xterm-256color',
+        'ENABLE_ANTHROPOMORPHISING': 'false',
+        'TAVS_IDENTITY_MODE': 'off',
+    }
+
+
+def _capture_tty(script, state, tmp_path):
+    """Run a trigger with TTY_DEVICE on a regular file and return its bytes."""
+    os.makedirs(tmp_path / 'home' / '.tavs')
+    # No latency budget: shedding under load would change the title
+    (tmp_path / 'home' / '.tavs' / 'user.conf').write_text(
+        'TAVS_LATENCY_BUDGET_MS=0\n')
+    result = subprocess.run(['bash', script, state], env=_env(tmp_path),
+                            capture_output=True, stdin=subprocess.DEVNULL,
+                            timeout=20)
+    tty = tmp_path / 'tty'
+    output = tty.read_bytes() if tty.exists() else b''
+    return result.returncode, output.replace(str(tmp_path).encode(), b'TMP')
+
+
+class TestBundleBehaviour:
+    """Test that the bundle behaves like the modular trigger."""
+
+    @pytest.mark.parametrize('state', ['processing', 'permission', 'reset'])
+    def test_same_tty_output(self, state, tmp_path):
+        modular = _capture_tty(
+            os.path.join(PROJECT_ROOT, 'src', 'agents', 'claude', 'trigger.sh'),
+            state, tmp_path / 'a')
+        bundled = _capture_tty(_bundle('claude'), state, tmp_path / 'b')
+        assert modular[0] == bundled[0] == 0
+        assert modular[1]
+        assert bundled[1] == modular[1]
+
+    def test_rerun_goes_through_bundle(self, tmp_path):
+        """tool_error returns to processing through the bundle, not src/core."""
+        out = tmp_path / 'bundles'
+        result = subprocess.run(
+            ['bash', '-c', f'TAVS_ROOT="{PROJECT_ROOT}" '
+             f'CLI_DIR="{PROJECT_ROOT}/src/cli"; '
+             'source "$CLI_DIR/cmd-build.sh" && '
+             f'build_trigger_bundles --quiet --out "{out}" --root claude'],
+            capture_output=True, text=True, timeout=60)
+        assert result.returncode == 0, result.stdout + result.stderr
+        bundle = out / 'claude' / 'trigger.bundle.sh'
+        assert f'_TAVS_TRIGGER={bundle}' in bundle.read_text()
+
+        os.makedirs(tmp_path / 'home')
+        result = subprocess.run(['bash', str(bundle), 'tool_error'],
+                                env=_env(tmp_path), capture_output=True,
+                                stdin=subprocess.DEVNULL, timeout=20)
+        assert result.returncode == 0, result.stderr
+        # The return runs 1.5s later; record what it is invoked with
+        marker = tmp_path / 'rerun'
+        bundle.write_text(f'#!/bin/bash\necho "$_TAVS_RERUN $*" > "{marker}"\n')
+        deadline = time.time() + 10
+        while not marker.exists() and time.time() < deadline:
+            time.sleep(0.1)
+        assert marker.read_text().strip() == '1 processing'
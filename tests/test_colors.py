@@ -10,6 +10,7 @@ Validates:
 - shift_hue() hue rotation
 - interpolate_color() and interpolate_hsl() blending
 - adjust_lightness() and adjust_saturation() modifications
+- The persisted color LUT ignores malformed lines and is trimmed by replacement
 
 These functions are critical for dynamic theming and stage color interpolation.
 All calculations use integer arithmetic scaled by 1000 for precision.
@@ -395,6 +396,98 @@ class TestCalculateStateColors:
             assert len(color) == 7
 
 
+class TestResultVariableVariants:
+    """Test fork-free *_into variants and the memoized color LUT."""
+
+    def test_shift_hue_into_matches_shift_hue(self):
+        """shift_hue_into should produce the same color as shift_hue."""
+        rc, stdout, _ = source_colors_and_run(
+            'TAVS_COLOR_LUT_FILE=""; shift_hue_into out "#473D2F" 120; '
+            'echo "$out $(shift_hue "#473D2F" 120)"'
+        )
+        assert rc == 0
+        into, echoed = stdout.split()
+        assert into == echoed
+
+    def test_interpolate_hsl_into_matches_interpolate_hsl(self):
+        """interpolate_hsl_into should produce the same color as interpolate_hsl."""
+        rc, stdout, _ = source_colors_and_run(
+            'TAVS_COLOR_LUT_FILE=""; interpolate_hsl_into out "#473D2F" "#2E3440" 400; '
+            'echo "$out $(interpolate_hsl "#473D2F" "#2E3440" 400)"'
+        )
+        assert rc == 0
+        into, echoed = stdout.split()
+        assert into == echoed
+
+    def test_lut_persists_across_processes(self, tmp_path):
+        """A computed color should be persisted and reused by the next process."""
+        lut = tmp_path / "color-lut"
+        rc, stdout, _ = source_colors_and_run(
+            f'TAVS_COLOR_LUT_FILE="{lut}"; shift_hue "#2E3440" 30'
+        )
+        assert rc == 0
+        assert f"shift:#2E3440:30={stdout}" in lut.read_text()
+
+        # Seeded entry is served from the LUT without recomputation
+        lut.write_text("shift:#2E3440:30=#ABCDEF\n")
+        rc, stdout, _ = source_colors_and_run(
+            f'TAVS_COLOR_LUT_FILE="{lut}"; shift_hue "#2E3440" 30'
+        )
+        assert stdout == "#ABCDEF"
+
+    def test_lut_ignores_malformed_lines(self, tmp_path):
+        """Only key=#RRGGBB lines of the shared LUT file are served."""
+        lut = tmp_path / "color-lut"
+        rc, computed, _ = source_colors_and_run(
+            'TAVS_COLOR_LUT_FILE=""; shift_hue "#2E3440" 30'
+        )
+        for bad in ("shift:#2E3440:30=#ABC\n",
+                    "shift:#2E3440:30=$(touch pwned)\n",
+                    "shift:#2E3440:30=#ABCDEF"):
+            lut.write_text("shift:#473D2F:30=#123456\n" + bad)
+            rc, stdout, _ = source_colors_and_run(
+                f'TAVS_COLOR_LUT_FILE="{lut}"; echo "$(shift_hue "#2E3440" 30)"; '
+                'shift_hue "#473D2F" 30'
+            )
+            assert rc == 0
+            assert stdout.split() == [computed, "#123456"], bad
+
+    def test_lut_trim_replaces_file(self, tmp_path):
+        """Trimming writes a new file instead of truncating the shared one."""
+        lut = tmp_path / "color-lut"
+        lut.write_text("shift:#000001:1=#000001\nshift:#000002:1=#000002\n")
+        inode = lut.stat().st_ino
+        rc, _, _ = source_colors_and_run(
+            f'TAVS_COLOR_LUT_FILE="{lut}"; _COLOR_LUT_MAX_ENTRIES=2; '
+            'shift_hue "#2E3440" 30 >/dev/null'
+        )
+        assert rc == 0
+        assert lut.read_text().startswith("shift:#2E3440:30=#")
+        assert lut.read_text().count("\n") == 1
+        assert lut.stat().st_ino != inode
+        assert list(tmp_path.iterdir()) == [lut]
+
+    def test_calculate_color_set_batch(self):
+        """calculate_color_set should set 7 state colors and 7 stage colors."""
+        rc, stdout, _ = source_colors_and_run(
+            'TAVS_COLOR_LUT_FILE=""; calculate_color_set "#2E3440"; '
+            'echo "$COLOR_SET_PROCESSING $COLOR_SET_PERMISSION $COLOR_SET_COMPLETE '
+            '$COLOR_SET_IDLE $COLOR_SET_COMPACTING $COLOR_SET_SUBAGENT $COLOR_SET_TOOL_ERROR"; '
+            'echo "$COLOR_SET_STAGE_0 $COLOR_SET_STAGE_1 $COLOR_SET_STAGE_2 $COLOR_SET_STAGE_3 '
+            '$COLOR_SET_STAGE_4 $COLOR_SET_STAGE_5 $COLOR_SET_STAGE_6"; '
+            'echo "$(shift_hue "#2E3440" 30) $(interpolate_hsl "$COLOR_SET_IDLE" "#2E3440" 200)"'
+        )
+        assert rc == 0
+        states, stages, expected = [line.split() for line in stdout.splitlines()]
+        assert len(states) == 7
+        assert len(stages) == 7
+        assert states[0] == expected[0]
+        assert stages[0] == states[2]  # complete
+        assert stages[1] == states[3]  # idle
+        assert stages[2] == expected[1]
+        assert stages[6] == "reset"
+
+
 class TestColorsSelfTest:
     """Run the built-in self-test in colors.sh."""
 
@@ -0,0 +1,183 @@
+"""
+Tests for src/core/config-snapshot.sh - Precompiled OSC bundles.
+
+Verifies:
+- compile_config_snapshot writes bundles for every variant
+- Bundle bytes match the live palette + background sequences
+- snapshot_is_fresh goes stale when a config source is newer
+- emit_osc_bundle reports a miss so callers fall back to the live path
+- The signals manifest and per-TTY bundle record for in-process emitters
+"""
+
+import os
+import time
+import pytest
+from conftest import run_bash, PROJECT_ROOT
+
+
+SOURCES = (
+    f'source "{PROJECT_ROOT}/src/core/theme-config-loader.sh" && '
+    f'source "{PROJECT_ROOT}/src/core/terminal-osc-sequences.sh" && '
+    f'source "{PROJECT_ROOT}/src/core/config-snapshot.sh"'
+)
+
+
+@pytest.fixture
+def snapshot_env(tmp_path):
+    """Environment with an isolated HOME and snapshot directory."""
+    env = os.environ.copy()
+    env['HOME'] = str(tmp_path / 'home')
+    env['TAVS_SNAPSHOT_DIR'] = str(tmp_path / 'snapshot')
+    os.makedirs(env['HOME'])
+    return env
+
+
+def _compile(env, agent='claude'):
+    return run_bash(f'{SOURCES} && compile_config_snapshot {agent}',
+                    env=env, timeout=30)
+
+
+class TestCompile:
+    """Test compile_config_snapshot output layout."""
+
+    def test_compile_writes_all_variants(self, snapshot_env):
+        result = _compile(snapshot_env)
+        assert result.returncode == 0, result.stderr
+
+        root = os.path.join(snapshot_env['TAVS_SNAPSHOT_DIR'], 'osc', 'claude')
+        variants = sorted(d for d in os.listdir(root)
+                          if os.path.isdir(os.path.join(root, d)))
+        assert variants == ['dark', 'light', 'muted-dark', 'muted-light']
+        for variant in variants:
+            files = os.listdir(os.path.join(root, variant))
+            assert 'reset.bg' in files and 'reset.pal' in files
+            assert any(f.startswith('processing-') and f.endswith('.pal')
+                       for f in files)
+        assert os.path.isfile(os.path.join(root, 'stamp'))
+
+    def test_bundle_matches_live_sequence(self, snapshot_env):
+        assert _compile(snapshot_env).returncode == 0
+
+        result = run_bash(
+            f'{SOURCES} && load_agent_config claude && '
+            'TTY_DEVICE=/dev/stdout; '
+            'send_osc_palette dark; send_osc_bg "$COLOR_PROCESSING"; '
+            'printf "|"; '
+            'emit_osc_bundle processing "$COLOR_PROCESSING" true',
+            env=snapshot_env)
+        assert result.returncode == 0, result.stderr
+        live, bundle = result.stdout.split('|')
+        assert bundle.startswith('\033]4;')
+        assert bundle == live
+
+    def test_bg_bundle_is_plain_osc11(self, snapshot_env):
+        assert _compile(snapshot_env).returncode == 0
+
+        result = run_bash(
+            f'{SOURCES} && load_agent_config claude && '
+            'TTY_DEVICE=/dev/stdout emit_osc_bundle complete "$COLOR_COMPLETE"'
+            ' && printf "|%s" "$COLOR_COMPLETE"',
+            env=snapshot_env)
+        assert result.returncode == 0, result.stderr
+        seq, color = result.stdout.split('|')
+        assert seq == f'\033]11;{color}\033\\'
+
+
+class TestFreshness:
+    """Test snapshot staleness detection."""
+
+    def test_missing_snapshot_is_stale(self, snapshot_env):
+        result = run_bash(f'{SOURCES} && snapshot_is_fresh', env=snapshot_env)
+        assert result.returncode == 1
+
+    def test_newer_user_config_is_stale(self, snapshot_env):
+        assert _compile(snapshot_env).returncode == 0
+        result = run_bash(f'{SOURCES} && snapshot_is_fresh claude',
+                          env=snapshot_env)
+        assert result.returncode == 0
+
+        stamp = os.path.join(snapshot_env['TAVS_SNAPSHOT_DIR'],
+                             'osc', 'claude', 'stamp')
+        past = time.time() - 60
+        os.utime(stamp, (past, past))
+        user_dir = os.path.join(snapshot_env['HOME'], '.tavs')
+        os.makedirs(user_dir)
+        with open(os.path.join(user_dir, 'user.conf'), 'w') as f:
+            f.write('STATE_GRACE_PERIOD_MS=400\n')
+
+        result = run_bash(f'{SOURCES} && snapshot_is_fresh claude',
+                          env=snapshot_env)
+        assert result.returncode == 1
+
+
+class TestEmitMiss:
+    """Test emit_osc_bundle fallback signalling."""
+
+    def test_unknown_color_is_a_miss(self, snapshot_env):
+        assert _compile(snapshot_env).returncode == 0
+        result = run_bash(
+            f'{SOURCES} && load_agent_config claude && '
+            'TTY_DEVICE=/dev/stdout emit_osc_bundle processing "#123456"',
+            env=snapshot_env)
+        assert result.returncode == 1
+        assert result.stdout == ''
+
+    def test_disabled_snapshot_is_a_miss(self, snapshot_env):
+        assert _compile(snapshot_env).returncode == 0
+        result = run_bash(
+            f'{SOURCES} && load_agent_config claude && '
+            'ENABLE_CONFIG_SNAPSHOT=false TTY_DEVICE=/dev/stdout '
+            'emit_osc_bundle complete "$COLOR_COMPLETE"',
+            env=snapshot_env)
+        assert result.returncode == 1
+        assert result.stdout == ''
+
+
+def _signals(env, agent='claude', variant='dark'):
+    path = os.path.join(env['TAVS_SNAPSHOT_DIR'], 'osc', agent, variant, 'signals')
+    with open(path) as f:
+        return [line.split('=', 1) for line in f.read().splitlines()]
+
+
+class TestSignals:
+    """Test the manifest and TTY record read by the OpenCode plugin."""
+
+    def test_manifest(self, snapshot_env):
+        assert _compile(snapshot_env).returncode == 0
+        entries = _signals(snapshot_env)
+        values = dict(entries)
+        # Default title mode skips processing only; other states get titles
+        assert len(values['processing']) == 6
+        assert values['complete'] == '-' and values['permission'] == '-'
+        assert values['grace_ms'] == '400' and values['journal'] == 'false'
+        sources = [v for k, v in entries if k == 'source']
+        assert any(s.endswith('defaults.conf') for s in sources)
+
+    def test_title_mode_full_needs_the_shell(self, snapshot_env):
+        user_dir = os.path.join(snapshot_env['HOME'], '.tavs')
+        os.makedirs(user_dir)
+        with open(os.path.join(user_dir, 'user.conf'), 'w') as f:
+            f.write('TAVS_TITLE_MODE="full"\nSTATE_GRACE_PERIOD_MS=1500\n')
+        assert _compile(snapshot_env).returncode == 0
+        values = dict(_signals(snapshot_env))
+        assert values['processing'] == '-'
+        assert values['grace_ms'] == '1500'  # Same grace period as the shell
+
+    def test_tty_record(self, snapshot_env, tmp_path):
+        assert _compile(snapshot_env).returncode == 0
+        snapshot_env['TAVS_TMP_DIR'] = str(tmp_path / 'tavs')
+        os.makedirs(tmp_path / 'tavs')
+        record = tmp_path / 'tavs' / 'osc._dev_null'
+        result = run_bash(
+            f'{SOURCES} && load_agent_config claude && '
+            'TTY_DEVICE=/dev/null TTY_SAFE=_dev_null '
+            'emit_osc_bundle processing "$COLOR_PROCESSING" true',
+            env=snapshot_env)
+        assert result.returncode == 0, result.stderr
+        dark = os.path.join(snapshot_env['TAVS_SNAPSHOT_DIR'], 'osc', 'claude', 'dark')
+        assert record.read_text() == f'dir={dark}\nkind=pal\n'
+
+        result = run_bash(f'{SOURCES} && TTY_SAFE=_dev_null snapshot_forget_tty',
+                          env=snapshot_env)
+        assert result.returncode == 0
+        assert not record.exists()
@@ -0,0 +1,101 @@
+"""
+Tests for src/core/debug-log.sh - One-line debug records with rotation.
+
+Verifies:
+- A record is one line with time, pid, event and quoted key=value pairs
+- Values with newlines stay on one line
+- Payloads are truncated to TAVS_DEBUG_PAYLOAD_MAX
+- A log past TAVS_DEBUG_LOG_MAX_KB is rotated, keeping TAVS_DEBUG_LOG_KEEP copies
+- DEBUG_ALL=1 trigger runs append to trigger.log instead of a file per hook
+"""
+
+import os
+import subprocess
+import pytest
+from conftest import run_bash, PROJECT_ROOT
+
+
+SOURCE = f'source "{PROJECT_ROOT}/src/core/debug-log.sh"'
+
+
+@pytest.fixture
+def log_env(tmp_path):
+    env = os.environ.copy()
+    env['TAVS_TMP_DIR'] = str(tmp_path / 'tavs')
+    env['LOG'] = str(tmp_path / 'tavs' / 'debug' / 'test.log')
+    return env
+
+
+def _lines(tmp_path, name='test.log'):
+    return (tmp_path / 'tavs' / 'debug' / name).read_text().splitlines()
+
+
+class TestRecord:
+    """Test debug_log record format."""
+
+    def test_one_line_record(self, log_env, tmp_path):
+        result = run_bash(
+            f'{SOURCE} && debug_log "$LOG" invocation state=processing '
+            '"pwd=/a b" "title=x\ny"', env=log_env)
+        assert result.returncode == 0, result.stderr
+        lines = _lines(tmp_path)
+        assert len(lines) == 1
+        fields = lines[0].split(' ', 3)
+        assert fields[1].isdigit() and fields[2] == 'invocation'
+        assert 'state=processing' in fields[3]
+        assert "pwd=/a\\ b" in fields[3]
+        assert "title=$'x\\ny'" in fields[3]
+
+    def test_records_append(self, log_env, tmp_path):
+        run_bash(f'{SOURCE} && debug_log "$LOG" a && debug_log "$LOG" b',
+                 env=log_env)
+        assert [l.split()[2] for l in _lines(tmp_path)] == ['a', 'b']
+
+    def test_payload_truncated(self, log_env, tmp_path):
+        log_env['TAVS_DEBUG_PAYLOAD_MAX'] = '10'
+        run_bash(f'{SOURCE} && debug_log "$LOG" hook "payload=$(printf "%050d" 0)"',
+                 env=log_env)
+        record = _lines(tmp_path)[0]
+        assert 'payload=0000000000...\\(+40\\ bytes\\)' in record
+
+
+class TestRotation:
+    """Test size-capped rotation."""
+
+    def test_rotates_past_limit(self, log_env, tmp_path):
+        log_env.update({'TAVS_DEBUG_LOG_MAX_KB': '1', 'TAVS_DEBUG_LOG_KEEP': '2'})
+        result = run_bash(
+            f'{SOURCE} && mkdir -p "${{LOG%/*}}" && for i in 1 2 3; do '
+            'printf "%02000d\\n" 0 > "$LOG" && _debug_log_rotate "$LOG"; done && '
+            'debug_log "$LOG" after', env=log_env)
+        assert result.returncode == 0, result.stderr
+        names = sorted(os.listdir(tmp_path / 'tavs' / 'debug'))
+        assert names == ['test.log', 'test.log.1', 'test.log.2']
+        assert _lines(tmp_path)[0].split()[2] == 'after'
+
+    def test_small_log_kept(self, log_env, tmp_path):
+        run_bash(f'{SOURCE} && debug_log "$LOG" a && _debug_log_rotate "$LOG"',
+                 env=log_env)
+        assert os.listdir(tmp_path / 'tavs' / 'debug') == ['test.log']
+
+
+class TestTriggerLogging:
+    """Test DEBUG_ALL=1 through trigger.sh."""
+
+    def test_invocation_record(self, log_env, tmp_path):
+        os.makedirs(tmp_path / 'home' / '.tavs')
+        (tmp_path / 'home' / '.tavs' / 'user.conf').write_text('DEBUG_ALL="1"\n')
+        log_env.update({
+            'HOME': str(tmp_path / 'home'), 'TTY_DEVICE': str(tmp_path / 'tty'),
+            'TERM': 'xterm-256color', 'TAVS_IDENTITY_MODE': 'off',
+            '_TAVS_HOOK_PAYLOAD': '{"hook_event_name": "PreToolUse"}',
+        })
+        subprocess.run(['bash', f'{PROJECT_ROOT}/src/core/trigger.sh', 'permission'],
+                       env=log_env, stdin=subprocess.DEVNULL, capture_output=True,
+                       timeout=20, check=True)
+        names = os.listdir(tmp_path / 'tavs' / 'debug')
+        assert 'trigger.log' in names
+        assert not [n for n in names if n.endswith('-permission.log')]
+        records = _lines(tmp_path, 'trigger.log')
+        assert len(records) == 1
+        assert 'state=permission' in records[0] and 'PreToolUse' in records[0]
@@ -0,0 +1,112 @@
+"""
+Tests for the git repo cache in src/core/dir-icon.sh.
+
+Verifies:
+- Worktree and git-root resolution match git's answers
+- A revisited cwd costs zero git invocations
+- Non-git directories never invoke git
+- A changed .git entry invalidates the cached answer
+"""
+
+import os
+import shutil
+import subprocess
+import time
+import pytest
+from conftest import run_bash, PROJECT_ROOT
+
+
+SOURCES = (
+    f'source "{PROJECT_ROOT}/src/core/spinner.sh" && '
+    f'source "{PROJECT_ROOT}/src/core/dir-icon.sh"'
+)
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None,
+                                reason='git not installed')
+
+
+def _git(*args, cwd):
+    subprocess.run(['git', *args], cwd=cwd, check=True,
+                   capture_output=True)
+
+
+@pytest.fixture
+def repo_env(tmp_path):
+    """Main repo with one linked worktree and a logging git wrapper."""
+    main = tmp_path / 'main'
+    os.makedirs(main / 'sub')
+    _git('init', '-q', cwd=main)
+    (main / 'file').write_text('x\n')
+    _git('add', 'file', cwd=main)
+    _git('-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-qm', 'init',
+         cwd=main)
+    _git('worktree', 'add', '-q', str(tmp_path / 'wt'), cwd=main)
+
+    bin_dir = tmp_path / 'bin'
+    os.makedirs(bin_dir)
+    wrapper = bin_dir / 'git'
+    wrapper.write_text(
+        '#!/bin/bash\n'
+        f'echo "$*" >> "{tmp_path}/git.log"\n'
+        f'exec {shutil.which("git")} "$@"\n')
+    wrapper.chmod(0o755)
+
+    env = os.environ.copy()
+    env['PATH'] = f'{bin_dir}:{env["PATH"]}'
+    env['HOME'] = str(tmp_path / 'home')
+    env.pop('XDG_RUNTIME_DIR', None)
+    os.makedirs(tmp_path / 'home')
+    return env
+
+
+def _git_calls(tmp_path):
+    log = tmp_path / 'git.log'
+    return len(log.read_text().splitlines()) if log.exists() else 0
+
+
+class TestGitRepoCache:
+    """Test _git_repo_info and its callers."""
+
+    def test_worktree_detected(self, repo_env, tmp_path):
+        result = run_bash(f'{SOURCES} && _detect_worktree "{tmp_path}/wt"',
+                          env=repo_env)
+        assert result.returncode == 0
+        main, wt = result.stdout.split('\t')
+        assert os.path.samefile(main, tmp_path / 'main')
+        assert os.path.samefile(wt, tmp_path / 'wt')
+
+    def test_git_root_mode(self, repo_env, tmp_path):
+        result = run_bash(
+            f'{SOURCES} && TAVS_DIR_IDENTITY_SOURCE=git-root '
+            f'_resolve_dir_identity "{tmp_path}/main/sub"', env=repo_env)
+        assert os.path.samefile(result.stdout, tmp_path / 'main')
+
+    def test_revisit_costs_no_git_calls(self, repo_env, tmp_path):
+        cmd = (f'{SOURCES} && _detect_worktree "{tmp_path}/wt"; '
+               f'_detect_worktree "{tmp_path}/main/sub"; true')
+        run_bash(cmd, env=repo_env)
+        first = _git_calls(tmp_path)
+        assert first == 2
+
+        result = run_bash(cmd, env=repo_env)
+        assert result.returncode == 0
+        assert _git_calls(tmp_path) == first
+
+    def test_non_git_dir_skips_git(self, repo_env, tmp_path):
+        plain = tmp_path / 'plain'
+        os.makedirs(plain)
+        result = run_bash(f'{SOURCES} && _git_repo_info "{plain}"',
+                          env=repo_env)
+        assert result.returncode == 1
+        assert _git_calls(tmp_path) == 0
+
+    def test_changed_git_entry_invalidates(self, repo_env, tmp_path):
+        plain = tmp_path / 'plain'
+        os.makedirs(plain)
+        cmd = f'{SOURCES} && _git_repo_info "{plain}"; echo "rc=$?"'
+        assert run_bash(cmd, env=repo_env).stdout.strip() == 'rc=1'
+
+        time.sleep(0.01)
+        _git('init', '-q', cwd=plain)
+        assert run_bash(cmd, env=repo_env).stdout.strip() == 'rc=0'
+        assert _git_calls(tmp_path) == 1
@@ -0,0 +1,132 @@
+"""
+Tests for src/core/event-dedup.sh - Early exit for repeated events.
+
+Verifies:
+- A repeated processing/permission/compacting event writes nothing to the TTY
+- A different state, permission mode or subagent count runs the full trigger
+- new-prompt, TAVS_DEDUP_WINDOW=0 and expired records are never deduped
+- A repeat after a deferred event was applied late still runs
+- A deduped event sources no module besides util.sh, metrics.sh and event-dedup.sh
+"""
+
+import os
+import subprocess
+import time
+import pytest
+from conftest import run_bash, PROJECT_ROOT
+
+
+TRIGGER = os.path.join(PROJECT_ROOT, 'src', 'core', 'trigger.sh')
+
+
+@pytest.fixture
+def dedup_env(tmp_path):
+    """Isolated HOME/TAVS_TMP_DIR with a regular file as the TTY."""
+    os.makedirs(tmp_path / 'home' / '.tavs')
+    env = {
+        'PATH': os.environ['PATH'],
+        'HOME': str(tmp_path / 'home'),
+        'TAVS_TMP_DIR': str(tmp_path / 'tavs'),
+        'TTY_DEVICE': str(tmp_path / 'tty'),
+        'TERM': 'xterm-256color',
+        'TAVS_AGENT': 'claude',
+        'TAVS_PERMISSION_MODE': 'default',
+        'TAVS_IDENTITY_MODE': 'off',
+    }
+    return env
+
+
+def _fire(env, tmp_path, *args):
+    """Run the core trigger; return True if it wrote to the TTY."""
+    tty = tmp_path / 'tty'
+    if tty.exists():
+        tty.unlink()
+    result = subprocess.run(['bash', TRIGGER, *args], env=env,
+                            capture_output=True, stdin=subprocess.DEVNULL,
+                            timeout=20)
+    assert result.returncode == 0, result.stderr
+    return tty.exists()
+
+
+def _user_conf(tmp_path, text):
+    (tmp_path / 'home' / '.tavs' / 'user.conf').write_text(text)
+
+
+class TestDedup:
+    """Test the fast path through trigger.sh."""
+
+    @pytest.mark.parametrize('state', ['processing', 'permission', 'compacting'])
+    def test_repeat_is_dropped(self, dedup_env, tmp_path, state):
+        assert _fire(dedup_env, tmp_path, state)
+        assert not _fire(dedup_env, tmp_path, state)
+
+    def test_state_change_runs(self, dedup_env, tmp_path):
+        assert _fire(dedup_env, tmp_path, 'compacting')
+        assert _fire(dedup_env, tmp_path, 'permission')
+
+    def test_mode_change_runs(self, dedup_env, tmp_path):
+        assert _fire(dedup_env, tmp_path, 'processing')
+        dedup_env['TAVS_PERMISSION_MODE'] = 'plan'
+        assert _fire(dedup_env, tmp_path, 'processing')
+
+    def test_subagent_count_change_runs(self, dedup_env, tmp_path):
+        assert _fire(dedup_env, tmp_path, 'processing')
+        fp = (tmp_path / 'tavs' / f'fp.{str(tmp_path / "tty").replace("/", "_")}')
+        count_file = [l.split('=', 1)[1] for l in fp.read_text().splitlines()
+                      if l.startswith('count_file=')][0]
+        with open(count_file, 'w') as f:
+            f.write('2\n')
+        assert _fire(dedup_env, tmp_path, 'processing')
+
+    def test_new_prompt_never_dropped(self, dedup_env, tmp_path):
+        assert _fire(dedup_env, tmp_path, 'processing', 'new-prompt')
+        assert _fire(dedup_env, tmp_path, 'processing', 'new-prompt')
+
+    def test_window_zero_disables(self, dedup_env, tmp_path):
+        _user_conf(tmp_path, 'TAVS_DEDUP_WINDOW=0\n')
+        assert _fire(dedup_env, tmp_path, 'permission')
+        assert _fire(dedup_env, tmp_path, 'permission')
+
+    def test_expired_record_runs(self, dedup_env, tmp_path):
+        assert _fire(dedup_env, tmp_path, 'permission')
+        fp = next((tmp_path / 'tavs').glob('fp.*'))
+        text = fp.read_text()
+        fp.write_text('\n'.join('ts=0' if l.startswith('ts=') else l
+                                for l in text.splitlines()) + '\n')
+        assert _fire(dedup_env, tmp_path, 'permission')
+
+    def test_repeat_after_deferred_event_runs(self, dedup_env, tmp_path):
+        _user_conf(tmp_path, 'STATE_GRACE_PERIOD_MS=1000\n')
+        state_db = tmp_path / 'tavs' / 'state'
+        assert _fire(dedup_env, tmp_path, 'permission')
+        _fire(dedup_env, tmp_path, 'processing')  # Deferred, re-run later
+        deadline = time.time() + 5
+        while state_db.read_text().split()[1] != 'processing':
+            assert time.time() < deadline, 'deferred processing never applied'
+            time.sleep(0.1)
+        assert _fire(dedup_env, tmp_path, 'permission')
+        assert state_db.read_text().split()[1] == 'permission'
+
+    def test_session_key_without_tty_device(self, dedup_env, tmp_path):
+        del dedup_env['TTY_DEVICE']
+        dedup_env['TAVS_SESSION_ID'] = 'abc-123'
+        result = run_bash(
+            f'source "{PROJECT_ROOT}/src/core/event-dedup.sh" && '
+            '_event_dedup_init && echo "$_TAVS_DEDUP_FILE"', env=dedup_env)
+        assert result.stdout.strip() == str(tmp_path / 'tavs' / 'fp.s.abc-123')
+
+
+class TestFastPath:
+    """Test that a dropped event loads nothing else."""
+
+    def test_no_modules_sourced(self, dedup_env, tmp_path):
+        assert _fire(dedup_env, tmp_path, 'permission')
+        result = run_bash(
+            f'set -x; source "{TRIGGER}" permission',
+            env=dedup_env, timeout=20)
+        sourced = [l for l in result.stderr.splitlines()
+                   if l.startswith('++ source ')]
+        # util.sh, metrics.sh (counts the dropped event), event-dedup.sh
+        assert len(sourced) == 3, sourced
+        assert 'metrics.sh' in sourced[1]
+        assert 'event-dedup.sh' in sourced[-1]
@@ -0,0 +1,119 @@
+"""
+Tests for src/core/feature-backoff.sh - Negative cache for failing features.
+
+Verifies:
+- A feature is skipped only after FEATURE_BACKOFF_THRESHOLD failures
+- A success clears the entry; an expired window is retried
+- Kitty background images and iTerm2 title queries honour the backoff
+- tavs doctor --reset-caches clears the entries
+"""
+
+import os
+import subprocess
+import pytest
+from conftest import run_bash, PROJECT_ROOT
+
+
+SOURCE = f'source "{PROJECT_ROOT}/src/core/feature-backoff.sh"'
+
+
+@pytest.fixture
+def backoff_env(tmp_path):
+    """Isolated TAVS_TMP_DIR with a fixed TTY_SAFE."""
+    env = os.environ.copy()
+    env['HOME'] = str(tmp_path / 'home')
+    env['TAVS_TMP_DIR'] = str(tmp_path / 'tavs')
+    env['TAVS_SNAPSHOT_DIR'] = str(tmp_path / 'snapshot')
+    env['TTY_SAFE'] = '_dev_pts_7'
+    env['FEATURE_BACKOFF_THRESHOLD'] = '3'
+    env['FEATURE_BACKOFF_SECONDS'] = '600'
+    os.makedirs(tmp_path / 'home')
+    return env
+
+
+def _active(env):
+    result = run_bash(f'{SOURCE} && feature_backoff_active kitty_remote',
+                      env=env)
+    return result.returncode == 0
+
+
+class TestThreshold:
+    """Test the failure count and backoff window."""
+
+    def test_skips_after_threshold(self, backoff_env, tmp_path):
+        for expected in (False, False, True):
+            run_bash(f'{SOURCE} && record_feature_failure kitty_remote',
+                     env=backoff_env)
+            assert _active(backoff_env) is expected
+
+        entry = (tmp_path / 'tavs' / 'backoff._dev_pts_7').read_text()
+        failures, until = entry.strip().split('=')[1].split()
+        assert failures == '3' and int(until) > 0
+
+    def test_success_clears_entry(self, backoff_env, tmp_path):
+        run_bash(f'{SOURCE} && record_feature_failure kitty_remote && '
+                 'record_feature_failure iterm2_query && '
+                 'record_feature_success kitty_remote', env=backoff_env)
+        entry = (tmp_path / 'tavs' / 'backoff._dev_pts_7').read_text()
+        assert entry == 'iterm2_query=1 0\n'
+
+    def test_expired_window_is_retried(self, backoff_env, tmp_path):
+        os.makedirs(tmp_path / 'tavs')
+        (tmp_path / 'tavs' / 'backoff._dev_pts_7').write_text(
+            'kitty_remote=3 1\n')
+        assert _active(backoff_env) is False
+
+        run_bash(f'{SOURCE} && record_feature_failure kitty_remote',
+                 env=backoff_env)
+        assert _active(backoff_env) is True
+
+
+class TestIntegration:
+    """Test callers that consult the backoff."""
+
+    def test_kitty_images_skipped_while_backed_off(self, backoff_env,
+                                                   tmp_path):
+        os.makedirs(tmp_path / 'tavs')
+        (tmp_path / 'tavs' / 'backoff._dev_pts_7').write_text(
+            'kitty_remote=3 9999999999\n')
+        result = run_bash(
+            f'source "{PROJECT_ROOT}/src/core/terminal-detection.sh" && '
+            f'{SOURCE} && source "{PROJECT_ROOT}/src/core/backgrounds.sh" && '
+            'ENABLE_STYLISH_BACKGROUNDS=true; STYLISH_DISABLE_SSH=false; '
+            'load_terminal_caps; TAVS_CAP_TERMINAL=kitty; '
+            'TAVS_CAP_BG_IMAGES=true; supports_background_images; '
+            'echo "rc=$?"', env=backoff_env)
+        assert result.stdout.strip() == 'rc=1'
+
+    def test_iterm2_query_skipped_while_backed_off(self, backoff_env,
+                                                   tmp_path):
+        os.makedirs(tmp_path / 'tavs')
+        (tmp_path / 'tavs' / 'backoff._dev_pts_7').write_text(
+            'iterm2_query=3 9999999999\n')
+        tty = tmp_path / 'tty'
+        tty.write_text('')
+        backoff_env['TERM_PROGRAM'] = 'iTerm.app'
+        result = run_bash(
+            f'{SOURCE} && source "{PROJECT_ROOT}/src/core/title-iterm2.sh" && '
+            f'TTY_DEVICE="{tty}" iterm2_get_var session.name; echo "rc=$?"',
+            env=backoff_env)
+        assert result.stdout.strip() == 'rc=1'
+        assert tty.read_bytes() == b''
+
+
+class TestDoctor:
+    """Test tavs doctor --reset-caches."""
+
+    def test_reset_caches_clears_backoff(self, backoff_env, tmp_path):
+        tmp_dir = tmp_path / 'tavs'
+        os.makedirs(tmp_dir)
+        for name in ('backoff._dev_pts_7', 'caps._dev_pts_7',
+                     'termbg._dev_pts_7'):
+            (tmp_dir / name).write_text('x=1\n')
+        (tmp_dir / 'state').write_text('keep\n')
+
+        result = subprocess.run(
+            [os.path.join(PROJECT_ROOT, 'tavs'), 'doctor', '--reset-caches'],
+            capture_output=True, text=True, env=backoff_env, timeout=30)
+        assert result.returncode == 0, result.stderr
+        assert sorted(os.listdir(tmp_dir)) == ['state']
@@ -0,0 +1,150 @@
+"""
+Tests for src/cli/cmd-hooks.sh - Hook subscriptions generated from config.
+
+Verifies:
+- The default config subscribes every event of the template
+- Disabled states drop their events; new-prompt and session hooks stay
+- PostToolUse is narrowed to the compaction tool when only compacting needs it
+  and no PreCompact hook is subscribed
+- tavs set rewrites the hooks file of an installed plugin
+- tavs install claude writes it; a template restored by a plugin update is
+  reported until the hooks are regenerated
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import pytest
+from conftest import PROJECT_ROOT
+
+
+TAVS = os.path.join(PROJECT_ROOT, 'tavs')
+TEMPLATE = os.path.join(PROJECT_ROOT, 'hooks', 'hooks.json')
+
+
+@pytest.fixture
+def plugin_home(tmp_path):
+    """HOME with an installed plugin cache holding the full template."""
+    hooks_dir = (tmp_path / '.claude' / 'plugins' / 'cache' /
+                 'terminal-agent-visual-signals' / 'tavs' / '3.0.0' / 'hooks')
+    os.makedirs(hooks_dir)
+    shutil.copy(TEMPLATE, hooks_dir)
+    os.makedirs(tmp_path / '.tavs')
+    return tmp_path
+
+
+def _installed(home):
+    path = next(home.glob('.claude/plugins/cache/*/tavs/*/hooks/hooks.json'))
+    with open(path) as f:
+        return json.load(f)['hooks']
+
+
+def _tavs(home, *args):
+    env = dict(os.environ, HOME=str(home))
+    return subprocess.run([TAVS, *args], env=env, capture_output=True,
+                          text=True, timeout=60)
+
+
+def _write(home, conf):
+    (home / '.tavs' / 'user.conf').write_text(conf)
+    result = _tavs(home, 'hooks', '--write')
+    assert result.returncode == 0, result.stderr
+    return _installed(home)
+
+
+class TestGenerate:
+    """Test tavs hooks --write against user.conf settings."""
+
+    def test_defaults_keep_everything(self, plugin_home):
+        with open(TEMPLATE) as f:
+            template = json.load(f)['hooks']
+        assert _write(plugin_home, '') == template
+
+    def test_disabled_states_dropped(self, plugin_home):
+        hooks = _write(plugin_home, 'ENABLE_TOOL_ERROR="false"\n'
+                                    'ENABLE_SUBAGENT="false"\n'
+                                    'ENABLE_IDLE="false"\n')
+        assert 'PostToolUseFailure' not in hooks
+        assert 'SubagentStart' not in hooks and 'SubagentStop' not in hooks
+        assert [e['matcher'] for e in hooks['Notification']] == ['permission_prompt']
+        for event in ('UserPromptSubmit', 'Stop', 'SessionStart', 'SessionEnd'):
+            assert event in hooks
+
+    def test_post_tool_use_narrowed(self, plugin_home, tmp_path):
+        conf = ('ENABLE_PERMISSION="false"\n'
+                'ENABLE_BELL_PERMISSION="false"\n'
+                'ENABLE_MODE_AWARE_PROCESSING="false"\n')
+        # PreCompact compaction ends on any tool, so PostToolUse stays wide
+        hooks = _write(plugin_home, conf)
+        assert 'PermissionRequest' not in hooks
+        assert 'PreCompact' in hooks
+        assert hooks['PostToolUse'][0]['matcher'] == '*'
+
+        # Without PreCompact only the compaction tool needs PostToolUse
+        with open(TEMPLATE) as f:
+            template = json.load(f)
+        del template['hooks']['PreCompact']
+        (tmp_path / 'template.json').write_text(json.dumps(template))
+        env = dict(os.environ, HOME=str(plugin_home))
+        result = subprocess.run(
+            ['bash', '-c',
+             f'TAVS_ROOT="{PROJECT_ROOT}" CLI_DIR="{PROJECT_ROOT}/src/cli"; '
+             'source "$CLI_DIR/cmd-hooks.sh" && '
+             'hooks_generate "$0" "$1"',
+             str(tmp_path / 'template.json'), str(tmp_path / 'out.json')],
+            env=env, capture_output=True, text=True, timeout=60)
+        assert result.returncode == 0, result.stderr
+        with open(tmp_path / 'out.json') as f:
+            hooks = json.load(f)['hooks']
+        assert hooks['PostToolUse'][0]['matcher'] == \
+            hooks['PreToolUse'][0]['matcher']
+
+    def test_post_tool_use_dropped(self, plugin_home):
+        hooks = _write(plugin_home, 'ENABLE_PERMISSION="false"\n'
+                                    'ENABLE_BELL_PERMISSION="false"\n'
+                                    'ENABLE_MODE_AWARE_PROCESSING="false"\n'
+                                    'ENABLE_COMPACTING="false"\n')
+        assert 'PostToolUse' not in hooks and 'PreCompact' not in hooks
+        assert 'new-prompt' in hooks['UserPromptSubmit'][0]['hooks'][0]['command']
+
+
+class TestSet:
+    """Test regeneration on tavs set."""
+
+    def test_relevant_setting_regenerates(self, plugin_home):
+        result = _tavs(plugin_home, 'set', 'ENABLE_TOOL_ERROR', 'false')
+        assert result.returncode == 0, result.stderr
+        assert 'PostToolUseFailure' not in _installed(plugin_home)
+
+    def test_template_unchanged(self, plugin_home):
+        with open(TEMPLATE) as f:
+            before = f.read()
+        _tavs(plugin_home, 'set', 'ENABLE_SUBAGENT', 'false')
+        with open(TEMPLATE) as f:
+            assert f.read() == before
+
+
+class TestInstall:
+    """Test tavs install claude and detection of overwritten hook files."""
+
+    def test_install_generates(self, plugin_home):
+        (plugin_home / '.tavs' / 'user.conf').write_text('ENABLE_SUBAGENT="false"\n')
+        result = _tavs(plugin_home, 'install', 'claude')
+        assert result.returncode == 0, result.stderr
+        assert 'SubagentStart' not in _installed(plugin_home)
+
+    def test_install_without_plugin(self, tmp_path):
+        result = _tavs(tmp_path, 'install', 'claude')
+        assert result.returncode == 1
+        assert 'No plugin installation found' in result.stdout + result.stderr
+
+    def test_plugin_update_reported(self, plugin_home):
+        assert 'Not generated by TAVS' in _tavs(plugin_home, 'hooks').stdout
+        _tavs(plugin_home, 'install', 'claude')
+        assert 'Not generated by TAVS' not in _tavs(plugin_home, 'hooks').stdout
+        # A plugin update puts the full template back
+        path = next(plugin_home.glob('.claude/plugins/cache/*/tavs/*/hooks/hooks.json'))
+        with open(TEMPLATE) as src, open(path, 'w') as dst:
+            dst.write(src.read().replace('  ', ' '))
+        assert 'Not generated by TAVS' in _tavs(plugin_home, 'doctor').stdout
@@ -67,34 +67,24 @@ class TestIdleFaceKeyGeneration:
         assert "idle_" in result.stdout
 
 
-class TestIdleWorkerFdPattern:
-    """Test that idle worker uses >&3 file descriptor correctly."""
+class TestIdleWorkerTtyWrites:
+    """Test that idle worker writes through the bounded frame writer."""
 
-    def test_uses_fd3_for_color_writes(self):
-        """Color writes should use >&3 file descriptor."""
+    def test_writes_through_tty_frame(self):
+        """Color and title writes should go through tty_write frames."""
         result = run_bash(
-            'grep -E "printf.*>&3" src/core/idle-worker-background.sh | head -3'
+            'grep -E "tty_write .*\\]0;|tty_frame_flush" src/core/idle-worker-background.sh'
         )
 
-        assert result.returncode == 0
-        assert ">&3" in result.stdout
-
-    def test_uses_fd3_for_title_writes(self):
-        """Title writes should use >&3 file descriptor."""
-        result = run_bash(
-            'grep -E \'printf.*\\]0;.*>&3\' src/core/idle-worker-background.sh'
-        )
-
-        assert result.returncode == 0, "Title writes should use >&3"
+        assert result.returncode == 0, "Writes should use tty_write/tty_frame_flush"
 
-    def test_opens_fd3_to_tty(self):
-        """Worker should open fd 3 to tty device."""
+    def test_no_persistent_tty_fd(self):
+        """Worker should not hold a descriptor to the tty device."""
         result = run_bash(
-            'grep -E "exec 3>" src/core/idle-worker-background.sh'
+            'grep -E "exec 3>|>&3" src/core/idle-worker-background.sh'
         )
 
-        assert result.returncode == 0
-        assert 'exec 3>"$tty_device"' in result.stdout or "exec 3>" in result.stdout
+        assert result.returncode == 1, result.stdout
 
 
 class TestIdleWorkerFaceComposition:
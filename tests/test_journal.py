@@ -0,0 +1,128 @@
+"""
+Tests for src/core/journal.sh and tavs replay - Transition journal.
+
+Verifies:
+- Nothing is journaled by default
+- Each event appends one line with outcome, previous and new state
+- A deduped event is journaled without loading the session state
+- tavs replay re-drives a journal and captures what reaches the TTY
+"""
+
+import os
+import subprocess
+import pytest
+from conftest import run_bash, PROJECT_ROOT
+
+
+TRIGGER = os.path.join(PROJECT_ROOT, 'src', 'core', 'trigger.sh')
+
+
+@pytest.fixture
+def journal_env(tmp_path):
+    os.makedirs(tmp_path / 'home' / '.tavs')
+    (tmp_path / 'home' / '.tavs' / 'user.conf').write_text(
+        'ENABLE_JOURNAL="true"\nSTATE_GRACE_PERIOD_MS=5000\n')
+    return {
+        'PATH': os.environ['PATH'],
+        'HOME': str(tmp_path / 'home'),
+        'TAVS_TMP_DIR': str(tmp_path / 'tavs'),
+        'TTY_DEVICE': str(tmp_path / 'tty'),
+        'TERM': 'xterm-256color',
+        'TAVS_AGENT': 'claude',
+        'TAVS_IDENTITY_MODE': 'off',
+        'TAVS_SESSION_ID': 'abc123',
+    }
+
+
+def _fire(env, *args):
+    subprocess.run(['bash', TRIGGER, *args], env=env, capture_output=True,
+                   stdin=subprocess.DEVNULL, timeout=20, check=True)
+
+
+def _journal(tmp_path):
+    path = tmp_path / 'tavs' / 'journal' / 's.abc123.log'
+    return [dict(f.split('=', 1) for f in line.split())
+            for line in path.read_text().splitlines()]
+
+
+class TestJournal:
+    """Test the lines trigger runs append."""
+
+    def test_off_by_default(self, journal_env, tmp_path):
+        (tmp_path / 'home' / '.tavs' / 'user.conf').write_text('')
+        _fire(journal_env, 'permission')
+        assert not (tmp_path / 'tavs' / 'journal').exists()
+
+    def test_transitions(self, journal_env, tmp_path):
+        # The pinned grace period must be the one the trigger uses
+        grace = run_bash(
+            f'source "{PROJECT_ROOT}/src/core/theme-config-loader.sh" && '
+            f'source "{PROJECT_ROOT}/src/core/session-state.sh" && '
+            'echo "$STATE_GRACE_PERIOD_MS"', env=journal_env)
+        assert grace.stdout.strip() == '5000'
+        _fire(journal_env, 'processing', 'new-prompt')
+        _fire(journal_env, 'permission')
+        _fire(journal_env, 'processing')
+        entries = [e for e in _journal(tmp_path) if e['rerun'] == '0']
+        assert [(e['state'], e['arg'], e['outcome'], e['prev'], e['new'])
+                for e in entries] == [
+            ('processing', 'new-prompt', 'applied', '-', 'processing'),
+            ('permission', '-', 'applied', 'processing', 'permission'),
+            ('processing', '-', 'deferred', 'permission', 'permission'),
+        ]
+        assert all(e['agent'] == 'claude' and e['subagents'] == '0' for e in entries)
+        assert all(e['seq'].isdigit() for e in entries)
+
+    def test_dedup_journaled(self, journal_env, tmp_path):
+        _fire(journal_env, 'permission')
+        _fire(journal_env, 'permission')
+        last = _journal(tmp_path)[-1]
+        assert last['outcome'] == 'dedup' and last['prev'] == '-'
+
+
+class TestReplay:
+    """Test tavs replay."""
+
+    def test_replay_back_to_back(self, journal_env, tmp_path):
+        journal = tmp_path / 'session.log'
+        journal.write_text(
+            'seq=1000000 state=processing arg=new-prompt agent=claude mode=- '
+            'outcome=applied prev=- new=processing emit_us=1 subagents=0 rerun=0\n'
+            'seq=2000000 state=permission arg=- agent=claude mode=- '
+            'outcome=applied prev=processing new=permission emit_us=1 subagents=0 rerun=0\n'
+            'seq=2500000 state=processing arg=- agent=claude mode=- '
+            'outcome=stale prev=permission new=permission emit_us=1 subagents=0 rerun=1\n')
+        capture = tmp_path / 'capture'
+        env = dict(journal_env)
+        del env['TTY_DEVICE']
+        result = subprocess.run(
+            [os.path.join(PROJECT_ROOT, 'tavs'), 'replay', str(journal),
+             '--speed', '0', '--tty', str(capture)],
+            env=env, capture_output=True, text=True, timeout=60)
+        assert result.returncode == 0, result.stderr
+        assert 'Events' in result.stdout and ' 2\n' in result.stdout
+        data = capture.read_bytes()
+        assert b'\x1b]11;' in data and b'\x1b]111' in data  # Colors, closing reset
+        assert not (tmp_path / 'tavs' / 'journal').exists()  # Scratch dir only
+
+    def test_replay_waits_for_deferred_events(self, journal_env, tmp_path):
+        (tmp_path / 'home' / '.tavs' / 'user.conf').write_text(
+            'ENABLE_JOURNAL="true"\nSTATE_GRACE_PERIOD_MS=1500\n')
+        journal = tmp_path / 'session.log'
+        journal.write_text(
+            'seq=1000000 state=permission arg=- agent=claude mode=- '
+            'outcome=applied prev=- new=permission emit_us=1 subagents=0 rerun=0\n'
+            'seq=1100000 state=processing arg=- agent=claude mode=- '
+            'outcome=deferred prev=permission new=permission emit_us=1 subagents=0 rerun=0\n'
+            'seq=2600000 state=processing arg=- agent=claude mode=- '
+            'outcome=applied prev=permission new=processing emit_us=1 subagents=0 rerun=1\n')
+        env = dict(journal_env)
+        del env['TTY_DEVICE']
+        result = subprocess.run(
+            [os.path.join(PROJECT_ROOT, 'tavs'), 'replay', str(journal), '--speed', '0'],
+            env=env, capture_output=True, text=True, timeout=60)
+        assert result.returncode == 0, result.stderr
+        rows = {l.split()[0]: l.split()[1:] for l in result.stdout.splitlines()
+                if l.split() and l.split()[0] in ('applied', 'deferred')}
+        assert rows['applied'] == ['2', '2']
+        assert rows['deferred'] == ['1', '1']
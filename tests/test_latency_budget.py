@@ -0,0 +1,126 @@
+"""
+Tests for src/core/latency-budget.sh - Shedding optional stages over budget.
+
+Verifies:
+- Stages run while the clock is not started or the budget is 0
+- Stages are shed in rank order as the elapsed time grows
+- Shed stages are counted per TTY
+- A trigger over budget still sends its colors and records the shed stages
+"""
+
+import os
+import subprocess
+import pytest
+from conftest import run_bash, PROJECT_ROOT
+
+
+SOURCE = f'source "{PROJECT_ROOT}/src/core/latency-budget.sh"'
+STAGES = 'for s in image dir_icon context user_title; do ' \
+         'latency_budget_allows $s && echo "$s run" || echo "$s shed"; done'
+
+
+@pytest.fixture
+def budget_env(tmp_path):
+    os.makedirs(tmp_path / 'tavs')
+    env = os.environ.copy()
+    env['TAVS_TMP_DIR'] = str(tmp_path / 'tavs')
+    env['TTY_DEVICE'] = str(tmp_path / 'tty')
+    return env
+
+
+@pytest.fixture
+def clock_env(tmp_path):
+    """No TTY_DEVICE: shed stages are not recorded, so no I/O in the timing."""
+    env = os.environ.copy()
+    env.pop('TTY_DEVICE', None)
+    env['TAVS_TMP_DIR'] = str(tmp_path / 'tavs')
+    return env
+
+
+def _stages(result):
+    return dict(line.split() for line in result.stdout.splitlines())
+
+
+def _elapsed(ms):
+    """Start the clock ms milliseconds ago."""
+    return f'util_now_ms && _TAVS_BUDGET_START=$(( _UTIL_NOW_MS - {ms} ))'
+
+
+class TestAllows:
+    """Test latency_budget_allows rank thresholds."""
+
+    def test_no_clock_runs_everything(self, budget_env):
+        result = run_bash(f'{SOURCE} && TAVS_LATENCY_BUDGET_MS=1 && {STAGES}',
+                          env=budget_env)
+        assert set(_stages(result).values()) == {'run'}
+
+    def test_zero_budget_disables(self, budget_env):
+        result = run_bash(
+            f'{SOURCE} && TAVS_LATENCY_BUDGET_MS=0 && {_elapsed(5000)} && {STAGES}',
+            env=budget_env)
+        assert set(_stages(result).values()) == {'run'}
+
+    # Each elapsed time sits in the middle of its band
+    @pytest.mark.parametrize('elapsed_ms,shed', [
+        (500, []),
+        (1500, ['image']),
+        (2500, ['image', 'dir_icon']),
+        (4500, ['image', 'dir_icon', 'context', 'user_title']),
+    ])
+    def test_rank_order(self, clock_env, elapsed_ms, shed):
+        result = run_bash(
+            f'{SOURCE} && TAVS_LATENCY_BUDGET_MS=1000 && {_elapsed(elapsed_ms)} && {STAGES}',
+            env=clock_env)
+        stages = _stages(result)
+        assert [s for s, v in stages.items() if v == 'shed'] == shed
+
+    def test_shed_counted(self, budget_env, tmp_path):
+        result = run_bash(
+            f'{SOURCE} && TAVS_LATENCY_BUDGET_MS=100 && {_elapsed(250)} && '
+            'latency_budget_allows image; latency_budget_allows image; '
+            'latency_budget_allows dir_icon; latency_budget_shed "$TTY_DEVICE" && '
+            'echo "$_LATENCY_SHED_IMAGE $_LATENCY_SHED_DIR_ICON $_LATENCY_SHED_LAST_STAGE"',
+            env=budget_env)
+        assert result.stdout.strip() == '2 1 dir_icon'
+
+    def test_recording_not_counted(self, budget_env):
+        # A shed stage that takes 600ms to record must not shed dir_icon
+        result = run_bash(
+            f'{SOURCE} && TAVS_LATENCY_BUDGET_MS=1000 && {_elapsed(1500)} && '
+            '_latency_budget_record() { sleep 0.6; } && ' + STAGES,
+            env=budget_env)
+        assert _stages(result) == {'image': 'shed', 'dir_icon': 'run',
+                                   'context': 'run', 'user_title': 'run'}
+
+    def test_clock_without_epochrealtime(self, clock_env):
+        # Bash 3.2: util_now_ms falls back to gdate/perl/date
+        result = run_bash(
+            f'{SOURCE} && unset EPOCHREALTIME && latency_budget_start && '
+            'TAVS_LATENCY_BUDGET_MS=1000 && '
+            '_TAVS_BUDGET_START=$(( _TAVS_BUDGET_START - 1500 )) && ' + STAGES,
+            env=clock_env)
+        assert [s for s, v in _stages(result).items() if v == 'shed'] == ['image']
+
+
+class TestTrigger:
+    """Test a trigger that runs over its budget."""
+
+    def test_colors_sent_and_stages_recorded(self, tmp_path):
+        os.makedirs(tmp_path / 'home' / '.tavs')
+        (tmp_path / 'home' / '.tavs' / 'user.conf').write_text(
+            'TAVS_LATENCY_BUDGET_MS=1\n')
+        env = {
+            'PATH': os.environ['PATH'],
+            'HOME': str(tmp_path / 'home'),
+            'TAVS_TMP_DIR': str(tmp_path / 'tavs'),
+            'TTY_DEVICE': str(tmp_path / 'tty'),
+            'TERM': 'xterm-256color',
+            'TAVS_IDENTITY_MODE': 'off',
+        }
+        result = subprocess.run(
+            ['bash', f'{PROJECT_ROOT}/src/core/trigger.sh', 'permission'],
+            env=env, stdin=subprocess.DEVNULL, capture_output=True, timeout=20)
+        assert result.returncode == 0, result.stderr
+        assert b'\x1b]11;' in (tmp_path / 'tty').read_bytes()
+        shed = (tmp_path / 'tavs' / f'shed.{str(tmp_path / "tty").replace("/", "_")}')
+        assert 'user_title=1' in shed.read_text().splitlines()
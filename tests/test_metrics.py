@@ -0,0 +1,129 @@
+"""
+Tests for src/core/metrics.sh - Trigger counters and run-time histograms.
+
+Verifies:
+- Each trigger run appends one line with its outcome (applied, deferred, dedup)
+- ENABLE_METRICS=false records nothing
+- A fold turns pending lines into totals and a Prometheus textfile export
+- Counted series (lock timeouts) are folded
+- tavs stats shows the totals per state and agent
+"""
+
+import os
+import subprocess
+import pytest
+from conftest import run_bash, PROJECT_ROOT
+
+
+SOURCE = f'source "{PROJECT_ROOT}/src/core/metrics.sh"'
+TRIGGER = os.path.join(PROJECT_ROOT, 'src', 'core', 'trigger.sh')
+
+
+@pytest.fixture
+def metrics_env(tmp_path):
+    os.makedirs(tmp_path / 'home' / '.tavs')
+    os.makedirs(tmp_path / 'tavs')
+    # Long grace period: a slow run must not let `processing` apply
+    (tmp_path / 'home' / '.tavs' / 'user.conf').write_text('STATE_GRACE_PERIOD_MS=5000\n')
+    return {
+        'PATH': os.environ['PATH'],
+        'HOME': str(tmp_path / 'home'),
+        'TAVS_TMP_DIR': str(tmp_path / 'tavs'),
+        'TTY_DEVICE': str(tmp_path / 'tty'),
+        'TERM': 'xterm-256color',
+        'TAVS_AGENT': 'claude',
+        'TAVS_IDENTITY_MODE': 'off',
+        'TAVS_METRICS_FOLD_EVERY': '100000',
+    }
+
+
+def _fire(env, state):
+    subprocess.run(['bash', TRIGGER, state], env=env, capture_output=True,
+                   stdin=subprocess.DEVNULL, timeout=20, check=True)
+
+
+def _pending(tmp_path):
+    path = tmp_path / 'tavs' / 'metrics.log'
+    return [l.split() for l in path.read_text().splitlines()] if path.exists() else []
+
+
+class TestRecording:
+    """Test the line each trigger run appends."""
+
+    def test_outcomes(self, metrics_env, tmp_path):
+        # The pinned grace period must be the one the trigger uses
+        grace = run_bash(
+            f'source "{PROJECT_ROOT}/src/core/theme-config-loader.sh" && '
+            f'source "{PROJECT_ROOT}/src/core/session-state.sh" && '
+            'echo "$STATE_GRACE_PERIOD_MS"', env=metrics_env)
+        assert grace.stdout.strip() == '5000'
+        _fire(metrics_env, 'permission')
+        _fire(metrics_env, 'permission')
+        _fire(metrics_env, 'processing')
+        lines = _pending(tmp_path)
+        assert [l[:4] for l in lines] == [
+            ['t', 'permission', 'claude', 'applied'],
+            ['t', 'permission', 'claude', 'dedup'],
+            ['t', 'processing', 'claude', 'deferred'],
+        ]
+        assert all(l[4].isdigit() for l in lines)
+
+    def test_disabled(self, metrics_env, tmp_path):
+        (tmp_path / 'home' / '.tavs' / 'user.conf').write_text('ENABLE_METRICS="false"\n')
+        _fire(metrics_env, 'permission')
+        _fire(metrics_env, 'permission')
+        assert _pending(tmp_path) == []
+
+
+class TestFold:
+    """Test metrics_fold on pending lines."""
+
+    def test_totals_and_export(self, metrics_env, tmp_path):
+        (tmp_path / 'tavs' / 'metrics.log').write_text(
+            't processing claude applied 3000\n'
+            't processing claude applied 40000\n'
+            't processing claude deferred -\n'
+            'c tavs_lock_timeouts_total{lock="frame"}\n')
+        result = run_bash(f'{SOURCE} && metrics_fold', env=metrics_env)
+        assert result.returncode == 0, result.stderr
+        assert not (tmp_path / 'tavs' / 'metrics.log').exists()
+
+        prom = (tmp_path / 'tavs' / 'metrics.prom').read_text()
+        labels = 'state="processing",agent="claude"'
+        assert '# TYPE tavs_trigger_duration_seconds histogram' in prom
+        assert f'tavs_trigger_total{{{labels},outcome="applied"}} 2' in prom
+        assert f'tavs_trigger_total{{{labels},outcome="deferred"}} 1' in prom
+        assert f'tavs_trigger_duration_seconds_bucket{{{labels},le="0.005"}} 1' in prom
+        assert f'tavs_trigger_duration_seconds_bucket{{{labels},le="0.05"}} 2' in prom
+        assert f'tavs_trigger_duration_seconds_sum{{{labels}}} 0.043000' in prom
+        assert f'tavs_trigger_duration_seconds_count{{{labels}}} 2' in prom
+        assert 'tavs_lock_timeouts_total{lock="frame"} 1' in prom
+
+    def test_folds_accumulate(self, metrics_env, tmp_path):
+        log = tmp_path / 'tavs' / 'metrics.log'
+        for _ in range(2):
+            log.write_text('t complete gemini applied 1000\n')
+            run_bash(f'{SOURCE} && metrics_fold', env=metrics_env)
+        prom = (tmp_path / 'tavs' / 'metrics.prom').read_text()
+        assert ('tavs_trigger_total{state="complete",agent="gemini",'
+                'outcome="applied"} 2') in prom
+
+    def test_textfile_copy(self, metrics_env, tmp_path):
+        metrics_env['TAVS_METRICS_TEXTFILE'] = str(tmp_path / 'tavs.prom')
+        (tmp_path / 'tavs' / 'metrics.log').write_text('c tavs_idle_max_runtime_total\n')
+        run_bash(f'{SOURCE} && metrics_fold', env=metrics_env)
+        assert 'tavs_idle_max_runtime_total 1' in (tmp_path / 'tavs.prom').read_text()
+
+
+class TestStatsCommand:
+    """Test tavs stats."""
+
+    def test_table(self, metrics_env, tmp_path):
+        (tmp_path / 'tavs' / 'metrics.log').write_text(
+            't permission claude applied 2000\nt permission claude dedup 500\n')
+        result = subprocess.run([os.path.join(PROJECT_ROOT, 'tavs'), 'stats'],
+                                env=metrics_env, capture_output=True, text=True,
+                                timeout=60)
+        assert result.returncode == 0, result.stderr
+        row = next(l for l in result.stdout.splitlines() if 'permission' in l)
+        assert row.split()[:7] == ['permission', 'claude', '2', '1', '0', '0', '1']
@@ -0,0 +1,134 @@
+"""
+Tests for src/core/session-state.sh - Transition table and deferred events.
+
+Verifies:
+- Protected transitions inside the grace period are deferred, others apply
+- A deferred event is applied by the core trigger when the grace period ends
+- A newer deferred event supersedes the pending one
+- An event stamped before the applied one neither emits nor records
+"""
+
+import os
+import subprocess
+import time
+import pytest
+from conftest import run_bash, PROJECT_ROOT
+
+
+TRIGGER = os.path.join(PROJECT_ROOT, 'src', 'core', 'trigger.sh')
+GRACE_MS = 1500
+
+
+@pytest.fixture
+def state_env(tmp_path):
+    """Isolated HOME/TAVS_TMP_DIR with a regular file as the TTY."""
+    os.makedirs(tmp_path / 'home' / '.tavs')
+    (tmp_path / 'home' / '.tavs' / 'user.conf').write_text(
+        f'STATE_GRACE_PERIOD_MS={GRACE_MS}\n')
+    return {
+        'PATH': os.environ['PATH'],
+        'HOME': str(tmp_path / 'home'),
+        'TAVS_TMP_DIR': str(tmp_path / 'tavs'),
+        'TTY_DEVICE': str(tmp_path / 'tty'),
+        'TERM': 'xterm-256color',
+        'TAVS_AGENT': 'claude',
+        'TAVS_IDENTITY_MODE': 'off',
+    }
+
+
+def _fire(env, state, seq=None):
+    if seq is not None:
+        env = dict(env, TAVS_EVENT_SEQ=str(seq))
+    subprocess.run(['bash', TRIGGER, state], env=env, capture_output=True,
+                   stdin=subprocess.DEVNULL, timeout=20, check=True)
+
+
+def _state(tmp_path):
+    line = (tmp_path / 'tavs' / 'state').read_text().splitlines()[-1]
+    return line.split()[1]
+
+
+def _wait_for_state(tmp_path, state, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if _state(tmp_path) == state:
+            return True
+        time.sleep(0.1)
+    return False
+
+
+class TestTransitionTable:
+    """Test get_state_transition against a recorded state."""
+
+    @pytest.mark.parametrize('current,new,age_ms,expected', [
+        ('permission', 'processing', 0, 'defer'),
+        ('permission', 'processing', 5000, 'apply'),
+        ('processing', 'permission', 0, 'apply'),
+        ('processing', 'complete', 0, 'defer'),
+        ('compacting', 'processing', 0, 'defer'),
+        ('complete', 'processing', 0, 'apply'),
+        ('reset', 'complete', 0, 'apply'),
+    ])
+    def test_lookup(self, state_env, current, new, age_ms, expected):
+        result = run_bash(
+            f'source "{PROJECT_ROOT}/src/core/session-state.sh" && '
+            'TTY_SAFE=_t && util_now_ms && '
+            f'echo "_t {current} 0 $((_UTIL_NOW_MS - {age_ms})) " > "$STATE_DB" && '
+            f'STATE_GRACE_PERIOD_MS=400 get_state_transition {new} && '
+            'echo "$_STATE_TRANSITION"', env=state_env)
+        assert result.stdout.strip() == expected
+
+
+class TestDeferredEvents:
+    """Test the deferred-event slot through trigger.sh."""
+
+    def test_configured_grace_period_applies(self, state_env):
+        result = run_bash(
+            f'source "{PROJECT_ROOT}/src/core/theme-config-loader.sh" && '
+            f'source "{PROJECT_ROOT}/src/core/session-state.sh" && '
+            'echo "$STATE_GRACE_PERIOD_MS"', env=state_env)
+        assert result.stdout.strip() == str(GRACE_MS)
+
+    def test_processing_after_permission_is_applied_late(self, state_env,
+                                                         tmp_path):
+        _fire(state_env, 'permission')
+        _fire(state_env, 'processing')
+        assert _state(tmp_path) == 'permission'
+        assert _wait_for_state(tmp_path, 'processing')
+
+    def test_newer_deferred_event_supersedes(self, state_env, tmp_path):
+        _fire(state_env, 'permission')
+        _fire(state_env, 'processing')
+        _fire(state_env, 'compacting')
+        assert _wait_for_state(tmp_path, 'compacting')
+        time.sleep(GRACE_MS / 1000 + 0.5)
+        assert _state(tmp_path) == 'compacting'
+
+
+class TestEventOrdering:
+    """Test TAVS_EVENT_SEQ stamps against the state record."""
+
+    def test_late_older_event_is_refused(self, state_env, tmp_path):
+        now = int(time.time() * 1_000_000)
+        _fire(state_env, 'compacting', seq=now)
+        (tmp_path / 'tty').unlink()
+        _fire(state_env, 'permission', seq=now - 50_000)
+        assert not (tmp_path / 'tty').exists()
+        assert _state(tmp_path) == 'compacting'
+
+    def test_newer_event_applies(self, state_env, tmp_path):
+        now = int(time.time() * 1_000_000)
+        _fire(state_env, 'compacting', seq=now)
+        _fire(state_env, 'permission', seq=now + 50_000)
+        assert _state(tmp_path) == 'permission'
+        line = (tmp_path / 'tavs' / 'state').read_text().split()
+        assert line[-1] == str(now + 50_000)
+
+    def test_reads_records_without_stamp(self, state_env):
+        result = run_bash(
+            f'source "{PROJECT_ROOT}/src/core/session-state.sh" && '
+            'TTY_SAFE=_t && printf "_x idle 15 5 \\n_t permission 100 7 \\n" '
+            '> "$STATE_DB" && read_session_state && '
+            'echo "$SESSION_STATE $SESSION_TIME [$SESSION_TIMER_PID] $SESSION_SEQ"',
+            env=state_env)
+        assert result.stdout.strip() == 'permission 7 [] 0'
@@ -0,0 +1,170 @@
+"""
+Tests for src/core/system-mode-watcher.sh - Shared light/dark mode watcher.
+
+Verifies:
+- Config load reads the watcher-published mode instead of probing
+- A mode file from a dead watcher is ignored
+- A published flip repaints registered TTYs in their current state
+- Closed TTYs are pruned and the watcher exits when none are left
+"""
+
+import os
+import time
+import pytest
+from conftest import run_bash, PROJECT_ROOT
+
+
+SOURCES = (
+    f'source "{PROJECT_ROOT}/src/core/theme-config-loader.sh" && '
+    f'source "{PROJECT_ROOT}/src/core/system-mode-watcher.sh"'
+)
+
+
+@pytest.fixture
+def watcher_env(tmp_path):
+    """Isolated tmp dir and HOME with light/dark switching enabled."""
+    env = os.environ.copy()
+    env.pop('COLORTERM', None)
+    env['HOME'] = str(tmp_path / 'home')
+    env['TAVS_TMP_DIR'] = str(tmp_path / 'tavs')
+    env['TAVS_SNAPSHOT_DIR'] = str(tmp_path / 'snapshot')
+    env['TAVS_AGENT'] = 'claude'
+    os.makedirs(tmp_path / 'tavs')
+    os.makedirs(tmp_path / 'home' / '.tavs')
+    (tmp_path / 'home' / '.tavs' / 'user.conf').write_text(
+        'ENABLE_LIGHT_DARK_SWITCHING="true"\n'
+        'ENABLE_TITLE_PREFIX="false"\n'
+        'SYSTEM_MODE_POLL_INTERVAL=0.2\n')
+    return env
+
+
+class TestSharedModeFile:
+    """Test _read_shared_system_mode / _load_system_mode."""
+
+    def test_config_load_uses_live_watcher_mode(self, watcher_env, tmp_path):
+        """Colors should follow the shared file without calling the probe."""
+        mode_file = tmp_path / 'tavs' / 'system-mode'
+        result = run_bash(
+            f'printf "light %s\\n" $$ > "{mode_file}"; {SOURCES} && '
+            '_detect_system_mode() { echo PROBED >&2; echo dark; }; '
+            'clear_mode_cache; load_agent_config claude; '
+            'echo "$IS_DARK_THEME $COLOR_PROCESSING $LIGHT_PROCESSING"',
+            env=watcher_env)
+        assert result.returncode == 0, result.stderr
+        assert 'PROBED' not in result.stderr
+        is_dark, color, light = result.stdout.split()
+        assert is_dark == 'false'
+        assert color == light
+
+    def test_dead_watcher_mode_is_ignored(self, watcher_env, tmp_path):
+        """A file left by a dead watcher should fall back to probing."""
+        mode_file = tmp_path / 'tavs' / 'system-mode'
+        mode_file.write_text('light 999999\n')
+        result = run_bash(
+            f'{SOURCES} && _read_shared_system_mode; echo "rc=$?"',
+            env=watcher_env)
+        assert result.stdout.strip() == 'rc=1'
+
+
+class TestRepaintOnFlip:
+    """Test _system_mode_publish repainting registered TTYs."""
+
+    def test_flip_repaints_current_state(self, watcher_env, tmp_path):
+        tty = tmp_path / 'tty'
+        tty.write_text('')
+        tty_safe = str(tty).replace('/', '_')
+        (tmp_path / 'tavs' / 'state').write_text(
+            f'{tty_safe} processing 30 0 \n')
+
+        result = run_bash(
+            f'{SOURCES} && TTY_DEVICE="{tty}" register_system_mode_tty && '
+            '_SYSTEM_MODE_WATCHER_PID=$$; '
+            '_system_mode_publish dark; '
+            f': > "{tty}"; '
+            '_system_mode_publish light; '
+            'load_agent_config claude; printf "%s" "$LIGHT_PROCESSING"',
+            env=watcher_env, timeout=15)
+        assert result.returncode == 0, result.stderr
+        content = tty.read_bytes()
+        assert content == f'\x1b]11;{result.stdout}\x1b\\'.encode()
+        assert (tmp_path / 'tavs' / 'system-mode').read_text().startswith(
+            'light ')
+
+    def test_first_publish_does_not_repaint(self, watcher_env, tmp_path):
+        tty = tmp_path / 'tty'
+        tty.write_text('')
+        result = run_bash(
+            f'{SOURCES} && TTY_DEVICE="{tty}" register_system_mode_tty && '
+            '_SYSTEM_MODE_WATCHER_PID=$$; _system_mode_publish dark',
+            env=watcher_env)
+        assert result.returncode == 0, result.stderr
+        assert tty.read_bytes() == b''
+
+
+class TestTtyRegistry:
+    """Test register/unregister/prune of the repaint list."""
+
+    def test_register_is_idempotent(self, watcher_env, tmp_path):
+        tty = tmp_path / 'tty'
+        tty.write_text('')
+        run_bash(
+            f'{SOURCES} && export TTY_DEVICE="{tty}" && '
+            'register_system_mode_tty && register_system_mode_tty',
+            env=watcher_env)
+        ttys = (tmp_path / 'tavs' / 'system-mode.ttys').read_text()
+        assert ttys == f'{tty} claude\n'
+
+    def test_prune_drops_closed_ttys(self, watcher_env, tmp_path):
+        live = tmp_path / 'live'
+        live.write_text('')
+        (tmp_path / 'tavs' / 'system-mode.ttys').write_text(
+            f'{tmp_path}/gone claude\n{live} gemini\n')
+        result = run_bash(f'{SOURCES} && _system_mode_prune_ttys',
+                          env=watcher_env)
+        assert result.returncode == 0
+        ttys = (tmp_path / 'tavs' / 'system-mode.ttys').read_text()
+        assert ttys == f'{live} gemini\n'
+
+    def test_unregister_removes_tty(self, watcher_env, tmp_path):
+        (tmp_path / 'tavs' / 'system-mode.ttys').write_text(
+            '/dev/pts/1 claude\n/dev/pts/2 codex\n')
+        run_bash(f'{SOURCES} && TTY_DEVICE=/dev/pts/1 '
+                 'unregister_system_mode_tty', env=watcher_env)
+        ttys = (tmp_path / 'tavs' / 'system-mode.ttys').read_text()
+        assert ttys == '/dev/pts/2 codex\n'
+
+
+class TestWatcherLifecycle:
+    """Test start_system_mode_watcher publishing and exiting."""
+
+    def test_watcher_publishes_then_exits_without_ttys(self, watcher_env,
+                                                       tmp_path):
+        tty = tmp_path / 'tty'
+        tty.write_text('')
+        mode_file = tmp_path / 'tavs' / 'system-mode'
+        result = run_bash(
+            f'{SOURCES} && load_agent_config claude && '
+            f'TTY_DEVICE="{tty}" register_system_mode_tty && '
+            'start_system_mode_watcher && start_system_mode_watcher',
+            env=watcher_env)
+        assert result.returncode == 0, result.stderr
+
+        deadline = time.time() + 15
+        while not mode_file.exists() and time.time() < deadline:
+            time.sleep(0.05)
+        assert mode_file.read_text().split()[0] in ('dark', 'light')
+
+        tty.unlink()
+        deadline = time.time() + 15
+        while mode_file.exists() and time.time() < deadline:
+            time.sleep(0.05)
+        assert not mode_file.exists()
+        assert not (tmp_path / 'tavs' / 'system-mode.lock').exists()
+
+    def test_disabled_without_switching(self, watcher_env, tmp_path):
+        result = run_bash(
+            f'{SOURCES} && load_agent_config claude && '
+            'ENABLE_LIGHT_DARK_SWITCHING=false start_system_mode_watcher',
+            env=watcher_env)
+        assert result.returncode == 1
+        assert not (tmp_path / 'tavs' / 'system-mode.lock').exists()
@@ -10,6 +10,8 @@ Validates:
 - detect_system_dark_mode() checks OS appearance
 - get_color_mode() returns color capability string
 - supports_osc10(), supports_osc11_query(), supports_osc1337() capability checks
+- query_terminal_bg() reads the reply within a sub-second timeout, ends it
+  at BEL or ST, and skips the read when the query write is dropped
 
 Terminal detection relies on environment variables set by each terminal:
 - ITERM_SESSION_ID for iTerm2
@@ -19,6 +21,7 @@ Terminal detection relies on environment variables set by each terminal:
 """
 
 import os
+import pytest
 from conftest import run_bash, PROJECT_ROOT
 
 
@@ -351,3 +354,273 @@ class TestDetectShSyntax:
                          cwd=PROJECT_ROOT)
         assert result.returncode == 0
         assert "OK" in result.stdout
+
+
+class TestParseOsc11Response:
+    """Test _parse_osc11_response() reply parsing."""
+
+    def test_parses_16bit_bel_reply(self):
+        """Should take the high byte of each 16-bit channel."""
+        rc, stdout, _ = source_detect_and_run(
+            "_parse_osc11_response $'\\033]11;rgb:1e1e/2f2f/abab\\a'")
+        assert rc == 0
+        assert stdout == "#1E2FAB"
+
+    def test_parses_st_terminated_reply(self):
+        """Should parse replies terminated by ESC backslash."""
+        rc, stdout, _ = source_detect_and_run(
+            "_parse_osc11_response $'\\033]11;rgb:ffff/0000/8080\\033\\\\'")
+        assert rc == 0
+        assert stdout == "#FF0080"
+
+    def test_rejects_garbage(self):
+        """Should fail on a reply without rgb: payload."""
+        rc, stdout, _ = source_detect_and_run("_parse_osc11_response 'junk'")
+        assert rc == 1
+        assert stdout == ""
+
+
+class TestQueryTerminalBg:
+    """Test query_terminal_bg() against a pseudo-terminal."""
+
+    # Bash 3.2 reads with the TTY timer instead of read -t
+    @pytest.mark.parametrize('prefix', ['', 'BASH_VERSION=3.2.57; '])
+    @pytest.mark.parametrize('end', [b'\x07', b'\x1b\\'], ids=['bel', 'st'])
+    def test_reply_read_up_to_terminator(self, prefix, end):
+        """Should send the query and return as soon as the reply ends."""
+        import pty
+        import select
+        import subprocess
+        import time
+
+        master, slave = pty.openpty()
+        env = os.environ.copy()
+        env['TERM_PROGRAM'] = 'ghostty'
+        proc = subprocess.Popen(
+            ['bash', '-c', prefix + 'source src/core/terminal-detection.sh && '
+             f'query_terminal_bg {os.ttyname(slave)} 2'],
+            stdout=subprocess.PIPE, cwd=PROJECT_ROOT, env=env)
+        try:
+            seen = b''
+            while b'11;?' not in seen:
+                ready, _, _ = select.select([master], [], [], 3)
+                assert ready, "query was never written to the TTY"
+                seen += os.read(master, 64)
+            os.write(master, b'\x1b]11;rgb:2828/2a2a/3636' + end)
+            start = time.monotonic()
+            stdout, _ = proc.communicate(timeout=5)
+        finally:
+            os.close(master)
+            os.close(slave)
+        assert proc.returncode == 0
+        assert stdout.decode().strip() == "#282A36"
+        # Well within the 2 s timeout
+        assert time.monotonic() - start < 1.5
+
+    def test_dropped_query_skips_read(self, tmp_path):
+        """A terminal that stopped reading drops the query; no reply is awaited."""
+        import pty
+        import subprocess
+        import time
+        import tty
+
+        master, slave = pty.openpty()
+        # Fill the output buffer so the next write blocks (raw first: a
+        # termios change from cooked mode frees buffer room)
+        tty.setraw(slave)
+        name = os.ttyname(slave)
+        writer = os.open(name, os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            while True:
+                os.write(writer, b'x')
+        except BlockingIOError:
+            pass
+        os.close(writer)
+        env = os.environ.copy()
+        env['TERM_PROGRAM'] = 'ghostty'
+        env['TAVS_TMP_DIR'] = str(tmp_path)
+        env['TAVS_TTY_WRITE_TIMEOUT'] = '0.2'
+        start = time.monotonic()
+        try:
+            result = subprocess.run(
+                ['bash', '-c', 'source src/core/terminal-detection.sh && '
+                 f'query_terminal_bg {name} 3'],
+                capture_output=True, cwd=PROJECT_ROOT, env=env, timeout=10)
+        finally:
+            os.close(master)
+            os.close(slave)
+        assert result.returncode == 1
+        assert time.monotonic() - start < 2
+        drops = tmp_path / f'frame.{name.replace("/", "_")}.drops'
+        assert 'timeouts=1' in drops.read_text()
+
+
+    def test_sub_second_wait_without_read_timeout(self):
+        """Bash 3.2 (whole-second read -t) should still give up within the timeout."""
+        import pty
+        import subprocess
+        import time
+
+        master, slave = pty.openpty()
+        env = os.environ.copy()
+        env['TERM_PROGRAM'] = 'ghostty'
+        start = time.monotonic()
+        try:
+            result = subprocess.run(
+                ['bash', '-c', 'BASH_VERSION=3.2.57; '
+                 'source src/core/terminal-detection.sh && '
+                 f'query_terminal_bg {os.ttyname(slave)} 0.2'],
+                capture_output=True, cwd=PROJECT_ROOT, env=env, timeout=10)
+        finally:
+            os.close(master)
+            os.close(slave)
+        assert result.returncode == 1
+        assert time.monotonic() - start < 0.9
+
+
+class TestTerminalBgCache:
+    """Test get_terminal_bg_cached() per-TTY caching."""
+
+    # Stub query counts calls in a file so subshell invocations are visible
+    STUB = ('query_terminal_bg() { echo x >> "$TAVS_TMP_DIR/calls"; '
+            'printf "%s\\n" "${STUB_BG:-}"; }; ')
+
+    def _run(self, tmp_path, cmd, extra_env=None):
+        env = os.environ.copy()
+        env['TAVS_TMP_DIR'] = str(tmp_path)
+        env['TERM_PROGRAM'] = 'ghostty'
+        env.update(extra_env or {})
+        return source_detect_and_run(self.STUB + cmd, env=env)
+
+    def _calls(self, tmp_path):
+        calls = tmp_path / 'calls'
+        return len(calls.read_text().splitlines()) if calls.exists() else 0
+
+    def test_queries_once_per_tty(self, tmp_path):
+        """Second lookup should be served from the cache."""
+        rc, stdout, _ = self._run(
+            tmp_path, 'get_terminal_bg_cached /dev/pts/9; '
+                      'get_terminal_bg_cached /dev/pts/9',
+            {'STUB_BG': '#112233'})
+        assert rc == 0
+        assert stdout.splitlines() == ['#112233', '#112233']
+        assert self._calls(tmp_path) == 1
+        assert (tmp_path / 'termbg._dev_pts_9').exists()
+
+    def test_caches_failed_query(self, tmp_path):
+        """An unanswered query should not be retried within the session."""
+        rc, stdout, _ = self._run(
+            tmp_path, 'get_terminal_bg_cached /dev/pts/9; '
+                      'get_terminal_bg_cached /dev/pts/9')
+        assert rc == 1
+        assert stdout == ""
+        assert self._calls(tmp_path) == 1
+
+    def test_profile_change_requeries(self, tmp_path):
+        """A different terminal profile should invalidate the entry."""
+        self._run(tmp_path, 'get_terminal_bg_cached /dev/pts/9',
+                  {'STUB_BG': '#112233', 'ITERM_PROFILE': 'Dark'})
+        rc, stdout, _ = self._run(
+            tmp_path, 'get_terminal_bg_cached /dev/pts/9',
+            {'STUB_BG': '#EEEEEE', 'ITERM_PROFILE': 'Light'})
+        assert stdout == "#EEEEEE"
+        assert self._calls(tmp_path) == 2
+
+    def test_clear_forces_requery(self, tmp_path):
+        """clear_terminal_bg_cache should drop the TTY's entry."""
+        self._run(tmp_path, 'get_terminal_bg_cached /dev/pts/9',
+                  {'STUB_BG': '#112233'})
+        self._run(tmp_path, 'clear_terminal_bg_cache /dev/pts/9; '
+                            'get_terminal_bg_cached /dev/pts/9',
+                  {'STUB_BG': '#112233'})
+        assert self._calls(tmp_path) == 2
+
+
+class TestTerminalCaps:
+    """Test the per-TTY capability record."""
+
+    def _env(self, tmp_path, **extra):
+        env = {
+            'PATH': os.environ.get('PATH', '/usr/bin:/bin'),
+            'HOME': str(tmp_path),
+            'TAVS_TMP_DIR': str(tmp_path),
+            'TTY_SAFE': '_dev_pts_7',
+        }
+        env.update(extra)
+        return env
+
+    def test_record_is_persisted_per_tty(self, tmp_path):
+        """First load computes and writes caps.{TTY_SAFE}."""
+        env = self._env(tmp_path, ITERM_SESSION_ID='w0t0p0:abc')
+        rc, stdout, _ = source_detect_and_run(
+            'load_terminal_caps; echo "$TAVS_CAP_TERMINAL $TAVS_CAP_OSC1337"',
+            env=env)
+        assert stdout == "iterm2 true"
+        record = (tmp_path / 'caps._dev_pts_7').read_text()
+        assert 'terminal=iterm2\n' in record
+        assert 'bg_images=true\n' in record
+
+    def test_later_loads_read_the_record(self, tmp_path):
+        """A persisted record is used as-is (no recomputation)."""
+        env = self._env(tmp_path, TERM_PROGRAM='ghostty')
+        source_detect_and_run('load_terminal_caps', env=env)
+        record = tmp_path / 'caps._dev_pts_7'
+        record.write_text(record.read_text().replace('osc11=true',
+                                                     'osc11=false'))
+        rc, _, _ = source_detect_and_run('supports_osc11_query', env=env)
+        assert rc == 1
+
+    def test_environment_change_recomputes(self, tmp_path):
+        """A record from another terminal environment is ignored."""
+        source_detect_and_run('load_terminal_caps',
+                              env=self._env(tmp_path, TERM_PROGRAM='ghostty'))
+        rc, stdout, _ = source_detect_and_run(
+            'load_terminal_caps; echo "$TAVS_CAP_TERMINAL"',
+            env=self._env(tmp_path, TERM_PROGRAM='Apple_Terminal'))
+        assert stdout == "terminal.app"
+        assert 'terminal=terminal.app' in (
+            tmp_path / 'caps._dev_pts_7').read_text()
+
+    def test_probe_reply_refines_unknown_terminal(self, tmp_path):
+        """XTVERSION name should replace an unknown terminal type."""
+        rc, stdout, _ = source_detect_and_run(
+            'compute_terminal_caps; '
+            "_parse_terminal_probe $'\\033P>|WezTerm 20240203\\033\\\\\\033[?62;4;22c'; "
+            'echo "$TAVS_CAP_TERMINAL|$TAVS_CAP_XTVERSION|$TAVS_CAP_DA1|$TAVS_CAP_OSC1337"',
+            env=self._env(tmp_path))
+        assert rc == 0
+        assert stdout == "wezterm|WezTerm 20240203|?62;4;22|true"
+
+    def test_probe_reads_both_replies_without_read_timeout(self, tmp_path):
+        """Bash 3.2: XTVERSION and DA1 arriving in one chunk are both parsed."""
+        import pty
+        import select
+        import subprocess
+
+        master, slave = pty.openpty()
+        proc = subprocess.Popen(
+            ['bash', '-c', 'BASH_VERSION=3.2.57; '
+             'source src/core/terminal-detection.sh && compute_terminal_caps && '
+             f'probe_terminal_caps {os.ttyname(slave)} 2 && '
+             'echo "$TAVS_CAP_TERMINAL|$TAVS_CAP_DA1"'],
+            stdout=subprocess.PIPE, cwd=PROJECT_ROOT, env=self._env(tmp_path))
+        try:
+            seen = b''
+            while b'[c' not in seen:
+                ready, _, _ = select.select([master], [], [], 3)
+                assert ready, "probe was never written to the TTY"
+                seen += os.read(master, 64)
+            os.write(master, b'\x1bP>|WezTerm 20240203\x1b\\\x1b[?62;4;22c')
+            stdout, _ = proc.communicate(timeout=5)
+        finally:
+            os.close(master)
+            os.close(slave)
+        assert proc.returncode == 0
+        assert stdout.decode().strip() == "wezterm|?62;4;22"
+
+    def test_probe_without_da1_fails(self, tmp_path):
+        """No DA1 reply means the terminal did not answer."""
+        rc, stdout, _ = source_detect_and_run(
+            'compute_terminal_caps; _parse_terminal_probe ""; echo "rc=$?"',
+            env=self._env(tmp_path))
+        assert stdout == "rc=1"
@@ -352,15 +352,15 @@ class TestStateFileAtomicity:
 
     def test_uses_temp_file_for_write(self):
         """save_title_state should use temp file + mv pattern."""
-        # This is a code inspection test - the function uses mktemp + mv
+        # This is a code inspection test - the function uses util_tmpfile + mv
         # Function is now in title-state-persistence.sh (extracted module)
         result = run_bash(
-            'grep -A25 "save_title_state()" src/core/title-state-persistence.sh | grep -E "mktemp|mv"',
+            'grep -A30 "^save_title_state()" src/core/title-state-persistence.sh | grep -E "util_tmpfile|mv"',
             cwd=PROJECT_ROOT
         )
         assert result.returncode == 0
-        # Should find both mktemp and mv in the function
-        assert "mktemp" in result.stdout or "mv" in result.stdout
+        # Should find both the temp name and mv in the function
+        assert "util_tmpfile" in result.stdout and "mv" in result.stdout
 
 
 class TestStateFileSecuritySanitization:
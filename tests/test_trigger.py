@@ -5,9 +5,12 @@ Verifies:
 - All states pass correct state parameter to send_osc_title
 - Script returns immediately (non-blocking)
 - Background worker is properly spawned
+- Two-phase mode sends colors from the hook and the title from a worker
 """
 
 import os
+import subprocess
+import threading
 import time
 import tempfile
 import pytest
@@ -212,3 +215,76 @@ class TestTriggerIntegration:
             pass
 
         assert result.returncode == 0
+
+
+class TestTwoPhase:
+    """Test ENABLE_TWO_PHASE_TRIGGER (colors first, decorations detached)."""
+
+    @pytest.fixture
+    def two_phase_env(self, tmp_path):
+        os.makedirs(tmp_path / 'home' / '.tavs')
+        (tmp_path / 'home' / '.tavs' / 'user.conf').write_text(
+            'ENABLE_TWO_PHASE_TRIGGER=true\n')
+        return {
+            'PATH': os.environ['PATH'],
+            'HOME': str(tmp_path / 'home'),
+            'TAVS_TMP_DIR': str(tmp_path / 'tavs'),
+            'TTY_DEVICE': str(tmp_path / 'tty'),
+            'TERM': 'xterm-256color',
+            'TAVS_IDENTITY_MODE': 'off',
+        }
+
+    def _fire(self, env, state):
+        return subprocess.run(
+            ['bash', f'{PROJECT_ROOT}/src/core/trigger.sh', state], env=env,
+            stdin=subprocess.DEVNULL, capture_output=True, timeout=20)
+
+    def test_title_follows_colors(self, two_phase_env, tmp_path):
+        fifo = tmp_path / 'fifo'
+        os.mkfifo(fifo)
+        two_phase_env['TTY_DEVICE'] = str(fifo)
+        chunks = []
+
+        def reader():
+            while len([c for c in chunks if c]) < 2:
+                with open(fifo, 'rb') as f:
+                    chunks.append(f.read())
+
+        thread = threading.Thread(target=reader, daemon=True)
+        thread.start()
+        result = self._fire(two_phase_env, 'permission')
+        thread.join(timeout=10)
+        assert result.returncode == 0, result.stderr
+        frames = [c for c in chunks if c]
+        assert len(frames) == 2
+        assert b'\x1b]11;' in frames[0] and b'\x1b]0;' not in frames[0]
+        assert b'\x1b]0;' in frames[1]
+
+    @pytest.mark.parametrize('bashpid', [True, False])
+    def test_worker_removes_pid_file(self, two_phase_env, tmp_path, bashpid):
+        tty_safe = str(tmp_path / 'tty').replace('/', '_')
+        pid_file = tmp_path / 'tavs' / f'phase2.{tty_safe}'
+        # Bash 3.2 has no BASHPID; unsetting it takes the same path
+        prefix = '' if bashpid else 'unset BASHPID; '
+        result = subprocess.run(
+            ['bash', '-c', prefix + 'source "$0" "$@"',
+             f'{PROJECT_ROOT}/src/core/trigger.sh', 'permission'],
+            env=two_phase_env, stdin=subprocess.DEVNULL,
+            capture_output=True, timeout=20)
+        assert result.returncode == 0, result.stderr
+        deadline = time.time() + 10
+        while pid_file.exists() and time.time() < deadline:
+            time.sleep(0.1)
+        assert not pid_file.exists()
+
+    def test_newer_event_replaces_worker(self, two_phase_env, tmp_path):
+        os.makedirs(tmp_path / 'tavs')
+        older = subprocess.Popen(['sleep', '30'])
+        tty_safe = str(tmp_path / 'tty').replace('/', '_')
+        (tmp_path / 'tavs' / f'phase2.{tty_safe}').write_text(f'{older.pid}\n')
+        assert self._fire(two_phase_env, 'permission').returncode == 0
+        try:
+            older.wait(timeout=5)
+        finally:
+            older.kill()
+        assert older.returncode != 0
@@ -0,0 +1,211 @@
+"""
+Tests for src/core/tty-frame.sh - One-write frames under a per-TTY lock.
+
+Verifies:
+- Writes inside a frame are held back and emitted together on flush
+- A trigger transition reaches the TTY in a single write
+- The frame record names the owning event and the lock is released
+- A frame older than the recorded owner is dropped
+- A lock left by a dead writer is taken over
+- A write to a terminal that stops reading is dropped within the time limit,
+  counted, and later frames are skipped during the backoff
+- The writer of a dropped frame is killed, with or without BASHPID
+- Commands registered for a frame run only once it is written
+- Immediate (query) writes bypass the frame and are bounded too
+"""
+
+import os
+import subprocess
+import threading
+import time
+import pytest
+from conftest import run_bash, PROJECT_ROOT
+
+
+SOURCE = f'source "{PROJECT_ROOT}/src/core/tty-frame.sh"'
+
+
+@pytest.fixture
+def frame_env(tmp_path):
+    os.makedirs(tmp_path / 'tavs')
+    env = os.environ.copy()
+    env['TAVS_TMP_DIR'] = str(tmp_path / 'tavs')
+    env['TTY_DEVICE'] = str(tmp_path / 'tty')
+    return env
+
+
+def _owner_file(tmp_path):
+    return tmp_path / 'tavs' / f'frame.{str(tmp_path / "tty").replace("/", "_")}'
+
+
+class TestFrame:
+    """Test tty_write / tty_frame_begin / tty_frame_flush."""
+
+    def test_writes_held_until_flush(self, frame_env, tmp_path):
+        result = run_bash(
+            f'{SOURCE} && tty_frame_begin && tty_write "\\033]11;%s\\033\\\\" "#112233" && '
+            'tty_write "\\007" && [[ ! -e "$TTY_DEVICE" ]] && '
+            'TAVS_EVENT_SEQ=5 tty_frame_flush processing', env=frame_env)
+        assert result.returncode == 0, result.stderr
+        assert (tmp_path / 'tty').read_bytes() == b'\x1b]11;#112233\x1b\\\x07'
+        owner = _owner_file(tmp_path).read_text()
+        assert 'state=processing\nseq=5\n' in owner
+        assert not os.path.exists(f'{_owner_file(tmp_path)}.lock')
+
+    def test_write_through_without_frame(self, frame_env, tmp_path):
+        run_bash(f'{SOURCE} && tty_write "%s" abc', env=frame_env)
+        assert (tmp_path / 'tty').read_text() == 'abc'
+
+    def test_older_frame_dropped(self, frame_env, tmp_path):
+        _owner_file(tmp_path).write_text('state=complete\nseq=2000\npid=1\n')
+        result = run_bash(
+            f'{SOURCE} && tty_frame_begin && tty_write x && '
+            'TAVS_EVENT_SEQ=1000 tty_frame_flush processing', env=frame_env)
+        assert result.returncode == 1
+        assert not (tmp_path / 'tty').exists()
+
+    def test_dead_writer_lock_taken_over(self, frame_env, tmp_path):
+        dead = subprocess.Popen(['true'])
+        dead.wait()
+        _owner_file(tmp_path).write_text(f'state=x\nseq=\npid={dead.pid}\n')
+        os.makedirs(f'{_owner_file(tmp_path)}.lock')
+        result = run_bash(
+            f'{SOURCE} && tty_frame_begin && tty_write x && tty_frame_flush y',
+            env=frame_env)
+        assert result.returncode == 0
+        assert (tmp_path / 'tty').read_text() == 'x'
+        assert 'pid=' in _owner_file(tmp_path).read_text()
+
+
+class TestSingleWrite:
+    """Count TTY opens for one trigger transition (FIFO as the TTY)."""
+
+    def test_transition_is_one_write(self, frame_env, tmp_path):
+        os.makedirs(tmp_path / 'home')
+        fifo = tmp_path / 'fifo'
+        os.mkfifo(fifo)
+        frame_env.update({
+            'HOME': str(tmp_path / 'home'), 'TTY_DEVICE': str(fifo),
+            'TERM': 'xterm-256color', 'TAVS_IDENTITY_MODE': 'off',
+        })
+        chunks = []
+        done = threading.Event()
+
+        def reader():
+            while not done.is_set():
+                with open(fifo, 'rb') as f:
+                    chunks.append(f.read())
+
+        thread = threading.Thread(target=reader, daemon=True)
+        thread.start()
+        result = subprocess.run(
+            ['bash', f'{PROJECT_ROOT}/src/core/trigger.sh', 'permission'],
+            env=frame_env, stdin=subprocess.DEVNULL, capture_output=True,
+            timeout=20)
+        done.set()
+        with open(fifo, 'wb'):
+            pass  # Unblock the reader
+        thread.join(timeout=5)
+        assert result.returncode == 0, result.stderr
+        frames = [c for c in chunks if c]
+        assert len(frames) == 1
+        assert b'\x1b]11;' in frames[0] and b'\x1b]0;' in frames[0]
+
+
+class TestBoundedWrite:
+    """Test the write time limit (FIFO without a reader as a stuck TTY)."""
+
+    @pytest.fixture
+    def stuck_env(self, frame_env, tmp_path):
+        fifo = tmp_path / 'stuck'
+        os.mkfifo(fifo)
+        frame_env['TTY_DEVICE'] = str(fifo)
+        frame_env['TAVS_TTY_WRITE_TIMEOUT'] = '0.2'
+        return frame_env
+
+    def _drops(self, tmp_path):
+        name = f'frame.{str(tmp_path / "stuck").replace("/", "_")}.drops'
+        text = (tmp_path / 'tavs' / name).read_text()
+        return dict(l.split('=', 1) for l in text.splitlines())
+
+    def test_stuck_write_dropped(self, stuck_env, tmp_path):
+        start = time.monotonic()
+        result = run_bash(
+            f'{SOURCE} && tty_frame_begin && tty_write x && tty_frame_flush processing',
+            env=stuck_env, timeout=10)
+        assert result.returncode == 1
+        assert time.monotonic() - start < 5
+        drops = self._drops(tmp_path)
+        assert drops['timeouts'] == '1' and drops['skipped'] == '0'
+        assert int(drops['until']) > int(drops['last'])
+
+    @pytest.mark.parametrize('bashpid', [True, False])
+    def test_stuck_writer_killed(self, stuck_env, tmp_path, bashpid):
+        # Bash 3.2 has no BASHPID; unsetting it takes the same path
+        prefix = '' if bashpid else 'unset BASHPID; '
+        result = run_bash(
+            f'{prefix}{SOURCE} && tty_frame_begin && tty_write x && '
+            'tty_frame_flush processing', env=stuck_env, timeout=10)
+        assert result.returncode == 1
+        time.sleep(0.2)
+        # A writer still blocked on the FIFO would complete its write now
+        fd = os.open(tmp_path / 'stuck', os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            time.sleep(0.2)
+            assert os.read(fd, 64) == b''
+        finally:
+            os.close(fd)
+
+    def test_on_write_skipped_when_dropped(self, stuck_env, tmp_path):
+        marker = tmp_path / 'saved'
+        result = run_bash(
+            f'{SOURCE} && tty_frame_begin && tty_write x && '
+            f'tty_frame_on_write touch "{marker}" && tty_frame_flush processing',
+            env=stuck_env, timeout=10)
+        assert result.returncode == 1
+        assert not marker.exists()
+
+    @pytest.mark.parametrize('stuck', [True, False])
+    def test_title_state_follows_frame(self, stuck_env, tmp_path, stuck):
+        if not stuck:
+            stuck_env['TTY_DEVICE'] = str(tmp_path / 'tty')
+        stuck_env['HOME'] = str(tmp_path)
+        core = f'{PROJECT_ROOT}/src/core'
+        run_bash(
+            f'source "{core}/theme-config-loader.sh" && '
+            f'source "{core}/context-data.sh" && '
+            f'source "{core}/title-management.sh" && '
+            f'TITLE_STATE_DB="{tmp_path}/title" TTY_SAFE=x TAVS_TITLE_MODE=full && '
+            'tty_frame_begin; set_tavs_title permission; '
+            '[[ ! -e "$TITLE_STATE_DB.x" ]] && tty_frame_flush permission',
+            env=stuck_env, timeout=10)
+        # A dropped frame leaves no saved title the terminal never showed
+        assert (tmp_path / 'title.x').exists() != stuck
+
+    def test_write_now_bounded(self, stuck_env, tmp_path):
+        start = time.monotonic()
+        result = run_bash(
+            f'{SOURCE} && tty_frame_begin && tty_write_now "q%s" 1',
+            env=stuck_env, timeout=10)
+        assert result.returncode == 1
+        assert time.monotonic() - start < 5
+        assert self._drops(tmp_path)['timeouts'] == '1'
+
+    def test_backoff_skips_without_waiting(self, stuck_env, tmp_path):
+        run_bash(f'{SOURCE} && tty_frame_begin && tty_write x && tty_frame_flush a',
+                 env=stuck_env, timeout=10)
+        stuck_env['TAVS_TTY_WRITE_TIMEOUT'] = '30'
+        result = run_bash(
+            f'{SOURCE} && tty_frame_begin && tty_write x && tty_frame_flush b',
+            env=stuck_env, timeout=10)
+        assert result.returncode == 1
+        drops = self._drops(tmp_path)
+        assert drops['timeouts'] == '1' and drops['skipped'] == '1'
+
+    def test_drops_reported(self, stuck_env, tmp_path):
+        run_bash(f'{SOURCE} && tty_frame_begin && tty_write x && tty_frame_flush a',
+                 env=stuck_env, timeout=10)
+        result = run_bash(
+            f'{SOURCE} && tty_frame_drops "$TTY_DEVICE" && '
+            'echo "$_TTY_DROP_TIMEOUTS $_TTY_DROP_SKIPPED"', env=stuck_env)
+        assert result.stdout.strip() == '1 0'
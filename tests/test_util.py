@@ -0,0 +1,124 @@
+"""
+Tests for src/core/util.sh - Builtin replacements for tr/date/cat/cksum/mktemp.
+
+Verifies:
+- util_hash produces the same value as `cksum` (registry keys stay stable)
+- util_read_file matches $(cat file) and reports missing files
+- util_strip_ctrl removes the same bytes as `tr -d '\\000-\\037\\177'`
+- Migrated hot paths spawn none of the replaced commands
+"""
+
+import os
+import subprocess
+import pytest
+from conftest import run_bash, PROJECT_ROOT
+
+
+SOURCE = f'source "{PROJECT_ROOT}/src/core/util.sh"'
+
+
+def _cksum(text):
+    result = subprocess.run(['cksum'], input=text.encode(),
+                            capture_output=True, check=True)
+    return result.stdout.split()[0].decode()
+
+
+class TestHelpers:
+    """Test the helpers against the commands they replace."""
+
+    @pytest.mark.parametrize('text', [
+        '', 'a', '/home/user/project', '/tmp/dir with spaces',
+        '/Users/jörg/プロジェクト', 'x' * 300,
+    ])
+    def test_hash_matches_cksum(self, text):
+        env = os.environ.copy()
+        env['TEXT'] = text
+        result = run_bash(f'{SOURCE} && util_hash "$TEXT" && echo "$_UTIL_HASH"',
+                          env=env)
+        assert result.stdout.strip() == _cksum(text)
+
+    def test_read_file_matches_cat(self, tmp_path):
+        path = tmp_path / 'f'
+        path.write_text('3\nsecond line\n\n')
+        result = run_bash(f'{SOURCE} && util_read_file "{path}" && '
+                          f'[[ "$_UTIL_FILE" == "$(cat "{path}")" ]]')
+        assert result.returncode == 0
+
+        result = run_bash(f'{SOURCE} && util_read_file "{tmp_path}/none"')
+        assert result.returncode == 1
+
+    def test_strip_ctrl(self):
+        result = run_bash(
+            f'{SOURCE} && util_strip_ctrl "$(printf "a\\001b\\033[0m\\tc\\177é")" '
+            '&& printf "%s" "$_UTIL_STRIPPED"')
+        assert result.stdout == 'ab[0mcé'
+
+    def test_case_and_tmpfile(self):
+        result = run_bash(
+            f'{SOURCE} && util_upper "claude-x" && util_lower "OFF" && '
+            'util_tmpfile /x/f && a="$_UTIL_TMPFILE" && util_tmpfile /x/f && '
+            'echo "$_UTIL_UPPER $_UTIL_LOWER ${a%%.tmp.*}" && '
+            '[[ "$a" != "$_UTIL_TMPFILE" ]]')
+        assert result.returncode == 0
+        assert result.stdout.split() == ['CLAUDE-X', 'off', '/x/f']
+
+
+REPLACED = ('tr', 'date', 'cat', 'cksum', 'mktemp', 'cut')
+
+
+@pytest.fixture
+def fork_env(tmp_path):
+    """Logging wrappers for the replaced commands on PATH."""
+    bin_dir = tmp_path / 'bin'
+    os.makedirs(bin_dir)
+    log = tmp_path / 'exec.log'
+    for name in REPLACED:
+        real = subprocess.run(['bash', '-c', f'type -P {name}'],
+                              capture_output=True, text=True).stdout.strip()
+        wrapper = bin_dir / name
+        wrapper.write_text(f'#!/bin/sh\necho {name} >> "{log}"\n'
+                           f'exec {real} "$@"\n')
+        wrapper.chmod(0o755)
+
+    env = os.environ.copy()
+    env['PATH'] = f'{bin_dir}:{env["PATH"]}'
+    env['HOME'] = str(tmp_path / 'home')
+    env['TAVS_TMP_DIR'] = str(tmp_path / 'tavs')
+    env['TTY_SAFE'] = '_dev_pts_5'
+    env.pop('XDG_RUNTIME_DIR', None)
+    os.makedirs(tmp_path / 'home')
+    os.makedirs(tmp_path / 'ctx')
+    (tmp_path / 'ctx' / 'context._dev_pts_5').write_text('pct=42\nts=0\n')
+    return env
+
+
+class TestForkFree:
+    """Count exec()s of the replaced commands on the migrated hot paths."""
+
+    def test_hot_paths_spawn_no_replaced_commands(self, fork_env, tmp_path):
+        core = f'{PROJECT_ROOT}/src/core'
+        result = run_bash(
+            f'source "{core}/theme-config-loader.sh" && '
+            f'source "{core}/terminal-osc-sequences.sh" && '
+            f'source "{core}/spinner.sh" && '
+            f'source "{core}/subagent-counter.sh" && '
+            f'source "{core}/identity-registry.sh" && '
+            f'source "{core}/dir-icon.sh" && '
+            f'source "{core}/context-data.sh" && '
+            f'source "{core}/feature-backoff.sh" && '
+            f': > "{tmp_path}/exec.log" && '
+            '_resolve_agent_variables claude; '
+            'get_compact_face processing >/dev/null; '
+            '_build_osc_palette_seq dark >/dev/null; '
+            'sanitize_for_terminal "$(printf "t\\001x")" >/dev/null; '
+            'increment_subagent_count; get_subagent_count >/dev/null; '
+            'decrement_subagent_count >/dev/null; '
+            '_hash_path /some/project >/dev/null; '
+            '_registry_store dir 123 X ""; '
+            '_registry_cleanup_expired dir 60; '
+            f'_TAVS_CONTEXT_STATE_DIR="{tmp_path}/ctx" read_bridge_state; '
+            'record_feature_failure kitty_remote; '
+            'feature_backoff_active kitty_remote; '
+            f'echo "$(< "{tmp_path}/exec.log")"', env=fork_env, timeout=20)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.split() == []